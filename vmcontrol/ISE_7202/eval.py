@@ -15,7 +15,49 @@ def load_trained_policy(args):
     return load(path)
 
 
-def run_evaluation(args, env, agent):
+def load_exported_policy(args):
+    """
+    Loads the exported TorchScript policy, which does not need the network code, and sets
+    the image size and channel arguments from the observation spec saved with it.
+
+        Parameters:
+            args (parsed_args): Arguments for this script
+
+        Returns:
+            agent (InferencePolicy): The policy, on the CPU
+            spec (dict): The spec of the policy, see rlkit.torch.export
+    """
+    from rlkit.torch.export import load_exported_policy as load
+    from rlkit.torch.inference import InferencePolicy
+
+    from pathlib import Path
+    import os
+
+    POLICY_NAME = "policy_int8.pt" if args.int8 else "policy.pt"
+    root_path = str( Path(__file__).resolve().parent )
+    path = os.path.join(root_path, "networks", args.name, POLICY_NAME)
+    policy, spec = load(path)
+
+    observation_spec = spec["observation_spec"]
+    if observation_spec:
+        args.depth = observation_spec["depth"]
+        args.image_size = observation_spec["image_size"]
+    return InferencePolicy(policy), spec
+
+
+def get_policy_input(obs, spec):
+    """
+    The flat policy input: the observation image, followed by the desired goal if the
+    exported policy takes it.
+    """
+    import numpy as np
+
+    if spec is None or spec["input_size"] == obs["observation"].size:
+        return obs["observation"]
+    return np.hstack((obs["observation"], obs["desired_goal"]))
+
+
+def run_evaluation(args, env, agent, spec=None):
     from train import wrap_environment
 
     env = wrap_environment(env, args)
@@ -27,7 +69,7 @@ def run_evaluation(args, env, agent):
             print('Reset Episode')
             obs = env.reset()
 
-        action = agent.get_action(obs['observation'])[0]
+        action = agent.get_action(get_policy_input(obs, spec))[0]
 
         input("press enter to take action...")
 
@@ -39,12 +81,16 @@ def run_evaluation(args, env, agent):
 
 
 def main(args):
+    spec = None
+    if args.exported:
+        policy, spec = load_exported_policy(args)
+    else:
+        policy = load_trained_policy(args)
     evaluation_env = get_gym_environment(args)
-    policy = load_trained_policy(args)
 
     print('[DEBUG] Loaded all, ready to run simulation')
 
-    run_evaluation(args, evaluation_env, policy)
+    run_evaluation(args, evaluation_env, policy, spec)
     
     # NOTE: Always close the environment
     evaluation_env.close()
@@ -78,9 +124,24 @@ if __name__ == "__main__":
         help="Include this flag to use the chosen environment with domain randomization"
     )
 
+    parser.add_argument(
+        "--exported",
+        action  = 'store_true',
+        default = False,
+        help = "Include this flag to run the exported policy.pt, whose image size and depth are saved with it."
+    )
+
+    parser.add_argument(
+        "--int8",
+        action  = 'store_true',
+        default = False,
+        help = "With --exported, run the int8 quantized policy_int8.pt."
+    )
+
     # NOTE: The following are network-specific attributes which _should_ be saved with the network.
     #       But I don't have the time nor the energy to do this right now. Best to put them in the
     #       network name so you don't forget. Or implement it yourself! Sorry about that.
+    #       With --exported they are read from the policy file instead.
     parser.add_argument(
         "--depth",
         action  = 'store_true',
@@ -170,7 +170,8 @@ def get_td3_trainer_and_policy(args, env, her = False):
     from torch import nn
 
     from rlkit.torch.td3.td3 import TD3Trainer
-    from rlkit.torch.conv_networks import FlattenCNN, TanhCNNPolicy
+    from rlkit.torch.conv_networks import ConvEncoder, FlattenCNN, SharedEncoderQf, TanhCNNPolicy, \
+        TanhSharedEncoderPolicy
 
     from rlkit.exploration_strategies.base import PolicyWrappedWithExplorationStrategy
     from rlkit.exploration_strategies.gaussian_and_epsilon_strategy import GaussianAndEpsilonStrategy
@@ -263,6 +264,53 @@ def get_td3_trainer_and_policy(args, env, her = False):
             **cnn_kwargs
         )
     
+    def get_shared_encoder_networks():
+        '''
+        Returns a policy and two critics that are MLP heads on one ConvEncoder, so
+        that the observation images are encoded once for all of them.
+
+            Returns:
+                policy, qf1, qf2: Neural network structures sharing their encoder
+        '''
+        encoder = ConvEncoder(
+            input_width    = cnn_kwargs['input_width'],
+            input_height   = cnn_kwargs['input_height'],
+            input_channels = cnn_kwargs['input_channels'],
+            kernel_sizes   = cnn_kwargs['kernel_sizes'],
+            n_channels     = cnn_kwargs['n_channels'],
+            strides        = cnn_kwargs['strides'],
+            paddings       = cnn_kwargs['paddings'],
+            # The goal that follows the image is passed on to the heads
+            added_input_size  = goal_dim,
+            batch_norm_conv   = cnn_kwargs['batch_norm_conv'],
+            hidden_init       = cnn_kwargs['hidden_init'],
+            hidden_activation = cnn_kwargs['hidden_activation'],
+        )
+        head_kwargs = dict(
+            hidden_sizes      = cnn_kwargs['hidden_sizes'],
+            hidden_init       = cnn_kwargs['hidden_init'],
+            hidden_activation = cnn_kwargs['hidden_activation'],
+        )
+        policy = TanhSharedEncoderPolicy(
+            encoder,
+            output_size=action_dim,
+            detach_encoder=args.detach_actor_encoder,
+            **head_kwargs
+        )
+        qf1 = SharedEncoderQf(encoder, added_fc_input_size=action_dim, **head_kwargs)
+        qf2 = SharedEncoderQf(encoder, added_fc_input_size=action_dim, **head_kwargs)
+        return policy, qf1, qf2
+
+    if args.shared_encoder:
+        policy, qf1, qf2 = get_shared_encoder_networks()
+        target_policy, target_qf1, target_qf2 = get_shared_encoder_networks()
+        trainer_kwargs['encoder_tau'] = args.encoder_tau
+    else:
+        policy = get_actor_network()
+        target_policy = get_actor_network()
+        qf1, qf2 = get_critic_network(), get_critic_network()
+        target_qf1, target_qf2 = get_critic_network(), get_critic_network()
+
     # Epsilon-random strategy that adds gaussian noise
     # to the non-random actions
     strategy = GaussianAndEpsilonStrategy(
@@ -280,11 +328,11 @@ def get_td3_trainer_and_policy(args, env, her = False):
 
     td3_trainer = TD3Trainer(
         policy = policy,
-        target_policy = get_actor_network(),
-        qf1 = get_critic_network(),
-        target_qf1 = get_critic_network(),
-        qf2 = get_critic_network(),
-        target_qf2 = get_critic_network(),
+        target_policy = target_policy,
+        qf1 = qf1,
+        target_qf1 = target_qf1,
+        qf2 = qf2,
+        target_qf2 = target_qf2,
         **trainer_kwargs
     )
 
@@ -506,21 +554,47 @@ def check_save_path(args):
     return path
 
 
-def save_td3_networks(trainer, path):
+def get_observation_spec(args):
+    """
+    Describes the observations the policy is trained on, so that they are saved with it.
+
+        Parameters:
+            args (parsed_args): Arguments for this script
+
+        Returns:
+            observation_spec (dict): Observation keys, image size and channel of the policy input
+    """
+    return dict(
+        observation_key  = OBSERVATION_KEY,
+        desired_goal_key = DESIRED_GOAL_KEY,
+        obs_mode         = "visiondepth",
+        depth            = args.depth,
+        image_channels   = 1 if args.depth else 3,
+        image_size       = args.image_size,
+    )
+
+
+def save_td3_networks(trainer, path, observation_spec=None):
     """
     Saves each network from the trainer (even though just the policy is needed).
     Networks are saved in /ISE_7202/networks/[NAME] where [NAME] is an input argument.
 
+    The policy is also exported with its architecture and observation spec as a TorchScript
+    file, policy.pt, and its int8 CPU variant, policy_int8.pt, see rlkit.torch.export.
+
     Note that this will overwrite any existing files. The `check_save_path` attempts to verify
     for users if this is intentional. Best practice is to call that first.
 
         Parameters:
             trainer (HERTrainer or TD3Trainer): Network to be saved.
             path (Path): Path to the directory all the files are saved in
+            observation_spec (dict): Observations of the policy, see `get_observation_spec`
     """
     from torch import save
     from torch.nn import Module
 
+    from rlkit.torch.export import export_policy
+
     import os
 
     network_dict = trainer.get_snapshot()
@@ -535,6 +609,10 @@ def save_td3_networks(trainer, path):
         fpath = os.path.join(path, fname)
         save(network, fpath)
 
+    policy = network_dict["trained_policy"]
+    export_policy(policy, os.path.join(path, "policy.pt"), observation_spec)
+    export_policy(policy, os.path.join(path, "policy_int8.pt"), observation_spec, int8=True)
+
 
 def set_pt_device(args):
     """
@@ -573,7 +651,7 @@ def main(args):
 
         run_algorithm(args, explore_env, td3_her_trainer, exploration_policy)
 
-        save_td3_networks(td3_her_trainer, save_path)
+        save_td3_networks(td3_her_trainer, save_path, get_observation_spec(args))
         
         print("[INFO] Finished main!")
     except Exception as e:
@@ -671,6 +749,28 @@ if __name__ == "__main__":
     )
 
 
+    parser.add_argument(
+        "--shared-encoder",
+        action  = 'store_true',
+        default = False,
+        help = "Include this flag to encode the images with one conv trunk shared by the actor and critic heads."
+    )
+
+    parser.add_argument(
+        "--detach-actor-encoder",
+        action  = 'store_true',
+        default = False,
+        help = "With --shared-encoder, stop the actor gradients at the encoder so only the critics train it."
+    )
+
+    parser.add_argument(
+        "--encoder-tau",
+        type = float,
+        default = 0.005,
+        help = "With --shared-encoder, Polyak rate of the target encoder."
+    )
+
+
     args = parser.parse_args()
     
     # The RLBench `visiondepth` observation mode returns a list for the "observation" key of
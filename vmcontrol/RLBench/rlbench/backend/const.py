@@ -14,6 +14,7 @@ EPISODE_FOLDER = 'episode%d'
 VARIATIONS_FOLDER = 'variation%d'
 
 LOW_DIM_PICKLE = 'low_dim_obs.pkl'
+PACKED_DEMO = 'packed_obs.npz'
 VARIATION_DESCRIPTIONS = 'variation_descriptions.pkl'
 
 TTT_FILE = 'task_design.ttt'
@@ -0,0 +1,295 @@
+"""Decoding of the images of stored demos.
+
+Stored demos keep one PNG per frame, per camera and per image type. This
+module decodes them across a pool of threads (PIL releases the GIL while
+decoding), can defer the decoding until a field of an observation is read
+(see LazyObservation), and reads/writes an optional packed format that keeps
+the already decoded frames of an episode in a single file (PACKED_DEMO).
+"""
+
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from os import listdir
+from os.path import join, exists
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from rlbench.backend.const import *
+from rlbench.backend.observation import Observation
+from rlbench.backend.utils import image_to_float_array, rgb_handles_to_mask
+from rlbench.demo import Demo
+
+# (observation field, camera attribute of ObservationConfig, image type)
+IMAGE_FIELDS = [
+    ('left_shoulder_rgb', 'left_shoulder_camera', 'rgb'),
+    ('left_shoulder_depth', 'left_shoulder_camera', 'depth'),
+    ('left_shoulder_mask', 'left_shoulder_camera', 'mask'),
+    ('right_shoulder_rgb', 'right_shoulder_camera', 'rgb'),
+    ('right_shoulder_depth', 'right_shoulder_camera', 'depth'),
+    ('right_shoulder_mask', 'right_shoulder_camera', 'mask'),
+    ('wrist_rgb', 'wrist_camera', 'rgb'),
+    ('wrist_depth', 'wrist_camera', 'depth'),
+    ('wrist_mask', 'wrist_camera', 'mask'),
+]
+
+_FIELD_FOLDERS = {
+    'left_shoulder_rgb': LEFT_SHOULDER_RGB_FOLDER,
+    'left_shoulder_depth': LEFT_SHOULDER_DEPTH_FOLDER,
+    'left_shoulder_mask': LEFT_SHOULDER_MASK_FOLDER,
+    'right_shoulder_rgb': RIGHT_SHOULDER_RGB_FOLDER,
+    'right_shoulder_depth': RIGHT_SHOULDER_DEPTH_FOLDER,
+    'right_shoulder_mask': RIGHT_SHOULDER_MASK_FOLDER,
+    'wrist_rgb': WRIST_RGB_FOLDER,
+    'wrist_depth': WRIST_DEPTH_FOLDER,
+    'wrist_mask': WRIST_MASK_FOLDER,
+}
+
+
+def _resize_if_needed(image, size):
+    if image.size[0] != size[0] or image.size[1] != size[1]:
+        image = image.resize(size)
+    return image
+
+
+def decode_frame(path: str, kind: str, size: Tuple[int, int]):
+    """Decodes a stored PNG the same way TaskEnvironment always did.
+
+    :param path: The PNG file.
+    :param kind: One of 'rgb', 'depth' or 'mask'.
+    :param size: The image size of the camera in the ObservationConfig.
+    :return: The decoded image.
+    """
+    return _decode(_resize_if_needed(Image.open(path), size), kind)
+
+
+def _decode(image, kind: str):
+    """Decodes the pixels of a stored PNG, as an image or an array."""
+    if kind == 'rgb':
+        return np.array(image)
+    elif kind == 'depth':
+        return image_to_float_array(image, DEPTH_SCALE)
+    # Masks are stored as coded RGB images.
+    # Here we transform them into 1 channel handles.
+    return rgb_handles_to_mask(np.array(image))
+
+
+class FrameRef(object):
+    """A frame that is still on disk, as a PNG file."""
+
+    __slots__ = ['path', 'kind', 'size']
+
+    def __init__(self, path: str, kind: str, size: Tuple[int, int]):
+        self.path = path
+        self.kind = kind
+        self.size = tuple(size)
+
+    def load(self):
+        return decode_frame(self.path, self.kind, self.size)
+
+
+class PackedFrameRef(object):
+    """A frame of a packed episode, read through a memory map.
+
+    The packed frames are the pixels of the PNGs, e.g. the RGB coded depth
+    and masks, which are resized and decoded like a FrameRef does.
+    """
+
+    __slots__ = ['path', 'field', 'kind', 'index', 'size']
+
+    def __init__(self, path: str, field: str, kind: str, index: int,
+                 size: Tuple[int, int]):
+        self.path = path
+        self.field = field
+        self.kind = kind
+        self.index = index
+        self.size = tuple(size)
+
+    def load(self):
+        frame = open_packed(self.path)[self.field][self.index]
+        if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+            return _decode(Image.fromarray(frame).resize(self.size), self.kind)
+        return _decode(np.array(frame), self.kind)
+
+
+_FRAME_REFS = (FrameRef, PackedFrameRef)
+
+
+class _LazyField(object):
+    """Data descriptor that decodes a frame reference when it is read.
+
+    The value lives in the instance __dict__ under the field name, so a
+    pickled Observation can be turned into a LazyObservation as it is.
+    Decoded frames are not kept: every read decodes the frame again, which
+    keeps the memory of a large set of demos bounded.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.name)
+        if isinstance(value, _FRAME_REFS):
+            return value.load()
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+
+class LazyObservation(Observation):
+    """An Observation whose images are decoded when they are accessed."""
+
+    left_shoulder_rgb = _LazyField('left_shoulder_rgb')
+    left_shoulder_depth = _LazyField('left_shoulder_depth')
+    left_shoulder_mask = _LazyField('left_shoulder_mask')
+    right_shoulder_rgb = _LazyField('right_shoulder_rgb')
+    right_shoulder_depth = _LazyField('right_shoulder_depth')
+    right_shoulder_mask = _LazyField('right_shoulder_mask')
+    wrist_rgb = _LazyField('wrist_rgb')
+    wrist_depth = _LazyField('wrist_depth')
+    wrist_mask = _LazyField('wrist_mask')
+
+    @staticmethod
+    def from_observation(obs: Observation) -> 'LazyObservation':
+        lazy = LazyObservation.__new__(LazyObservation)
+        lazy.__dict__.update(obs.__dict__)
+        return lazy
+
+    def is_loaded(self, field: str) -> bool:
+        """False while the field is still a reference to a file."""
+        return not isinstance(self.__dict__.get(field), _FRAME_REFS)
+
+
+def _camera_wants(obs_config, camera: str, kind: str) -> bool:
+    return getattr(getattr(obs_config, camera), kind)
+
+
+def frame_refs(observations: List[Observation], obs_config,
+               packed_path: str = None) -> list:
+    """Lists the frames that the obs_config asks for.
+
+    The image fields of the observations must hold the paths of their PNGs
+    (as set by TaskEnvironment._get_stored_demos).
+
+    :return: A list of (observation index, field, reference).
+    """
+    packed = open_packed(packed_path) if packed_path is not None else {}
+    refs = []
+    for i, obs in enumerate(observations):
+        for field, camera, kind in IMAGE_FIELDS:
+            if not _camera_wants(obs_config, camera, kind):
+                continue
+            size = getattr(obs_config, camera).image_size
+            if field in packed:
+                refs.append(
+                    (i, field,
+                     PackedFrameRef(packed_path, field, kind, i, size)))
+                continue
+            path = obs.__dict__.get(field)
+            if isinstance(path, str):
+                refs.append((i, field, FrameRef(path, kind, size)))
+    return refs
+
+
+def load_frames(observations: List[Observation], obs_config,
+                lazy: bool = False, num_workers: int = 1,
+                packed_path: str = None) -> List[Observation]:
+    """Replaces the image paths of stored observations by their images.
+
+    :param observations: The observations of one episode.
+    :param obs_config: The ObservationConfig of the task environment.
+    :param lazy: Return LazyObservations that decode their frames when they
+        are accessed, instead of decoding everything now.
+    :param num_workers: Number of decoding threads, when not lazy.
+    :param packed_path: The PACKED_DEMO file of the episode, if any.
+    :return: The observations.
+    """
+    refs = frame_refs(observations, obs_config, packed_path)
+    if lazy:
+        lazy_observations = [LazyObservation.from_observation(o)
+                             for o in observations]
+        for i, field, ref in refs:
+            setattr(lazy_observations[i], field, ref)
+        if isinstance(observations, Demo):
+            observations._observations = lazy_observations
+            return observations
+        return lazy_observations
+
+    if num_workers > 1:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            frames = list(pool.map(lambda r: r[2].load(), refs))
+    else:
+        frames = [ref.load() for _, _, ref in refs]
+    for (i, field, _), frame in zip(refs, frames):
+        setattr(observations[i], field, frame)
+    return observations
+
+
+@lru_cache(maxsize=32)
+def open_packed(path: str) -> dict:
+    """Memory maps the arrays of a PACKED_DEMO file.
+
+    The file is an uncompressed npz archive, so each member is a plain .npy
+    file at a fixed offset and can be mapped without being read.
+
+    :return: A dict of field name to read only array.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise RuntimeError(
+                    'Packed demo %s must not be compressed.' % path)
+            # The local header is 30 bytes, followed by the name and extra.
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            shape, fortran_order, dtype = header
+            arrays[info.filename[:-len('.npy')]] = np.memmap(
+                path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                order='F' if fortran_order else 'C')
+    return arrays
+
+
+def pack_episode(example_path: str, size: Tuple[int, int] = None) -> str:
+    """Writes the PACKED_DEMO file of a stored episode.
+
+    Every image folder of the episode is decoded once and kept as a
+    (num_steps, H, W[, C]) uint8 array of the PNG pixels, the depth and masks
+    still RGB coded, so that a PackedFrameRef at another camera size resizes
+    the same pixels as a FrameRef. The PNG folders are left in place.
+
+    :param example_path: The episode folder.
+    :param size: Resize the frames to this size, None keeps the stored size.
+    :return: The path of the packed file.
+    """
+    arrays = {}
+    for field, _, kind in IMAGE_FIELDS:
+        folder = join(example_path, _FIELD_FOLDERS[field])
+        if not exists(folder) or len(listdir(folder)) == 0:
+            continue
+        num_steps = len(listdir(folder))
+        frames = []
+        for i in range(num_steps):
+            path = join(folder, IMAGE_FORMAT % i)
+            image = Image.open(path)
+            if size is not None:
+                image = _resize_if_needed(image, size)
+            frames.append(np.array(image))
+        arrays[field] = np.stack(frames)
+    packed_path = join(example_path, PACKED_DEMO)
+    # np.savez stores the members uncompressed, which open_packed relies on.
+    np.savez(packed_path, **arrays)
+    open_packed.cache_clear()
+    return packed_path
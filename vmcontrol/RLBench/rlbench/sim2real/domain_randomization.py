@@ -68,7 +68,9 @@ class VisualRandomizationConfig(RandomizationConfig):
                  #TODO: BAKE IN LOGIC FOR ARMS
                  apply_arm = False,
                  apply_gripper = False,
-                 apply_floor = False
+                 apply_floor = False,
+                 texture_cache_size: int = 64,
+                 preload_textures: bool = False
                  ):
         super().__init__(whitelist, blacklist)
         self._image_directory = image_directory
@@ -86,6 +88,12 @@ class VisualRandomizationConfig(RandomizationConfig):
         self.apply_arm = apply_arm
         self.apply_gripper = apply_gripper
         self.apply_floor = apply_floor
+        # Textures kept loaded between randomizations, see TextureBank.
+        self.texture_cache_size = texture_cache_size
+        self.preload_textures = preload_textures
+
+    def get_image_files(self) -> List[str]:
+        return list(self._imgs)
 
     def sample(self, samples: int) -> np.ndarray:
         return np.random.choice(self._imgs, samples, replace=False)
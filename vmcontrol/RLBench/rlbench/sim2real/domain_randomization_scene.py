@@ -7,6 +7,7 @@ from rlbench.backend.scene import Scene
 from rlbench.observation_config import ObservationConfig
 from rlbench.backend.robot import Robot
 from rlbench.sim2real.domain_randomization import RandomizeEvery
+from rlbench.sim2real.texture_bank import TextureBank
 
 SCENE_OBJECTS = ['Floor', 'Roof', 'Wall1', 'Wall2', 'Wall3', 'Wall4',
                  'diningTable_visible']
@@ -51,6 +52,14 @@ class DomainRandomizationScene(Scene):
                 # Make the floor plane renderable (to cover old floor)
                 self._scene_objects[0].set_renderable(True)
 
+        self._texture_bank = None
+        if self._visual_rand_config is not None:
+            self._texture_bank = TextureBank(
+                self._pyrep, self._visual_rand_config.texture_cache_size)
+            if self._visual_rand_config.preload_textures:
+                self._texture_bank.preload(
+                    self._visual_rand_config.get_image_files())
+
     def _should_randomize_episode(self, index: int):
         rand = self._count % self._frequency == 0 or self._count == 0
         if self._randomize_every == RandomizeEvery.VARIATION:
@@ -72,7 +81,7 @@ class DomainRandomizationScene(Scene):
             for file, obj in zip(files, tree):
                 if self._visual_rand_config.should_randomize(obj.get_name()):
                     # print(obj.get_name())
-                    text_ob, texture = self._pyrep.create_texture(file)
+                    texture = self._texture_bank.get(file)
                     try:
                         obj.set_texture(texture, **TEX_KWARGS)
                     except RuntimeError:
@@ -80,7 +89,8 @@ class DomainRandomizationScene(Scene):
                         for o in ungrouped:
                             o.set_texture(texture, **TEX_KWARGS)
                         self._pyrep.group_objects(ungrouped)
-                    text_ob.remove()
+            # Only once applied, the shapes keep any texture dropped here.
+            self._texture_bank.trim()
 
     def init_task(self) -> None:
         super().init_task()
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from typing import List
+
+from pyrep import PyRep
+from pyrep.textures.texture import Texture
+
+# Where the helper shapes that hold the cached textures are parked.
+_HIDDEN_POSITION = [0., 0., -100.]
+
+
+class TextureBank(object):
+    """Loads each texture file once and keeps the texture for later episodes.
+
+    CoppeliaSim only creates a texture together with a textured plane, and
+    the texture lives as long as a shape uses it. The bank keeps that plane,
+    hidden, for every cached file so the texture can be applied again by
+    handle instead of being read from disk and created again.
+    """
+
+    def __init__(self, pyrep: PyRep, max_textures: int = 64):
+        """
+        :param pyrep: The simulator the textures are created in.
+        :param max_textures: Number of textures kept once trim() is called,
+            least recently used first out. 0 keeps none, which is the same as
+            creating every texture when it is needed.
+        """
+        self._pyrep = pyrep
+        self._max_textures = max_textures
+        self._textures = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._textures)
+
+    def __contains__(self, filename: str):
+        return filename in self._textures
+
+    def get(self, filename: str) -> Texture:
+        """Gets the texture of a file, creating it on the first request."""
+        if filename in self._textures:
+            self._textures.move_to_end(filename)
+            self.hits += 1
+            return self._textures[filename][1]
+        self.misses += 1
+        holder, texture = self._pyrep.create_texture(filename)
+        holder.set_renderable(False)
+        holder.set_detectable(False)
+        holder.set_collidable(False)
+        holder.set_position(_HIDDEN_POSITION)
+        self._textures[filename] = (holder, texture)
+        return texture
+
+    def preload(self, filenames: List[str]) -> None:
+        """Creates the textures of the given files, up to max_textures."""
+        for filename in filenames[:self._max_textures]:
+            self.get(filename)
+
+    def trim(self) -> None:
+        """Drops the least recently used textures above max_textures.
+
+        Call it once the textures have been applied: shapes that use a
+        dropped texture keep it, only the cached handle is released.
+        """
+        while len(self._textures) > self._max_textures:
+            _, (holder, _) = self._textures.popitem(last=False)
+            holder.remove()
+
+    def clear(self) -> None:
+        for holder, _ in self._textures.values():
+            holder.remove()
+        self._textures.clear()
@@ -2,14 +2,13 @@ from os import listdir
 from os.path import join, exists
 import pickle
 import numpy as np
-from PIL import Image
 from pyrep import PyRep
 from pyrep.errors import IKError
 from rlbench.backend.exceptions import BoundaryError, WaypointError
 from rlbench.backend.scene import Scene
 from rlbench.backend.task import Task
 from rlbench.backend.const import *
-from rlbench.backend.utils import image_to_float_array, rgb_handles_to_mask
+from rlbench.backend.demo_loader import load_frames
 from rlbench.backend.robot import Robot
 import logging
 from typing import List
@@ -295,8 +294,16 @@ class TaskEnvironment(object):
         return self._scene.get_observation(), int(success), terminate
 
     def get_demos(self, amount: int, live_demos=False,
-                  image_paths=True) -> List[Demo]:
-        """Negative means all demos"""
+                  image_paths=True, lazy=False,
+                  num_workers=1) -> List[Demo]:
+        """Negative means all demos.
+
+        When loading stored demos with image_paths=False, lazy=True returns
+        observations that only decode an image when it is accessed, and
+        num_workers > 1 decodes the images on that many threads. Episodes
+        that were packed with demo_loader.pack_episode are read from their
+        packed file.
+        """
 
         if not live_demos and (self._dataset_root is None
                        or len(self._dataset_root) == 0):
@@ -307,7 +314,8 @@ class TaskEnvironment(object):
             if self._dataset_root is None or len(self._dataset_root) == 0:
                 raise RuntimeError(
                     "Can't ask for stored demo when no dataset root provided.")
-            demos = self._get_stored_demos(amount, image_paths)
+            demos = self._get_stored_demos(
+                amount, image_paths, lazy, num_workers)
         else:
             ctr_loop = self._robot.arm.joints[0].is_control_loop_enabled()
             self._robot.arm.joints[0].set_control_loop_enabled(True)
@@ -336,12 +344,9 @@ class TaskEnvironment(object):
                     'Could not collect demos. Maybe a problem with the task?')
         return demos
 
-    def _resize_if_needed(self, image, size):
-        if image.size[0] != size[0] or image.size[1] != size[1]:
-            image = image.resize(size)
-        return image
-
-    def _get_stored_demos(self, amount: int, image_paths: bool) -> List[Demo]:
+    def _get_stored_demos(self, amount: int, image_paths: bool,
+                          lazy: bool = False,
+                          num_workers: int = 1) -> List[Demo]:
 
         task_root = join(self._dataset_root, self._task.get_name())
         if not exists(task_root):
@@ -428,59 +433,10 @@ class TaskEnvironment(object):
                     obs[i].task_low_dim_state = None
 
             if not image_paths:
-                for i in range(num_steps):
-                    if obs_config.left_shoulder_camera.rgb:
-                        obs[i].left_shoulder_rgb = np.array(
-                            self._resize_if_needed(
-                                Image.open(obs[i].left_shoulder_rgb),
-                                obs_config.left_shoulder_camera.image_size))
-                    if obs_config.right_shoulder_camera.rgb:
-                        obs[i].right_shoulder_rgb = np.array(
-                            self._resize_if_needed(Image.open(
-                            obs[i].right_shoulder_rgb),
-                                obs_config.right_shoulder_camera.image_size))
-                    if obs_config.wrist_camera.rgb:
-                        obs[i].wrist_rgb = np.array(
-                            self._resize_if_needed(
-                                Image.open(obs[i].wrist_rgb),
-                                obs_config.wrist_camera.image_size))
-
-                    if obs_config.left_shoulder_camera.depth:
-                        obs[i].left_shoulder_depth = image_to_float_array(
-                            self._resize_if_needed(
-                                Image.open(obs[i].left_shoulder_depth),
-                                obs_config.left_shoulder_camera.image_size),
-                            DEPTH_SCALE)
-                    if obs_config.right_shoulder_camera.depth:
-                        obs[i].right_shoulder_depth = image_to_float_array(
-                            self._resize_if_needed(
-                                Image.open(obs[i].right_shoulder_depth),
-                                obs_config.right_shoulder_camera.image_size),
-                            DEPTH_SCALE)
-                    if obs_config.wrist_camera.depth:
-                        obs[i].wrist_depth = image_to_float_array(
-                            self._resize_if_needed(
-                                Image.open(obs[i].wrist_depth),
-                                obs_config.wrist_camera.image_size),
-                            DEPTH_SCALE)
-
-                    # Masks are stored as coded RGB images.
-                    # Here we transform them into 1 channel handles.
-                    if obs_config.left_shoulder_camera.mask:
-                        obs[i].left_shoulder_mask = rgb_handles_to_mask(
-                            np.array(self._resize_if_needed(Image.open(
-                                obs[i].left_shoulder_mask),
-                                obs_config.left_shoulder_camera.image_size)))
-                    if obs_config.right_shoulder_camera.mask:
-                        obs[i].right_shoulder_mask = rgb_handles_to_mask(
-                            np.array(self._resize_if_needed(Image.open(
-                                obs[i].right_shoulder_mask),
-                                obs_config.right_shoulder_camera.image_size)))
-                    if obs_config.wrist_camera.mask:
-                        obs[i].wrist_mask = rgb_handles_to_mask(np.array(
-                            self._resize_if_needed(Image.open(
-                                obs[i].wrist_mask),
-                                obs_config.wrist_camera.image_size)))
+                packed_path = join(example_path, PACKED_DEMO)
+                obs = load_frames(
+                    obs, obs_config, lazy=lazy, num_workers=num_workers,
+                    packed_path=packed_path if exists(packed_path) else None)
 
             demos.append(obs)
         return demos
@@ -0,0 +1,135 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+import numpy as np
+from PIL import Image
+
+from rlbench.backend import demo_loader
+from rlbench.backend.const import *
+from rlbench.backend.observation import Observation
+from rlbench.observation_config import ObservationConfig
+
+NUM_STEPS = 4
+IMAGE_SIZE = (32, 32)
+
+
+def _empty_observation():
+    return Observation(*([None] * 17))
+
+
+def make_episode(example_path):
+    """Writes a small stored episode with random frames for every camera."""
+    for folder in [LEFT_SHOULDER_RGB_FOLDER, RIGHT_SHOULDER_RGB_FOLDER,
+                   WRIST_RGB_FOLDER, LEFT_SHOULDER_MASK_FOLDER,
+                   RIGHT_SHOULDER_MASK_FOLDER, WRIST_MASK_FOLDER]:
+        os.makedirs(join(example_path, folder))
+        for i in range(NUM_STEPS):
+            Image.fromarray(np.random.randint(
+                0, 256, IMAGE_SIZE + (3,), dtype=np.uint8)).save(
+                join(example_path, folder, IMAGE_FORMAT % i))
+    for folder in [LEFT_SHOULDER_DEPTH_FOLDER, RIGHT_SHOULDER_DEPTH_FOLDER,
+                   WRIST_DEPTH_FOLDER]:
+        os.makedirs(join(example_path, folder))
+        for i in range(NUM_STEPS):
+            Image.fromarray(np.random.randint(
+                0, 256, IMAGE_SIZE, dtype=np.uint8)).save(
+                join(example_path, folder, IMAGE_FORMAT % i))
+    obs = [_empty_observation() for _ in range(NUM_STEPS)]
+    with open(join(example_path, LOW_DIM_PICKLE), 'wb') as f:
+        pickle.dump(obs, f)
+
+
+def stored_observations(example_path):
+    with open(join(example_path, LOW_DIM_PICKLE), 'rb') as f:
+        obs = pickle.load(f)
+    for i, o in enumerate(obs):
+        for field, _, _ in demo_loader.IMAGE_FIELDS:
+            setattr(o, field, join(example_path,
+                                   demo_loader._FIELD_FOLDERS[field],
+                                   IMAGE_FORMAT % i))
+    return obs
+
+
+class TestDemoLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.example_path = join(self.tmp_dir, EPISODE_FOLDER % 0)
+        make_episode(self.example_path)
+        self.obs_config = ObservationConfig()
+        self.obs_config.set_all(True)
+        for camera in [self.obs_config.left_shoulder_camera,
+                       self.obs_config.right_shoulder_camera,
+                       self.obs_config.wrist_camera]:
+            camera.image_size = IMAGE_SIZE
+
+    def tearDown(self):
+        demo_loader.open_packed.cache_clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def load(self, **kwargs):
+        return demo_loader.load_frames(
+            stored_observations(self.example_path), self.obs_config,
+            **kwargs)
+
+    def assert_same_frames(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for e, a in zip(expected, actual):
+            for field, _, _ in demo_loader.IMAGE_FIELDS:
+                np.testing.assert_array_equal(
+                    getattr(e, field), getattr(a, field))
+
+    def test_eager_loads_arrays(self):
+        obs = self.load()
+        self.assertIsInstance(obs[0].wrist_rgb, np.ndarray)
+        self.assertEqual(obs[0].wrist_rgb.shape, IMAGE_SIZE + (3,))
+        self.assertEqual(obs[0].wrist_depth.shape, IMAGE_SIZE)
+        self.assertEqual(obs[0].wrist_mask.shape, IMAGE_SIZE)
+
+    def test_parallel_matches_sequential(self):
+        self.assert_same_frames(self.load(), self.load(num_workers=4))
+
+    def test_lazy_decodes_on_access(self):
+        obs = self.load(lazy=True)
+        self.assertIsInstance(obs[0], demo_loader.LazyObservation)
+        self.assertFalse(obs[0].is_loaded('wrist_rgb'))
+        self.assert_same_frames(self.load(), obs)
+
+    def test_lazy_observation_pickles(self):
+        obs = pickle.loads(pickle.dumps(self.load(lazy=True)))
+        self.assert_same_frames(self.load(), obs)
+
+    def test_packed_matches_png(self):
+        packed_path = demo_loader.pack_episode(self.example_path)
+        self.assertTrue(packed_path.endswith(PACKED_DEMO))
+        expected = self.load()
+        self.assert_same_frames(expected, self.load(packed_path=packed_path))
+        self.assert_same_frames(
+            expected, self.load(packed_path=packed_path, lazy=True))
+
+    def test_packed_at_another_camera_size(self):
+        packed_path = demo_loader.pack_episode(self.example_path)
+        for camera in [self.obs_config.left_shoulder_camera,
+                       self.obs_config.right_shoulder_camera,
+                       self.obs_config.wrist_camera]:
+            camera.image_size = (24, 24)
+        expected = self.load()
+        self.assertEqual(expected[0].wrist_mask.shape, (24, 24))
+        self.assert_same_frames(expected, self.load(packed_path=packed_path))
+        self.assert_same_frames(
+            expected, self.load(packed_path=packed_path, lazy=True))
+
+    def test_packed_arrays_are_memory_mapped(self):
+        packed_path = demo_loader.pack_episode(self.example_path)
+        arrays = demo_loader.open_packed(packed_path)
+        self.assertIsInstance(arrays['wrist_rgb'], np.memmap)
+        self.assertEqual(arrays['wrist_rgb'].shape,
+                         (NUM_STEPS,) + IMAGE_SIZE + (3,))
+        # the masks are kept RGB coded, as in their PNGs
+        self.assertEqual(arrays['wrist_mask'].dtype, np.uint8)
+        self.assertEqual(arrays['wrist_mask'].shape,
+                         (NUM_STEPS,) + IMAGE_SIZE + (3,))
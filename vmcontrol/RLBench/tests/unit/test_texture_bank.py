@@ -0,0 +1,91 @@
+import unittest
+
+from pyrep.textures.texture import Texture
+
+from rlbench.sim2real.texture_bank import TextureBank
+
+
+class StubShape(object):
+
+    def __init__(self):
+        self.removed = False
+        self.renderable = True
+
+    def set_renderable(self, value):
+        self.renderable = value
+
+    def set_detectable(self, value):
+        pass
+
+    def set_collidable(self, value):
+        pass
+
+    def set_position(self, position):
+        pass
+
+    def remove(self):
+        self.removed = True
+
+
+class StubPyRep(object):
+    """Counts create_texture calls instead of loading anything."""
+
+    def __init__(self):
+        self.created = []
+
+    def create_texture(self, filename):
+        shape = StubShape()
+        self.created.append((filename, shape))
+        return shape, Texture(len(self.created))
+
+
+class TestTextureBank(unittest.TestCase):
+
+    def setUp(self):
+        self.pyrep = StubPyRep()
+
+    def test_texture_created_once(self):
+        bank = TextureBank(self.pyrep, max_textures=4)
+        first = bank.get('a.png')
+        self.assertEqual(bank.get('a.png'), first)
+        self.assertEqual(len(self.pyrep.created), 1)
+        self.assertEqual((bank.hits, bank.misses), (1, 1))
+
+    def test_holder_is_hidden(self):
+        bank = TextureBank(self.pyrep, max_textures=4)
+        bank.get('a.png')
+        self.assertFalse(self.pyrep.created[0][1].renderable)
+
+    def test_trim_evicts_least_recently_used(self):
+        bank = TextureBank(self.pyrep, max_textures=2)
+        for name in ['a.png', 'b.png', 'c.png']:
+            bank.get(name)
+        bank.get('a.png')
+        bank.trim()
+        self.assertEqual(len(bank), 2)
+        self.assertNotIn('b.png', bank)
+        self.assertIn('a.png', bank)
+        self.assertTrue(self.pyrep.created[1][1].removed)
+        self.assertFalse(self.pyrep.created[0][1].removed)
+
+    def test_no_cache_recreates_every_time(self):
+        bank = TextureBank(self.pyrep, max_textures=0)
+        for _ in range(3):
+            bank.get('a.png')
+            bank.trim()
+        self.assertEqual(len(self.pyrep.created), 3)
+        self.assertTrue(all(s.removed for _, s in self.pyrep.created))
+
+    def test_preload_respects_limit(self):
+        bank = TextureBank(self.pyrep, max_textures=2)
+        bank.preload(['a.png', 'b.png', 'c.png'])
+        self.assertEqual(len(self.pyrep.created), 2)
+        bank.get('a.png')
+        self.assertEqual(len(self.pyrep.created), 2)
+
+    def test_clear_removes_holders(self):
+        bank = TextureBank(self.pyrep, max_textures=4)
+        bank.get('a.png')
+        bank.clear()
+        self.assertEqual(len(bank), 0)
+        self.assertTrue(self.pyrep.created[0][1].removed)
@@ -0,0 +1,122 @@
+"""Load time and peak memory of the stored demo loading modes.
+
+Generates a fixture directory of random episodes laid out like the ones
+written by tools/dataset_generator.py, then loads all of them once per mode,
+each mode in its own process so that the peak RSS are comparable.
+
+    python tools/benchmark_demo_loading.py --episodes 50 --steps 40
+"""
+
+import os
+import pickle
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from os.path import join
+
+import numpy as np
+from PIL import Image
+
+from rlbench.backend import demo_loader
+from rlbench.backend.const import *
+from rlbench.backend.observation import Observation
+from rlbench.observation_config import ObservationConfig
+
+from absl import app
+from absl import flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer('episodes', 50, 'Number of episodes in the fixture.')
+flags.DEFINE_integer('steps', 40, 'Number of steps per episode.')
+flags.DEFINE_integer('image_size', 128, 'Side of the stored frames.')
+flags.DEFINE_integer('workers', 8, 'Decoding threads of the parallel mode.')
+flags.DEFINE_string('fixture', '', 'Existing fixture, skips the generation.')
+flags.DEFINE_string('mode', '', 'Internal: run a single mode and report.')
+
+MODES = ['sequential', 'parallel', 'lazy', 'packed', 'packed_lazy']
+
+
+def make_fixture(path, episodes, steps, size):
+    for e in range(episodes):
+        example_path = join(path, EPISODE_FOLDER % e)
+        for field, _, kind in demo_loader.IMAGE_FIELDS:
+            folder = join(example_path, demo_loader._FIELD_FOLDERS[field])
+            os.makedirs(folder)
+            shape = (size, size) if kind == 'depth' else (size, size, 3)
+            for i in range(steps):
+                Image.fromarray(np.random.randint(
+                    0, 256, shape, dtype=np.uint8)).save(
+                    join(folder, IMAGE_FORMAT % i))
+        with open(join(example_path, LOW_DIM_PICKLE), 'wb') as f:
+            pickle.dump([Observation(*([None] * 17)) for _ in range(steps)], f)
+        demo_loader.pack_episode(example_path)
+
+
+def load_all(path, mode):
+    obs_config = ObservationConfig()
+    obs_config.set_all(True)
+    for camera in [obs_config.left_shoulder_camera,
+                   obs_config.right_shoulder_camera, obs_config.wrist_camera]:
+        camera.image_size = (FLAGS.image_size, FLAGS.image_size)
+    demos = []
+    for example in sorted(os.listdir(path)):
+        example_path = join(path, example)
+        with open(join(example_path, LOW_DIM_PICKLE), 'rb') as f:
+            obs = pickle.load(f)
+        for i, o in enumerate(obs):
+            for field, _, _ in demo_loader.IMAGE_FIELDS:
+                setattr(o, field, join(example_path,
+                                       demo_loader._FIELD_FOLDERS[field],
+                                       IMAGE_FORMAT % i))
+        packed = join(example_path, PACKED_DEMO) if 'packed' in mode else None
+        demos.append(demo_loader.load_frames(
+            obs, obs_config, lazy=mode.endswith('lazy'),
+            num_workers=FLAGS.workers if mode == 'parallel' else 1,
+            packed_path=packed))
+    return demos
+
+
+def run_mode(path, mode):
+    start = time.time()
+    demos = load_all(path, mode)
+    load_time = time.time() - start
+    # Touch one field per observation, what a training loop would read.
+    start = time.time()
+    for demo in demos:
+        for obs in demo:
+            obs.wrist_rgb
+    access_time = time.time() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print('%-12s load %7.2fs  first access %6.2fs  peak RSS %8.1f MB' % (
+        mode, load_time, access_time, peak_mb))
+
+
+def main(argv):
+    if FLAGS.mode:
+        run_mode(FLAGS.fixture, FLAGS.mode)
+        return
+
+    fixture = FLAGS.fixture
+    tmp_dir = None
+    if not fixture:
+        tmp_dir = fixture = tempfile.mkdtemp()
+        print('Generating %d episodes of %d steps in %s' % (
+            FLAGS.episodes, FLAGS.steps, fixture))
+        make_fixture(fixture, FLAGS.episodes, FLAGS.steps, FLAGS.image_size)
+    try:
+        for mode in MODES:
+            subprocess.check_call(
+                [sys.executable, __file__, '--fixture', fixture,
+                 '--mode', mode, '--workers', str(FLAGS.workers),
+                 '--image_size', str(FLAGS.image_size)])
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,94 @@
+"""Randomized-episode reset latency with and without the texture bank.
+
+Runs the texture part of DomainRandomizationScene._randomize against a stub
+PyRep whose create_texture reads and decodes the image file, the part of the
+cost that the bank saves, and counts its calls.
+
+    python tools/benchmark_texture_bank.py --episodes 200
+"""
+
+import os
+import time
+
+import numpy as np
+from PIL import Image
+from pyrep.textures.texture import Texture
+
+from rlbench.sim2real.domain_randomization import VisualRandomizationConfig
+from rlbench.sim2real.domain_randomization_scene import SCENE_OBJECTS
+from rlbench.sim2real.texture_bank import TextureBank
+
+from absl import app
+from absl import flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer('episodes', 200, 'Number of randomized episodes.')
+flags.DEFINE_integer('objects', len(SCENE_OBJECTS),
+                     'Number of randomized objects per episode.')
+flags.DEFINE_string('textures', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'unit',
+    'assets', 'textures'), 'Folder of texture images.')
+
+
+class StubShape(object):
+
+    def set_renderable(self, value):
+        pass
+
+    def set_detectable(self, value):
+        pass
+
+    def set_collidable(self, value):
+        pass
+
+    def set_position(self, position):
+        pass
+
+    def set_texture(self, texture, **kwargs):
+        pass
+
+    def remove(self):
+        pass
+
+
+class StubPyRep(object):
+
+    def __init__(self):
+        self.create_texture_calls = 0
+
+    def create_texture(self, filename):
+        self.create_texture_calls += 1
+        np.asarray(Image.open(filename).convert('RGB'))
+        return StubShape(), Texture(self.create_texture_calls)
+
+
+def run(config, cache_size):
+    pyrep = StubPyRep()
+    bank = TextureBank(pyrep, cache_size)
+    objects = [StubShape() for _ in range(FLAGS.objects)]
+    latencies = []
+    for _ in range(FLAGS.episodes):
+        start = time.time()
+        for file, obj in zip(config.sample(len(objects)), objects):
+            obj.set_texture(bank.get(file))
+        bank.trim()
+        latencies.append(time.time() - start)
+    latencies = np.array(latencies) * 1000
+    print('cache %4d: %6.2f ms/reset (p99 %6.2f ms), %5d create_texture '
+          'calls' % (cache_size, latencies.mean(),
+                     np.percentile(latencies, 99), pyrep.create_texture_calls))
+
+
+def main(argv):
+    config = VisualRandomizationConfig(FLAGS.textures)
+    num_files = len(config.get_image_files())
+    if FLAGS.objects > num_files:
+        raise ValueError('Need at least %d textures, found %d.' % (
+            FLAGS.objects, num_files))
+    for cache_size in [0, num_files // 2, num_files]:
+        run(config, cache_size)
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -9,6 +9,7 @@ import os
 import pickle
 from PIL import Image
 from rlbench.backend import utils
+from rlbench.backend.demo_loader import pack_episode
 from rlbench.backend.const import *
 import numpy as np
 
@@ -26,6 +27,9 @@ flags.DEFINE_integer('processes', 1,
                      'The number of parallel processes during collection.')
 flags.DEFINE_integer('episodes_per_task', 10,
                      'The number of episodes to collect per task.')
+flags.DEFINE_bool('pack_demos', False,
+                  'Also write each episode as a single packed file of '
+                  'decoded frames, for faster loading.')
 
 
 def check_and_make(dir):
@@ -207,6 +211,9 @@ def run(i, lock, task_index, variation_count, results, file_lock, tasks):
                 episode_path = os.path.join(episodes_path, EPISODE_FOLDER % ex_idx)
                 with file_lock:
                     save_demo(demo, episode_path)
+                # Decoding the episode again, every process on its own.
+                if FLAGS.pack_demos:
+                    pack_episode(episode_path)
                 break
             if abort_variation:
                 break
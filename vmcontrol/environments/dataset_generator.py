@@ -1,9 +1,9 @@
 from __future__ import division, absolute_import, print_function
 
 import argparse
-import glob
 import multiprocessing
 import os
+import queue
 import shutil
 import time
 # import dmc2gym
@@ -17,6 +17,7 @@ import numpy as np
 # from srl_zoo.utils import printRed, printYellow
 
 from environments.rlbench_gym.rlbenchds_env import RLBenchDSEnv
+from environments.dataset_writer import DatasetWriter
 
 
 import gym
@@ -100,69 +101,47 @@ envs = {
     'procedural': procedural
 }
 
-def convertImagePath(args, path, record_id_start):
+def run_episodes(args, worker_num, next_episode, emit):
     """
-    Used to convert an image path, from one location, to another
+    Run a session of an environment, generating the episodes it is handed
     :param args: (ArgumentParser object)
-    :param path: (str)
-    :param record_id_start: (int) where does the current part start counting its records
-    :return:
+    :param worker_num: (int) The ID of the environment session
+    :param next_episode: (function) returns the index of the next episode to generate, None when there is none left
+    :param emit: (function) called with (episode, data) when an episode is complete, see EpisodeSaver
     """
-    image_name = path.split("/")[-1]
-    # get record id for output, by adding the current offset with the record_id
-    # of the folder
-    new_record_id = record_id_start + int(path.split("/")[-2].split("_")[-1])
-    return args.name + "/record_{:03d}".format(new_record_id) + "/" + image_name
-
-
-def env_thread(args, thread_num, partition=True, use_ppo2=False):
-    """
-    Run a session of an environment
-    :param args: (ArgumentParser object)
-    :param thread_num: (int) The thread ID of the environment session
-    :param partition: (bool) If the output should be in multiple parts (default=True)
-    :param use_ppo2: (bool) Use ppo2 to generate the dataset
-    """
-    print('[%d] Made it to thread start' % thread_num)
+    print('[%d] Made it to thread start' % worker_num)
     env_kwargs = {
-        "max_steps_per_epoch": args.max_steps_per_epoch
+        "max_steps_per_epoch": args.max_steps_per_epoch,
+        # every worker writes straight into the final record_### folders
+        "name": args.name,
+        "path": args.save_path,
+        "episode_callback": emit,
     }
 
-    if partition:
-        env_kwargs["name"] = args.name + "_part-" + str(thread_num)
-    else:
-        env_kwargs["name"] = args.name
-    env_kwargs['path'] = args.save_path
-
     # NOTE: The following error of CoppeliaSim crashing was largely resolved by importing RLKit
     #       and PyTorch libraries _after_ the environment was created. Unsure why this was a fix
     #       but it does seem to work.
     # 
-    # print('[%d] [DEBUG] Made it to wrapped_env line' % thread_num)
     # NOTE: This is the line with our error inside of it!
     #       This references the lambda function, which eventually reaches RLBenchEnv.__init__
     env_kwargs["wrapped_env"] = envs[args.env](args.dr, args.special_start, args.alt)
 
-    # print('[%d] [DEBUG] Made it to RLBenchDSEnv line' % thread_num)
     env_class = RLBenchDSEnv
     env = env_class(**env_kwargs)
 
     frames = 0
     start_time = time.time()
 
-    # print('[%d] [DEBUG] Made it to episode loop start' % thread_num)
-    # divide evenly, then do an extra one for only some of them in order to get the right count
-    for i_episode in range(args.num_episode // args.num_cpu + 1 * (args.num_episode % args.num_cpu > thread_num)):
-        # seed + position in this slice + size of slice (with reminder if uneven partitions)
-        seed = args.seed + i_episode + args.num_episode // args.num_cpu * thread_num + \
-               (thread_num if thread_num <= args.num_episode % args.num_cpu else args.num_episode % args.num_cpu)
+    episode = next_episode()
+    while episode is not None:
+        # the seed only depends on the episode, so a resumed run generates the same episodes
+        seed = args.seed + episode
 
         env.seed(seed)
         env.action_space.seed(seed)  # this is for the sample() function from gym.space
-        obs = env.reset()
+        obs = env.reset(episode_idx=episode)
         done = False
         t = 0
-        episode_toward_target_on = False
         while not done:
             action = [env.action_space.sample()]
 
@@ -173,12 +152,22 @@ def env_thread(args, thread_num, partition=True, use_ppo2=False):
 
             _, _, done, _ = env.step(action_to_step,t)
 
-            done == done or t == args.max_steps_per_epoch
             if done:
                 print("Episode finished after {} timesteps".format(t + 1))
 
-        if thread_num == 0:
+        if worker_num == 0:
             print("{:.2f} FPS".format(frames * args.num_cpu / (time.time() - start_time)))
+        episode = next_episode()
+
+
+def env_process(args, worker_num, work_queue, result_queue):
+    """
+    Worker process: takes episode indices from work_queue and sends the episodes data back through result_queue
+    """
+    try:
+        run_episodes(args, worker_num, work_queue.get, lambda episode, data: result_queue.put((episode, data)))
+    finally:
+        result_queue.put((None, worker_num))
 
 
 def main():
@@ -207,8 +196,9 @@ def main():
 
     parser.add_argument('--seed', type=int, default=0, help='the seed')
     parser.add_argument('-f', '--force', action='store_true', default=False,
-                        help='Force the save, even if it overrides something else,' +
-                             ' including partial parts if they exist')
+                        help='Force the save, even if it overrides something else')
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='Continue an interrupted run, only the episodes missing from its manifest are generated')
 
     #TODO: Change this argument to be for the diff types of tasks                        
     parser.add_argument('--multi-view', action='store_true', default=False, help='Set a second camera to the scene')
@@ -235,102 +225,70 @@ def main():
     # this is done so seed 0 and 1 are different and not simply offset of the same datasets.
     args.seed = np.random.RandomState(args.seed).randint(int(1e10))
 
+    data_folder = args.save_path + args.name
     # File exists, need to deal with it
-    if not args.no_record_data and os.path.exists(args.save_path + args.name):
-        assert args.force, "Error: save directory '{}' already exists".format(args.save_path + args.name)
+    if not args.no_record_data and os.path.exists(data_folder) and not args.resume:
+        assert args.force, "Error: save directory '{}' already exists, use --resume to continue it".format(data_folder)
 
-        shutil.rmtree(args.save_path + args.name)
-        for part in glob.glob(args.save_path + args.name + "_part-[0-9]*"):
-            shutil.rmtree(part)
+        shutil.rmtree(data_folder)
     if not args.no_record_data:
         # create the output
-        os.makedirs(args.save_path + args.name, exist_ok=True)
+        os.makedirs(data_folder, exist_ok=True)
+
+    info = {'env': args.env, 'seed': int(args.seed), 'max_steps_per_epoch': args.max_steps_per_epoch,
+            'dr': args.dr, 'alt': args.alt, 'special_start': args.special_start}
+    writer = DatasetWriter(data_folder, info, resume=args.resume)
+    todo = writer.remaining(args.num_episode)
+    print("{} episodes to generate, {} already done".format(len(todo), args.num_episode - len(todo)))
+
+    if args.num_cpu == 1 or len(todo) <= 1:
+        todo_iter = iter(todo)
+        run_episodes(args, 0, lambda: next(todo_iter, None), writer.append_episode)
+    elif len(todo) > 0:
+        # episode-granular work queue, the workers pull an episode whenever they are free
+        work_queue = multiprocessing.Queue()
+        result_queue = multiprocessing.Queue()
+        num_workers = min(args.num_cpu, len(todo))
+        for episode in todo:
+            work_queue.put(episode)
+        for _ in range(num_workers):
+            work_queue.put(None)
 
-    if args.num_cpu == 1:
-        env_thread(args, 0, partition=False, use_ppo2=args.run_ppo2)
-    else:
-        # try and divide into multiple processes, with an environment each
         try:
             jobs = []
-            for i in range(args.num_cpu):
-                process = multiprocessing.Process(target=env_thread, args=(args, i, True, args.run_ppo2))
+            for i in range(num_workers):
+                process = multiprocessing.Process(target=env_process, args=(args, i, work_queue, result_queue))
                 jobs.append(process)
 
             for j in jobs:
                 j.start()
-
-            try:
-                for j in jobs:
-                    j.join()
-            except Exception as e:
-                print("Error: unable to join thread")
-                raise e
-
         except Exception as e:
             print("Error: unable to start thread")
             raise e
 
-    if not args.no_record_data and args.num_cpu > 1:
-        # sleep 1 second, to avoid congruency issues from multiprocess (eg., files still writing)
-        time.sleep(1)
-        # get all the parts
-        file_parts = sorted(glob.glob(args.save_path + args.name + "_part-[0-9]*"), key=lambda a: int(a.split("-")[-1]))
-
-        # move the config files from any as they are identical
-        os.rename(file_parts[0] + "/dataset_config.json", args.save_path + args.name + "/dataset_config.json")
-        os.rename(file_parts[0] + "/env_globals.json", args.save_path + args.name + "/env_globals.json")
-
-        ground_truth = None
-        preprocessed_data = None
-
-        # used to convert the part record_id to the fused record_id
-        record_id = 0
-        for part in file_parts:
-            # sort the record names alphabetically, then numerically
-            records = sorted(glob.glob(part + "/record_[0-9]*"), key=lambda a: int(a.split("_")[-1]))
-
-            record_id_start = record_id
-            for record in records:
-                os.renames(record, args.save_path + args.name + "/record_{:03d}".format(record_id))
-                record_id += 1
-
-            # fuse the npz files together, in the right order
-            if ground_truth is None:
-                # init
-                ground_truth = {}
-                preprocessed_data = {}
-                ground_truth_load = np.load(part + "/ground_truth.npz")
-                preprocessed_data_load = np.load(part + "/preprocessed_data.npz")
-
-                for arr in ground_truth_load.files:
-                    if arr == "images_path":
-                        ground_truth[arr] = np.array(
-                            [convertImagePath(args, path, record_id_start) for path in ground_truth_load[arr]])
-                    else:
-                        ground_truth[arr] = ground_truth_load[arr]
-                for arr in preprocessed_data_load.files:
-                    preprocessed_data[arr] = preprocessed_data_load[arr]
-
+        # only this process writes the arrays and the manifest
+        finished = 0
+        while finished < num_workers:
+            try:
+                episode, data = result_queue.get(timeout=10)
+            except queue.Empty:
+                if not any(j.is_alive() for j in jobs):
+                    print("Error: every worker stopped, rerun with --resume to finish the dataset")
+                    break
+                continue
+            if episode is None:
+                finished += 1
             else:
-                ground_truth_load = np.load(part + "/ground_truth.npz")
-                preprocessed_data_load = np.load(part + "/preprocessed_data.npz")
-
-                for arr in ground_truth_load.files:
-                    if arr == "images_path":
-                        sanitised_paths = np.array(
-                            [convertImagePath(args, path, record_id_start) for path in ground_truth_load[arr]])
-                        ground_truth[arr] = np.concatenate((ground_truth[arr], sanitised_paths))
-                    else:
-                        ground_truth[arr] = np.concatenate((ground_truth[arr], ground_truth_load[arr]))
-                for arr in preprocessed_data_load.files:
-                    preprocessed_data[arr] = np.concatenate((preprocessed_data[arr], preprocessed_data_load[arr]))
-
-            # remove the current part folder
-            shutil.rmtree(part)
-
-        # save the fused outputs
-        np.savez(args.save_path + args.name + "/ground_truth.npz", **ground_truth)
-        np.savez(args.save_path + args.name + "/preprocessed_data.npz", **preprocessed_data)
+                writer.append_episode(episode, data)
+
+        for j in jobs:
+            j.join()
+
+    if len(writer.episodes) == args.num_episode:
+        writer.finalize()
+    else:
+        print("{} of {} episodes done, rerun with --resume to finish the dataset".format(
+            len(writer.episodes), args.num_episode))
 
     if args.reward_dist:
         rewards, counts = np.unique(np.load(args.save_path + args.name + "/preprocessed_data.npz")['rewards'],
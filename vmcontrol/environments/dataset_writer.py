@@ -0,0 +1,175 @@
+from __future__ import division, absolute_import, print_function
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+MANIFEST_NAME = "manifest.jsonl"
+INFO_NAME = "dataset_info.json"
+ARRAYS_FOLDER = "arrays"
+
+# which npz file each per-step array ends up in, same split as EpisodeSaver.save
+GROUND_TRUTH_ARRAYS = ['ground_truth_states', 'images_path']
+PREPROCESSED_ARRAYS = ['rewards', 'actions', 'episode_starts']
+
+# fixed width of the strings stored on disk (images_path)
+MIN_STR_WIDTH = 256
+
+
+class AppendableArray(object):
+    """
+    Array stored on disk as raw rows, that grows along its first axis
+    :param path: (str) the data file, its dtype and row shape are kept next to it in path.json
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta_path = path + ".json"
+        self.dtype = None
+        self.row_shape = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.dtype = np.dtype(meta['dtype'])
+            self.row_shape = tuple(meta['row_shape'])
+
+    @property
+    def row_nbytes(self):
+        return int(np.prod(self.row_shape, dtype=np.int64)) * self.dtype.itemsize
+
+    def __len__(self):
+        if self.dtype is None or not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path) // self.row_nbytes
+
+    def append(self, rows):
+        """
+        :param rows: (array-like) the rows to add, of shape (n, *row_shape)
+        """
+        rows = np.asarray(rows)
+        if self.dtype is None:
+            dtype = rows.dtype
+            if dtype.kind == 'U':
+                dtype = np.dtype('<U%d' % max(MIN_STR_WIDTH, 2 * dtype.itemsize // 4))
+            self.dtype = dtype
+            self.row_shape = rows.shape[1:]
+            with open(self.meta_path, 'w') as f:
+                json.dump({'dtype': self.dtype.str, 'row_shape': list(self.row_shape)}, f)
+        assert rows.shape[1:] == self.row_shape, \
+            "Error: rows of shape {} appended to {} of row shape {}".format(rows.shape[1:], self.path, self.row_shape)
+        if self.dtype.kind == 'U':
+            assert rows.dtype.itemsize <= self.dtype.itemsize, "Error: string too long for {}".format(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(np.ascontiguousarray(rows, dtype=self.dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def truncate(self, num_rows):
+        """Drop every row past num_rows, e.g. rows of an episode that was not committed to the manifest"""
+        if os.path.exists(self.path):
+            os.truncate(self.path, num_rows * self.row_nbytes)
+
+    def read(self):
+        """
+        :return: (np.ndarray) a read only memory map of the rows
+        """
+        if len(self) == 0:
+            return np.zeros((0,) + (self.row_shape or ()), dtype=self.dtype or np.float64)
+        return np.memmap(self.path, dtype=self.dtype, mode='r', shape=(len(self),) + self.row_shape)
+
+
+class DatasetWriter(object):
+    """
+    Streams the per-step data of a generated dataset to disk, one episode at a time.
+
+    Every completed episode is appended to growing on-disk arrays and then recorded in an
+    append-only manifest, so a crashed run can be resumed: rows that were written after the
+    last manifest entry are dropped, and the episodes missing from the manifest are generated again.
+    :param data_folder: (str) the dataset folder, which also holds the record_### image folders
+    :param info: (dict) parameters of the run, a resumed run must use the same ones
+    :param resume: (bool) continue the run found in data_folder
+    """
+
+    def __init__(self, data_folder, info, resume=False):
+        self.data_folder = data_folder
+        self.manifest_path = os.path.join(data_folder, MANIFEST_NAME)
+        self.arrays_folder = os.path.join(data_folder, ARRAYS_FOLDER)
+        os.makedirs(self.arrays_folder, exist_ok=True)
+
+        info_path = os.path.join(data_folder, INFO_NAME)
+        if resume and os.path.exists(info_path):
+            with open(info_path) as f:
+                previous = json.load(f)
+            assert previous == info, \
+                "Error: cannot resume, the run in '{}' used {}".format(data_folder, previous)
+        else:
+            with open(info_path, 'w') as f:
+                json.dump(info, f)
+
+        self.episodes = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                for line in f:
+                    # a line cut by a crash is not committed
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self.episodes[entry['episode']] = entry
+            # rewrite the manifest without any partial trailing line
+            with open(self.manifest_path, 'w') as f:
+                for entry in self.episodes.values():
+                    f.write(json.dumps(entry) + "\n")
+
+        self.arrays = {name: AppendableArray(os.path.join(self.arrays_folder, name + ".bin"))
+                       for name in GROUND_TRUTH_ARRAYS + PREPROCESSED_ARRAYS}
+        # drop the rows of an episode that was being written when the run stopped
+        for name, array in self.arrays.items():
+            array.truncate(sum(entry['rows'].get(name, 0) for entry in self.episodes.values()))
+
+    def is_done(self, episode):
+        return episode in self.episodes
+
+    def remaining(self, num_episode):
+        """
+        Remove the images of unfinished episodes
+        :param num_episode: (int)
+        :return: ([int]) the episodes that still need to be generated
+        """
+        todo = [e for e in range(num_episode) if not self.is_done(e)]
+        for episode in todo:
+            record = os.path.join(self.data_folder, "record_{:03d}".format(episode))
+            if os.path.exists(record):
+                shutil.rmtree(record)
+        return todo
+
+    def append_episode(self, episode, data):
+        """
+        :param episode: (int) the episode index
+        :param data: (dict) per-step arrays of the episode, keyed by the names in GROUND_TRUTH_ARRAYS
+            and PREPROCESSED_ARRAYS
+        """
+        rows = {}
+        for name, values in data.items():
+            if len(values) > 0:
+                self.arrays[name].append(values)
+            rows[name] = len(values)
+        entry = {'episode': int(episode), 'rows': rows}
+        # the manifest entry is written last, it is what commits the episode
+        with open(self.manifest_path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.episodes[episode] = entry
+
+    def finalize(self):
+        """
+        Write ground_truth.npz and preprocessed_data.npz, in the format of EpisodeSaver.save.
+        Rows are in the order the episodes completed, images_path keeps them aligned to their frames.
+        """
+        ground_truth = {name: self.arrays[name].read() for name in GROUND_TRUTH_ARRAYS}
+        preprocessed_data = {name: self.arrays[name].read() for name in PREPROCESSED_ARRAYS}
+        np.savez(os.path.join(self.data_folder, "ground_truth.npz"), **ground_truth)
+        np.savez(os.path.join(self.data_folder, "preprocessed_data.npz"), **preprocessed_data)
@@ -155,10 +155,12 @@ class EpisodeSaver(object):
     :param learn_states: (bool)
     :param path: (str)
     :param relative_pos: (bool)
+    :param episode_callback: (function) if set, called with (episode_idx, data) at the end of every
+        episode, with the per-step arrays of that episode only, instead of rewriting the npz files
     """
 
     def __init__(self, name, env_name=None,
-                 path='data/'):
+                 path='data/', episode_callback=None):
         super(EpisodeSaver, self).__init__()
         self.name = name
         self.data_folder = path + name
@@ -181,6 +183,7 @@ class EpisodeSaver(object):
         self.n_steps = 0
 
         self.env_name = env_name
+        self.episode_callback = episode_callback
 
     def saveImage(self, observation):
         """
@@ -280,14 +283,15 @@ class EpisodeSaver(object):
         denoise = denoise(rgb,0.1).astype(np.uint8)
         save(denoise, "denoise")
 
-    def reset(self, observation, ground_truth):
+    def reset(self, observation, ground_truth, episode_idx=None):
         """
         Called when starting a new episode
         :param observation: 
         :param ground_truth: (numpy array)
+        :param episode_idx: (int) index of the record folder, by default the one after the previous episode
         """
         if len(self.episode_starts) == 0 or self.episode_starts[-1] is False:
-            self.episode_idx += 1
+            self.episode_idx = self.episode_idx + 1 if episode_idx is None else episode_idx
 
             self.episode_step = 0
             self.episode_success = False
@@ -319,9 +323,30 @@ class EpisodeSaver(object):
             self.ground_truth_states.append(ground_truth_state)
             
             self.saveImage(observation)
+        elif self.episode_callback is not None:
+            self.episode_callback(self.episode_idx, self.pop_episode())
         else:   
             # Save the gathered data at the end of each episode
             self.save()
+
+    def pop_episode(self):
+        """
+        Hand over the per-step data gathered so far and forget it
+        :return: (dict)
+        """
+        data = {
+            'rewards': np.array(self.rewards),
+            'actions': np.array(self.actions),
+            'episode_starts': np.array(self.episode_starts),
+            'ground_truth_states': np.array(self.ground_truth_states),
+            'images_path': np.array(self.images_path)
+        }
+        self.rewards = []
+        self.actions = []
+        self.episode_starts = []
+        self.ground_truth_states = []
+        self.images_path = []
+        return data
     
     def save(self):
         """
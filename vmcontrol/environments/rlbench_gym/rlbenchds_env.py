@@ -17,7 +17,8 @@ class RLBenchDSEnv():
     wrapped_env is the rlbench env, passed in initialized. This class just calls actions on that env.
     """
 
-    def __init__(self,name="RLBenchDS-unset", wrapped_env=None, max_steps_per_epoch=100, path=None, **_kwargs):
+    def __init__(self,name="RLBenchDS-unset", wrapped_env=None, max_steps_per_epoch=100, path=None,
+                 episode_callback=None, **_kwargs):
         #Passed in in dataset_generator.py kwargs.
         self.env = wrapped_env
         self.max_steps_per_epoch = max_steps_per_epoch
@@ -27,7 +28,7 @@ class RLBenchDSEnv():
         except:
             env_name = self.env.unwrapped.spec.id
         print(env_name)
-        self.saver = EpisodeSaver(name, env_name=env_name, path = path)
+        self.saver = EpisodeSaver(name, env_name=env_name, path = path, episode_callback=episode_callback)
 
         self.action_space = self.env.action_space
 
@@ -68,15 +69,16 @@ class RLBenchDSEnv():
         return None
 
 
-    def reset(self):
+    def reset(self, episode_idx=None):
         """
         Reset the environment
+        :param episode_idx: (int) record folder of the new episode, see EpisodeSaver.reset
         :return: (numpy ndarray) first observation of the env
         """
         self.observation = self.env.reset()
         ground_truth, obs = self.observation['state'], self.observation['observation']
         if self.saver is not None:
-            self.saver.reset(obs, ground_truth)
+            self.saver.reset(obs, ground_truth, episode_idx)
         return self.observation
 
 
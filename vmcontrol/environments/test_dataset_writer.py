@@ -0,0 +1,97 @@
+"""
+Tests for resuming the dataset generation after a crash.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from environments.dataset_writer import AppendableArray, DatasetWriter, MANIFEST_NAME
+
+NUM_EPISODES = 4
+INFO = {'num_episode': NUM_EPISODES, 'seed': 0}
+
+
+def episode_data(episode, num_steps=5):
+    rng = np.random.RandomState(episode)
+    return {
+        'ground_truth_states': rng.uniform(-1, 1, (num_steps, 3)),
+        'images_path': np.array(["record_{:03d}/frame{:06d}".format(episode, i) for i in range(num_steps)]),
+        'rewards': rng.uniform(0, 1, num_steps),
+        'actions': rng.uniform(-1, 1, (num_steps, 2)),
+        'episode_starts': np.arange(num_steps) == 0,
+    }
+
+
+def write_episode(writer, episode):
+    # the worker writes the frames straight into the record folder
+    record = os.path.join(writer.data_folder, "record_{:03d}".format(episode))
+    os.makedirs(record, exist_ok=True)
+    open(os.path.join(record, "frame000000.jpg"), 'w').close()
+    writer.append_episode(episode, episode_data(episode))
+
+
+def finalized(data_folder):
+    with np.load(os.path.join(data_folder, "ground_truth.npz")) as ground_truth, \
+            np.load(os.path.join(data_folder, "preprocessed_data.npz")) as preprocessed_data:
+        arrays = dict(ground_truth)
+        arrays.update(preprocessed_data)
+    return arrays
+
+
+def test_appendable_array(tmp_path):
+    array = AppendableArray(str(tmp_path / 'states.bin'))
+    array.append(np.ones((2, 3)))
+    array.append(np.zeros((1, 3)))
+    # reopened from its file
+    array = AppendableArray(str(tmp_path / 'states.bin'))
+    assert len(array) == 3
+    array.truncate(2)
+    assert np.array_equal(array.read(), np.ones((2, 3)))
+    with pytest.raises(AssertionError):
+        array.append(np.ones((1, 4)))
+
+
+def test_resume_after_a_crash_matches_an_uninterrupted_run(tmp_path):
+    expected_folder = str(tmp_path / 'uninterrupted')
+    writer = DatasetWriter(expected_folder, INFO)
+    for episode in writer.remaining(NUM_EPISODES):
+        write_episode(writer, episode)
+    writer.finalize()
+
+    data_folder = str(tmp_path / 'crashed')
+    writer = DatasetWriter(data_folder, INFO)
+    for episode in range(2):
+        write_episode(writer, episode)
+    # killed while committing episode 2: its rows and frames are on disk, its manifest line is cut
+    os.makedirs(os.path.join(data_folder, "record_002"))
+    for name, values in episode_data(2).items():
+        writer.arrays[name].append(values[:3])
+    with open(os.path.join(data_folder, MANIFEST_NAME), 'a') as f:
+        f.write('{"episode": 2, "ro')
+
+    writer = DatasetWriter(data_folder, INFO, resume=True)
+    assert sorted(writer.episodes) == [0, 1]
+    with open(os.path.join(data_folder, MANIFEST_NAME)) as f:
+        assert len(f.read().splitlines()) == 2
+    assert len(writer.arrays['rewards']) == 10
+    remaining = writer.remaining(NUM_EPISODES)
+    assert remaining == [2, 3]
+    assert not os.path.exists(os.path.join(data_folder, "record_002"))
+    assert os.path.exists(os.path.join(data_folder, "record_001"))
+    for episode in remaining:
+        write_episode(writer, episode)
+    writer.finalize()
+
+    expected, actual = finalized(expected_folder), finalized(data_folder)
+    assert sorted(actual) == sorted(expected)
+    for name in expected:
+        assert np.array_equal(actual[name], expected[name]), name
+    assert sorted(os.listdir(data_folder)) == sorted(os.listdir(expected_folder))
+
+
+def test_resume_needs_the_same_parameters(tmp_path):
+    DatasetWriter(str(tmp_path), INFO)
+    with pytest.raises(AssertionError):
+        DatasetWriter(str(tmp_path), dict(INFO, seed=1), resume=True)
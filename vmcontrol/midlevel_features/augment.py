@@ -0,0 +1,115 @@
+import torch
+import torch.nn as nn
+
+
+def paired_random_crop(tensors, size, flip=True, center=False, generator=None):
+    """
+    Crop (and horizontally flip) a batch of images, every tensor in `tensors` gets the same crop and flip
+    for a given sample, so inputs and targets stay aligned.
+    :param tensors: ([torch.Tensor]) each of shape (B, H, W, C), same B, H and W
+    :param size: (int) side of the square crop
+    :param flip: (bool) flip each sample with probability 0.5
+    :param center: (bool) center crop instead of a random crop, disables the flip
+    :param generator: (torch.Generator) on the cpu
+    :return: ([torch.Tensor]) each of shape (B, size, size, C)
+    """
+    batch, height, width = tensors[0].shape[:3]
+    device = tensors[0].device
+    if center:
+        top = torch.full((batch,), (height - size) // 2, dtype=torch.long)
+        left = torch.full((batch,), (width - size) // 2, dtype=torch.long)
+    else:
+        top = torch.randint(0, height - size + 1, (batch,), generator=generator)
+        left = torch.randint(0, width - size + 1, (batch,), generator=generator)
+    offsets = torch.arange(size)
+    rows = top[:, None] + offsets
+    cols = left[:, None] + offsets
+    if flip and not center:
+        flipped = torch.rand(batch, generator=generator) < 0.5
+        cols = torch.where(flipped[:, None], cols.flip(1), cols)
+    rows, cols = rows.to(device), cols.to(device)
+    batch_idx = torch.arange(batch, device=device)[:, None, None]
+    # a single gather per tensor, crop and flip at once
+    return [t[batch_idx, rows[:, :, None], cols[:, None, :]] for t in tensors]
+
+
+def _grayscale(images):
+    # ITU-R 601-2 luma, same weights as torchvision
+    r, g, b = images.unbind(1)
+    return (0.299 * r + 0.587 * g + 0.114 * b).unsqueeze(1)
+
+
+def color_jitter(images, brightness=0., contrast=0., saturation=0., generator=None):
+    """
+    Batched equivalent of torchvision's ColorJitter, with a different factor for every sample
+    :param images: (torch.Tensor) float images in [0, 1] of shape (B, 3, H, W)
+    :param brightness: (float) factors are drawn from [1 - brightness, 1 + brightness]
+    :param contrast: (float)
+    :param saturation: (float)
+    :param generator: (torch.Generator) on the cpu
+    :return: (torch.Tensor)
+    """
+    batch = images.shape[0]
+
+    def factor(amount):
+        f = 1 + (torch.rand(batch, generator=generator) * 2 - 1) * amount
+        return f.to(images.device, images.dtype).view(batch, 1, 1, 1)
+
+    if brightness > 0:
+        images = (images * factor(brightness)).clamp(0, 1)
+    if contrast > 0:
+        mean = _grayscale(images).mean(dim=(1, 2, 3), keepdim=True)
+        images = torch.lerp(mean, images, factor(contrast)).clamp(0, 1)
+    if saturation > 0:
+        images = torch.lerp(_grayscale(images), images, factor(saturation)).clamp(0, 1)
+    return images
+
+
+class PairedBatchAugment(nn.Module):
+    """
+    Augments whole uint8 batches on the training device. The first tensor is the network input,
+    the others are targets: all of them get the same crop and flip, only the input is colour jittered.
+
+    In eval mode (model.eval()) it center crops, without flip or jitter, like transNoAugment.
+    """
+
+    def __init__(self, crop_size=256, flip=True, brightness=0., contrast=0., saturation=0., device=None, seed=None):
+        """
+        :param crop_size: (int) side of the square crop
+        :param flip: (bool) random horizontal flips
+        :param brightness: (float) see color_jitter
+        :param contrast: (float)
+        :param saturation: (float)
+        :param device: (str) where the augmentation runs, defaults to cuda when available
+        :param seed: (int) seed of the augmentation, None for the global torch RNG
+        """
+        super().__init__()
+        self.crop_size = crop_size
+        self.flip = flip
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device = torch.device(device)
+        # the random draws are tiny, they stay on the cpu so runs are reproducible on any device
+        self.generator = None
+        if seed is not None:
+            self.generator = torch.Generator()
+            self.generator.manual_seed(seed)
+
+    def forward(self, inputs, *targets):
+        """
+        :param inputs: (torch.Tensor) uint8 images of shape (B, H, W, 3)
+        :param targets: (torch.Tensor) uint8 images of shape (B, H, W, C), or (B, H, W)
+        :return: ([torch.Tensor]) float images in [0, 1] of shape (B, C, crop_size, crop_size), inputs first
+        """
+        batch = [t.to(self.device, non_blocking=True) for t in (inputs,) + targets]
+        batch = [t.unsqueeze(-1) if t.dim() == 3 else t for t in batch]
+        batch = paired_random_crop(batch, self.crop_size, flip=self.flip, center=not self.training,
+                                   generator=self.generator)
+        batch = [t.permute(0, 3, 1, 2).float().div_(255) for t in batch]
+        if self.training:
+            batch[0] = color_jitter(batch[0], self.brightness, self.contrast, self.saturation,
+                                    generator=self.generator)
+        return batch
@@ -0,0 +1,77 @@
+import argparse
+import random
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from augment import PairedBatchAugment
+from rlkit.util.benchmark import print_results, time_calls
+
+'''
+Compares the per-sample PIL augmentation of load_data.RLBenchEnvsDataset with the batched
+augment.PairedBatchAugment, on random 288x288 frames. Example usage:
+
+python benchmark_augment.py --num_images 512 --batch_size 32
+'''
+
+
+def per_sample_pil(inputs, targets, jitter):
+    trans = transforms.Compose([
+        transforms.RandomCrop(256),
+        transforms.RandomHorizontalFlip(),
+        transforms.ColorJitter(jitter, jitter, jitter),
+        transforms.ToTensor(),
+    ])
+    trans_target = transforms.Compose([
+        transforms.RandomCrop(256),
+        transforms.RandomHorizontalFlip(),
+        transforms.ToTensor(),
+    ])
+    for rgb, target in zip(inputs, targets):
+        # same seed trick as RLBenchEnvsDataset.__getitem__
+        seed = np.random.randint(2147483647)
+        random.seed(seed)
+        torch.manual_seed(seed)
+        trans(Image.fromarray(rgb))
+        random.seed(seed)
+        torch.manual_seed(seed)
+        trans_target(Image.fromarray(target))
+
+
+def batched(inputs, targets, augmenter, batch_size):
+    for i in range(0, len(inputs), batch_size):
+        augmenter(torch.from_numpy(inputs[i:i + batch_size]), torch.from_numpy(targets[i:i + batch_size]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-sample and batched paired augmentation')
+    parser.add_argument('--num_images', type=int, default=512)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--image_size', type=int, default=288)
+    parser.add_argument('--color_jitter', type=float, default=0.2)
+    parser.add_argument('--device', type=str, default=None, help='Defaults to cuda when available')
+    args = parser.parse_args()
+
+    shape = (args.num_images, args.image_size, args.image_size, 3)
+    inputs = np.random.randint(0, 256, shape, dtype=np.uint8)
+    targets = np.random.randint(0, 256, shape, dtype=np.uint8)
+
+    pil_seconds = time_calls(lambda: per_sample_pil(inputs, targets, args.color_jitter), 1, warmup=0)
+
+    augmenter = PairedBatchAugment(crop_size=256, brightness=args.color_jitter, contrast=args.color_jitter,
+                                   saturation=args.color_jitter, device=args.device)
+    # warm up, the first cuda call pays for the context creation
+    batched(inputs[:args.batch_size], targets[:args.batch_size], augmenter, args.batch_size)
+    batched_seconds = time_calls(lambda: batched(inputs, targets, augmenter, args.batch_size), 1, warmup=0,
+                                 device=augmenter.device)
+
+    print_results([
+        ('per-sample PIL', args.num_images / pil_seconds),
+        ('batched on {}'.format(augmenter.device), args.num_images / batched_seconds),
+    ], 'images/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import socket
+
+import torch
+import torch.multiprocessing as mp
+import torch.nn as nn
+
+from benchmark_train import make_net
+import distributed
+from rlkit.util.benchmark import print_results, time_calls
+from supervised import SupervisedTrainer
+
+'''
+Throughput of the data-parallel SupervisedTrainer of train.py --distributed with 1, 2 and 4
+processes, gloo on CPU by default, on random 256x256 batches and a stand-in for the Taskonomy
+encoder-decoder. Every process trains on batch_size images per step, so the images/s should
+grow with the processes as long as the all-reduce of the gradients keeps up. Example usage:
+
+python benchmark_distributed.py --processes 1 2 4 --batch_size 8 --num_batches 10
+python benchmark_distributed.py --backend nccl --processes 1 2 4
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def worker(rank, world_size, args, port, results):
+    os.environ['MASTER_ADDR'] = 'localhost'
+    os.environ['MASTER_PORT'] = str(port)
+    os.environ['LOCAL_RANK'] = str(rank)
+    # the cores are shared between the processes
+    if args.backend == 'gloo':
+        torch.set_num_threads(max(1, args.threads // world_size))
+    device = distributed.init_distributed(args.backend, rank=rank, world_size=world_size)
+    torch.manual_seed(0)
+    model = make_net().to(device)
+    trainer = SupervisedTrainer(model, torch.optim.Adam(model.parameters(), lr=3e-4), nn.L1Loss(),
+                                amp=args.amp, device=device, bucket_cap_mb=args.bucket_cap_mb)
+    batches = [(torch.rand(args.batch_size, 3, 256, 256, device=device) * 2 - 1,
+                torch.rand(args.batch_size, 3, 256, 256, device=device) * 2 - 1)
+               for _ in range(args.num_batches)]
+    def epoch(batches):
+        trainer.train_epoch(batches)
+        distributed.barrier()
+    epoch(batches[:2])
+    seconds = time_calls(lambda: epoch(batches), 1, warmup=0)
+    if distributed.is_main_process():
+        results.put(world_size * args.batch_size * args.num_batches / seconds)
+    distributed.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the data-parallel mid-level training')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--backend', type=str, default='gloo', choices=['gloo', 'nccl'])
+    parser.add_argument('--batch_size', type=int, default=8, help='Batch of a process')
+    parser.add_argument('--num_batches', type=int, default=10)
+    parser.add_argument('--bucket_cap_mb', type=float, default=25)
+    parser.add_argument('--amp', action='store_true', default=False)
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads(), help='CPU threads shared by the gloo processes')
+    args = parser.parse_args()
+
+    results = mp.get_context('spawn').SimpleQueue()
+    rates = []
+    for world_size in args.processes:
+        mp.spawn(worker, args=(world_size, args, free_port(), results), nprocs=world_size, join=True)
+        rates.append((world_size, results.get()))
+    baseline = rates[0][1] / rates[0][0]
+    print_results([("{} processes".format(world_size), images_per_s,
+                    "scaling efficiency {:.0%}".format(images_per_s / (baseline * world_size)))
+                   for world_size, images_per_s in rates], 'images/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from rlkit.util.benchmark import print_results, time_calls
+from sweep import ensure_cache, launch, make_runs, run_command
+
+'''
+Wall time and peak memory of a sweep of N concurrent runs that each scan and decode the PNG
+dataset themselves, against a sweep.py sweep that packs it once into shared memory-mapped arrays,
+on a synthetic dataset and a stand-in for train.py (a small network fitted on CPU, so that the
+data loading dominates). The memory is the proportional set size of every run and of its
+DataLoader workers, so the shared pages are counted once. Example usage:
+
+python benchmark_sweep.py --num_frames 512 --num_runs 4 --num_epochs 2
+'''
+
+
+def write_synthetic_dataset(root_dir, num_frames, size=288, tasks=('normal',), num_records=2, seed=0):
+    """
+    PNG frames laid out like dataset_generator.py writes them, record_###/frame######_{type}.png
+    """
+    rng = np.random.RandomState(seed)
+    for i in range(num_frames):
+        record_dir = os.path.join(root_dir, 'record_{:03d}'.format(i % num_records))
+        os.makedirs(record_dir, exist_ok=True)
+        # smooth images, which compress like rendered frames
+        low_res = rng.randint(0, 256, (len(tasks) + 1, 9, 9, 3)).astype(np.uint8)
+        for task, image in zip(('rgb',) + tuple(tasks), low_res):
+            image = Image.fromarray(image).resize((size, size), Image.BILINEAR)
+            image.save(os.path.join(record_dir, 'frame{:06d}_{}.png'.format(i, task)))
+
+
+def stand_in_run(argv):
+    """
+    Reads the dataset like train.py, through genDS, and fits a small network on it
+    """
+    import torch
+    import torch.nn as nn
+    from load_data import genDS
+    from supervised import SupervisedTrainer
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--name', type=str, required=True)
+    parser.add_argument('--feature_task', type=str, required=True)
+    parser.add_argument('--lr', type=float, default=3e-4)
+    parser.add_argument('--model_path', type=str, default="")
+    parser.add_argument('--data_path', type=str, default="")
+    parser.add_argument('--cache_path', type=str, default="")
+    parser.add_argument('--split_seed', type=int, default=None)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--num_epochs', type=int, default=1)
+    parser.add_argument('--num_workers', type=int, default=2)
+    args = parser.parse_args(argv)
+
+    torch.set_num_threads(1)
+    trainLoader, valLoader, _ = genDS(batch_size=args.batch_size, num_workers=args.num_workers, task_name=args.feature_task,
+                                      path=args.data_path, cache_path=args.cache_path, split_seed=args.split_seed)
+    model = nn.Sequential(nn.AvgPool2d(8), nn.Conv2d(3, 3, 3, padding=1), nn.Upsample(scale_factor=8)).to(args.device)
+
+    def prepare_batch(sample):
+        return sample['rgb'].to(args.device), sample[args.feature_task].to(args.device)
+
+    trainer = SupervisedTrainer(model, torch.optim.Adam(model.parameters(), lr=args.lr), nn.L1Loss(), prepare_batch,
+                                device=args.device)
+    for _ in range(args.num_epochs):
+        trainer.end_epoch(trainer.train_epoch(trainLoader), trainer.evaluate(valLoader))
+    os.makedirs(args.name, exist_ok=True)
+    with open(os.path.join(args.name, 'val_loss.txt'), 'w') as f:
+        f.write(str(trainer.val_loss_history))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sweeps with and without the shared dataset')
+    parser.add_argument('--num_frames', type=int, default=512)
+    parser.add_argument('--num_runs', type=int, default=4)
+    parser.add_argument('--num_epochs', type=int, default=2)
+    parser.add_argument('--num_workers', type=int, default=2, help='DataLoader workers of a run')
+    parser.add_argument('--work_dir', type=str, default=None, help='Default is a temporary folder')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp()
+    data_path = os.path.join(work_dir, 'data')
+    cache_path = os.path.join(work_dir, 'cache')
+    write_synthetic_dataset(data_path, args.num_frames)
+
+    script = os.path.abspath(__file__)
+    runs = make_runs(['normal'], [3e-4], [""], list(range(args.num_runs)), ['cpu'])
+    extra_args = ['--run', '--num_epochs', str(args.num_epochs), '--num_workers', str(args.num_workers)]
+
+    # every run scans the folder and decodes the PNGs itself
+    commands = []
+    for run in runs:
+        command = run_command(run, os.path.join(work_dir, 'independent'), "", extra_args, script=script)
+        commands.append(command + ['--data_path', data_path])
+    independent = launch(commands, max_concurrent=args.num_runs)
+
+    # packed once, then every run reads the shared arrays
+    pack_time = time_calls(lambda: ensure_cache(data_path, cache_path, ['normal']), 1, warmup=0)
+    commands = [run_command(run, os.path.join(work_dir, 'shared'), cache_path, extra_args, script=script) for run in runs]
+    shared = launch(commands, max_concurrent=args.num_runs)
+
+    results = []
+    for name, report, extra_time in [('independent runs', independent, 0.), ('shared dataset', shared, pack_time)]:
+        assert all(r['returncode'] == 0 for r in report['runs']), "Error: a run of the {} failed".format(name)
+        results.append((name, report['wall_time'] + extra_time, "peak memory {:7.1f} MB{}".format(
+            report['peak_memory'] / 2 ** 20, '  packing {:.1f} s'.format(extra_time) if extra_time else '')))
+    print_results(results, 's wall time', per_second=False)
+    if args.work_dir is None:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    if '--run' in sys.argv:
+        # a run of the sweep, launched by main
+        sys.argv.remove('--run')
+        stand_in_run(sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,79 @@
+import argparse
+
+import torch
+import torch.nn as nn
+
+from rlkit.util.benchmark import print_results, time_calls
+from supervised import SupervisedTrainer
+
+'''
+Compares the images/s of the former train.py loop (fp32, loss.item() after every batch) with
+SupervisedTrainer in fp32, with AMP and with AMP and channels_last, on random 256x256 batches and
+a stand-in for the Taskonomy encoder-decoder. Example usage:
+
+python benchmark_train.py --batch_size 32 --num_batches 20
+'''
+
+
+def make_net():
+    # 3x256x256 -> 8x16x16 -> 3x256x256, like the Taskonomy networks
+    return nn.Sequential(
+        nn.Conv2d(3, 64, 7, stride=2, padding=3), nn.BatchNorm2d(64), nn.ReLU(),
+        nn.Conv2d(64, 128, 3, stride=2, padding=1), nn.BatchNorm2d(128), nn.ReLU(),
+        nn.Conv2d(128, 256, 3, stride=2, padding=1), nn.BatchNorm2d(256), nn.ReLU(),
+        nn.Conv2d(256, 8, 3, stride=2, padding=1),
+        nn.ConvTranspose2d(8, 128, 4, stride=4), nn.ReLU(),
+        nn.ConvTranspose2d(128, 32, 2, stride=2), nn.ReLU(),
+        nn.ConvTranspose2d(32, 3, 2, stride=2), nn.Tanh(),
+    )
+
+
+def former_loop(model, batches, optimizer, criterion):
+    model.train()
+    running_loss = 0.0
+    for inputs, targets in batches:
+        optimizer.zero_grad()
+        loss = criterion(model(inputs), targets)
+        loss.backward()
+        optimizer.step()
+        running_loss += loss.item() * inputs.size(0)
+    return running_loss
+
+
+def images_per_s(run, batches, device):
+    run(batches[:2])
+    return sum(len(inputs) for inputs, _ in batches) / time_calls(lambda: run(batches), 1, warmup=0, device=device)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mid-level training loops')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--num_batches', type=int, default=20)
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    batches = [(torch.rand(args.batch_size, 3, 256, 256, device=device) * 2 - 1,
+                torch.rand(args.batch_size, 3, 256, 256, device=device) * 2 - 1)
+               for _ in range(args.num_batches)]
+
+    torch.manual_seed(0)
+    model = make_net().to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=3e-4)
+    results = [('former loop', images_per_s(lambda b: former_loop(model, b, optimizer, nn.L1Loss()), batches, device))]
+
+    for name, kwargs in [
+        ('SupervisedTrainer', dict()),
+        ('+ amp', dict(amp=True)),
+        ('+ amp, channels_last', dict(amp=True, channels_last=True)),
+    ]:
+        torch.manual_seed(0)
+        model = make_net().to(device)
+        trainer = SupervisedTrainer(model, torch.optim.Adam(model.parameters(), lr=3e-4), nn.L1Loss(),
+                                    device=device, **kwargs)
+        results.append((name, images_per_s(trainer.train_epoch, batches, device)))
+    print_results(results, 'images/s')
+
+
+if __name__ == '__main__':
+    main()
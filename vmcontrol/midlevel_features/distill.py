@@ -0,0 +1,143 @@
+from visualpriors.transforms import VisualPriorPredictedLabel
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+
+import torch
+import torch.optim as optim
+
+from load_data import genDS
+from rlkit.torch.student_encoder import StudentEncoder, distill_step, feature_mse, measure_latency, save_student
+
+'''
+Distills the encoder of a Taskonomy network into a small StudentEncoder that reproduces its
+8x16x16 features, on the rgb frames generated by environments/dataset_generator.py. The student
+in {name}/student.pt is loaded by mid_level_train.py with --student_path. Example usage:
+
+python distill.py --name insert_name --feature_task normal --models_path /path/to/models --data_path /path/to/train/data/
+
+The feature MSE on the test split and the CPU latency of the student and the teacher are printed
+to {name}/log.txt and written to {name}/report.json.
+'''
+parser = argparse.ArgumentParser(description='Distill a mid-level feature encoder into a small CNN')
+parser.add_argument('--name', type=str, required=True, help='Folder name for the output. Dont end with trailing slash')
+parser.add_argument('--feature_task', type=str, required=True, help='Feature task of the teacher. One of sobel, normal, segment_semantic, or depth')
+parser.add_argument('--models_path', type=str, default="", help='Same as mid_level_train.py, path/feature_task/bestModel.pth is the fine-tuned teacher. Default is the Taskonomy weights.')
+parser.add_argument('--batch_size', type=int, default=64, help='Batch size to train with')
+parser.add_argument('--num_epochs', type=int, default=50, help='Number of epochs to train with')
+parser.add_argument('--lr', type=float, default=1e-3, help='Learning rate')
+parser.add_argument('--data_path', type=str, default='example_path', help='Path to folders generated by robotics-rl-srl')
+parser.add_argument('--cache_path', type=str, default="", help='Folder written by pack_data.py. If set, the packed arrays and their splits are used instead of the PNGs in data_path')
+parser.add_argument('--channels', type=int, nargs='+', default=[32, 48, 64, 96], help='Widths of the student convs')
+parser.add_argument('--latency_threads', type=int, default=1, help='Torch threads the CPU latency is measured with, like a rollout worker')
+
+args = parser.parse_args()
+
+os.makedirs(args.name, exist_ok=True)
+
+#redirect stdout to a log file
+sys.stdout = open('%s/log.txt' % args.name, 'w')
+
+# only the rgb inputs are used, the autoencoder target is the rgb image itself
+trainLoader, valLoader, testLoader = genDS(batch_size=args.batch_size, task_name="autoencoder", path=args.data_path, cache_path=args.cache_path)
+
+device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+map_task_to_taskonomy = {
+    "normal" : "normal",
+    "sobel": "edge_texture",
+    "depth": "depth_euclidean",
+    "segment_semantic": "segment_semantic",
+    "segment_img": "segment_semantic",
+    "sobel_3d": "edge_occlusion",
+    "autoencoder": "autoencoding",
+    "denoise": "denoising"
+}
+
+taskonomy_feature = map_task_to_taskonomy[args.feature_task]
+VisualPriorPredictedLabel._load_unloaded_nets([taskonomy_feature])
+net = VisualPriorPredictedLabel.feature_task_to_net[taskonomy_feature]
+if args.feature_task == "segment_img":
+    # the fine-tuned weights have the 5 class decoder of train.py
+    net.decoder.decoder_output[0] = torch.nn.Conv2d(16, 5, kernel_size=(3, 3), stride=(1, 1), padding=(1, 1))
+    net.decoder.decoder_output[1] = torch.nn.Identity()
+if args.models_path:
+    net.load_state_dict(torch.load(args.models_path + "/" + args.feature_task + "/bestModel.pth", map_location='cpu'))
+
+# the features of mid_level_train.py
+teacher = net.encoder
+teacher.normalize_outputs = True
+teacher.eval()
+for param in teacher.parameters():
+    param.requires_grad = False
+teacher.to(device)
+
+student = StudentEncoder((3, 256, 256), (8, 16, 16), channels=args.channels).to(device)
+optimizer = optim.Adam(student.parameters(), lr=args.lr)
+
+
+def images(dl):
+    for sample in dl:
+        yield sample['rgb'].to(device)
+
+
+def distill(student, teacher, traindl, valdl, optimizer, num_epochs):
+    since = time.time()
+    best_mse = float("inf")
+    val_mse_history = []
+
+    for epoch in range(num_epochs):
+        print('Epoch {}/{}'.format(epoch, num_epochs - 1))
+        print('-' * 10)
+
+        student.train()
+        running_loss = 0.0
+        count = 0
+        for inputs in images(traindl):
+            running_loss += distill_step(student, teacher, inputs, optimizer)
+            count += 1
+        print('train MSE: {:.6f}'.format(running_loss / max(count, 1)))
+
+        student.eval()
+        val_mse = feature_mse(student, teacher, images(valdl))
+        val_mse_history.append(val_mse)
+        print('val MSE: {:.6f}'.format(val_mse))
+        if val_mse < best_mse:
+            best_mse = val_mse
+            save_student(student, "%s/student.pt" % args.name, feature_task=args.feature_task, val_mse=val_mse)
+
+        time_elapsed = time.time() - since
+        print('Epoch complete in {:.0f}m {:.0f}s'.format(time_elapsed // 60, time_elapsed % 60))
+        sys.stdout.flush()
+
+    print('Best val MSE: {:.6f}'.format(best_mse))
+    return val_mse_history
+
+
+val_mse_history = distill(student, teacher, trainLoader, valLoader, optimizer, args.num_epochs)
+
+student.load_state_dict(torch.load("%s/student.pt" % args.name, map_location=device)['state_dict'])
+student.eval()
+test_mse = feature_mse(student, teacher, images(testLoader))
+
+torch.set_num_threads(args.latency_threads)
+student_latency = measure_latency(copy.deepcopy(student).cpu(), (3, 256, 256))
+teacher_latency = measure_latency(copy.deepcopy(teacher).cpu(), (3, 256, 256))
+report = dict(
+    feature_task=args.feature_task,
+    test_mse=test_mse,
+    val_mse_history=val_mse_history,
+    student_parameters=sum(p.numel() for p in student.parameters()),
+    teacher_parameters=sum(p.numel() for p in teacher.parameters()),
+    student_cpu_ms=student_latency * 1000,
+    teacher_cpu_ms=teacher_latency * 1000,
+    cpu_threads=args.latency_threads,
+)
+print('Test MSE: {:.6f}'.format(test_mse))
+print('CPU latency of a frame with {} threads: student {:.1f}ms, teacher {:.1f}ms'.format(
+    args.latency_threads, report['student_cpu_ms'], report['teacher_cpu_ms']))
+with open("%s/report.json" % args.name, 'w') as f:
+    json.dump(report, f, indent=2)
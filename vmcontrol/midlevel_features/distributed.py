@@ -0,0 +1,114 @@
+import contextlib
+import os
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def init_distributed(backend=None, init_method='env://', rank=None, world_size=None):
+    """
+    Join the process group of a data-parallel job, by default the one of
+    torchrun, which sets RANK, WORLD_SIZE, LOCAL_RANK, MASTER_ADDR and
+    MASTER_PORT in the environment of every process.
+    :param backend: (str) nccl or gloo, nccl if CUDA is available by default
+    :param init_method: (str) env:// or a file:// or tcp:// rendezvous
+    :param rank: (int) by default RANK
+    :param world_size: (int) by default WORLD_SIZE
+    :return: (torch.device) the device of this process, cuda:LOCAL_RANK with nccl and cpu with gloo
+    """
+    if backend is None:
+        backend = 'nccl' if torch.cuda.is_available() else 'gloo'
+    rank = int(os.environ.get('RANK', 0)) if rank is None else rank
+    world_size = int(os.environ.get('WORLD_SIZE', 1)) if world_size is None else world_size
+    dist.init_process_group(backend, init_method=init_method, rank=rank, world_size=world_size)
+    if backend == 'nccl':
+        local_rank = int(os.environ.get('LOCAL_RANK', rank % torch.cuda.device_count()))
+        torch.cuda.set_device(local_rank)
+        return torch.device('cuda', local_rank)
+    return torch.device('cpu')
+
+
+def cleanup():
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def wrap_model(model, device, bucket_cap_mb=25):
+    """
+    DistributedDataParallel copy of model: the gradients are averaged across
+    processes in buckets of bucket_cap_mb, each all-reduced as soon as the
+    backward pass has filled it, so that the communication overlaps the rest of
+    the backward pass. The gradients are views of the buckets, which saves a
+    copy of them.
+    """
+    device = torch.device(device)
+    device_ids = [device.index] if device.type == 'cuda' else None
+    return DistributedDataParallel(model, device_ids=device_ids, bucket_cap_mb=bucket_cap_mb,
+                                   gradient_as_bucket_view=True)
+
+
+def set_epoch(loader, epoch):
+    """
+    Set the epoch of the DistributedSampler of a loader, given directly or
+    through a BatchSampler, from which its permutation of the frames is drawn.
+    Without one, nothing is done.
+    """
+    sampler = getattr(loader, 'sampler', None)
+    sampler = getattr(sampler, 'sampler', sampler)
+    if hasattr(sampler, 'set_epoch'):
+        sampler.set_epoch(epoch)
+
+
+def all_reduce_sum(tensor):
+    """
+    :return: (torch.Tensor) tensor summed over every process, in place
+    """
+    if is_distributed():
+        dist.all_reduce(tensor)
+    return tensor
+
+
+def all_gather_object(obj):
+    """
+    :return: (list) the obj of every process, by rank
+    """
+    if not is_distributed():
+        return [obj]
+    objects = [None] * get_world_size()
+    dist.all_gather_object(objects, obj)
+    return objects
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+@contextlib.contextmanager
+def main_process_first():
+    """
+    The main process runs the block before the others, e.g. to download and
+    cache pretrained weights that they then read.
+    """
+    if not is_main_process():
+        barrier()
+    yield
+    if is_main_process():
+        barrier()
@@ -3,13 +3,17 @@ import torch
 import pandas as pd
 import numpy as np
 from skimage import io, transform
-from torch.utils.data import Dataset, DataLoader, random_split, Subset
+from torch.utils.data import Dataset, DataLoader, random_split, Subset, BatchSampler, RandomSampler, SequentialSampler
+from torch.utils.data.distributed import DistributedSampler
 from torchvision import transforms, utils
 import glob
 import random
 from PIL import Image
 import pathlib
 
+from augment import paired_random_crop
+from pack_data import load_manifest, make_splits
+
 class RLBenchEnvsDataset(Dataset):
     """RLBench dataset, spanning multiple envs"""
 
@@ -91,6 +95,144 @@ class RLBenchEnvsDataset(Dataset):
         return sample
 
 
+def format_sample(task_name, rgb, target, segment=None):
+    """
+    Scale a batch the same way as the ToTensor based pipeline of RLBenchEnvsDataset
+    :param task_name: (str)
+    :param rgb: (torch.Tensor) float input in [0, 1] of shape (B, 3, H, W)
+    :param target: (torch.Tensor) float target in [0, 1] of shape (B, C, H, W)
+    :param segment: (torch.Tensor) float segment_img in [0, 1] of shape (B, 1, H, W), if any
+    :return: (dict)
+    """
+    sample = {'rgb': rgb * 2 - 1}
+    if task_name in ['segment_semantic', 'segment_img']:
+        target = target[:, 0] * 255
+    pix2pix_tasks = ['depth', 'normal', 'sobel', "autoencoder", "denoise"]
+    if task_name in pix2pix_tasks:
+        target = target * 2 - 1
+    sample[task_name] = target
+
+    # Always return segment img mask, for use in the loss.
+    if segment is not None:
+        sample['segment_img'] = segment[:, 0] * 255
+    return sample
+
+
+class RLBenchMemmapDataset(Dataset):
+    """RLBench dataset read from the memory-mapped arrays written by pack_data.py
+
+    Indexed with a list of frame indices (see batch_loader) and returns a whole batch, the crop
+    and flip are done once on the batched tensors instead of per image. With raw=True the uint8
+    frames are returned as they are stored, for augment.PairedBatchAugment to process them on the
+    training device.
+    """
+
+    def __init__(self, cache_dir, task_name="normal", split=None, augment=True, crop_size=256, raw=False, split_seed=None):
+        """
+        Args:
+            cache_dir (string): Folder written by pack_data.py
+            task_name (str): same as RLBenchEnvsDataset
+            split (str): one of ['train', 'val', 'test'] to only expose that split of the manifest,
+                None for every frame
+            augment (bool): random crop and flip, otherwise center crop
+            crop_size (int): side of the square crop
+            raw (bool): return uncropped uint8 (B, H, W, C) arrays under 'rgb', 'target' and 'segment_img'
+            split_seed (int): split the frames with this seed instead of the split of the manifest,
+                e.g. every run of a sweep over the same cache its own
+        """
+        self.cache_dir = cache_dir
+        self.manifest = load_manifest(cache_dir)
+        self.task_name = task_name
+        self.augment = augment
+        self.crop_size = crop_size
+        self.raw = raw
+
+        # the autoencoder target is the rgb image itself
+        self.array_names = ['rgb', "rgb" if task_name == "autoencoder" else task_name]
+        if 'segment_img' in self.manifest['arrays'] and task_name != 'segment_img':
+            self.array_names.append('segment_img')
+        # opened lazily, a pickled memmap would be copied into every DataLoader worker
+        self.arrays = None
+
+        if split is None:
+            self.indices = np.arange(self.manifest['num_frames'])
+        else:
+            splits = self.manifest['splits']
+            if split_seed is not None:
+                splits = make_splits(self.manifest['num_frames'], seed=split_seed)
+            self.indices = np.array(splits[split], dtype=np.int64)
+        print("Dataset has", len(self.indices), "unique images")
+        self.generator = None
+
+    def _generator(self):
+        # every DataLoader worker gets its own crop stream, the main process uses the global torch RNG
+        info = torch.utils.data.get_worker_info()
+        if info is None:
+            return None
+        if self.generator is None:
+            self.generator = torch.Generator()
+            self.generator.manual_seed(info.seed)
+        return self.generator
+
+    def _open(self, name):
+        return np.load(os.path.join(self.cache_dir, self.manifest['arrays'][name]['file']), mmap_mode='r')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['arrays'] = None
+        return state
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, idx):
+        if torch.is_tensor(idx):
+            idx = idx.tolist()
+        if isinstance(idx, int):
+            idx = [idx]
+        # sorted reads are sequential on disk, the order within a batch does not matter
+        frames = np.sort(self.indices[idx])
+
+        if self.arrays is None:
+            self.arrays = [self._open(name) for name in self.array_names]
+        batch = [torch.from_numpy(np.ascontiguousarray(a[frames])) for a in self.arrays]
+        if self.raw:
+            return dict(zip(['rgb', 'target', 'segment_img'], batch))
+
+        batch = paired_random_crop(batch, self.crop_size, flip=self.augment, center=not self.augment,
+                                   generator=self._generator())
+        batch = [t.permute(0, 3, 1, 2).float() / 255 for t in batch]
+        return format_sample(self.task_name, *batch)
+
+
+def worker_kwargs(num_workers, persistent_workers=False, prefetch_factor=2):
+    """
+    DataLoader arguments that keep the workers alive between epochs and the batches they
+    prefetch, only valid with workers
+    """
+    if num_workers == 0:
+        return {}
+    return dict(persistent_workers=persistent_workers, prefetch_factor=prefetch_factor)
+
+
+def split_sampler(dataset, distributed=False, shuffle=False):
+    """
+    Sampler of a split, shuffled every epoch for the train split and sequential otherwise. With
+    distributed the share of the frames of this process: every world_size-th frame of the same
+    permutation on every process, padded so that every process gets as many batches. The
+    permutation is drawn from the epoch set by distributed.set_epoch
+    """
+    if distributed:
+        return DistributedSampler(dataset, shuffle=shuffle)
+    return RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+
+
+def batch_loader(dataset, batch_size, num_workers, drop_last=True, distributed=False, shuffle=False, **kwargs):
+    """DataLoader that hands a whole batch of indices to an RLBenchMemmapDataset at once"""
+    sampler = BatchSampler(split_sampler(dataset, distributed, shuffle), batch_size=batch_size, drop_last=drop_last)
+    return torch.utils.data.DataLoader(dataset, sampler=sampler, batch_size=None, num_workers=num_workers, **kwargs)
+
+
 # adapted from https://discuss.pytorch.org/t/using-imagefolder-random-split-with-multiple-transforms/79899/3
 trans = transforms.Compose([
     transforms.RandomCrop(256),
@@ -113,8 +255,24 @@ transNoAugment_target = transforms.Compose([
     transforms.ToTensor(),
     ])
 
-def genDS(batch_size=128, num_workers=4, task_name='normal', path='fill in path'):
+def genDS(batch_size=128, num_workers=4, task_name='normal', path='fill in path', cache_path=None, raw=False,
+          persistent_workers=False, prefetch_factor=2, pin_memory=False, distributed=False, split_seed=None):
+    """
+    Train, val and test loaders. With distributed, every process of the process group loads its
+    share of each split, batch_size is then the batch of a process. With split_seed, the frames are
+    split with this seed, otherwise by the manifest of cache_path or randomly
+    """
     task_name = task_name
+    kwargs = dict(worker_kwargs(num_workers, persistent_workers, prefetch_factor), pin_memory=pin_memory)
+    if cache_path:
+        # packed dataset, the splits come from the manifest
+        traindata = RLBenchMemmapDataset(cache_path, task_name=task_name, split='train', augment=True, raw=raw, split_seed=split_seed)
+        valdata = RLBenchMemmapDataset(cache_path, task_name=task_name, split='val', augment=False, raw=raw, split_seed=split_seed)
+        testdata = RLBenchMemmapDataset(cache_path, task_name=task_name, split='test', augment=False, raw=raw, split_seed=split_seed)
+        return (batch_loader(traindata, batch_size, num_workers, distributed=distributed, shuffle=True, **kwargs),
+                batch_loader(valdata, batch_size, num_workers, distributed=distributed, **kwargs),
+                batch_loader(testdata, batch_size, num_workers, distributed=distributed, **kwargs))
+
     augmented = RLBenchEnvsDataset(path,task_name=task_name,transform=trans, transform_target=trans_target)
     nonaugmented = RLBenchEnvsDataset(path,task_name=task_name,transform=transNoAugment, transform_target=transNoAugment_target)
 
@@ -124,7 +282,11 @@ def genDS(batch_size=128, num_workers=4, task_name='normal', path='fill in path'
     indices = list(range(num_train))
     split = int(np.floor(train_size * num_train))
     split2 = int(np.floor((train_size+(1-train_size)/2) * num_train))
-    np.random.shuffle(indices)
+    # every process of a process group must split the frames the same way
+    if split_seed is not None:
+        np.random.RandomState(split_seed).shuffle(indices)
+    else:
+        (np.random.RandomState(0) if distributed else np.random).shuffle(indices)
     train_idx, valid_idx, test_idx = indices[:split], indices[split:split2], indices[split2:]
 
     traindata = Subset(augmented, indices=train_idx)
@@ -132,10 +294,10 @@ def genDS(batch_size=128, num_workers=4, task_name='normal', path='fill in path'
     testdata = Subset(nonaugmented, indices=test_idx)
 
 
-    trainLoader = torch.utils.data.DataLoader(traindata, batch_size=batch_size, 
-                                            num_workers=num_workers, drop_last=True)
-    valLoader = torch.utils.data.DataLoader(valdata, batch_size=batch_size, 
-                                            num_workers=num_workers, drop_last=True)
-    testLoader = torch.utils.data.DataLoader(testdata, batch_size=batch_size,
-                                            num_workers=num_workers, drop_last=True)
+    trainLoader = torch.utils.data.DataLoader(traindata, batch_size=batch_size, sampler=split_sampler(traindata, distributed, shuffle=True),
+                                            num_workers=num_workers, drop_last=True, **kwargs)
+    valLoader = torch.utils.data.DataLoader(valdata, batch_size=batch_size, sampler=split_sampler(valdata, distributed),
+                                            num_workers=num_workers, drop_last=True, **kwargs)
+    testLoader = torch.utils.data.DataLoader(testdata, batch_size=batch_size, sampler=split_sampler(testdata, distributed),
+                                            num_workers=num_workers, drop_last=True, **kwargs)
     return trainLoader, valLoader, testLoader
\ No newline at end of file
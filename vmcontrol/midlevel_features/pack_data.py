@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import pathlib
+from multiprocessing import Pool
+
+import numpy as np
+from skimage import io
+
+'''
+One-off packer that converts a dataset generated by environments/dataset_generator.py into
+memory-mapped uint8 arrays that RLBenchMemmapDataset (load_data.py) can read without decoding PNGs.
+
+Example usage:
+
+python pack_data.py --data_path /path/to/train/data/ --out_path /path/to/cache/ --tasks normal depth segment_img
+
+The output folder contains one {task}.npy array of shape (N, H, W, C) per task plus a manifest.json
+with the frame list, array shapes and the train/val/test split.
+'''
+
+MANIFEST_NAME = "manifest.json"
+
+# every frame type written by EpisodeSaver.saveImage, rgb is always packed
+FRAME_TYPES = ['rgb', 'depth', 'normal', 'sobel', 'segment_img', 'sobel_3d', 'denoise']
+
+
+def list_frames(root_dir):
+    """
+    Find every rgb frame below root_dir, in a stable order
+    :param root_dir: (str)
+    :return: ([str]) paths relative to root_dir
+    """
+    files = [str(x.relative_to(root_dir)) for x in pathlib.Path(root_dir).rglob("*_rgb.png")]
+    return sorted(files)
+
+
+def make_splits(num_frames, seed=0, train_size=0.8):
+    """
+    Deterministic train/val/test split, same proportions as load_data.genDS
+    :param num_frames: (int)
+    :param seed: (int)
+    :param train_size: (float) the rest is halved between val and test
+    :return: (dict) split name -> list of frame indices
+    """
+    indices = np.random.RandomState(seed).permutation(num_frames)
+    split = int(np.floor(train_size * num_frames))
+    split2 = int(np.floor((train_size + (1 - train_size) / 2) * num_frames))
+    return {
+        'train': sorted(indices[:split].tolist()),
+        'val': sorted(indices[split:split2].tolist()),
+        'test': sorted(indices[split2:].tolist()),
+    }
+
+
+def frame_path(root_dir, rgb_file, task):
+    return os.path.join(root_dir, rgb_file[:-len("_rgb.png")] + "_{}.png".format(task))
+
+
+def _read(path):
+    img = np.array(io.imread(path), dtype=np.uint8)
+    if img.ndim == 2:
+        img = img[..., np.newaxis]
+    return img
+
+
+def _read_chunk(paths):
+    return np.stack([_read(p) for p in paths])
+
+
+def pack(root_dir, out_dir, tasks=None, seed=0, num_workers=4, chunk_size=256):
+    """
+    Decode the PNG dataset once and write it to memory-mapped arrays
+    :param root_dir: (str) dataset folder, see RLBenchEnvsDataset
+    :param out_dir: (str) output folder
+    :param tasks: ([str]) frame types to pack besides rgb, None packs every type found on disk
+    :param seed: (int) seed of the train/val/test split
+    :param num_workers: (int) decoding processes
+    :param chunk_size: (int) frames decoded per job
+    :return: (dict) the manifest
+    """
+    files = list_frames(root_dir)
+    assert len(files) > 0, "Error: no *_rgb.png frames found in '{}'".format(root_dir)
+
+    if tasks is None:
+        tasks = [t for t in FRAME_TYPES if os.path.exists(frame_path(root_dir, files[0], t))]
+    tasks = ['rgb'] + [t for t in tasks if t != 'rgb']
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        'version': 1,
+        'root_dir': os.path.abspath(root_dir),
+        'num_frames': len(files),
+        'files': files,
+        'arrays': {},
+        'split_seed': seed,
+        'splits': make_splits(len(files), seed=seed),
+    }
+
+    with Pool(num_workers) as pool:
+        for task in tasks:
+            shape = (len(files),) + _read(frame_path(root_dir, files[0], task)).shape
+            array_name = "{}.npy".format(task)
+            out = np.lib.format.open_memmap(os.path.join(out_dir, array_name), mode='w+',
+                                            dtype=np.uint8, shape=shape)
+            paths = [frame_path(root_dir, f, task) for f in files]
+            jobs = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+            for i, chunk in enumerate(pool.imap(_read_chunk, jobs)):
+                assert chunk.shape[1:] == shape[1:], \
+                    "Error: '{}' frames do not all have the shape {}".format(task, shape[1:])
+                out[i * chunk_size:i * chunk_size + len(chunk)] = chunk
+            out.flush()
+            del out
+            manifest['arrays'][task] = {'file': array_name, 'shape': list(shape)}
+            print("Packed", task, shape)
+
+    # written last, so a folder with a manifest is always complete
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def load_manifest(cache_dir):
+    with open(os.path.join(cache_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack a mid-level feature dataset into memory-mapped arrays')
+    parser.add_argument('--data_path', type=str, required=True, help='Path to folders generated by robotics-rl-srl')
+    parser.add_argument('--out_path', type=str, required=True, help='Folder to write the packed arrays to')
+    parser.add_argument('--tasks', type=str, nargs='*', default=None,
+                        help='Frame types to pack besides rgb. Default is every type found on disk')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the train/val/test split')
+    parser.add_argument('--num_workers', type=int, default=4, help='Number of decoding processes')
+    args = parser.parse_args()
+
+    pack(args.data_path, args.out_path, tasks=args.tasks, seed=args.seed, num_workers=args.num_workers)
+
+
+if __name__ == '__main__':
+    main()
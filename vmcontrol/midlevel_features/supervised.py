@@ -0,0 +1,251 @@
+import contextlib
+import os
+import random
+
+import numpy as np
+import torch
+
+import distributed
+from rlkit.torch.mixed_precision import MixedPrecision
+
+
+def get_rng_state():
+    """
+    :return: (dict) the state of the python, numpy and torch (CPU and CUDA) generators
+    """
+    state = dict(
+        python=random.getstate(),
+        numpy=np.random.get_state(),
+        torch=torch.get_rng_state(),
+    )
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def read_checkpoint(file_name):
+    """
+    :return: (dict) a state_dict of SupervisedTrainer, e.g. to read its data_state before the
+        loaders and the trainer are built
+    """
+    # the RNG states are CPU tensors, the rest is mapped back by load_state_dict, and the
+    # python and numpy RNG states are not weights
+    return torch.load(file_name, map_location='cpu', weights_only=False)
+
+
+class SupervisedTrainer(object):
+    """
+    Training loop of a supervised network, e.g. the fine-tuning of the
+    Taskonomy networks in train.py.
+
+    The forward passes are autocast with MixedPrecision (float16 with loss
+    scaling on CUDA, bfloat16 on CPU) and the network and its image inputs can
+    be kept channels_last. The gradients of accumulation_steps batches are
+    summed before every optimizer step. The losses are summed on the device and
+    read back once per epoch, so that no batch waits for the host.
+
+    state_dict holds everything a killed job needs to carry on where it
+    stopped: the network, optimizer, loss scaler, RNG states, epoch and loss
+    history, see save_checkpoint and load_checkpoint. data_state holds what
+    the loaders need to be built the same way again, e.g. the seed of the
+    train/val/test split, see read_checkpoint.
+
+    In a process group (see distributed.init_distributed) the
+    network is wrapped in DistributedDataParallel, every process trains on its
+    share of the batches (a DistributedSampler) and the losses are summed over
+    the processes, so that they all return the same train and validation loss.
+    train_epoch sets the epoch of the DistributedSampler of its loader, so that
+    the processes draw the same new permutation of the frames every epoch, also
+    after a resume. The checkpoints are written by the main process only.
+
+    Usage:
+        trainer = SupervisedTrainer(net, optimizer, nn.L1Loss(), prepare_batch, amp=True)
+        for epoch in range(trainer.epoch, num_epochs):
+            train_loss = trainer.train_epoch(train_loader)
+            val_loss = trainer.evaluate(val_loader)
+            trainer.end_epoch(train_loss, val_loss)
+            trainer.save_checkpoint('checkpoint.pth')
+    """
+
+    def __init__(
+            self,
+            model,
+            optimizer,
+            criterion,
+            prepare_batch=None,
+            amp=False,
+            channels_last=False,
+            accumulation_steps=1,
+            device=None,
+            bucket_cap_mb=25,
+    ):
+        """
+        :param model: (nn.Module) on device
+        :param optimizer: (torch.optim.Optimizer)
+        :param criterion: (callable) loss of (outputs, targets), computed in float32
+        :param prepare_batch: (callable) maps a sample of the loader to (inputs, targets) on device,
+            by default the loader yields them
+        :param amp: (bool)
+        :param channels_last: (bool)
+        :param accumulation_steps: (int) batches per optimizer step
+        :param device: (torch.device or str) where the network runs
+        :param bucket_cap_mb: (float) size of the gradient buckets all-reduced at once, in a process group
+        """
+        assert accumulation_steps >= 1, "Error: accumulation_steps must be at least 1"
+        # the network itself, whose state_dict is saved, and the network that is called
+        self.module = model
+        self.optimizer = optimizer
+        self.criterion = criterion
+        self.prepare_batch = prepare_batch or (lambda sample: sample)
+        self.channels_last = channels_last
+        self.accumulation_steps = accumulation_steps
+        self.mixed_precision = MixedPrecision(enabled=amp, device=device)
+        self.scaler = self.mixed_precision.scaler(optimizer)
+        if channels_last:
+            self.module.to(memory_format=torch.channels_last)
+        self.device = next(self.module.parameters()).device
+        self.model = model
+        if distributed.is_distributed():
+            self.model = distributed.wrap_model(model, self.device, bucket_cap_mb=bucket_cap_mb)
+
+        self.epoch = 0
+        self.best_loss = float("inf")
+        self.train_loss_history = []
+        self.val_loss_history = []
+        # saved with the checkpoints, set by the caller
+        self.data_state = {}
+
+    def _inputs(self, inputs):
+        if self.channels_last and inputs.dim() == 4:
+            return inputs.contiguous(memory_format=torch.channels_last)
+        return inputs
+
+    def _loss(self, inputs, targets):
+        with self.mixed_precision.autocast():
+            outputs = self.model(self._inputs(inputs))
+        return self.criterion(outputs.float(), targets)
+
+    def _no_sync(self, sync):
+        # the gradients of the accumulated batches are only all-reduced with the last one
+        if sync or not distributed.is_distributed():
+            return contextlib.suppress()
+        return self.model.no_sync()
+
+    def _mean(self, total_loss, num_inputs):
+        totals = torch.stack([total_loss.float(), torch.tensor(float(num_inputs), device=self.device)])
+        total_loss, num_inputs = distributed.all_reduce_sum(totals).tolist()
+        return total_loss / num_inputs if num_inputs else float("nan")
+
+    def _optimizer_step(self):
+        self.scaler.step(self.optimizer)
+        self.scaler.update()
+        self.optimizer.zero_grad()
+
+    def train_epoch(self, batches):
+        """
+        :param batches: (iterable) samples of the loader
+        :return: (float) the mean loss per input
+        """
+        distributed.set_epoch(batches, self.epoch)
+        self.model.train()
+        self.optimizer.zero_grad()
+        total_loss = torch.zeros((), device=self.device)
+        num_inputs = 0
+        pending = 0
+        batches = iter(batches)
+        sample = next(batches, None)
+        while sample is not None:
+            next_sample = next(batches, None)
+            inputs, targets = self.prepare_batch(sample)
+            step = pending + 1 == self.accumulation_steps or next_sample is None
+            with self._no_sync(step):
+                loss = self._loss(inputs, targets)
+                self.scaler.scale(loss / self.accumulation_steps).backward()
+            pending += 1
+            if step:
+                # the last batches of the epoch may be fewer than accumulation_steps
+                self._optimizer_step()
+                pending = 0
+            total_loss += loss.detach() * inputs.shape[0]
+            num_inputs += inputs.shape[0]
+            sample = next_sample
+        return self._mean(total_loss, num_inputs)
+
+    def evaluate(self, batches):
+        """
+        :return: (float) the mean loss per input
+        """
+        self.model.eval()
+        total_loss = torch.zeros((), device=self.device)
+        num_inputs = 0
+        with torch.no_grad():
+            for sample in batches:
+                inputs, targets = self.prepare_batch(sample)
+                total_loss += self._loss(inputs, targets) * inputs.shape[0]
+                num_inputs += inputs.shape[0]
+        return self._mean(total_loss, num_inputs)
+
+    def end_epoch(self, train_loss, val_loss):
+        """
+        :return: (bool) whether val_loss is the best so far
+        """
+        self.train_loss_history.append(train_loss)
+        self.val_loss_history.append(val_loss)
+        self.epoch += 1
+        if val_loss < self.best_loss:
+            self.best_loss = val_loss
+            return True
+        return False
+
+    def state_dict(self):
+        """
+        Called by every process of a process group, which gathers their RNG states
+        """
+        return dict(
+            model=self.module.state_dict(),
+            optimizer=self.optimizer.state_dict(),
+            scaler=self.scaler.state_dict(),
+            rng=distributed.all_gather_object(get_rng_state()),
+            epoch=self.epoch,
+            best_loss=self.best_loss,
+            train_loss_history=self.train_loss_history,
+            val_loss_history=self.val_loss_history,
+            data_state=self.data_state,
+        )
+
+    def load_state_dict(self, state):
+        self.module.load_state_dict(state['model'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.scaler.load_state_dict(state['scaler'])
+        # the RNG states of every rank, a resumed job with other processes reuses them in turn
+        rng = state['rng']
+        set_rng_state(rng[distributed.get_rank() % len(rng)])
+        self.epoch = state['epoch']
+        self.best_loss = state['best_loss']
+        self.train_loss_history = list(state['train_loss_history'])
+        self.val_loss_history = list(state['val_loss_history'])
+        self.data_state = dict(state.get('data_state', {}))
+
+    def save_checkpoint(self, file_name):
+        """
+        Written to a temporary file first, so that a job killed while saving
+        leaves the previous checkpoint intact. Called by every process of a
+        process group, only the main one writes.
+        """
+        state = self.state_dict()
+        if not distributed.is_main_process():
+            return
+        tmp_file_name = file_name + '.tmp'
+        torch.save(state, tmp_file_name)
+        os.replace(tmp_file_name, file_name)
+
+    def load_checkpoint(self, file_name):
+        self.load_state_dict(read_checkpoint(file_name))
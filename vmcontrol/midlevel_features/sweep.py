@@ -0,0 +1,184 @@
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+from pack_data import MANIFEST_NAME, load_manifest, pack
+
+'''
+Hyperparameter sweep over train.py that decodes the PNG dataset once. The frames are packed by
+pack_data.py into memory-mapped arrays (unless cache_path already holds them), then every run reads
+them with --cache_path: the arrays are opened read-only, so the concurrent runs share the same
+pages of the page cache instead of each scanning the folder and decoding its own copy. Every run
+gets its own split seed and device, round robin over --devices. Example usage:
+
+python sweep.py --name sweep --data_path /path/to/train/data/ --cache_path /path/to/cache/ \\
+    --feature_tasks normal depth --lrs 3e-4 1e-4 --model_paths "" random --split_seeds 0 1 \\
+    --devices cuda:0 cuda:1 --max_concurrent 4 -- --batch_size 32 --num_epochs 50
+
+Arguments after -- are passed to every run. Each run writes to {name}/{run name}, and the wall
+time, peak memory of the sweep and the status of every run are written to {name}/sweep.json.
+'''
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train.py')
+
+# the arrays a run of each feature task reads besides rgb, its own frames otherwise
+_TASK_ARRAYS = {"autoencoder": []}
+
+
+def ensure_cache(data_path, cache_path, feature_tasks, num_workers=4):
+    """
+    Pack the dataset into cache_path, unless a complete pack of the frames the feature tasks need
+    is already there
+    :return: (dict) the manifest
+    """
+    tasks = sorted({a for t in feature_tasks for a in _TASK_ARRAYS.get(t, [t])})
+    if os.path.exists(os.path.join(cache_path, MANIFEST_NAME)):
+        manifest = load_manifest(cache_path)
+        missing = [t for t in tasks if t not in manifest['arrays']]
+        assert not missing, "Error: the cache in '{}' has no {} frames".format(cache_path, missing)
+        return manifest
+    assert data_path, "Error: '{}' is not packed, set the data path".format(cache_path)
+    # the segment_img masks are packed too when they exist, train.py reads them for the loss
+    manifest = pack(data_path, cache_path, tasks=None, num_workers=num_workers)
+    missing = [t for t in tasks if t not in manifest['arrays']]
+    assert not missing, "Error: the dataset in '{}' has no {} frames".format(data_path, missing)
+    return manifest
+
+
+def make_runs(feature_tasks, lrs, model_paths, split_seeds, devices):
+    """
+    One run per combination of the swept values, the devices are assigned round robin
+    :return: ([dict]) the runs, with their name and device
+    """
+    runs = []
+    for i, (feature_task, lr, model_path, split_seed) in enumerate(
+            itertools.product(feature_tasks, lrs, model_paths, split_seeds)):
+        init = os.path.basename(model_path.rstrip('/')) if model_path else 'taskonomy'
+        runs.append(dict(
+            name='{}_lr{:g}_{}_split{}'.format(feature_task, lr, init, split_seed),
+            feature_task=feature_task,
+            lr=lr,
+            model_path=model_path,
+            split_seed=split_seed,
+            device=devices[i % len(devices)],
+        ))
+    return runs
+
+
+def run_command(run, sweep_dir, cache_path, extra_args=(), script=SCRIPT):
+    """
+    :return: ([str]) the command line of a run of train.py, or of another script with its arguments
+    """
+    return [
+        sys.executable, script,
+        '--name', os.path.join(sweep_dir, run['name']),
+        '--feature_task', run['feature_task'],
+        '--lr', str(run['lr']),
+        '--model_path', run['model_path'],
+        '--cache_path', cache_path,
+        '--split_seed', str(run['split_seed']),
+        '--device', run['device'],
+    ] + list(extra_args)
+
+
+def _children(pid):
+    try:
+        with open('/proc/{}/task/{}/children'.format(pid, pid)) as f:
+            return [int(c) for c in f.read().split()]
+    except (IOError, ValueError):
+        return []
+
+
+def _pss(pid):
+    # proportional set size: the pages shared by n processes count 1/n in each of them
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    return 0
+
+
+def process_tree_pss(pids):
+    """
+    :return: (int) bytes of memory of the processes and of their children, e.g. the DataLoader
+        workers, with the shared pages counted once. 0 where /proc is not available
+    """
+    total = 0
+    stack = list(pids)
+    while stack:
+        pid = stack.pop()
+        total += _pss(pid)
+        stack.extend(_children(pid))
+    return total
+
+
+def launch(commands, max_concurrent=1, poll_interval=0.5, log_dir=None):
+    """
+    Run the commands, at most max_concurrent at once, and sample the memory of the running ones
+    :return: (dict) wall_time, peak_memory (bytes) and the return code and wall time of every command
+    """
+    pending = list(enumerate(commands))
+    running = {}
+    results = [None] * len(commands)
+    peak_memory = 0
+    start = time.time()
+    while pending or running:
+        while pending and len(running) < max_concurrent:
+            i, command = pending.pop(0)
+            out = open(os.path.join(log_dir, 'run_{}.out'.format(i)), 'w') if log_dir else subprocess.DEVNULL
+            running[i] = (subprocess.Popen(command, stdout=out, stderr=subprocess.STDOUT), time.time(), out)
+        peak_memory = max(peak_memory, process_tree_pss([p.pid for p, _, _ in running.values()]))
+        time.sleep(poll_interval)
+        for i, (process, run_start, out) in list(running.items()):
+            if process.poll() is not None:
+                results[i] = dict(returncode=process.returncode, wall_time=time.time() - run_start)
+                if out is not subprocess.DEVNULL:
+                    out.close()
+                del running[i]
+    return dict(wall_time=time.time() - start, peak_memory=peak_memory, runs=results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep train.py over a dataset decoded once')
+    parser.add_argument('--name', type=str, required=True, help='Folder of the runs')
+    parser.add_argument('--data_path', type=str, default="", help='Path to folders generated by robotics-rl-srl, packed once into cache_path')
+    parser.add_argument('--cache_path', type=str, required=True, help='Folder of the arrays written by pack_data.py, shared by every run')
+    parser.add_argument('--feature_tasks', type=str, nargs='+', default=['normal'])
+    parser.add_argument('--lrs', type=float, nargs='+', default=[3e-4])
+    parser.add_argument('--model_paths', type=str, nargs='+', default=[""], help='Initializations, "" for the Taskonomy weights and random for none')
+    parser.add_argument('--split_seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--devices', type=str, nargs='+', default=['cuda'], help='Devices the runs are assigned to in turn')
+    parser.add_argument('--max_concurrent', type=int, default=1, help='Runs at once')
+    parser.add_argument('--num_workers', type=int, default=4, help='Decoding processes of the packing')
+    parser.add_argument('--script', type=str, default=SCRIPT, help='Training script, train.py by default')
+    parser.add_argument('extra_args', nargs=argparse.REMAINDER, help='-- then the arguments of every run')
+    args = parser.parse_args()
+    extra_args = args.extra_args[1:] if args.extra_args[:1] == ['--'] else args.extra_args
+
+    os.makedirs(args.name, exist_ok=True)
+    start = time.time()
+    ensure_cache(args.data_path, args.cache_path, args.feature_tasks, num_workers=args.num_workers)
+    pack_time = time.time() - start
+
+    runs = make_runs(args.feature_tasks, args.lrs, args.model_paths, args.split_seeds, args.devices)
+    commands = [run_command(run, args.name, args.cache_path, extra_args, script=args.script) for run in runs]
+    report = launch(commands, max_concurrent=args.max_concurrent, log_dir=args.name)
+    for run, result in zip(runs, report['runs']):
+        run.update(result)
+        print("{:40s} {:8s} return code {} in {:.0f}s".format(run['name'], run['device'], run['returncode'], run['wall_time']))
+    report.update(runs=runs, pack_time=pack_time, wall_time=time.time() - start)
+    print("Sweep of {} runs in {:.0f}s (packing {:.0f}s), peak memory {:.2f}GB".format(
+        len(runs), report['wall_time'], pack_time, report['peak_memory'] / 2 ** 30))
+    with open(os.path.join(args.name, 'sweep.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Tests for the batched paired augmentation of the mid-level training.
+"""
+
+import torch
+
+from augment import PairedBatchAugment, color_jitter, paired_random_crop
+
+SIZE = 8
+
+
+def images(batch=6, height=12, width=10, channels=3, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(0, 256, (batch, height, width, channels), generator=generator, dtype=torch.uint8)
+
+
+def test_inputs_and_targets_get_the_same_crop_and_flip():
+    inputs = images()
+    # a one channel target made of the same pixels
+    targets = inputs[..., :1].clone()
+    generator = torch.Generator().manual_seed(0)
+    for _ in range(5):
+        cropped_inputs, cropped_targets = paired_random_crop([inputs, targets], SIZE, generator=generator)
+        assert cropped_inputs.shape == (6, SIZE, SIZE, 3)
+        assert torch.equal(cropped_inputs[..., :1], cropped_targets)
+
+
+def test_crops_are_windows_of_the_images():
+    inputs = images()
+    cropped, = paired_random_crop([inputs], SIZE, generator=torch.Generator().manual_seed(1))
+    for image, crop in zip(inputs, cropped):
+        windows = [image[top:top + SIZE, left:left + SIZE]
+                   for top in range(12 - SIZE + 1) for left in range(10 - SIZE + 1)]
+        assert any(torch.equal(crop, w) or torch.equal(crop, w.flip(1)) for w in windows)
+
+
+def test_center_crop():
+    inputs = images()
+    cropped, = paired_random_crop([inputs], SIZE, center=True)
+    assert torch.equal(cropped, inputs[:, 2:2 + SIZE, 1:1 + SIZE])
+
+
+def test_eval_mode_center_crops_without_jitter():
+    augment = PairedBatchAugment(crop_size=SIZE, brightness=0.5, contrast=0.5, saturation=0.5, device='cpu', seed=0)
+    augment.eval()
+    inputs, targets = images(), images(channels=1, seed=1)[..., 0]
+    augmented_inputs, augmented_targets = augment(inputs, targets)
+    assert torch.allclose(augmented_inputs, inputs[:, 2:2 + SIZE, 1:1 + SIZE].permute(0, 3, 1, 2).float() / 255)
+    assert augmented_targets.shape == (6, 1, SIZE, SIZE)
+    assert torch.allclose(augmented_targets[:, 0], targets[:, 2:2 + SIZE, 1:1 + SIZE].float() / 255)
+
+
+def test_only_the_inputs_are_jittered():
+    inputs = images()
+    augment = PairedBatchAugment(crop_size=SIZE, brightness=0.5, device='cpu', seed=0)
+    augmented_inputs, augmented_targets = augment(inputs, inputs.clone())
+    assert augmented_inputs.shape == augmented_targets.shape == (6, 3, SIZE, SIZE)
+    assert not torch.allclose(augmented_inputs, augmented_targets)
+    # the same crop of the same pixels, before the jitter
+    unjittered = PairedBatchAugment(crop_size=SIZE, device='cpu', seed=0)
+    assert torch.equal(unjittered(inputs)[0], augmented_targets)
+
+
+def test_no_jitter_is_the_identity():
+    batch = images().permute(0, 3, 1, 2).float() / 255
+    assert torch.equal(color_jitter(batch), batch)
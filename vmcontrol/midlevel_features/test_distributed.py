@@ -0,0 +1,104 @@
+"""
+Two-process data-parallel training with gloo on CPU.
+"""
+
+import os
+
+import numpy as np
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch import nn as nn
+from torch.utils.data import BatchSampler, TensorDataset
+from torch.utils.data.distributed import DistributedSampler
+
+import distributed
+from supervised import SupervisedTrainer
+
+WORLD_SIZE = 2
+BATCH_SIZE = 4
+
+pytestmark = pytest.mark.skipif(not dist.is_available(), reason="torch.distributed is not available")
+
+
+def make_trainer():
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Conv2d(3, 8, 3, padding=1), nn.ReLU(), nn.Conv2d(8, 3, 3, padding=1))
+    return SupervisedTrainer(model, torch.optim.SGD(model.parameters(), lr=0.1), nn.MSELoss(), device='cpu')
+
+
+def make_dataset(num_inputs):
+    rng = np.random.RandomState(0)
+    inputs = torch.from_numpy(rng.uniform(-1, 1, (num_inputs, 3, 8, 8)).astype(np.float32))
+    return TensorDataset(inputs, -inputs)
+
+
+def loader(dataset, batch_size, distributed_sampler):
+    indices = DistributedSampler(dataset, shuffle=False) if distributed_sampler else range(len(dataset))
+    return [dataset[batch] for batch in BatchSampler(indices, batch_size, drop_last=False)]
+
+
+def train(trainer, train_batches, val_batches, num_epochs=3):
+    for _ in range(num_epochs):
+        trainer.end_epoch(trainer.train_epoch(train_batches), trainer.evaluate(val_batches))
+
+
+def worker(rank, rendezvous, output_dir):
+    distributed.init_distributed('gloo', init_method='file://' + rendezvous, rank=rank, world_size=WORLD_SIZE)
+    trainer = make_trainer()
+    assert isinstance(trainer.model, nn.parallel.DistributedDataParallel)
+    # every process trains on half of every batch of the single process run
+    train(trainer, loader(make_dataset(16), BATCH_SIZE, True), loader(make_dataset(6), BATCH_SIZE, True))
+    trainer.save_checkpoint(os.path.join(output_dir, 'checkpoint.pth'))
+    torch.save(dict(
+        parameters=[p.detach() for p in trainer.module.parameters()],
+        train_loss_history=trainer.train_loss_history,
+        val_loss_history=trainer.val_loss_history,
+    ), os.path.join(output_dir, 'rank_{}.pth'.format(rank)))
+    distributed.cleanup()
+
+
+def test_two_processes_match_a_single_process(tmp_path):
+    mp.spawn(worker, args=(str(tmp_path / 'rendezvous'), str(tmp_path)), nprocs=WORLD_SIZE, join=True)
+    ranks = [torch.load(str(tmp_path / 'rank_{}.pth'.format(rank)), weights_only=False) for rank in range(WORLD_SIZE)]
+
+    trainer = make_trainer()
+    assert trainer.model is trainer.module
+    train(trainer, loader(make_dataset(16), WORLD_SIZE * BATCH_SIZE, False), loader(make_dataset(6), BATCH_SIZE, False))
+
+    for rank in ranks:
+        for p, q in zip(rank['parameters'], trainer.module.parameters()):
+            assert torch.allclose(p, q, atol=1e-5)
+        assert np.allclose(rank['train_loss_history'], trainer.train_loss_history, atol=1e-5)
+        # the validation loss is reduced over both halves of the validation set
+        assert np.allclose(rank['val_loss_history'], trainer.val_loss_history, atol=1e-5)
+
+    # written once, by rank 0, with the RNG states of both ranks
+    checkpoint = torch.load(str(tmp_path / 'checkpoint.pth'), weights_only=False)
+    assert len(checkpoint['rng']) == WORLD_SIZE
+    assert checkpoint['epoch'] == 3
+    trainer = make_trainer()
+    trainer.load_checkpoint(str(tmp_path / 'checkpoint.pth'))
+    for p, q in zip(ranks[0]['parameters'], trainer.module.parameters()):
+        assert torch.equal(p, q)
+
+
+def test_train_epoch_reshuffles_the_shares():
+    dataset = make_dataset(16)
+    # the shares of both ranks, without a process group
+    samplers = [DistributedSampler(dataset, num_replicas=WORLD_SIZE, rank=rank, shuffle=True) for rank in range(WORLD_SIZE)]
+    loaders = [torch.utils.data.DataLoader(dataset, sampler=BatchSampler(s, BATCH_SIZE, drop_last=False), batch_size=None)
+               for s in samplers]
+    trainer = make_trainer()
+    shares = []
+    for epoch in range(2):
+        trainer.train_epoch(loaders[0])
+        assert samplers[0].epoch == epoch
+        distributed.set_epoch(loaders[1], epoch)
+        shares.append([list(s) for s in samplers])
+        trainer.end_epoch(0., 0.)
+    for epoch_shares in shares:
+        # the ranks split one permutation
+        assert sorted(epoch_shares[0] + epoch_shares[1]) == list(range(16))
+    assert shares[0][0] != shares[1][0]
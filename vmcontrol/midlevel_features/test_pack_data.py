@@ -0,0 +1,78 @@
+"""
+Tests for the memory-mapped dataset cache, on a small synthetic image set.
+"""
+
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+from torch.utils.data import RandomSampler, SequentialSampler
+
+from benchmark_sweep import write_synthetic_dataset
+from load_data import RLBenchMemmapDataset, genDS
+from pack_data import MANIFEST_NAME, list_frames, load_manifest, make_splits, pack
+
+NUM_FRAMES = 20
+
+
+def test_make_splits():
+    splits = make_splits(100, seed=3)
+    assert [len(splits[s]) for s in ['train', 'val', 'test']] == [80, 10, 10]
+    assert sorted(splits['train'] + splits['val'] + splits['test']) == list(range(100))
+    assert make_splits(100, seed=3) == splits
+    assert make_splits(100, seed=4) != splits
+
+
+@pytest.fixture(scope='module')
+def data_path(tmp_path_factory):
+    data_path = str(tmp_path_factory.mktemp('pack') / 'data')
+    write_synthetic_dataset(data_path, NUM_FRAMES, size=256)
+    return data_path
+
+
+def test_pack(data_path, tmp_path):
+    manifest = pack(data_path, str(tmp_path), tasks=['normal'], seed=1, num_workers=2, chunk_size=8)
+    assert load_manifest(str(tmp_path)) == manifest
+    assert manifest['files'] == list_frames(data_path)
+    assert manifest['splits'] == make_splits(NUM_FRAMES, seed=1)
+    for task in ['rgb', 'normal']:
+        array = np.load(os.path.join(str(tmp_path), manifest['arrays'][task]['file']), mmap_mode='r')
+        assert array.shape == (NUM_FRAMES, 256, 256, 3)
+        # every chunk lands at the rows of its frames
+        for i in [0, 9, NUM_FRAMES - 1]:
+            path = os.path.join(data_path, manifest['files'][i][:-len('rgb.png')] + task + '.png')
+            assert np.array_equal(array[i], np.array(Image.open(path)))
+
+
+def test_manifest_is_written_last(data_path, tmp_path):
+    # a normal frame of another size makes the packing fail once rgb is written
+    normal = os.path.join(data_path, list_frames(data_path)[-1][:-len('rgb.png')] + 'normal.png')
+    original = Image.open(normal)
+    original.load()
+    original.resize((128, 128)).save(normal)
+    try:
+        with pytest.raises(AssertionError):
+            pack(data_path, str(tmp_path), tasks=['normal'], num_workers=1, chunk_size=8)
+    finally:
+        original.save(normal)
+    assert os.path.exists(os.path.join(str(tmp_path), 'rgb.npy'))
+    assert not os.path.exists(os.path.join(str(tmp_path), MANIFEST_NAME))
+
+
+def test_memmap_dataset(data_path, tmp_path):
+    pack(data_path, str(tmp_path), tasks=['normal'], num_workers=1)
+    data = RLBenchMemmapDataset(str(tmp_path), 'normal', 'val', augment=False)
+    sample = data[[0, 1]]
+    assert sample['rgb'].shape == (2, 3, 256, 256)
+    assert -1 <= float(sample['rgb'].min()) and float(sample['rgb'].max()) <= 1
+    assert sample['normal'].shape == (2, 3, 256, 256)
+
+
+def test_train_batches_are_shuffled(data_path, tmp_path):
+    pack(data_path, str(tmp_path), tasks=['normal'], num_workers=1)
+    trainLoader, valLoader, testLoader = genDS(batch_size=2, num_workers=0, task_name='normal', cache_path=str(tmp_path))
+    # the loaders are handed whole batches of indices by a BatchSampler
+    assert isinstance(trainLoader.sampler.sampler, RandomSampler)
+    for loader in [valLoader, testLoader]:
+        assert isinstance(loader.sampler.sampler, SequentialSampler)
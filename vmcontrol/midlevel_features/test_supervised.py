@@ -0,0 +1,87 @@
+"""
+Tests for the training loop of the mid-level networks.
+"""
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from supervised import SupervisedTrainer, read_checkpoint
+
+
+def make_trainer(**kwargs):
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Conv2d(3, 8, 3, padding=1), nn.ReLU(), nn.Conv2d(8, 3, 3, padding=1), nn.Tanh())
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+    return SupervisedTrainer(model, optimizer, nn.L1Loss(), **kwargs)
+
+
+def batches(num_batches=4, batch_size=4):
+    # drawn from the global RNGs, like the random crops of the loaders, so resuming must restore them
+    for _ in range(num_batches):
+        inputs = torch.rand(batch_size, 3, 8, 8) * 2 - 1
+        noise = torch.from_numpy(np.random.uniform(-0.1, 0.1, (batch_size, 3, 8, 8)).astype(np.float32))
+        yield inputs, (-inputs + noise).clamp(-1, 1)
+
+
+def run(trainer, num_epochs, checkpoint=None):
+    for _ in range(trainer.epoch, num_epochs):
+        trainer.end_epoch(trainer.train_epoch(batches()), trainer.evaluate(batches(2)))
+        if checkpoint is not None:
+            trainer.save_checkpoint(checkpoint)
+    return trainer.train_loss_history, trainer.val_loss_history
+
+
+def test_loss_decreases():
+    train_losses, val_losses = run(make_trainer(), 10)
+    assert train_losses[-1] < 0.5 * train_losses[0]
+    assert val_losses[-1] < 0.5 * val_losses[0]
+
+
+def test_resume_reproduces_the_loss_curve(tmp_path):
+    np.random.seed(0)
+    expected = run(make_trainer(), 6)
+
+    checkpoint = str(tmp_path / 'checkpoint.pth')
+    np.random.seed(0)
+    run(make_trainer(), 3, checkpoint=checkpoint)
+    # a new process: other weights and RNG states until the checkpoint is loaded
+    np.random.seed(1)
+    trainer = make_trainer()
+    trainer.load_checkpoint(checkpoint)
+    assert trainer.epoch == 3
+    assert run(trainer, 6) == expected
+
+
+def test_data_state_is_saved(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.pth')
+    trainer = make_trainer()
+    trainer.data_state = dict(split_seed=7)
+    run(trainer, 1, checkpoint=checkpoint)
+    # readable before the loaders and the trainer are built
+    assert read_checkpoint(checkpoint)['data_state'] == dict(split_seed=7)
+    trainer = make_trainer()
+    trainer.load_checkpoint(checkpoint)
+    assert trainer.data_state == dict(split_seed=7)
+
+
+def test_accumulation_matches_larger_batches():
+    np.random.seed(1)
+    inputs, targets = next(batches(1, 8))
+
+    def one_step(trainer, batch_size):
+        trainer.train_epoch(zip(inputs.split(batch_size), targets.split(batch_size)))
+        return [p.detach().clone() for p in trainer.model.parameters()]
+
+    large = one_step(make_trainer(), 8)
+    accumulated = one_step(make_trainer(accumulation_steps=2), 4)
+    for p, q in zip(large, accumulated):
+        assert torch.allclose(p, q, atol=1e-5)
+
+
+def test_amp_and_channels_last():
+    trainer = make_trainer(amp=True, channels_last=True, device='cpu')
+    assert trainer.model[0].weight.is_contiguous(memory_format=torch.channels_last)
+    train_losses, _ = run(trainer, 5)
+    assert np.isfinite(train_losses).all()
+    assert train_losses[-1] < train_losses[0]
@@ -0,0 +1,86 @@
+"""
+Tests for the sweep over a dataset decoded once, on CPU with a small synthetic image set.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from benchmark_sweep import write_synthetic_dataset
+from load_data import RLBenchMemmapDataset
+from pack_data import MANIFEST_NAME
+from sweep import ensure_cache, launch, make_runs, run_command
+
+NUM_FRAMES = 20
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    root = tmp_path_factory.mktemp('sweep')
+    data_path = str(root / 'data')
+    cache_path = str(root / 'cache')
+    write_synthetic_dataset(data_path, NUM_FRAMES, size=256)
+    ensure_cache(data_path, cache_path, ['normal'], num_workers=1)
+    return data_path, cache_path
+
+
+def test_ensure_cache_packs_once(dataset):
+    data_path, cache_path = dataset
+    manifest_time = os.path.getmtime(os.path.join(cache_path, MANIFEST_NAME))
+    manifest = ensure_cache(data_path, cache_path, ['normal'])
+    assert manifest['num_frames'] == NUM_FRAMES
+    assert os.path.getmtime(os.path.join(cache_path, MANIFEST_NAME)) == manifest_time
+    # packed without the data path, no other task can be added
+    with pytest.raises(AssertionError):
+        ensure_cache("", cache_path, ['depth'])
+
+
+def test_make_runs():
+    runs = make_runs(['normal', 'depth'], [1e-3, 1e-4], [""], [0, 1], ['cuda:0', 'cuda:1', 'cpu'])
+    assert len(runs) == 8
+    assert len({r['name'] for r in runs}) == 8
+    assert [r['device'] for r in runs[:4]] == ['cuda:0', 'cuda:1', 'cpu', 'cuda:0']
+    assert runs[0]['name'] == 'normal_lr0.001_taskonomy_split0'
+
+
+def test_split_seeds(dataset):
+    _, cache_path = dataset
+    splits = {}
+    for seed in [0, 1]:
+        splits[seed] = [RLBenchMemmapDataset(cache_path, 'normal', split, split_seed=seed).indices
+                        for split in ['train', 'val', 'test']]
+        assert sorted(np.concatenate(splits[seed]).tolist()) == list(range(NUM_FRAMES))
+    assert not np.array_equal(splits[0][0], splits[1][0])
+
+
+def test_views_are_read_only(dataset):
+    _, cache_path = dataset
+    data = RLBenchMemmapDataset(cache_path, 'normal', 'train', split_seed=0)
+    assert data[[0, 1]]['rgb'].shape == (2, 3, 256, 256)
+    rgb = data.arrays[0]
+    assert isinstance(rgb, np.memmap) and not rgb.flags.writeable
+    with pytest.raises(ValueError):
+        rgb[0, 0, 0, 0] = 0
+
+
+def test_launch(tmp_path):
+    commands = [[sys.executable, '-c', 'import sys; sys.exit({})'.format(code)] for code in [0, 3, 0]]
+    report = launch(commands, max_concurrent=2, poll_interval=0.05, log_dir=str(tmp_path))
+    assert [r['returncode'] for r in report['runs']] == [0, 3, 0]
+    assert report['wall_time'] >= max(r['wall_time'] for r in report['runs'])
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_sweep_runs(dataset, tmp_path):
+    # every run trains on the shared arrays with its own split
+    _, cache_path = dataset
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_sweep.py')
+    runs = make_runs(['normal'], [1e-3], [""], [0, 1], ['cpu'])
+    extra_args = ['--run', '--num_workers', '0', '--batch_size', '4']
+    commands = [run_command(run, str(tmp_path), cache_path, extra_args, script=script) for run in runs]
+    report = launch(commands, max_concurrent=2, poll_interval=0.1)
+    assert [r['returncode'] for r in report['runs']] == [0, 0]
+    for run in runs:
+        assert os.path.exists(os.path.join(str(tmp_path), run['name'], 'val_loss.txt'))
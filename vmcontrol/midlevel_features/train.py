@@ -2,7 +2,10 @@ from visualpriors.transforms import VisualPriorPredictedLabel
 import torch.utils.model_zoo
 import torch
 from PIL import Image
-from load_data import genDS
+from load_data import genDS, format_sample
+from augment import PairedBatchAugment
+from supervised import SupervisedTrainer, read_checkpoint
+import distributed
 import numpy as np
 import argparse
 
@@ -23,6 +26,11 @@ Argparse! Example usage:
 
 python train.py --name insert_name --feature_task normal --batch_size 32 --num_epochs 500 --data_path /path/to/train/data/ --lr 3e-4
 
+Data-parallel on 4 GPUs (NCCL), or on 4 CPU processes (gloo), batch_size is then the batch of a process:
+
+torchrun --nproc_per_node 4 train.py --distributed --name insert_name --feature_task normal --data_path /path/to/train/data/
+torchrun --nproc_per_node 4 train.py --distributed --backend gloo --name insert_name --feature_task normal --data_path /path/to/train/data/
+
 '''
 parser = argparse.ArgumentParser(description='Train mid-level features from a dataset')
 parser.add_argument('--name', type=str, required=True,help='Folder name for the output. Dont end with trailing slash')
@@ -34,8 +42,24 @@ parser.add_argument('--lr', type=float, default=3e-4, help='Learning rate')
 parser.add_argument('--data_path', type=str, default='example_path', help='Path to folders generated by robotics-rl-srl')
 parser.add_argument('--model_path', type=str, default="", help='Path to model to initialize for finetuning. Default is nothing.')
 parser.add_argument('--checkpoint_interval', type=int, default=20, help='')
+parser.add_argument('--cache_path', type=str, default="", help='Folder written by pack_data.py. If set, the packed arrays and their splits are used instead of the PNGs in data_path')
+parser.add_argument('--device_augment', action='store_true', default=False, help='Crop, flip and jitter whole batches on the training device. Needs --cache_path')
+parser.add_argument('--color_jitter', type=float, default=0., help='Brightness, contrast and saturation jitter of the inputs with --device_augment')
+parser.add_argument('--amp', action='store_true', default=False, help='Autocast the forward passes, to fp16 with loss scaling on GPU and bf16 on CPU')
+parser.add_argument('--channels_last', action='store_true', default=False, help='Keep the network and its inputs in channels_last memory format')
+parser.add_argument('--accumulation_steps', type=int, default=1, help='Batches whose gradients are summed before every optimizer step')
+parser.add_argument('--num_workers', type=int, default=4, help='DataLoader workers')
+parser.add_argument('--persistent_workers', action='store_true', default=False, help='Keep the DataLoader workers alive between epochs')
+parser.add_argument('--prefetch_factor', type=int, default=2, help='Batches prefetched by every DataLoader worker')
+parser.add_argument('--distributed', action='store_true', default=False, help='Data-parallel training in the process group of torchrun, only rank 0 logs and checkpoints')
+parser.add_argument('--backend', type=str, default=None, choices=['nccl', 'gloo'], help='Backend of the process group, nccl if CUDA is available by default. gloo runs on CPU')
+parser.add_argument('--bucket_cap_mb', type=float, default=25, help='Size of the gradient buckets all-reduced at once with --distributed')
+parser.add_argument('--split_seed', type=int, default=None, help='Seed of the train/val/test split. Default is the split of the cache manifest, or a random one')
+parser.add_argument('--device', type=str, default='cuda', help='Device to train on, without --distributed')
+parser.add_argument('--resume', action='store_true', default=False, help='Carry on from name/checkpoint.pth, written at the end of every epoch, if it exists')
 
 args = parser.parse_args()
+assert args.cache_path or not args.device_augment, "Error: --device_augment needs --cache_path"
 
 name = args.name
 feature_task = args.feature_task
@@ -45,14 +69,36 @@ lr = args.lr
 
 os.makedirs(name, exist_ok=True)
 
-#redirect stdout to a log file
-sys.stdout = open('%s/log.txt' % name, 'w')
-
-
-trainLoader, valLoader, testLoader = genDS(batch_size=batch_size, task_name=feature_task, path = args.data_path)
-
-
-device = 'cuda'
+checkpoint_path = '%s/checkpoint.pth' % name
+resume = args.resume and os.path.exists(checkpoint_path)
+
+device = args.device
+if args.distributed:
+    device = distributed.init_distributed(args.backend)
+
+#redirect stdout to a log file, the other ranks are quiet
+sys.stdout = open('%s/log.txt' % name if distributed.is_main_process() else os.devnull, 'a' if resume else 'w')
+
+# the split of a resumed job is that of its checkpoint, or the val and test frames would leak into
+# the train split. A random PNG split gets a seed, the same on every rank, to be saved with it
+checkpoint = read_checkpoint(checkpoint_path) if resume else None
+split_seed = args.split_seed
+if checkpoint is not None and 'split_seed' in checkpoint.get('data_state', {}):
+    assert split_seed is None or split_seed == checkpoint['data_state']['split_seed'], \
+        "Error: --split_seed differs from the split seed of %s" % checkpoint_path
+    split_seed = checkpoint['data_state']['split_seed']
+elif split_seed is None and not args.cache_path:
+    assert checkpoint is None, "Error: %s has no split seed, resume with the --split_seed of the run" % checkpoint_path
+    split_seed = distributed.all_gather_object(np.random.randint(2 ** 31 - 1))[0]
+
+trainLoader, valLoader, testLoader = genDS(batch_size=batch_size, num_workers=args.num_workers, task_name=feature_task, path = args.data_path, cache_path=args.cache_path, raw=args.device_augment,
+                                           persistent_workers=args.persistent_workers, prefetch_factor=args.prefetch_factor, pin_memory=not args.device_augment,
+                                           distributed=args.distributed, split_seed=split_seed)
+
+augmenter = None
+if args.device_augment:
+    augmenter = PairedBatchAugment(crop_size=256, brightness=args.color_jitter, contrast=args.color_jitter,
+                                   saturation=args.color_jitter, device=device)
 
 map_task_to_taskonomy = {
     "normal" : "normal",
@@ -66,7 +112,9 @@ map_task_to_taskonomy = {
 }
 
 taskonomy_feature = map_task_to_taskonomy[feature_task]
-VisualPriorPredictedLabel._load_unloaded_nets([taskonomy_feature])
+# rank 0 downloads the weights, the others read them from the cache
+with distributed.main_process_first():
+    VisualPriorPredictedLabel._load_unloaded_nets([taskonomy_feature])
 VisualPriorPredictedLabel.feature_task_to_net[taskonomy_feature] = VisualPriorPredictedLabel.feature_task_to_net[taskonomy_feature].to(device)
 net = VisualPriorPredictedLabel.feature_task_to_net[taskonomy_feature] 
 
@@ -74,7 +122,7 @@ if feature_task == "segment_img":
     num_max = 5
     net.decoder.decoder_output[0] = torch.nn.Conv2d(16, num_max, kernel_size=(3, 3), stride=(1, 1), padding=(1, 1))
     net.decoder.decoder_output[1] = torch.nn.Identity()
-    net.cuda()
+    net.to(device)
 
 if args.model_path == "random":
     def weight_reset(m):
@@ -82,7 +130,7 @@ if args.model_path == "random":
             m.reset_parameters()
     net.apply(weight_reset)
 elif args.model_path:
-    net.load_state_dict(torch.load(args.model_path + "/" + args.feature_task + "/bestModel.pth"))
+    net.load_state_dict(torch.load(args.model_path + "/" + args.feature_task + "/bestModel.pth", map_location=device))
 
 net.encoder.eval_only = False
 net.decoder.eval_only = False
@@ -100,92 +148,72 @@ if feature_task=="segment_img":
 else:
     loss = nn.L1Loss()
 
-#training loop
-def train_model(model, traindl, valdl, criterion, optimizer, num_epochs=25, feature_task='normal'):
-    since = time.time()
+def prepare_batch(sample):
+    if augmenter is not None:
+        batch = augmenter(sample['rgb'], sample['target'], *([sample['segment_img']] if 'segment_img' in sample else []))
+        sample = format_sample(feature_task, *batch)
+
+    inputs = sample['rgb'].to(device, non_blocking=True)
+    targets = sample[feature_task].to(device, non_blocking=True)
+
+    if feature_task == "denoise":
+        inputs, targets = targets, inputs
 
-    val_loss_history = []
-    # same as val loss, just ::
-    epoch_loss_history = []
+    if feature_task == "segment_semantic" or feature_task == "segment_img":
+        targets = targets.long()
+    return inputs, targets
 
-    best_model_wts = copy.deepcopy(model.state_dict())
 
-    best_loss = float("inf")
+#training loop
+def train_model(trainer, traindl, valdl, num_epochs=25):
+    since = time.time()
+
+    if trainer.epoch:
+        print('Resumed from epoch', trainer.epoch)
 
-    for epoch in range(num_epochs):
+    for epoch in range(trainer.epoch, num_epochs):
         print('Epoch {}/{}'.format(epoch, num_epochs - 1))
         print('-' * 10)
 
-        # Each epoch has a training and validation phase
-        for phase in ['train', 'val']:
-            print("Phase", phase)
-            if phase == 'train':
-                model.train()
-            else:
-                model.eval()
-
-            running_loss = 0.0
-
-            if phase == 'train':
-                dl = traindl
-            else:
-                dl = valdl
-
-            count = 1
-            for sample in dl:
-                if count % 100 == 0:
-                    print("On batch", count)
-                count += 1
-
-                inputs = sample['rgb'].to(device)
-                targets = sample[feature_task].to(device)
-
-                if feature_task == "denoise":
-                    inputs, targets = targets, inputs
-
-                mask = None
-
-                if feature_task == "segment_semantic" or feature_task == "segment_img":
-                    targets = targets.long()
-
-                # zero the parameter gradients
-                optimizer.zero_grad()
-
-                # forward
-                # track history if only in train
-                with torch.set_grad_enabled(phase == 'train'):
-                    outputs = model(inputs)
-                    loss = criterion(outputs, targets)
-                    if phase == 'train':
-                        loss.backward()
-                        optimizer.step()
-
-                # statistics
-                running_loss += loss.item() * inputs.size(0)
-            # the loss is scaled above
-            epoch_loss = running_loss / len(dl)
-
-            print('{} Loss: {:.4f}'.format(phase, epoch_loss))
-
-            # deep copy the model
-            if phase == 'val' and epoch_loss < best_loss:
-                best_loss = epoch_loss
-                torch.save(model.state_dict(), "%s/bestModel.pth" % name)
-            if phase == 'val':
-                val_loss_history.append(epoch_loss)
-
-        #checkpoint model                
-        print("Running val loss history", val_loss_history)
-        print("Best val so far", best_loss)
-        if epoch % args.checkpoint_interval == 0:
-            torch.save(model.state_dict(), "%s/epoch_%s.pth" % (name, epoch))
+        if augmenter is not None:
+            augmenter.train(True)
+        epoch_start = time.time()
+        train_loss = trainer.train_epoch(traindl)
+        images_per_s = len(traindl) * batch_size * distributed.get_world_size() / (time.time() - epoch_start)
+        print('{} Loss: {:.4f} ({:.1f} images/s)'.format('train', train_loss, images_per_s))
+
+        if augmenter is not None:
+            augmenter.train(False)
+        val_loss = trainer.evaluate(valdl)
+        print('{} Loss: {:.4f}'.format('val', val_loss))
+
+        # the network state_dicts are what mid_level_train.py loads, the losses are the same on every rank
+        if trainer.end_epoch(train_loss, val_loss) and distributed.is_main_process():
+            torch.save(trainer.module.state_dict(), "%s/bestModel.pth" % name)
+
+        #checkpoint model
+        print("Running val loss history", trainer.val_loss_history)
+        print("Best val so far", trainer.best_loss)
+        if epoch % args.checkpoint_interval == 0 and distributed.is_main_process():
+            torch.save(trainer.module.state_dict(), "%s/epoch_%s.pth" % (name, epoch))
+        trainer.save_checkpoint(checkpoint_path)
 
         time_elapsed = time.time() - since
         print('Epoch complete in {:.0f}m {:.0f}s'.format(time_elapsed // 60, time_elapsed % 60))
+        sys.stdout.flush()
 
     time_elapsed = time.time() - since
     print('Training complete in {:.0f}m {:.0f}s'.format(time_elapsed // 60, time_elapsed % 60))
-    print('Best val loss: {:4f}'.format(best_loss))
-    print(val_loss_history)
-    return model, val_loss_history
-train_model(net, trainLoader, valLoader, loss, optimizer, num_epochs, feature_task)
\ No newline at end of file
+    print('Best val loss: {:4f}'.format(trainer.best_loss))
+    print(trainer.val_loss_history)
+    return trainer.module, trainer.val_loss_history
+
+
+trainer = SupervisedTrainer(net, optimizer, loss, prepare_batch, amp=args.amp, channels_last=args.channels_last,
+                            accumulation_steps=args.accumulation_steps, device=device, bucket_cap_mb=args.bucket_cap_mb)
+if checkpoint is not None:
+    trainer.load_state_dict(checkpoint)
+    del checkpoint
+trainer.data_state = dict(split_seed=split_seed)
+train_model(trainer, trainLoader, valLoader, num_epochs)
+distributed.cleanup()
@@ -25,7 +25,8 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
             min_num_steps_before_training=0,
             random_before_training = False,
             num_epochs_per_eval=0,
-            rad=False
+            rad=False,
+            num_batches_per_sample=1,
     ):
         super().__init__(
             trainer,
@@ -46,6 +47,8 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
         self.random_before_training = random_before_training
         self.num_epochs_per_eval = num_epochs_per_eval
         self.rad = rad
+        # number of batches gathered from the replay buffer and sent to the trainer at once
+        self.num_batches_per_sample = num_batches_per_sample
 
     def _train(self):
         if self.min_num_steps_before_training > 0:
@@ -90,10 +93,19 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
                 gt.stamp('data storing', unique=False)
 
                 self.training_mode(True)
-                for _ in range(self.num_trains_per_train_loop):
-                    train_data = self.replay_buffer.random_batch(
-                        self.batch_size)
-                    self.trainer.train(train_data)
+                num_trains = 0
+                while num_trains < self.num_trains_per_train_loop:
+                    num_batches = min(self.num_batches_per_sample,
+                                      self.num_trains_per_train_loop - num_trains)
+                    if num_batches == 1:
+                        train_data = self.replay_buffer.random_batch(
+                            self.batch_size)
+                        self.trainer.train(train_data)
+                    else:
+                        train_data = self.replay_buffer.random_batches(
+                            num_batches, self.batch_size)
+                        self.trainer.train_batches(train_data)
+                    num_trains += num_batches
                 gt.stamp('training', unique=False)
                 self.training_mode(False)
  
@@ -17,6 +17,7 @@ import pickle
 import errno
 import torch
 
+from rlkit.core.snapshot_writer import SnapshotWriter
 from rlkit.core.tabulate import tabulate
 
 
@@ -87,6 +88,9 @@ class Logger(object):
         self._snapshot_dir = None
         self._snapshot_mode = 'all'
         self._snapshot_gap = 1
+        self._snapshot_writer = SnapshotWriter(async_writes=False)
+        self._replay_buffer_snapshot_gap = 0
+        self._replay_buffer_checkpointer = None
 
         self._log_tabular_only = False
         self._header_printed = False
@@ -149,6 +153,23 @@ class Logger(object):
     def set_snapshot_gap(self, gap):
         self._snapshot_gap = gap
 
+    def set_snapshot_writer(self, async_writes=True, keep_last=None):
+        """
+        :param async_writes: (bool) pickle the snapshots on a background thread
+        :param keep_last: (int) number of itr_#.pkl snapshots kept, None keeps all of them
+        """
+        self._snapshot_writer.flush()
+        self._snapshot_writer = SnapshotWriter(async_writes=async_writes, keep_last=keep_last)
+
+    def flush_snapshots(self):
+        self._snapshot_writer.flush()
+
+    def set_replay_buffer_snapshot_gap(self, gap):
+        """
+        :param gap: (int) epochs between two incremental replay buffer checkpoints, 0 for none
+        """
+        self._replay_buffer_snapshot_gap = gap
+
     def set_log_tabular_only(self, log_tabular_only):
         self._log_tabular_only = log_tabular_only
 
@@ -278,32 +299,62 @@ class Logger(object):
         self._prefix_str = ''.join(self._prefixes)
 
     def save_itr_params(self, itr, params):
-        key = None
+        """
+        The replay buffer is left out of the snapshot when it is checkpointed on its own,
+        with a replay_buffer_snapshot_gap, see save_replay_buffer.
+        """
+        separate_replay_buffer = self._replay_buffer_snapshot_gap > 0
         for k in list(params.keys()):
-            if k.endswith('env'):
+            if k.endswith('env') or (separate_replay_buffer and k.startswith('replay_buffer/')):
                 del params[k]
         if self._snapshot_dir:
+            file_names = []
             if self._snapshot_mode == 'all':
-                file_name = osp.join(self._snapshot_dir, 'itr_%d.pkl' % itr)
-                torch.save(params, file_name)
+                file_names.append(osp.join(self._snapshot_dir, 'itr_%d.pkl' % itr))
             elif self._snapshot_mode == 'last':
                 # override previous params
-                file_name = osp.join(self._snapshot_dir, 'params.pkl')
-                torch.save(params, file_name)
+                file_names.append(osp.join(self._snapshot_dir, 'params.pkl'))
             elif self._snapshot_mode == "gap":
                 if itr % self._snapshot_gap == 0:
-                    file_name = osp.join(self._snapshot_dir, 'itr_%d.pkl' % itr)
-                    torch.save(params, file_name)
+                    file_names.append(osp.join(self._snapshot_dir, 'itr_%d.pkl' % itr))
             elif self._snapshot_mode == "gap_and_last":
                 if itr % self._snapshot_gap == 0:
-                    file_name = osp.join(self._snapshot_dir, 'itr_%d.pkl' % itr)
-                    torch.save(params, file_name)
-                file_name = osp.join(self._snapshot_dir, 'params.pkl')
-                torch.save(params, file_name)
+                    file_names.append(osp.join(self._snapshot_dir, 'itr_%d.pkl' % itr))
+                file_names.append(osp.join(self._snapshot_dir, 'params.pkl'))
             elif self._snapshot_mode == 'none':
                 pass
             else:
                 raise NotImplementedError
+            self._snapshot_writer.save(file_names, params)
+
+    def save_replay_buffer(self, itr, replay_buffer):
+        """
+        Incremental checkpoint of the replay buffer in snapshot_dir/replay_buffer,
+        every replay_buffer_snapshot_gap epochs.
+        """
+        if (not self._snapshot_dir or self._replay_buffer_snapshot_gap <= 0
+                or itr % self._replay_buffer_snapshot_gap != 0
+                or replay_buffer.checkpoint_arrays() is None):
+            return
+        self._replay_buffer_checkpoint().save(replay_buffer)
+
+    def load_replay_buffer(self, replay_buffer):
+        """
+        Restore the replay buffer checkpoint of snapshot_dir/replay_buffer, e.g. when a run
+        resumes in the snapshot_dir of the run it carries on.
+        :return: (bool) whether there was a checkpoint to restore
+        """
+        if (not self._snapshot_dir or replay_buffer.checkpoint_arrays() is None
+                or not osp.exists(osp.join(self._snapshot_dir, 'replay_buffer'))):
+            return False
+        return self._replay_buffer_checkpoint().load(replay_buffer)
+
+    def _replay_buffer_checkpoint(self):
+        if self._replay_buffer_checkpointer is None:
+            from rlkit.data_management.replay_buffer_checkpoint import ReplayBufferCheckpointer
+            self._replay_buffer_checkpointer = ReplayBufferCheckpointer(
+                osp.join(self._snapshot_dir, 'replay_buffer'))
+        return self._replay_buffer_checkpointer
 
 
 logger = Logger()
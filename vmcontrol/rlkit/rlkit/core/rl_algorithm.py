@@ -43,7 +43,11 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
 
     def train(self, start_epoch=0):
         self._start_epoch = start_epoch
+        if start_epoch > 0:
+            # a resumed run carries on with the replay buffer of its last checkpoint, if any
+            logger.load_replay_buffer(self.replay_buffer)
         self._train()
+        logger.flush_snapshots()
 
     def _train(self):
         """
@@ -54,6 +58,7 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
     def _end_epoch(self, epoch, num_epochs_per_eval=0):
         snapshot = self._get_snapshot()
         logger.save_itr_params(epoch, snapshot)
+        logger.save_replay_buffer(epoch, self.replay_buffer)
         gt.stamp('saving')
         self._log_stats(epoch, num_epochs_per_eval)
 
@@ -73,6 +78,7 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
             snapshot['exploration/' + k] = v
         # for k, v in self.eval_data_collector.get_snapshot().items():
         #     snapshot['evaluation/' + k] = v
+        # left out by the logger when it is checkpointed on its own, see Logger.save_replay_buffer
         for k, v in self.replay_buffer.get_snapshot().items():
             snapshot['replay_buffer/' + k] = v
         return snapshot
@@ -0,0 +1,136 @@
+"""
+Snapshot writing off the training thread.
+"""
+import atexit
+import copy
+import itertools
+import os
+import queue
+import threading
+
+import torch
+from torch import nn as nn
+
+
+def atomic_save(obj, file_name):
+    """
+    torch.save to a temporary file renamed over file_name, so a crash during
+    the write never leaves a truncated snapshot behind.
+    """
+    tmp_file_name = file_name + '.tmp'
+    with open(tmp_file_name, 'wb') as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file_name, file_name)
+
+
+def _cpu_tensor(tensor):
+    cpu_tensor = tensor.detach().to('cpu', copy=True)
+    if isinstance(tensor, nn.Parameter):
+        return nn.Parameter(cpu_tensor, requires_grad=tensor.requires_grad)
+    return cpu_tensor
+
+
+def _seed_memo(obj, memo, depth):
+    # map the tensors of modules and optimizers to CPU copies for copy.deepcopy
+    if isinstance(obj, nn.Module):
+        tensors = itertools.chain(obj.parameters(), obj.buffers())
+    elif isinstance(obj, torch.optim.Optimizer):
+        tensors = (v for state in obj.state.values() for v in state.values() if torch.is_tensor(v))
+    else:
+        if depth > 0 and hasattr(obj, '__dict__'):
+            for value in vars(obj).values():
+                _seed_memo(value, memo, depth - 1)
+        return
+    for tensor in tensors:
+        if id(tensor) not in memo:
+            memo[id(tensor)] = _cpu_tensor(tensor)
+
+
+def cpu_copy(params):
+    """
+    A deep copy of a snapshot whose module parameters, buffers and optimizer
+    states are on the CPU. The objects of the snapshot, e.g. the trainer, are
+    searched one attribute deep for modules and optimizers. Other tensors are
+    copied on their device.
+
+    Training can go on while the copy is pickled, it does not change anymore.
+    """
+    memo = {}
+    for value in params.values():
+        _seed_memo(value, memo, depth=1)
+    return copy.deepcopy(params, memo)
+
+
+class SnapshotWriter(object):
+    """
+    Writes snapshots with atomic_save, on a background thread when async_writes is set.
+
+    save() copies the snapshot to the CPU on the calling thread, then queues its
+    serialization. A single snapshot waits in the queue, a second save blocks
+    until the previous one is written rather than piling up copies in memory.
+    :param async_writes: (bool) serialize on a background thread
+    :param keep_last: (int) number of itr_#.pkl snapshots kept on disk, None keeps all of them
+    """
+
+    def __init__(self, async_writes=True, keep_last=None):
+        self.async_writes = async_writes
+        self.keep_last = keep_last
+        self._itr_files = []
+        self._queue = None
+        self._thread = None
+        self._error = None
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._worker, name='snapshot-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _worker(self):
+        while True:
+            file_names, params = self._queue.get()
+            try:
+                self._write(file_names, params)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, file_names, params):
+        for file_name in file_names:
+            atomic_save(params, file_name)
+            if os.path.basename(file_name).startswith('itr_'):
+                self._itr_files.append(file_name)
+        if self.keep_last is not None:
+            while len(self._itr_files) > self.keep_last:
+                old_file_name = self._itr_files.pop(0)
+                if os.path.exists(old_file_name):
+                    os.remove(old_file_name)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("snapshot write failed") from error
+
+    def save(self, file_names, params):
+        """
+        :param file_names: ([str]) every file the snapshot is written to
+        :param params: (dict) the snapshot
+        """
+        if not file_names:
+            return
+        self._raise_error()
+        if not self.async_writes:
+            self._write(file_names, params)
+            return
+        if self._thread is None:
+            self._start()
+        self._queue.put((file_names, cpu_copy(params)))
+
+    def flush(self):
+        """Wait for the queued snapshots to be written"""
+        if self._queue is not None:
+            self._queue.join()
+        self._raise_error()
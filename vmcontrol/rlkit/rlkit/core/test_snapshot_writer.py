@@ -0,0 +1,87 @@
+"""
+Tests for the background snapshot writer and the replay buffer checkpoints of the logger.
+"""
+
+import os
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.core.logging import Logger
+from rlkit.core.snapshot_writer import SnapshotWriter, cpu_copy
+from rlkit.data_management.simple_replay_buffer import SimpleReplayBuffer
+
+
+class Trainer(object):
+    def __init__(self):
+        self.policy = nn.Linear(3, 2)
+        self.optimizer = torch.optim.Adam(self.policy.parameters())
+
+
+def test_cpu_copy_is_independent():
+    trainer = Trainer()
+    trainer.optimizer.zero_grad()
+    trainer.policy(torch.rand(4, 3)).sum().backward()
+    trainer.optimizer.step()
+    copied = cpu_copy({'algorithm': trainer, 'trained_policy': trainer.policy})
+    # the modules shared by the snapshot entries stay shared in the copy
+    assert copied['algorithm'].policy is copied['trained_policy']
+    weight = trainer.policy.weight.detach().clone()
+    with torch.no_grad():
+        trainer.policy.weight.add_(1)
+    assert torch.equal(copied['trained_policy'].weight, weight)
+    state = copied['algorithm'].optimizer.state
+    assert copied['trained_policy'].weight in state
+
+
+def test_async_writes_the_state_at_save_time(tmp_path):
+    writer = SnapshotWriter(async_writes=True)
+    policy = nn.Linear(3, 2)
+    weight = policy.weight.detach().clone()
+    file_name = str(tmp_path / 'params.pkl')
+    writer.save([file_name], {'trained_policy': policy})
+    with torch.no_grad():
+        policy.weight.add_(1)
+    writer.flush()
+    assert torch.equal(torch.load(file_name, weights_only=False)['trained_policy'].weight, weight)
+    assert not os.path.exists(file_name + '.tmp')
+
+
+def test_keep_last(tmp_path):
+    writer = SnapshotWriter(async_writes=True, keep_last=2)
+    for itr in range(5):
+        writer.save([str(tmp_path / ('itr_%d.pkl' % itr)), str(tmp_path / 'params.pkl')], {'itr': itr})
+    writer.flush()
+    assert sorted(os.listdir(str(tmp_path))) == ['itr_3.pkl', 'itr_4.pkl', 'params.pkl']
+
+
+def test_logger_leaves_out_checkpointed_replay_buffer(tmp_path):
+    for gap, keys in [(0, ['trainer/policy', 'replay_buffer/data']), (1, ['trainer/policy'])]:
+        logger = Logger()
+        logger.set_snapshot_dir(str(tmp_path))
+        logger.set_snapshot_mode('last')
+        logger.set_replay_buffer_snapshot_gap(gap)
+        logger.save_itr_params(0, {'trainer/policy': nn.Linear(1, 1), 'replay_buffer/data': torch.zeros(10)})
+        logger.flush_snapshots()
+        snapshot = torch.load(str(tmp_path / 'params.pkl'), weights_only=False)
+        assert list(snapshot.keys()) == keys
+
+
+def test_logger_restores_replay_buffer(tmp_path):
+    buffer = SimpleReplayBuffer(10, 3, 2, env_info_sizes={})
+    logger = Logger()
+    logger.set_snapshot_dir(str(tmp_path))
+    assert not logger.load_replay_buffer(buffer)
+    logger.set_replay_buffer_snapshot_gap(2)
+    for i in range(4):
+        buffer.add_sample(np.full(3, i), np.zeros(2), i, np.zeros(3), 0, {})
+        logger.save_replay_buffer(i, buffer)
+
+    # the resumed run logs to the same folder, the last checkpoint is the one of epoch 2
+    resumed = Logger()
+    resumed.set_snapshot_dir(str(tmp_path))
+    restored = SimpleReplayBuffer(10, 3, 2, env_info_sizes={})
+    assert resumed.load_replay_buffer(restored)
+    assert restored._size == 3
+    assert np.array_equal(restored._observations[:3], buffer._observations[:3])
@@ -6,6 +6,15 @@ class Trainer(object, metaclass=abc.ABCMeta):
     def train(self, data):
         pass
 
+    def train_batches(self, data):
+        """
+        One training step per batch of data, whose arrays are of shape
+        [num_batches, batch_size, ...] as returned by ReplayBuffer.random_batches.
+        """
+        num_batches = len(next(iter(data.values())))
+        for i in range(num_batches):
+            self.train({key: value[i] for key, value in data.items()})
+
     def end_epoch(self, epoch):
         pass
 
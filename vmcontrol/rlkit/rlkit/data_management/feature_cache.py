@@ -0,0 +1,123 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _update_hash(h, part):
+    if isinstance(part, (list, tuple)):
+        h.update(b'[%d' % len(part))
+        for p in part:
+            _update_hash(h, p)
+        h.update(b']')
+        return
+    array = np.ascontiguousarray(part)
+    h.update(str(array.dtype).encode())
+    h.update(str(array.shape).encode())
+    h.update(array.tobytes())
+
+
+def content_key(*parts):
+    """
+    A 128 bit hash of arrays, numbers and lists of them, e.g. a uint8 frame or
+    the (save state, action, goal) of a re-rendered step. Equal values of the
+    same dtypes and shapes have equal keys.
+    :return: (bytes)
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _update_hash(h, part)
+    return h.digest()
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    return 8
+
+
+class FeatureCache(object):
+    """
+    Bounded LRU cache of features keyed by content_key, e.g. the mid-level
+    features of re-rendered frames, so that identical frames or identical
+    re-rendered steps are neither rendered nor encoded twice.
+
+    The cached values (arrays, numbers or tuples of them) take at most
+    max_bytes of memory, the least recently used ones are evicted first. With
+    spill_dir, evicted values are pickled there and loaded back on a later
+    miss in memory, which counts as a hit.
+    :param max_bytes: (int)
+    :param spill_dir: (str) None to drop the evicted values
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._values = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.spill_hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values or (self.spill_dir is not None and os.path.exists(self._spill_path(key)))
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, key.hex() + '.pkl')
+
+    def get(self, key, default=None):
+        value = self._values.get(key)
+        if value is not None:
+            self._values.move_to_end(key)
+            self.hits += 1
+            return value
+        if self.spill_dir is not None:
+            path = self._spill_path(key)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                os.remove(path)
+                self.hits += 1
+                self.spill_hits += 1
+                self.put(key, value)
+                return value
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        if key in self._values:
+            self._bytes -= _nbytes(self._values.pop(key))
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        self._values[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, old_value = self._values.popitem(last=False)
+            self._bytes -= _nbytes(old_value)
+            self.evictions += 1
+            if self.spill_dir is not None:
+                with open(self._spill_path(old_key), 'wb') as f:
+                    pickle.dump(old_value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get_diagnostics(self):
+        lookups = self.hits + self.misses
+        return OrderedDict([
+            ('hits', self.hits),
+            ('misses', self.misses),
+            ('hit rate', self.hits / lookups if lookups else 0.),
+            ('spill hits', self.spill_hits),
+            ('evictions', self.evictions),
+            ('entries', len(self._values)),
+            ('MB', self._bytes / 2 ** 20),
+        ])
@@ -0,0 +1,172 @@
+import numpy as np
+import torch
+
+_DTYPES = {
+    'float64': np.float64,
+    'float32': np.float32,
+    'float16': np.float16,
+    'int8': np.int8,
+}
+
+
+class PCAProjection(object):
+    """
+    Linear projection of the features on their first principal components,
+    fitted once on the first warmup_size stored features and fixed afterwards.
+    Shared by the observation and next observation storages of a buffer.
+    :param dim: (int) number of components kept
+    :param warmup_size: (int) number of features it is fitted on
+    """
+
+    def __init__(self, dim, warmup_size=1000):
+        assert warmup_size >= dim, "Error: fit the projection on at least dim features"
+        self.dim = dim
+        self.warmup_size = warmup_size
+        self.mean = None
+        self.components = None
+        self._torch = {}
+
+    @property
+    def fitted(self):
+        return self.components is not None
+
+    def fit(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        self.mean = features.mean(axis=0)
+        _, _, vt = np.linalg.svd(features - self.mean, full_matrices=False)
+        self.components = vt[:self.dim].astype(np.float32)
+        self.mean = self.mean.astype(np.float32)
+        self._torch = {}
+
+    def project(self, features):
+        return (features - self.mean) @ self.components.T
+
+    def reconstruct(self, projected):
+        return projected @ self.components + self.mean
+
+    def reconstruct_torch(self, projected):
+        device = projected.device
+        if device not in self._torch:
+            self._torch[device] = (torch.from_numpy(self.components).to(device),
+                                   torch.from_numpy(self.mean).to(device))
+        components, mean = self._torch[device]
+        return torch.matmul(projected, components) + mean
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_torch'] = {}
+        return state
+
+
+class FeatureStorage(object):
+    """
+    Ring storage of the encoded observations of a replay buffer, e.g. the
+    mid-level features, in a compact dtype:
+        - float64, float32 or float16: the features cast to it
+        - int8: every channel, a contiguous block of feature_size / num_channels
+          values such as one feature map of the encoder, scaled by its largest
+          absolute value, and the scales are stored next to the codes
+    With a projection, the projected features are stored instead, see PCAProjection.
+    Until it is fitted the features are kept as float32.
+
+    Batches hold the codes (and '<key>_scales'), which go to the device as is
+    and are decoded there by decode_torch.
+    :param max_size: (int)
+    :param feature_size: (int)
+    :param dtype: (str) float64, float32, float16 or int8
+    :param num_channels: (int) for int8
+    :param projection: (PCAProjection)
+    """
+
+    def __init__(self, max_size, feature_size, dtype='float16', num_channels=1, projection=None):
+        assert dtype in _DTYPES, "Error: dtype must be one of {}".format(list(_DTYPES))
+        self.max_size = max_size
+        self.feature_size = feature_size
+        self.dtype = dtype
+        self.projection = projection
+        self._stored_size = feature_size if projection is None else projection.dim
+        self.num_channels = num_channels if projection is None else 1
+        assert self._stored_size % self.num_channels == 0, \
+            "Error: {} features do not split in {} channels".format(self._stored_size, self.num_channels)
+        self.codes = np.zeros((max_size, self._stored_size), dtype=_DTYPES[dtype])
+        self.scales = np.ones((max_size, self.num_channels), dtype=np.float32) if dtype == 'int8' else None
+        self._warmup = None
+        self._num_warmup = 0
+        if projection is not None and not projection.fitted:
+            assert projection.warmup_size <= max_size, "Error: the warmup does not fit in the buffer"
+            self._warmup = np.zeros((projection.warmup_size, feature_size), dtype=np.float32)
+
+    @property
+    def bytes_per_row(self):
+        scales = 0 if self.scales is None else self.scales.itemsize * self.num_channels
+        return self.codes.itemsize * self._stored_size + scales
+
+    def _encode(self, features, rows):
+        features = np.asarray(features, dtype=np.float32).reshape(-1, self.feature_size)
+        if self.projection is not None:
+            features = self.projection.project(features)
+        if self.dtype != 'int8':
+            self.codes[rows] = features
+            return
+        channels = features.reshape(len(features), self.num_channels, -1)
+        scales = np.abs(channels).max(axis=2) / 127.
+        scales[scales == 0] = 1.
+        codes = np.clip(np.rint(channels / scales[:, :, None]), -127, 127)
+        self.codes[rows] = codes.reshape(len(features), -1)
+        self.scales[rows] = scales
+
+    def __setitem__(self, row, features):
+        if self._warmup is None:
+            self._encode(features, [row])
+            return
+        assert row < len(self._warmup), "Error: the buffer wrapped around before the projection was fitted"
+        self._warmup[row] = np.reshape(features, -1)
+        self._num_warmup = max(self._num_warmup, row + 1)
+        if not self.projection.fitted and self._num_warmup == len(self._warmup):
+            self.projection.fit(self._warmup)
+        if self.projection.fitted:
+            # fitted by this storage or by the other one of the buffer
+            self._encode(self._warmup[:self._num_warmup], np.arange(self._num_warmup))
+            self._warmup = None
+
+    def batch(self, key, indices):
+        """
+        :return: (dict) the codes of the rows, under key, and their scales
+        """
+        assert self._warmup is None, "Error: sampled before the projection is fitted"
+        batch = {key: self.codes[indices]}
+        if self.scales is not None:
+            batch[key + '_scales'] = self.scales[indices]
+        return batch
+
+    def decode(self, codes, scales=None):
+        """
+        :return: (np.ndarray) the float32 features of codes, on the host
+        """
+        features = codes.astype(np.float32)
+        if scales is not None:
+            shape = features.shape
+            features = (features.reshape(shape[:-1] + (self.num_channels, -1)) * scales[..., None]).reshape(shape)
+        if self.projection is not None:
+            features = self.projection.reconstruct(features)
+        return features
+
+    def decode_torch(self, batch, key):
+        """
+        Decode batch[key] in place on its device, in batches of any leading shape
+        """
+        features = batch[key].float()
+        scales = batch.pop(key + '_scales', None)
+        if scales is not None:
+            shape = features.shape
+            features = (features.reshape(shape[:-1] + (self.num_channels, -1)) * scales.unsqueeze(-1)).reshape(shape)
+        if self.projection is not None:
+            features = self.projection.reconstruct_torch(features)
+        batch[key] = features
+        return batch
+
+    def checkpoint_arrays(self, key):
+        arrays = {key: self.codes}
+        if self.scales is not None:
+            arrays[key + '_scales'] = self.scales
+        return arrays
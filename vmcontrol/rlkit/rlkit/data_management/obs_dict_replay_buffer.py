@@ -1,6 +1,10 @@
 import numpy as np
 from gym.spaces import Dict, Discrete
 import time
+from collections import OrderedDict
+
+from rlkit.data_management.feature_cache import content_key
+from rlkit.data_management.feature_storage import FeatureStorage, PCAProjection
 from rlkit.data_management.replay_buffer import ReplayBuffer
 
 
@@ -348,9 +352,37 @@ class imgObsDictRelabelingBuffer(ReplayBuffer):
             desired_goal_key='desired_goal',
             achieved_goal_key='achieved_goal',
             t_fn =None,
+            batch_t_fn=None,
+            feature_cache=None,
+            feature_dtype=None,
+            feature_channels=1,
+            feature_projection_dim=None,
+            projection_warmup_size=1000,
+            observation_dtype=np.float64,
     ):
+        """
+        :param t_fn: maps a re-rendered observation to the stored one, e.g. its mid-level features
+        :param batch_t_fn: maps a list of re-rendered observations to the array of the stored
+            ones, used instead of t_fn so that all the frames of a path are transformed at
+            once, e.g. EncoderService.encode_batch
+        :param feature_cache: (FeatureCache) caches the transformed re-rendered steps, keyed by
+            their save state, action and goal, and the transformed frames, keyed by their pixels.
+            The re-rendering env must be deterministic.
+        :param feature_dtype: (str) store the observations, e.g. encoded features, in a
+            FeatureStorage of this dtype (float16 or int8), decoded on the device when
+            training. None stores them as float64.
+        :param feature_channels: (int) number of channels of the int8 features, which have a
+            scale each, e.g. the feature maps of the encoder
+        :param feature_projection_dim: (int) store the features projected on this number of
+            principal components, fitted on the first projection_warmup_size observations
+        :param projection_warmup_size: (int)
+        :param observation_dtype: (np.dtype) of the observations without feature storage, e.g.
+            np.uint8 for raw frames encoded by the learner, see FrameEncoder
+        """
         self.k = k
         self.t_fn = t_fn
+        self.batch_t_fn = batch_t_fn
+        self.feature_cache = feature_cache
         if internal_keys is None:
             internal_keys = []
         self.internal_keys = internal_keys
@@ -390,11 +422,26 @@ class imgObsDictRelabelingBuffer(ReplayBuffer):
         self._rewards = np.zeros((max_size, 1))
 
 
-        self._obs = np.zeros((max_size,self.env.observation_space.spaces["observation"].low.size ))
-        self._next_obs = np.zeros((max_size,self.env.observation_space.spaces["observation"].low.size ))
+        obs_size = self.env.observation_space.spaces["observation"].low.size
+        self._feature_storage = feature_dtype is not None or feature_projection_dim is not None
+        if self._feature_storage:
+            projection = None
+            if feature_projection_dim is not None:
+                projection = PCAProjection(feature_projection_dim, projection_warmup_size)
+            storage_kwargs = dict(
+                dtype=feature_dtype or 'float32',
+                num_channels=feature_channels,
+                projection=projection,
+            )
+            self._obs = FeatureStorage(max_size, obs_size, **storage_kwargs)
+            self._next_obs = FeatureStorage(max_size, obs_size, **storage_kwargs)
+        else:
+            self._obs = np.zeros((max_size, obs_size), dtype=observation_dtype)
+            self._next_obs = np.zeros((max_size, obs_size), dtype=observation_dtype)
         
         self._top = 0
         self._size = 0
+        self._num_added = 0
 
         self.rerendering_env = rerendering_env
         rerendering_env.reset()
@@ -429,6 +476,7 @@ class imgObsDictRelabelingBuffer(ReplayBuffer):
 
     def _advance(self):
         self._top = (self._top + 1) % self.max_size
+        self._num_added += 1
         if self._size < self.max_size:
             self._size += 1
 
@@ -468,15 +516,78 @@ class imgObsDictRelabelingBuffer(ReplayBuffer):
                 kactions[i*k+j] = actions[i]
                 kgoals[i*k+j] = obs[sampled_goal_idx]['achieved_goal']
                 sampled_idx.append(sampled_goal_idx)
-        out = self.rerendering_env.get_resample_step(states, kactions, kgoals)
+        out = self._resample(states, kactions, kgoals)
         for i, tupl in enumerate(out):
 
             obs_before, r,d, obs_after = tupl 
 
-            obs_before = self.t_fn(obs_before)
-            obs_after = self.t_fn(obs_after)
             self.add_sample(obs_before, kactions[i], r,  terminals[i // self.k], obs_after)
 
+    def _cached(self, keys):
+        """
+        Look the keys up in the feature cache, a key seen earlier in keys is a hit too.
+        :return: (list, OrderedDict) the cached values or None, and the index of the first
+            occurrence of every missing key
+        """
+        values = [None] * len(keys)
+        missing = OrderedDict()
+        for i, key in enumerate(keys):
+            if key in missing:
+                self.feature_cache.hits += 1
+                continue
+            values[i] = self.feature_cache.get(key)
+            if values[i] is None:
+                missing[key] = i
+        return values, missing
+
+    def _resample(self, states, actions, goals):
+        """
+        Re-render the steps from the states with the relabeled goals and transform their
+        observations, or look them up in the feature cache.
+        :return: ([tuple]) the transformed observation, reward, done and transformed next
+            observation of every step
+        """
+        if self.feature_cache is None:
+            out = self.rerendering_env.get_resample_step(states, actions, goals)
+            return self._transform_steps(out)
+        keys = [content_key(s, a, g) for s, a, g in zip(states, actions, goals)]
+        results, missing = self._cached(keys)
+        if missing:
+            todo = list(missing.values())
+            out = self.rerendering_env.get_resample_step(
+                [states[i] for i in todo], actions[todo], goals[todo])
+            for key, result in zip(missing, self._transform_steps(out)):
+                self.feature_cache.put(key, result)
+                missing[key] = result
+        return [missing[key] if result is None else result for key, result in zip(keys, results)]
+
+    def _transform_steps(self, out):
+        # observations before and after every step, transformed together
+        transformed = self._transform([o for tupl in out for o in (tupl[0], tupl[3])])
+        return [(transformed[2 * i], r, d, transformed[2 * i + 1]) for i, (_, r, d, _) in enumerate(out)]
+
+    def _transform(self, frames):
+        def transform(frames):
+            if self.batch_t_fn is not None and len(frames) > 0:
+                return list(self.batch_t_fn(frames))
+            return [self.t_fn(frame) for frame in frames]
+
+        if self.feature_cache is None:
+            return transform(frames)
+        keys = [content_key(frame) for frame in frames]
+        features, missing = self._cached(keys)
+        if missing:
+            for key, feature in zip(missing, transform([frames[i] for i in missing.values()])):
+                self.feature_cache.put(key, feature)
+                missing[key] = feature
+        return [missing[key] if feature is None else feature for key, feature in zip(keys, features)]
+
+    def get_diagnostics(self):
+        if self.feature_cache is None:
+            return {}
+        return OrderedDict(('feature cache ' + name, value)
+                           for name, value in self.feature_cache.get_diagnostics().items())
+
 
 
     def _sample_indices(self, batch_size):
@@ -484,15 +595,63 @@ class imgObsDictRelabelingBuffer(ReplayBuffer):
 
     def random_batch(self, batch_size):
         indices = np.random.randint(0, self._size, batch_size)
+        return self._batch(indices)
+
+    def random_batches(self, num_batches, batch_size):
+        indices = np.random.randint(0, self._size, (num_batches, batch_size))
+        return self._batch(indices)
+
+    def checkpoint_arrays(self):
+        if not self._feature_storage:
+            return dict(
+                observations=self._obs,
+                actions=self._actions,
+                rewards=self._rewards,
+                terminals=self._terminals,
+                next_observations=self._next_obs,
+            )
+        if self._obs.projection is not None:
+            # the projection is not a per transition array
+            return None
+        arrays = dict(
+            actions=self._actions,
+            rewards=self._rewards,
+            terminals=self._terminals,
+        )
+        arrays.update(self._obs.checkpoint_arrays('observations'))
+        arrays.update(self._next_obs.checkpoint_arrays('next_observations'))
+        return arrays
+
+    def _batch(self, indices):
+        if not self._feature_storage:
+            batch = dict(
+                observations=self._obs[indices],
+                actions=self._actions[indices],
+                rewards=self._rewards[indices],
+                terminals=self._terminals[indices],
+                next_observations=self._next_obs[indices],
+            )
+            return batch
         batch = dict(
-            observations=self._obs[indices],
             actions=self._actions[indices],
             rewards=self._rewards[indices],
             terminals=self._terminals[indices],
-            next_observations=self._next_obs[indices],
         )
+        batch.update(self._obs.batch('observations', indices))
+        batch.update(self._next_obs.batch('next_observations', indices))
         return batch
 
+    def decode_torch_batch(self, batch):
+        if self._feature_storage:
+            self._obs.decode_torch(batch, 'observations')
+            self._next_obs.decode_torch(batch, 'next_observations')
+        return batch
+
+    @property
+    def bytes_per_transition(self):
+        obs_bytes = 2 * (self._obs.bytes_per_row if self._feature_storage else self._obs[0].nbytes)
+        return obs_bytes + self._actions[0].nbytes + self._rewards[0].nbytes + self._terminals[0].nbytes
+
     def _batch_obs_dict(self, indices):
         return {
             key: self._obs[key][indices]
@@ -629,6 +788,7 @@ class newstateObsDictRelabelingBuffer(ReplayBuffer):
         
         self._top = 0
         self._size = 0
+        self._num_added = 0
         self._idx_to_future_obs_idx = [None] * max_size
 
     def add_sample(self, obs, action, reward, terminal,
@@ -642,6 +802,7 @@ class newstateObsDictRelabelingBuffer(ReplayBuffer):
 
     def _advance(self):
         self._top = (self._top + 1) % self.max_size
+        self._num_added += 1
         if self._size < self.max_size:
             self._size += 1
 
@@ -680,6 +841,22 @@ class newstateObsDictRelabelingBuffer(ReplayBuffer):
 
     def random_batch(self, batch_size):
         indices = np.random.randint(0, self._size, batch_size)
+        return self._batch(indices)
+
+    def random_batches(self, num_batches, batch_size):
+        indices = np.random.randint(0, self._size, (num_batches, batch_size))
+        return self._batch(indices)
+
+    def checkpoint_arrays(self):
+        return dict(
+            observations=self._obs,
+            actions=self._actions,
+            rewards=self._rewards,
+            terminals=self._terminals,
+            next_observations=self._next_obs,
+        )
+
+    def _batch(self, indices):
         batch = dict(
             observations=self._obs[indices],
             actions=self._actions[indices],
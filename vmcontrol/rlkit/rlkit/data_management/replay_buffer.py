@@ -1,5 +1,7 @@
 import abc
 
+import numpy as np
+
 
 class ReplayBuffer(object, metaclass=abc.ABCMeta):
     """
@@ -83,6 +85,33 @@ class ReplayBuffer(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    def random_batches(self, num_batches, batch_size):
+        """
+        Return `num_batches` batches of size `batch_size`, stacked into arrays
+        of shape [num_batches, batch_size, ...].
+
+        This default implementation calls random_batch for every batch, buffers
+        that sample uniformly gather all of them with one index instead.
+        """
+        batches = [self.random_batch(batch_size) for _ in range(num_batches)]
+        return {key: np.stack([batch[key] for batch in batches]) for key in batches[0]}
+
+    def checkpoint_arrays(self):
+        """
+        The arrays of a ring buffer indexed by self._top and self._size, which
+        also counts its samples in self._num_added, for ReplayBufferCheckpointer.
+        :return: (dict) name to array, None if the buffer cannot be checkpointed
+        """
+        return None
+
+    def decode_torch_batch(self, batch):
+        """
+        Decode, on the device, a batch of torch tensors of observations that the
+        buffer stores in a compact form, e.g. with FeatureStorage.
+        :return: (dict) the batch
+        """
+        return batch
+
     def get_diagnostics(self):
         return {}
 
@@ -0,0 +1,122 @@
+import json
+import os
+
+import numpy as np
+
+META_NAME = "meta.json"
+JOURNAL_NAME = "journal.npz"
+
+
+class ReplayBufferCheckpointer(object):
+    """
+    Incremental on-disk copy of a ring replay buffer.
+
+    Each array of ReplayBuffer.checkpoint_arrays() is a .npy memory map of the
+    full capacity of the buffer. A checkpoint only writes the rows added since
+    the previous one. They go to a journal first, with the meta.json (top, size
+    and number of added samples) they lead to, which replaces the previous
+    journal atomically, then into the arrays, then meta.json is replaced
+    atomically and the journal removed. A checkpoint interrupted before its
+    journal is written leaves the previous one as it was, one interrupted after
+    it is completed by the next save or load, so the arrays never hold a row
+    whose fields come from different transitions.
+    :param folder: (str)
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.meta_path = os.path.join(folder, META_NAME)
+        self.journal_path = os.path.join(folder, JOURNAL_NAME)
+        os.makedirs(folder, exist_ok=True)
+
+    def _array_path(self, name):
+        return os.path.join(self.folder, name + ".npy")
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+
+    def _write_journal(self, rows, meta, arrays):
+        # np.savez appends .npz to names without it
+        tmp_path = self.journal_path[:-len('.npz')] + '.tmp.npz'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, _rows=rows, _meta=json.dumps(meta),
+                     **{'array_' + name: array[rows] for name, array in arrays.items()})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _apply_journal(self, arrays):
+        """
+        Write the rows of the journal into the arrays, then its meta.json
+        :param arrays: (dict) the checkpoint_arrays of the buffer, for the shape and dtype of new files
+        :return: (bool) whether there was a journal
+        """
+        if not os.path.exists(self.journal_path):
+            return False
+        with np.load(self.journal_path) as journal:
+            rows = journal['_rows']
+            meta = json.loads(str(journal['_meta']))
+            for name, array in arrays.items():
+                path = self._array_path(name)
+                if meta['fresh'] or not os.path.exists(path):
+                    stored = np.lib.format.open_memmap(path, mode='w+', dtype=array.dtype, shape=array.shape)
+                else:
+                    stored = np.lib.format.open_memmap(path, mode='r+')
+                stored[rows] = journal['array_' + name]
+                stored.flush()
+                del stored
+        del meta['fresh']
+        self._write_meta(meta)
+        os.remove(self.journal_path)
+        return True
+
+    def save(self, replay_buffer):
+        """
+        :return: (int) the number of rows written
+        """
+        arrays = replay_buffer.checkpoint_arrays()
+        assert arrays is not None, \
+            "Error: {} does not support checkpoints".format(type(replay_buffer).__name__)
+        self._apply_journal(arrays)
+        top, size, num_added = replay_buffer._top, replay_buffer._size, replay_buffer._num_added
+        max_size = len(next(iter(arrays.values())))
+
+        meta = self._read_meta()
+        new_rows = num_added if meta is None else num_added - meta['num_added']
+        if meta is None or new_rows < 0 or new_rows >= max_size:
+            rows = np.arange(size)
+        else:
+            rows = (top - new_rows + np.arange(new_rows)) % max_size
+
+        self._write_journal(rows, {'top': int(top), 'size': int(size), 'num_added': int(num_added),
+                                   'fresh': meta is None}, arrays)
+        self._apply_journal(arrays)
+        return len(rows)
+
+    def load(self, replay_buffer):
+        """
+        Restore a checkpoint into replay_buffer, which must have the same capacity
+        :return: (bool) whether there was a checkpoint to restore
+        """
+        arrays = replay_buffer.checkpoint_arrays()
+        self._apply_journal(arrays)
+        meta = self._read_meta()
+        if meta is None:
+            return False
+        for name, array in arrays.items():
+            array[:] = np.load(self._array_path(name), mmap_mode='r')
+        replay_buffer._top = meta['top']
+        replay_buffer._size = meta['size']
+        replay_buffer._num_added = meta['num_added']
+        return True
@@ -37,6 +37,7 @@ class SimpleReplayBuffer(ReplayBuffer):
 
         self._top = 0
         self._size = 0
+        self._num_added = 0
 
     def add_sample(self, observation, action, reward, next_observation,
                    terminal, env_info, **kwargs):
@@ -55,11 +56,19 @@ class SimpleReplayBuffer(ReplayBuffer):
 
     def _advance(self):
         self._top = (self._top + 1) % self._max_replay_buffer_size
+        self._num_added += 1
         if self._size < self._max_replay_buffer_size:
             self._size += 1
 
     def random_batch(self, batch_size):
         indices = np.random.randint(0, self._size, batch_size)
+        return self._batch(indices)
+
+    def random_batches(self, num_batches, batch_size):
+        indices = np.random.randint(0, self._size, (num_batches, batch_size))
+        return self._batch(indices)
+
+    def _batch(self, indices):
         batch = dict(
             observations=self._observations[indices],
             actions=self._actions[indices],
@@ -84,6 +93,18 @@ class SimpleReplayBuffer(ReplayBuffer):
             for key in self._env_info_keys
         }
 
+    def checkpoint_arrays(self):
+        arrays = dict(
+            observations=self._observations,
+            actions=self._actions,
+            rewards=self._rewards,
+            terminals=self._terminals,
+            next_observations=self._next_obs,
+        )
+        for key in self._env_info_keys:
+            arrays['env_info_' + key] = self._env_infos[key]
+        return arrays
+
     def num_steps_can_sample(self):
         return self._size
 
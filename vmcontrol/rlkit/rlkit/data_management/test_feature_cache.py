@@ -0,0 +1,122 @@
+"""
+Tests for the feature cache of the re-rendered HER steps.
+"""
+
+import numpy as np
+from gym.spaces import Box, Dict
+
+from rlkit.data_management.feature_cache import FeatureCache, content_key
+from rlkit.data_management.obs_dict_replay_buffer import imgObsDictRelabelingBuffer
+
+FRAME_SIZE = 12
+GOAL_DIM = 3
+ACTION_DIM = 2
+
+
+def test_content_key():
+    frame = np.arange(FRAME_SIZE, dtype=np.uint8)
+    assert content_key(frame) == content_key(frame.copy())
+    assert content_key(frame) != content_key(frame[::-1])
+    assert content_key(frame) != content_key(frame.astype(np.float32))
+    state = [np.zeros(7), np.ones(2), True]
+    assert content_key(state, np.zeros(2)) == content_key([np.zeros(7), np.ones(2), True], np.zeros(2))
+
+
+def test_lru_eviction_within_byte_budget():
+    cache = FeatureCache(max_bytes=3 * 80)
+    for i in range(4):
+        cache.put(i, np.full(10, i, dtype=np.float64))
+    assert len(cache) == 3
+    assert cache.get(0) is None
+    assert cache.get(1) is not None
+    cache.put(4, np.zeros(10))
+    # 1 was used more recently than 2
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    stats = cache.get_diagnostics()
+    assert stats['hits'] == 2 and stats['misses'] == 2 and stats['evictions'] == 2
+    assert stats['MB'] * 2 ** 20 <= 3 * 80
+
+
+def test_spill_to_disk(tmp_path):
+    cache = FeatureCache(max_bytes=80, spill_dir=str(tmp_path))
+    cache.put(b'a', np.full(10, 1.))
+    cache.put(b'b', np.full(10, 2.))
+    assert np.array_equal(cache.get(b'a'), np.full(10, 1.))
+    assert cache.spill_hits == 1
+    assert np.array_equal(cache.get(b'b'), np.full(10, 2.))
+
+
+class FakeEnv(object):
+    observation_space = Dict(dict(
+        observation=Box(0, 1, (FRAME_SIZE,), dtype=np.float32),
+        desired_goal=Box(-1, 1, (GOAL_DIM,), dtype=np.float32),
+        achieved_goal=Box(-1, 1, (GOAL_DIM,), dtype=np.float32),
+    ))
+    action_space = Box(-1, 1, (ACTION_DIM,), dtype=np.float32)
+
+
+class FakeRerenderingEnv(object):
+    """Renders the save state and the goal, deterministically"""
+
+    def __init__(self):
+        self.num_steps = 0
+
+    def reset(self):
+        pass
+
+    def get_resample_step(self, states, actions, goals):
+        self.num_steps += len(states)
+        out = []
+        for state, action, goal in zip(states, actions, goals):
+            before = np.resize(np.concatenate([state, goal]), FRAME_SIZE)
+            after = np.resize(np.concatenate([state + action.sum(), goal]), FRAME_SIZE)
+            out.append((before, float(goal[0]), False, after))
+        return out
+
+
+def make_path(path_len=10):
+    # the achieved goals repeat, like the reach targets within an episode
+    goals = [np.full(GOAL_DIM, i % 2) for i in range(path_len)]
+    obs = [dict(observation=np.zeros(FRAME_SIZE), achieved_goal=goals[i], save_state=np.full(3, i))
+           for i in range(path_len)]
+    return dict(
+        observations=obs,
+        next_observations=obs[1:] + obs[-1:],
+        actions=np.ones((path_len, ACTION_DIM)),
+        rewards=np.zeros((path_len, 1)),
+        terminals=np.zeros((path_len, 1)),
+    )
+
+
+def make_buffer(feature_cache=None):
+    num_frames = []
+
+    def t_fn(frame):
+        num_frames.append(1)
+        return frame * 2 - 1
+
+    buffer = imgObsDictRelabelingBuffer(
+        max_size=1000, env=FakeEnv(), rerendering_env=FakeRerenderingEnv(), k=4, t_fn=t_fn,
+        feature_cache=feature_cache)
+    return buffer, num_frames
+
+
+def test_cached_relabeling_matches():
+    path = make_path()
+    buffer, num_frames = make_buffer()
+    cached_buffer, cached_num_frames = make_buffer(FeatureCache())
+    np.random.seed(0)
+    buffer.add_path(path)
+    np.random.seed(0)
+    cached_buffer.add_path(path)
+    size = buffer._size
+    assert cached_buffer._size == size
+    for name in ['_obs', '_next_obs', '_actions', '_rewards', '_terminals']:
+        assert np.array_equal(getattr(buffer, name)[:size], getattr(cached_buffer, name)[:size])
+    # the same goal of the same state is only rendered once
+    assert cached_buffer.rerendering_env.num_steps < buffer.rerendering_env.num_steps
+    assert len(cached_num_frames) < len(num_frames)
+
+    cached_buffer.add_path(path)
+    assert cached_buffer.get_diagnostics()['feature cache hit rate'] > 0.5
@@ -0,0 +1,83 @@
+"""
+Tests for the compact storage of the encoded observations of the replay buffers.
+"""
+
+import numpy as np
+import torch
+
+from rlkit.data_management.feature_storage import FeatureStorage, PCAProjection
+from rlkit.torch.core import np_to_pytorch_batch
+
+MAX_SIZE = 200
+NUM_CHANNELS = 8
+FEATURE_SIZE = NUM_CHANNELS * 16
+
+
+def features(n, seed=0):
+    # feature maps of different scales, like the encoder outputs
+    rng = np.random.RandomState(seed)
+    scales = np.repeat(rng.uniform(0.1, 10, (n, NUM_CHANNELS)), FEATURE_SIZE // NUM_CHANNELS, axis=1)
+    return rng.normal(size=(n, FEATURE_SIZE)) * scales
+
+
+def fill(storage, data):
+    for i, row in enumerate(data):
+        storage[i] = row
+
+
+def relative_error(decoded, data):
+    return np.abs(decoded - data).max() / np.abs(data).max()
+
+
+def test_float16_reconstruction():
+    storage = FeatureStorage(MAX_SIZE, FEATURE_SIZE, dtype='float16')
+    data = features(MAX_SIZE)
+    fill(storage, data)
+    batch = storage.batch('observations', np.arange(MAX_SIZE))
+    assert batch['observations'].dtype == np.float16
+    assert relative_error(storage.decode(batch['observations']), data) < 1e-3
+    assert storage.bytes_per_row == 2 * FEATURE_SIZE
+
+
+def test_int8_per_channel_reconstruction():
+    storage = FeatureStorage(MAX_SIZE, FEATURE_SIZE, dtype='int8', num_channels=NUM_CHANNELS)
+    data = features(MAX_SIZE)
+    fill(storage, data)
+    batch = storage.batch('observations', np.arange(MAX_SIZE))
+    decoded = storage.decode(batch['observations'], batch['observations_scales'])
+    # at most half a step of every channel's scale
+    channels = data.reshape(MAX_SIZE, NUM_CHANNELS, -1)
+    step = np.abs(channels).max(axis=2, keepdims=True) / 127.
+    assert np.all(np.abs(decoded.reshape(channels.shape) - channels) <= step / 2 + 1e-6)
+    assert storage.bytes_per_row == FEATURE_SIZE + 4 * NUM_CHANNELS
+
+
+def test_decode_torch_matches_host_decode():
+    storage = FeatureStorage(MAX_SIZE, FEATURE_SIZE, dtype='int8', num_channels=NUM_CHANNELS)
+    fill(storage, features(MAX_SIZE))
+    indices = np.random.randint(0, MAX_SIZE, (3, 16))
+    np_batch = storage.batch('observations', indices)
+    expected = storage.decode(np_batch['observations'], np_batch['observations_scales'])
+    batch = storage.decode_torch(np_to_pytorch_batch(np_batch), 'observations')
+    assert set(batch) == {'observations'}
+    assert batch['observations'].dtype == torch.float32
+    assert np.allclose(batch['observations'].cpu().numpy(), expected, atol=1e-5)
+
+
+def test_projection_fitted_on_warmup():
+    # low rank features and noise
+    rng = np.random.RandomState(0)
+    data = rng.normal(size=(MAX_SIZE, 4)) @ rng.normal(size=(4, FEATURE_SIZE)) + 0.01 * rng.normal(size=(MAX_SIZE, FEATURE_SIZE))
+    projection = PCAProjection(8, warmup_size=50)
+    storage = FeatureStorage(MAX_SIZE, FEATURE_SIZE, dtype='float16', projection=projection)
+    next_storage = FeatureStorage(MAX_SIZE, FEATURE_SIZE, dtype='float16', projection=projection)
+    for i, row in enumerate(data):
+        storage[i] = row
+        next_storage[i] = row
+    assert projection.fitted
+    assert storage.bytes_per_row == 2 * 8
+    for s in [storage, next_storage]:
+        batch = s.batch('observations', np.arange(MAX_SIZE))
+        assert relative_error(s.decode(batch['observations']), data) < 0.02
+        torch_batch = s.decode_torch(np_to_pytorch_batch(batch), 'observations')
+        assert np.allclose(torch_batch['observations'].cpu().numpy(), s.decode(batch['observations']), atol=1e-4)
@@ -0,0 +1,157 @@
+"""
+Tests for the multi-batch sampling of the replay buffers.
+"""
+
+import pickle
+
+import numpy as np
+import torch
+
+from rlkit.data_management.replay_buffer import ReplayBuffer
+from rlkit.data_management.simple_replay_buffer import SimpleReplayBuffer
+from rlkit.torch.torch_rl_algorithm import TorchTrainer
+
+OBS_DIM = 6
+ACTION_DIM = 2
+
+
+def make_buffer(size=100):
+    buffer = SimpleReplayBuffer(size, OBS_DIM, ACTION_DIM, env_info_sizes={})
+    for i in range(size):
+        buffer.add_sample(np.full(OBS_DIM, i), np.full(ACTION_DIM, i), i, np.full(OBS_DIM, i + 1), 0, {})
+    return buffer
+
+
+def test_random_batches_gathers_whole_transitions():
+    buffer = make_buffer()
+    batches = buffer.random_batches(5, 8)
+    assert batches['observations'].shape == (5, 8, OBS_DIM)
+    assert batches['actions'].shape == (5, 8, ACTION_DIM)
+    assert batches['rewards'].shape == (5, 8, 1)
+    # every row is one transition, indexed by its reward
+    index = batches['rewards'][..., 0]
+    assert np.array_equal(batches['observations'][..., 0], index)
+    assert np.array_equal(batches['next_observations'][..., 0], index + 1)
+
+
+def test_random_batches_matches_random_batch_draws():
+    buffer = make_buffer()
+    np.random.seed(0)
+    batches = buffer.random_batches(3, 4)
+    np.random.seed(0)
+    indices = np.random.randint(0, 100, (3, 4))
+    for i in range(3):
+        assert np.array_equal(batches['observations'][i], buffer._batch(indices[i])['observations'])
+
+
+class StackingBuffer(ReplayBuffer):
+    """Relabeling-like buffer with only random_batch, for the default random_batches"""
+
+    def add_sample(self, *args, **kwargs):
+        pass
+
+    def terminate_episode(self):
+        pass
+
+    def num_steps_can_sample(self, **kwargs):
+        return 0
+
+    def random_batch(self, batch_size):
+        return dict(observations=np.random.rand(batch_size, OBS_DIM))
+
+
+def test_default_random_batches_stacks():
+    assert StackingBuffer().random_batches(4, 3)['observations'].shape == (4, 3, OBS_DIM)
+
+
+class RecordingTrainer(TorchTrainer):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def train_from_torch(self, batch):
+        self.batches.append(batch)
+
+    @property
+    def networks(self):
+        return []
+
+
+def test_train_batches_steps_once_per_batch():
+    buffer = make_buffer()
+    batches = buffer.random_batches(4, 8)
+    trainer = RecordingTrainer()
+    trainer.train_batches(batches)
+    assert len(trainer.batches) == 4
+    assert trainer.get_diagnostics()['num train calls'] == 4
+    for i, batch in enumerate(trainer.batches):
+        assert batch['observations'].shape == (8, OBS_DIM)
+        assert torch.equal(batch['observations'], torch.from_numpy(batches['observations'][i]).float())
+
+
+def test_incremental_checkpoint(tmp_path):
+    from rlkit.data_management.replay_buffer_checkpoint import ReplayBufferCheckpointer
+    buffer = SimpleReplayBuffer(10, OBS_DIM, ACTION_DIM, env_info_sizes={})
+    checkpointer = ReplayBufferCheckpointer(str(tmp_path))
+    for i in range(4):
+        buffer.add_sample(np.full(OBS_DIM, i), np.zeros(ACTION_DIM), i, np.zeros(OBS_DIM), 0, {})
+    assert checkpointer.save(buffer) == 4
+    # wraps around the end of the ring
+    for i in range(4, 13):
+        buffer.add_sample(np.full(OBS_DIM, i), np.zeros(ACTION_DIM), i, np.zeros(OBS_DIM), 0, {})
+    assert checkpointer.save(buffer) == 9
+    assert checkpointer.save(buffer) == 0
+
+    restored = SimpleReplayBuffer(10, OBS_DIM, ACTION_DIM, env_info_sizes={})
+    assert checkpointer.load(restored)
+    assert (restored._top, restored._size) == (buffer._top, buffer._size)
+    assert np.array_equal(restored._observations, buffer._observations)
+    assert np.array_equal(restored._rewards, buffer._rewards)
+
+
+
+def test_interrupted_checkpoint_keeps_whole_transitions(tmp_path, monkeypatch):
+    from rlkit.data_management import replay_buffer_checkpoint
+    from rlkit.data_management.replay_buffer_checkpoint import ReplayBufferCheckpointer
+
+    def add(buffer, start, stop):
+        for i in range(start, stop):
+            buffer.add_sample(np.full(OBS_DIM, i), np.full(ACTION_DIM, i), i, np.zeros(OBS_DIM), 0, {})
+
+    buffer = SimpleReplayBuffer(10, OBS_DIM, ACTION_DIM, env_info_sizes={})
+    add(buffer, 0, 8)
+    ReplayBufferCheckpointer(str(tmp_path)).save(buffer)
+    # the next checkpoint is killed once the observations of the new rows are written
+    add(buffer, 8, 13)
+    open_memmap = np.lib.format.open_memmap
+    calls = []
+
+    def killed_open_memmap(*args, **kwargs):
+        calls.append(args)
+        if len(calls) > 1:
+            raise KeyboardInterrupt
+        return open_memmap(*args, **kwargs)
+
+    monkeypatch.setattr(replay_buffer_checkpoint.np.lib.format, 'open_memmap', killed_open_memmap)
+    try:
+        ReplayBufferCheckpointer(str(tmp_path)).save(buffer)
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.undo()
+
+    # the resumed run completes it
+    restored = SimpleReplayBuffer(10, OBS_DIM, ACTION_DIM, env_info_sizes={})
+    assert ReplayBufferCheckpointer(str(tmp_path)).load(restored)
+    assert (restored._top, restored._size, restored._num_added) == (buffer._top, buffer._size, buffer._num_added)
+    for name, array in buffer.checkpoint_arrays().items():
+        assert np.array_equal(restored.checkpoint_arrays()[name], array), name
+    assert np.array_equal(restored._observations[:, 0], restored._actions[:, 0])
+
+def test_trainer_pickles_without_the_replay_buffer():
+    buffer = make_buffer(10000)
+    trainer = RecordingTrainer()
+    trainer.batch_decoder = buffer.decode_torch_batch
+    state = pickle.dumps(trainer)
+    assert len(state) < buffer._observations.nbytes
+    assert pickle.loads(state).batch_decoder is None
+    assert trainer.batch_decoder is not None
@@ -217,6 +217,9 @@ def setup_logger(
         tabular_log_file="progress.csv",
         snapshot_mode="last",
         snapshot_gap=1,
+        snapshot_async=False,
+        snapshot_keep_last=None,
+        replay_buffer_snapshot_gap=0,
         log_tabular_only=False,
         log_dir=None,
         git_infos=None,
@@ -242,6 +245,10 @@ def setup_logger(
     :param snapshot_mode:
     :param log_tabular_only:
     :param snapshot_gap:
+    :param snapshot_async: Pickle the snapshots on a background thread.
+    :param snapshot_keep_last: Number of itr_#.pkl snapshots kept, None keeps all of them.
+    :param replay_buffer_snapshot_gap: Epochs between two incremental replay buffer
+        checkpoints, 0 for none.
     :param log_dir:
     :param git_infos:
     :param script_name: If set, save the script name to this.
@@ -273,6 +280,8 @@ def setup_logger(
     logger.set_snapshot_dir(log_dir)
     logger.set_snapshot_mode(snapshot_mode)
     logger.set_snapshot_gap(snapshot_gap)
+    logger.set_snapshot_writer(async_writes=snapshot_async, keep_last=snapshot_keep_last)
+    logger.set_replay_buffer_snapshot_gap(replay_buffer_snapshot_gap)
     logger.set_log_tabular_only(log_tabular_only)
     exp_name = log_dir.split("/")[-1]
     logger.push_prefix("[%s] " % exp_name)
@@ -1,10 +1,14 @@
+from functools import partial
+
 import torch
 from torch import nn as nn
+from torch.nn import functional as F
 
 from rlkit.pythonplusplus import identity
 from rlkit.policies.base import Policy
 from rlkit.torch.data_management.normalizer import TorchFixedNormalizer
 from rlkit.torch.modules import LayerNorm
+from rlkit.torch.networks import Mlp
 from rlkit.torch import pytorch_util as ptu
 from rlkit.torch.core import eval_np
 import numpy as np
@@ -111,15 +115,11 @@ class CNN(nn.Module):
                                           length=self.added_fc_input_size,
                                           dim=1)
 
-        # need to reshape from batch of flattened images into (channels, w, h)
-        h = conv_input.view(conv_input.shape[0],
-                            self.input_channels,
-                            self.input_height,
-                            self.input_width)
+        h = self.image_batch(conv_input)
         h = self.apply_forward(h, self.conv_layers, self.conv_norm_layers,
                                use_batch_norm=self.batch_norm_conv)
         # flatten channels for fc layers
-        h = h.view(h.size(0), -1)
+        h = self.flatten_features(h)
 
         if fc_input:
             h = torch.cat((h, extra_fc_input), dim=1)
@@ -129,6 +129,16 @@ class CNN(nn.Module):
         output = self.output_activation(self.last_fc(h))
         return output
 
+    def image_batch(self, conv_input):
+        # need to reshape from batch of flattened images into (channels, w, h)
+        return conv_input.view(conv_input.shape[0],
+                               self.input_channels,
+                               self.input_height,
+                               self.input_width)
+
+    def flatten_features(self, h):
+        return h.view(h.size(0), -1)
+
     def apply_forward(self, input, hidden_layers, norm_layers,
                       use_batch_norm=False):
         h = input
@@ -145,6 +155,180 @@ class FlattenCNN(CNN):
         flat_inputs = torch.cat(inputs, dim=1)
         return super().forward(flat_inputs, **kwargs)
 
+class ChannelsLastCNN(CNN):
+    """
+    CNN that takes the images as flattened height x width x channels pixels,
+    uint8 or float in [0, 255], and converts them to float on the device.
+
+    The conv layers run in the channels_last memory format, which is the layout
+    of the input, and the conv features are flattened in that order too, so the
+    images are never transposed in memory.
+    """
+
+    def __init__(self, *args, pixel_scale=2. / 255, pixel_shift=-1., **kwargs):
+        """
+        :param pixel_scale: (float) the pixels are mapped to pixel * pixel_scale + pixel_shift,
+            by default to [-1, 1]
+        :param pixel_shift: (float)
+        """
+        super().__init__(*args, **kwargs)
+        self.pixel_scale = pixel_scale
+        self.pixel_shift = pixel_shift
+        self.to(memory_format=torch.channels_last)
+
+    def image_batch(self, conv_input):
+        h = conv_input.view(conv_input.shape[0],
+                            self.input_height,
+                            self.input_width,
+                            self.input_channels).permute(0, 3, 1, 2)
+        h = h.to(torch.float32, memory_format=torch.channels_last)
+        return h * self.pixel_scale + self.pixel_shift
+
+    def flatten_features(self, h):
+        # (batch, height, width, channels) is a view of a channels_last tensor
+        return h.permute(0, 2, 3, 1).reshape(h.size(0), -1)
+
+
+class FlattenChannelsLastCNN(ChannelsLastCNN):
+    #assumes obs, then action
+    def forward(self, *inputs, **kwargs):
+        flat_inputs = torch.cat(inputs, dim=1)
+        return super().forward(flat_inputs, **kwargs)
+
+
+class CriticEnsemble(nn.Module):
+    """
+    N FlattenCNN critics evaluated in one batched pass.
+
+    The weights of the critics are stacked: the first conv layer of every critic
+    runs as one convolution over the shared input, the next ones as grouped
+    convolutions (one group per critic) and the fc layers as batched matrix
+    multiplies. The output has shape [num_critics, batch, output_size].
+    """
+
+    def __init__(self, num_critics, critics=None, **cnn_kwargs):
+        """
+        :param num_critics: (int)
+        :param critics: ([CNN]) critics of the same architecture to copy the weights from.
+            By default, num_critics new ones are created from cnn_kwargs.
+        :param cnn_kwargs: arguments of CNN
+        """
+        super().__init__()
+        if critics is None:
+            # initialize every critic exactly like a FlattenCNN would be
+            critics = [CNN(**cnn_kwargs) for _ in range(num_critics)]
+        assert len(critics) == num_critics
+        template = critics[0]
+
+        self.num_critics = num_critics
+        self.input_width = template.input_width
+        self.input_height = template.input_height
+        self.input_channels = template.input_channels
+        self.output_size = template.output_size
+        self.output_activation = template.output_activation
+        self.hidden_activation = template.hidden_activation
+        self.batch_norm_conv = template.batch_norm_conv
+        self.batch_norm_fc = template.batch_norm_fc
+        self.added_fc_input_size = template.added_fc_input_size
+        self.conv_input_length = template.conv_input_length
+        self.conv_params = [(conv.stride, conv.padding) for conv in template.conv_layers]
+
+        def stack(tensors):
+            return nn.Parameter(torch.cat([t.detach().clone() for t in tensors]))
+
+        # conv weights are stacked along the output channels: [N * out, in, k, k]
+        self.conv_weights = nn.ParameterList()
+        self.conv_biases = nn.ParameterList()
+        self.conv_norm_layers = nn.ModuleList()
+        for i in range(len(template.conv_layers)):
+            layers = [c.conv_layers[i] for c in critics]
+            self.conv_weights.append(stack([l.weight for l in layers]))
+            self.conv_biases.append(stack([l.bias for l in layers]))
+            self.conv_norm_layers.append(
+                self._stack_norm([c.conv_norm_layers[i] for c in critics], nn.BatchNorm2d))
+
+        # fc weights are stacked as [N, in, out] for torch.baddbmm
+        self.fc_weights = nn.ParameterList()
+        self.fc_biases = nn.ParameterList()
+        self.fc_norm_layers = nn.ModuleList()
+        for i in range(len(template.fc_layers)):
+            layers = [c.fc_layers[i] for c in critics]
+            self.fc_weights.append(stack([l.weight.t()[None] for l in layers]))
+            self.fc_biases.append(stack([l.bias[None, None] for l in layers]))
+            self.fc_norm_layers.append(
+                self._stack_norm([c.fc_norm_layers[i] for c in critics], nn.BatchNorm1d))
+        self.last_fc_weight = stack([c.last_fc.weight.t()[None] for c in critics])
+        self.last_fc_bias = stack([c.last_fc.bias[None, None] for c in critics])
+
+    @classmethod
+    def from_critics(cls, critics):
+        return cls(len(critics), critics=critics)
+
+    @staticmethod
+    def _stack_norm(norm_layers, norm_class):
+        # batch norm is per channel, so one layer over the stacked channels normalizes every critic on its own
+        norm = norm_class(sum(n.num_features for n in norm_layers))
+        for name in ['weight', 'bias', 'running_mean', 'running_var']:
+            getattr(norm, name).data.copy_(torch.cat([getattr(n, name).data for n in norm_layers]))
+        return norm
+
+    def forward(self, *inputs, critic=None):
+        """
+        :param inputs: observations then actions, like FlattenCNN
+        :param critic: (int) only evaluate this critic, by default all of them are
+        :return: (torch.Tensor) [num_critics, batch, output_size], num_critics is 1 when critic is set
+        """
+        flat_inputs = torch.cat(inputs, dim=1)
+        if critic is None:
+            members = slice(None)
+            num_critics = self.num_critics
+        else:
+            members = slice(critic, critic + 1)
+            num_critics = 1
+        batch_size = flat_inputs.shape[0]
+
+        conv_input = flat_inputs.narrow(start=0, length=self.conv_input_length, dim=1).contiguous()
+        h = conv_input.view(batch_size, self.input_channels, self.input_height, self.input_width)
+        for i, (weight, bias) in enumerate(zip(self.conv_weights, self.conv_biases)):
+            out_channels = weight.shape[0] // self.num_critics
+            channels = slice(None) if critic is None else \
+                slice(critic * out_channels, (critic + 1) * out_channels)
+            stride, padding = self.conv_params[i]
+            # the first layer reads the same input for every critic
+            h = F.conv2d(h, weight[channels], bias[channels], stride=stride, padding=padding,
+                         groups=1 if i == 0 else num_critics)
+            if self.batch_norm_conv:
+                h = self._apply_norm(self.conv_norm_layers[i], h, channels)
+            h = self.hidden_activation(h)
+
+        # [batch, N * C, H, W] -> [N, batch, C * H * W]
+        h = h.view(batch_size, num_critics, -1).transpose(0, 1)
+        if self.added_fc_input_size != 0:
+            extra_fc_input = flat_inputs.narrow(start=self.conv_input_length,
+                                                length=self.added_fc_input_size,
+                                                dim=1)
+            h = torch.cat((h, extra_fc_input.expand(num_critics, -1, -1)), dim=2)
+        for i, (weight, bias) in enumerate(zip(self.fc_weights, self.fc_biases)):
+            h = torch.baddbmm(bias[members], h, weight[members])
+            if self.batch_norm_fc:
+                hidden_size = h.shape[2]
+                channels = slice(None) if critic is None else \
+                    slice(critic * hidden_size, (critic + 1) * hidden_size)
+                h = h.transpose(0, 1).reshape(batch_size, -1)
+                h = self._apply_norm(self.fc_norm_layers[i], h, channels)
+                h = h.view(batch_size, num_critics, hidden_size).transpose(0, 1)
+            h = self.hidden_activation(h)
+        return self.output_activation(torch.baddbmm(
+            self.last_fc_bias[members], h, self.last_fc_weight[members]))
+
+    def _apply_norm(self, norm, h, channels):
+        if channels == slice(None):
+            return norm(h)
+        return F.batch_norm(h, norm.running_mean[channels], norm.running_var[channels],
+                            norm.weight[channels], norm.bias[channels],
+                            self.training, norm.momentum, norm.eps)
+
+
 class CNNPolicy(CNN, Policy):
     """
     A simpler interface for creating policies.
@@ -180,6 +364,196 @@ class TanhCNNPolicy(CNNPolicy):
         super().__init__(*args, output_activation=torch.tanh, **kwargs)
 
 
+class ChannelsLastCNNPolicy(ChannelsLastCNN, CNNPolicy):
+    """
+    CNNPolicy on uint8 height x width x channels images, see ChannelsLastCNN.
+    """
+    pass
+
+
+class TanhChannelsLastCNNPolicy(ChannelsLastCNNPolicy):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, output_activation=torch.tanh, **kwargs)
+
+
+class ConvEncoder(nn.Module):
+    """
+    The conv layers of CNN on their own, so that one trunk can feed the heads
+    of the actor and of the critics.
+
+    Encodes the image part of a flat observation and passes the
+    added_input_size values that follow it (e.g. the goal) through unchanged.
+    """
+
+    def __init__(
+            self,
+            input_width,
+            input_height,
+            input_channels,
+            kernel_sizes,
+            n_channels,
+            strides,
+            paddings,
+            added_input_size=0,
+            batch_norm_conv=False,
+            hidden_init=nn.init.orthogonal_,
+            hidden_activation=nn.ReLU(),
+    ):
+        assert len(kernel_sizes) == \
+               len(n_channels) == \
+               len(strides) == \
+               len(paddings)
+        super().__init__()
+
+        self.input_width = input_width
+        self.input_height = input_height
+        self.input_channels = input_channels
+        self.added_input_size = added_input_size
+        self.batch_norm_conv = batch_norm_conv
+        self.hidden_activation = hidden_activation
+        self.conv_input_length = self.input_width * self.input_height * self.input_channels
+
+        self.conv_layers = nn.ModuleList()
+        self.conv_norm_layers = nn.ModuleList()
+        for out_channels, kernel_size, stride, padding in \
+                zip(n_channels, kernel_sizes, strides, paddings):
+            conv = nn.Conv2d(input_channels,
+                             out_channels,
+                             kernel_size,
+                             stride=stride,
+                             padding=padding)
+            hidden_init(conv.weight, gain=np.sqrt(2))
+            conv.bias.data.fill_(0)
+            self.conv_layers.append(conv)
+            input_channels = out_channels
+
+        test_mat = torch.zeros(1, self.input_channels, self.input_width,
+                               self.input_height)
+        for conv_layer in self.conv_layers:
+            test_mat = conv_layer(test_mat)
+            self.conv_norm_layers.append(nn.BatchNorm2d(test_mat.shape[1]))
+        self.output_size = int(np.prod(test_mat.shape)) + added_input_size
+
+    def forward(self, input):
+        conv_input = input.narrow(start=0,
+                                  length=self.conv_input_length,
+                                  dim=1).contiguous()
+        h = conv_input.view(conv_input.shape[0],
+                            self.input_channels,
+                            self.input_height,
+                            self.input_width)
+        for layer, norm_layer in zip(self.conv_layers, self.conv_norm_layers):
+            h = layer(h)
+            if self.batch_norm_conv:
+                h = norm_layer(h)
+            h = self.hidden_activation(h)
+        h = h.view(h.size(0), -1)
+        if self.added_input_size != 0:
+            extra_input = input.narrow(start=self.conv_input_length,
+                                       length=self.added_input_size,
+                                       dim=1)
+            h = torch.cat((h, extra_input), dim=1)
+        return h
+
+
+def _encoder_head(input_size, output_size, hidden_sizes, hidden_init, hidden_activation, output_activation):
+    # same initialization as the fc layers of CNN
+    return Mlp(
+        hidden_sizes=hidden_sizes,
+        output_size=output_size,
+        input_size=input_size,
+        init_w=1e-6,
+        hidden_activation=hidden_activation,
+        output_activation=output_activation,
+        hidden_init=partial(hidden_init, gain=np.sqrt(2)),
+        b_init_value=0.,
+    )
+
+
+class SharedEncoderQf(nn.Module):
+    """
+    Critic made of a ConvEncoder, possibly shared with other networks, and
+    an MLP head that takes the features and the action.
+    Call forward_features to reuse features already computed for the batch.
+    """
+
+    def __init__(
+            self,
+            encoder: ConvEncoder,
+            hidden_sizes,
+            output_size=1,
+            added_fc_input_size=0,
+            hidden_init=nn.init.orthogonal_,
+            hidden_activation=nn.ReLU(),
+            output_activation=identity,
+    ):
+        super().__init__()
+        self.encoder = encoder
+        self.head = _encoder_head(encoder.output_size + added_fc_input_size, output_size,
+                                  hidden_sizes, hidden_init, hidden_activation, output_activation)
+
+    def forward(self, obs, *inputs):
+        return self.forward_features(self.encoder(obs), *inputs)
+
+    def forward_features(self, features, *inputs):
+        return self.head(torch.cat((features,) + inputs, dim=1))
+
+
+class SharedEncoderPolicy(nn.Module, Policy):
+    """
+    Policy made of a ConvEncoder, possibly shared with the critics, and an
+    MLP head. With detach_encoder the policy gradients stop at the encoder,
+    which is then only trained by the critics.
+    """
+
+    def __init__(
+            self,
+            encoder: ConvEncoder,
+            hidden_sizes,
+            output_size,
+            detach_encoder=False,
+            hidden_init=nn.init.orthogonal_,
+            hidden_activation=nn.ReLU(),
+            output_activation=identity,
+    ):
+        super().__init__()
+        self.encoder = encoder
+        self.detach_encoder = detach_encoder
+        self.head = _encoder_head(encoder.output_size, output_size,
+                                  hidden_sizes, hidden_init, hidden_activation, output_activation)
+
+    def forward(self, obs):
+        return self.forward_features(self.encoder(obs))
+
+    def forward_features(self, features):
+        if self.detach_encoder:
+            features = features.detach()
+        return self.head(features)
+
+    def trainable_parameters(self):
+        """
+        :return: the parameters the policy loss should update
+        """
+        if self.detach_encoder:
+            return self.head.parameters()
+        return self.parameters()
+
+    def get_action(self, obs_np):
+        actions = self.get_actions(obs_np[None])
+        return actions[0, :], {}
+
+    def get_actions(self, obs):
+        return eval_np(self, obs)
+
+
+class TanhSharedEncoderPolicy(SharedEncoderPolicy):
+    """
+    A helper class since most policies have a tanh output activation.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, output_activation=torch.tanh, **kwargs)
+
+
 class TwoHeadDCNN(nn.Module):
     def __init__(
             self,
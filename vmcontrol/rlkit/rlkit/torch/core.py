@@ -36,11 +36,17 @@ def np_ify(tensor_or_other):
         return tensor_or_other
 
 
-def _elem_or_tuple_to_variable(elem_or_tuple):
+def _elem_or_tuple_to_variable(elem_or_tuple, keep_uint8=False):
     if isinstance(elem_or_tuple, tuple):
         return tuple(
-            _elem_or_tuple_to_variable(e) for e in elem_or_tuple
+            _elem_or_tuple_to_variable(e, keep_uint8) for e in elem_or_tuple
         )
+    if keep_uint8 and elem_or_tuple.dtype == np.uint8:
+        # a quarter of the bytes to transfer, converted to float by the network
+        return torch.from_numpy(elem_or_tuple).to(ptu.device)
+    if elem_or_tuple.dtype in (np.int8, np.float16):
+        # compact feature codes, see FeatureStorage, are converted on the device
+        return torch.from_numpy(elem_or_tuple).to(ptu.device).float()
     return ptu.from_numpy(elem_or_tuple).float()
 
 
@@ -52,9 +58,9 @@ def _filter_batch(np_batch):
             yield k, v
 
 
-def np_to_pytorch_batch(np_batch):
+def np_to_pytorch_batch(np_batch, keep_uint8=False):
     return {
-        k: _elem_or_tuple_to_variable(x)
+        k: _elem_or_tuple_to_variable(x, keep_uint8)
         for k, x in _filter_batch(np_batch)
         if x.dtype != np.dtype('O')  # ignore object (e.g. dictionaries)
     }
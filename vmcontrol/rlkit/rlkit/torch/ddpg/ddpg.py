@@ -7,6 +7,7 @@ from torch import nn as nn
 
 import rlkit.torch.pytorch_util as ptu
 from rlkit.core.eval_util import create_stats_ordered_dict
+from rlkit.torch.target_network import TargetNetwork
 from rlkit.torch.torch_rl_algorithm import TorchTrainer
 
 
@@ -44,6 +45,10 @@ class DDPGTrainer(TorchTrainer):
         self.target_qf = target_qf
         self.policy = policy
         self.target_policy = target_policy
+        self.target_networks = [
+            TargetNetwork(self.policy, self.target_policy),
+            TargetNetwork(self.qf, self.target_qf),
+        ]
 
         self.discount = discount
         self.reward_scale = reward_scale
@@ -177,12 +182,12 @@ class DDPGTrainer(TorchTrainer):
 
     def _update_target_networks(self):
         if self.use_soft_update:
-            ptu.soft_update_from_to(self.policy, self.target_policy, self.tau)
-            ptu.soft_update_from_to(self.qf, self.target_qf, self.tau)
+            for target_network in self.target_networks:
+                target_network.update(self.tau)
         else:
             if self._n_train_steps_total % self.target_hard_update_period == 0:
-                ptu.copy_model_params_from_to(self.qf, self.target_qf)
-                ptu.copy_model_params_from_to(self.policy, self.target_policy)
+                for target_network in self.target_networks:
+                    target_network.copy()
 
     def get_diagnostics(self):
         return self.eval_statistics
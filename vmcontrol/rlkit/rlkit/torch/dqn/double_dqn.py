@@ -41,9 +41,7 @@ class DoubleDQNTrainer(DQNTrainer):
         Soft target network updates
         """
         if self._n_train_steps_total % self.target_update_period == 0:
-            ptu.soft_update_from_to(
-                self.qf, self.target_qf, self.soft_target_tau
-            )
+            self.target_network.update(self.soft_target_tau)
 
         """
         Save some statistics for eval using just one batch.
@@ -7,6 +7,7 @@ from torch import nn as nn
 
 import rlkit.torch.pytorch_util as ptu
 from rlkit.core.eval_util import create_stats_ordered_dict
+from rlkit.torch.target_network import TargetNetwork
 from rlkit.torch.torch_rl_algorithm import TorchTrainer
 
 
@@ -26,6 +27,7 @@ class DQNTrainer(TorchTrainer):
         super().__init__()
         self.qf = qf
         self.target_qf = target_qf
+        self.target_network = TargetNetwork(self.qf, self.target_qf)
         self.learning_rate = learning_rate
         self.soft_target_tau = soft_target_tau
         self.target_update_period = target_update_period
@@ -71,9 +73,7 @@ class DQNTrainer(TorchTrainer):
         Soft Updates
         """
         if self._n_train_steps_total % self.target_update_period == 0:
-            ptu.soft_update_from_to(
-                self.qf, self.target_qf, self.soft_target_tau
-            )
+            self.target_network.update(self.soft_target_tau)
 
         """
         Save some statistics for eval using just one batch.
@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+
+import rlkit.torch.pytorch_util as ptu
+
+
+class EncoderService(object):
+    """
+    Runs a frozen image encoder, e.g. a Taskonomy mid-level encoder, on batches
+    of the frames requested by every caller: the exploration environment, the
+    re-rendered frames of imgObsDictRelabelingBuffer.add_path and evaluation.
+
+    Callers copy their frames into slots of a preallocated (pinned if the
+    encoder is on CUDA) input array and wait for the features in the matching
+    slots of an output array. A worker thread takes the requests in order and
+    runs the encoder as soon as max_batch_size frames are waiting, or
+    max_wait seconds after the first of them. Frames are encoded one batch at a
+    time, so the encoder is never called concurrently.
+
+    Usage:
+        service = EncoderService(lambda x: net.encoder(x * 2 - 1), (3, 256, 256))
+        features = service.encode(frame)           # [feature_size]
+        features = service.encode_batch(frames)    # [len(frames), feature_size]
+    :param encoder: (callable) maps a float32 batch of frames on the device to a batch of features
+    :param input_shape: (tuple) the shape of a frame
+    :param max_batch_size: (int)
+    :param max_wait: (float) seconds a request waits for others to batch with
+    :param num_slots: (int) frames in flight, 4 * max_batch_size by default
+    :param device: (torch.device) where the encoder runs, ptu.device by default
+    """
+
+    def __init__(self, encoder, input_shape, max_batch_size=32, max_wait=0.002, num_slots=None, device=None):
+        self.encoder = encoder
+        self.input_shape = tuple(input_shape)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.num_slots = num_slots or 4 * max_batch_size
+        assert self.num_slots >= max_batch_size, "Error: num_slots must be at least max_batch_size"
+        self.device = torch.device(device if device is not None else (ptu.device or 'cpu'))
+
+        inputs = torch.empty((self.num_slots,) + self.input_shape, dtype=torch.float32)
+        if self.device.type == 'cuda':
+            inputs = inputs.pin_memory()
+        self._inputs = inputs
+        self._inputs_np = inputs.numpy()
+        # allocated on the first batch, once the feature size is known
+        self._outputs = None
+        self._done = [threading.Event() for _ in range(self.num_slots)]
+        self._free_slots = queue.Queue()
+        for slot in range(self.num_slots):
+            self._free_slots.put(slot)
+        self._requests = queue.Queue()
+        self._errors = [None] * self.num_slots
+        self.batch_sizes = []
+        self._thread = threading.Thread(target=self._worker, name='encoder-service', daemon=True)
+        self._thread.start()
+
+    def _next_batch(self):
+        # a None request closes the service, after the frames requested before it
+        slots = [self._requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(slots) < self.max_batch_size and slots[-1] is not None:
+            timeout = deadline - time.perf_counter()
+            try:
+                slot = self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            slots.append(slot)
+        return slots
+
+    def _worker(self):
+        closed = False
+        while not closed:
+            slots = self._next_batch()
+            if slots[-1] is None:
+                closed = True
+                slots.pop()
+            if not slots:
+                continue
+            try:
+                self._encode(slots)
+            except Exception as e:
+                for slot in slots:
+                    self._errors[slot] = e
+            finally:
+                for slot in slots:
+                    self._done[slot].set()
+
+    def _encode(self, slots):
+        # the slots of a batch are usually contiguous, then the frames are a view of the inputs
+        start = slots[0]
+        if slots == list(range(start, start + len(slots))):
+            frames = self._inputs[start:start + len(slots)]
+        else:
+            frames = self._inputs[torch.as_tensor(slots)]
+        frames = frames.to(self.device, non_blocking=True)
+        with torch.no_grad():
+            features = self.encoder(frames)
+        features = features.reshape(len(slots), -1).to('cpu', torch.float32).numpy()
+        if self._outputs is None:
+            self._outputs = np.empty((self.num_slots, features.shape[1]), dtype=np.float32)
+        self._outputs[slots] = features
+        self.batch_sizes.append(len(slots))
+
+    def _submit(self, frame, slot):
+        self._done[slot].clear()
+        self._inputs_np[slot] = np.reshape(frame, self.input_shape)
+        self._requests.put(slot)
+        return slot
+
+    def _result(self, slot):
+        self._done[slot].wait()
+        error, self._errors[slot] = self._errors[slot], None
+        if error is not None:
+            self._free_slots.put(slot)
+            raise RuntimeError("encoder service failed") from error
+        features = self._outputs[slot].copy()
+        self._free_slots.put(slot)
+        return features
+
+    def encode(self, frame):
+        """
+        :param frame: (np.ndarray) of input_shape, or of its size
+        :return: (np.ndarray) the flat features of the frame
+        """
+        return self._result(self._submit(frame, self._free_slots.get()))
+
+    def encode_batch(self, frames):
+        """
+        Submit every frame before waiting for the first features, so that they are
+        encoded in as few batches as possible.
+        :param frames: (np.ndarray or list) frames of input_shape
+        :return: (np.ndarray) the features, of shape [len(frames), feature_size]
+        """
+        features = []
+        slots = []
+        for frame in frames:
+            # collect the oldest frames of this call rather than wait for a slot while
+            # holding others, which could deadlock with other callers doing the same
+            while slots and self._free_slots.empty():
+                features.append(self._result(slots.pop(0)))
+            slots.append(self._submit(frame, self._free_slots.get()))
+        features.extend(self._result(slot) for slot in slots)
+        return np.stack(features) if features else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join()
@@ -0,0 +1,151 @@
+import time
+
+import numpy as np
+import torch
+from torch.nn import functional as F
+
+from rlkit.torch.pytorch_util import inference_mode
+
+
+def resize_images(images, resolution, mode='bilinear'):
+    """
+    :param images: (torch.Tensor) float batch of shape [N, C, H, W]
+    :param resolution: (int) side of the resized square images, None to keep them
+    :return: (torch.Tensor) [N, C, resolution, resolution]
+    """
+    if resolution is None or images.shape[-2:] == (resolution, resolution):
+        return images
+    if mode in ('bilinear', 'bicubic') and images.shape[-1] > resolution:
+        # antialiased when downsampling, like a frame rendered at that resolution
+        try:
+            return F.interpolate(images, size=(resolution, resolution), mode=mode, align_corners=False, antialias=True)
+        except TypeError:
+            # antialias appeared in torch 1.11
+            pass
+    return F.interpolate(images, size=(resolution, resolution), mode=mode, align_corners=False)
+
+
+class EncoderTransform(object):
+    """
+    The t_fn of the mid-level features: the frames of the env in [0, 1], at
+    whatever resolution it renders them, are resized on the device to
+    input_resolution x input_resolution, scaled to [-1, 1] and encoded.
+
+    A flat or shaped observation holds num_views square frames, e.g. the front
+    and alt views, whose feature maps are concatenated along the channels.
+    The Taskonomy encoders and StudentEncoder are fully convolutional, their
+    features are input_resolution / 16 wide.
+    :param encoder: (nn.Module) maps a float batch of images in [-1, 1] to feature maps
+    :param input_resolution: (int) side of the encoded images, None for the rendered side
+    :param num_views: (int)
+    :param channels: (int) of a frame
+    :param device: (torch.device) where the encoder runs, that of its parameters by default
+    :param mode: (str) interpolation mode of the resize
+    """
+
+    def __init__(self, encoder, input_resolution=256, num_views=1, channels=3, device=None, mode='bilinear'):
+        self.encoder = encoder
+        self.input_resolution = input_resolution
+        self.num_views = num_views
+        self.channels = channels
+        if device is None:
+            parameter = next(encoder.parameters(), None)
+            device = 'cpu' if parameter is None else parameter.device
+        self.device = torch.device(device)
+        self.mode = mode
+
+    def images(self, frames):
+        """
+        :param frames: (torch.Tensor) [N, ...] observations in [0, 1] of num_views square frames
+        :return: (torch.Tensor) [N * num_views, channels, input_resolution, input_resolution] in [-1, 1]
+        """
+        n = frames.shape[0]
+        pixels = frames[0].numel() // (self.num_views * self.channels)
+        side = int(round(pixels ** 0.5))
+        assert side * side == pixels, "Error: frames of {} pixels are not square".format(pixels)
+        images = frames.reshape(n * self.num_views, self.channels, side, side).float()
+        return resize_images(images, self.input_resolution, self.mode) * 2 - 1
+
+    def encode(self, frames):
+        """
+        :param frames: (torch.Tensor) [N, ...] observations in [0, 1], on the device
+        :return: (torch.Tensor) [N, num_views * feature_channels, h, w] float32 feature maps
+        """
+        with inference_mode():
+            features = self.encoder(self.images(frames))
+        return features.float().reshape((frames.shape[0], -1) + features.shape[-2:])
+
+    def transform(self, obs):
+        """
+        The t_fn
+        :param obs: (np.ndarray) an observation in [0, 1]
+        :return: (np.ndarray) its flat features
+        """
+        frames = torch.as_tensor(np.asarray(obs, dtype=np.float32), device=self.device).reshape(1, -1)
+        return self.encode(frames).cpu().numpy().flatten()
+
+    def __call__(self, obs):
+        return self.transform(obs)
+
+    def transform_observation(self, obs):
+        """
+        The main_t_fn, encodes obs['observation'] in place
+        """
+        obs['observation'] = self.transform(obs['observation'])
+        return obs
+
+
+def feature_drift(features, reference):
+    """
+    Drift of feature maps from reference ones, e.g. those of 256 x 256 frames,
+    compared at the resolution of the reference, to which the features are
+    bilinearly resized.
+    :param features: (torch.Tensor) [N, C, h, w]
+    :param reference: (torch.Tensor) [N, C, H, W]
+    :return: (dict) the MSE relative to the mean square of the reference, and the mean cosine similarity
+        of the flat features
+    """
+    features = features.float()
+    reference = reference.float()
+    if features.shape[-2:] != reference.shape[-2:]:
+        features = F.interpolate(features, size=reference.shape[-2:], mode='bilinear', align_corners=False)
+    relative_mse = ((features - reference) ** 2).mean() / (reference ** 2).mean().clamp_min(1e-12)
+    cosine = F.cosine_similarity(features.flatten(1), reference.flatten(1), dim=1).mean()
+    return dict(relative_mse=relative_mse.item(), cosine=cosine.item())
+
+
+def profile_resolutions(encoder, frames, resolutions, reference_resolution=256, repeats=10, device=None):
+    """
+    Encode latency of a frame and feature drift at every resolution.
+
+    The frames, rendered at the reference resolution or above, are resized to
+    every resolution first, like frames rendered at that resolution, then
+    encoded by an EncoderTransform at that resolution.
+    :param frames: (torch.Tensor) [N, C, H, W] frames in [0, 1]
+    :return: ([dict]) resolution, feature_shape, latency_ms (median, one frame at a time),
+        relative_mse and cosine, in the order of resolutions
+    """
+    reference_transform = EncoderTransform(encoder, reference_resolution, channels=frames.shape[1], device=device)
+    frames = frames.to(reference_transform.device)
+    reference = reference_transform.encode(frames)
+    results = []
+    for resolution in resolutions:
+        transform = EncoderTransform(encoder, resolution, channels=frames.shape[1], device=device)
+        rendered = resize_images(frames.float(), resolution)
+        features = transform.encode(rendered)
+
+        times = []
+        for i in range(repeats + 1):
+            start = time.perf_counter()
+            transform.encode(rendered[i % len(rendered)][None])
+            if transform.device.type == 'cuda':
+                torch.cuda.synchronize()
+            times.append(time.perf_counter() - start)
+        result = dict(
+            resolution=resolution,
+            feature_shape=tuple(features.shape[1:]),
+            latency_ms=sorted(times[1:])[len(times[1:]) // 2] * 1000,
+        )
+        result.update(feature_drift(features, reference))
+        results.append(result)
+    return results
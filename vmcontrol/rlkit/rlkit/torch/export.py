@@ -0,0 +1,163 @@
+"""
+Self-describing policy files for evaluation and rollout workers.
+
+An exported policy is a TorchScript archive, loadable with torch.jit.load and
+without rlkit on the import path, that holds the traced policy with its
+weights and a JSON spec of its architecture, observation layout and
+normalization:
+
+    export_policy(policy, 'policy.pt', observation_spec=dict(
+        observation_key='observation', desired_goal_key='desired_goal',
+        image_channels=3, image_size=64, goal_dim=3))
+    policy, spec = load_exported_policy('policy.pt')
+    action = policy(torch.from_numpy(np.hstack((obs, goal))).float()[None])
+"""
+import copy
+import json
+
+import torch
+from torch import nn as nn
+
+import rlkit.torch.pytorch_util as ptu
+
+SPEC_FILE = 'policy_spec.json'
+FORMAT_VERSION = 1
+
+# attributes of the CNN and ConvEncoder networks that describe them
+_ARCHITECTURE_ATTRIBUTES = [
+    'input_width',
+    'input_height',
+    'input_channels',
+    'added_fc_input_size',
+    'added_input_size',
+    'hidden_sizes',
+    'output_size',
+    'batch_norm_conv',
+    'batch_norm_fc',
+    'detach_encoder',
+]
+
+
+def _layers(module):
+    layers = []
+    for name, layer in module.named_modules():
+        if isinstance(layer, nn.Conv2d):
+            layers.append(dict(name=name, type='Conv2d', in_channels=layer.in_channels,
+                               out_channels=layer.out_channels, kernel_size=list(layer.kernel_size),
+                               stride=list(layer.stride), padding=list(layer.padding), groups=layer.groups))
+        elif isinstance(layer, nn.Linear):
+            layers.append(dict(name=name, type='Linear', in_features=layer.in_features,
+                               out_features=layer.out_features))
+    return layers
+
+
+def _json_value(value):
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_value(v) for v in value]
+    return type(value).__name__ if not callable(value) else getattr(value, '__name__', type(value).__name__)
+
+
+def describe_architecture(policy):
+    """
+    :return: (dict) the class, the constructor attributes and the layers of the policy
+    """
+    architecture = dict(policy_class=type(policy).__name__)
+    for network in [policy, getattr(policy, 'encoder', None)]:
+        if network is None:
+            continue
+        prefix = '' if network is policy else 'encoder_'
+        for attribute in _ARCHITECTURE_ATTRIBUTES:
+            if hasattr(network, attribute):
+                architecture[prefix + attribute] = _json_value(getattr(network, attribute))
+        for attribute in ['hidden_activation', 'output_activation']:
+            if hasattr(network, attribute):
+                architecture[prefix + attribute] = _json_value(getattr(network, attribute))
+    architecture['layers'] = _layers(policy)
+    return architecture
+
+
+def policy_input_size(policy):
+    """
+    :return: (int) the length of the flat observations of a CNN or shared encoder policy
+    """
+    network = getattr(policy, 'encoder', policy)
+    added = getattr(network, 'added_fc_input_size', getattr(network, 'added_input_size', 0))
+    return network.conv_input_length + added
+
+
+def _normalization(policy):
+    normalizer = getattr(policy, 'obs_normalizer', None)
+    normalization = dict(
+        # images scaled to [-1, 1] by the networks that take uint8 pixels
+        pixel_scale=getattr(policy, 'pixel_scale', None),
+        pixel_shift=getattr(policy, 'pixel_shift', None),
+    )
+    if normalizer is not None:
+        normalization.update(
+            obs_mean=normalizer.mean.tolist(),
+            obs_std=normalizer.std.tolist(),
+            clip_range=normalizer.default_clip_range,
+        )
+    return normalization
+
+
+def _trace(policy, input_size, input_dtype):
+    example = torch.zeros(1, input_size, dtype=input_dtype)
+    # the normalizers make their tensors on ptu.device, trace them as CPU constants
+    device, ptu.device = ptu.device, torch.device('cpu')
+    try:
+        with torch.no_grad():
+            return torch.jit.freeze(torch.jit.trace(policy, example))
+    finally:
+        ptu.device = device
+
+
+def quantize_int8(policy):
+    """
+    :return: (nn.Module) a copy of the policy with int8 dynamic quantized Linear layers, for the CPU
+    """
+    quantization = getattr(torch, 'ao', torch).quantization
+    return quantization.quantize_dynamic(policy, {nn.Linear}, dtype=torch.qint8)
+
+
+def export_policy(policy, file_name, observation_spec=None, int8=False, input_dtype=torch.float32):
+    """
+    Trace the policy on the CPU in eval mode and save it with its spec.
+    :param policy: (nn.Module) a policy whose forward takes flat observations
+    :param file_name: (str)
+    :param observation_spec: (dict) e.g. the observation keys, image size and channels and goal
+        size the policy expects, stored as is
+    :param int8: (bool) quantize the Linear layers to int8 (dynamic quantization), CPU only
+    :param input_dtype: (torch.dtype) torch.uint8 for the networks that take uint8 pixels
+    :return: (dict) the spec
+    """
+    policy = copy.deepcopy(policy).cpu().eval()
+    input_size = policy_input_size(policy)
+    spec = dict(
+        format_version=FORMAT_VERSION,
+        architecture=describe_architecture(policy),
+        input_size=input_size,
+        input_dtype=str(input_dtype).replace('torch.', ''),
+        observation_spec=observation_spec or {},
+        normalization=_normalization(policy),
+        int8=int8,
+    )
+    if int8:
+        policy = quantize_int8(policy)
+    traced = _trace(policy, input_size, input_dtype)
+    torch.jit.save(traced, file_name, _extra_files={SPEC_FILE: json.dumps(spec)})
+    return spec
+
+
+def load_exported_policy(file_name, map_location='cpu'):
+    """
+    :return: (torch.jit.ScriptModule, dict) the policy and its spec
+    """
+    extra_files = {SPEC_FILE: ''}
+    policy = torch.jit.load(file_name, map_location=map_location, _extra_files=extra_files)
+    spec = json.loads(extra_files[SPEC_FILE])
+    assert spec['format_version'] <= FORMAT_VERSION, \
+        "Error: {} has a newer export format ({})".format(file_name, spec['format_version'])
+    return policy, spec
@@ -0,0 +1,142 @@
+import numpy as np
+import torch
+
+import rlkit.torch.pytorch_util as ptu
+from rlkit.policies.base import Policy
+from rlkit.torch.encoder_transform import resize_images
+from rlkit.torch.mixed_precision import MixedPrecision
+
+
+class FrameEncoder(object):
+    """
+    Frozen encoder, e.g. a Taskonomy mid-level encoder, run by the learner on
+    the raw uint8 frames of the sampled batches, so that the replay buffer
+    holds frames rather than features and does not go stale when the encoder
+    or its checkpoint changes.
+
+    A flat observation is num_views frames of image_shape, e.g. the front and
+    alt views, whose features are concatenated in the same order. Calling it on
+    a torch batch, as TorchTrainer.batch_decoder, encodes the observations and
+    next observations in one pass, and the frames that appear more than once in
+    them, e.g. the next observation of a step that is the observation of the
+    following one, only once. The repeated frames are found by a hash of every
+    frame, one multiply-add per byte, rather than by sorting the frames, and
+    checked against the frames they stand for.
+    :param encoder: (nn.Module) maps a float batch of images in [-1, 1] to features
+    :param image_shape: (tuple) the (channels, height, width) of a stored frame
+    :param num_views: (int)
+    :param amp: (bool) autocast the encoder, to float16 on CUDA and bfloat16 on CPU
+    :param deduplicate: (bool) encode the repeated frames of a batch once
+    :param input_resolution: (int) side the frames are resized to on the device before they are
+        encoded, None to encode them as stored
+    """
+
+    def __init__(self, encoder, image_shape=(3, 256, 256), num_views=1, amp=False, deduplicate=True,
+                 input_resolution=None):
+        self.encoder = encoder.eval()
+        for p in self.encoder.parameters():
+            p.requires_grad_(False)
+        self.image_shape = tuple(image_shape)
+        self.num_views = num_views
+        self.mixed_precision = MixedPrecision(enabled=amp, device=self._device())
+        self.deduplicate = deduplicate
+        self.input_resolution = input_resolution
+        self.num_frames = 0
+        self.num_encoded = 0
+        self._coefficients = None
+
+    def _device(self):
+        parameter = next(self.encoder.parameters(), None)
+        return torch.device('cpu') if parameter is None else parameter.device
+
+    def encode(self, frames):
+        """
+        :param frames: (torch.Tensor) uint8 observations of shape [N, num_views * C * H * W], on the device
+        :return: (torch.Tensor) the float32 features, of shape [N, num_views * feature_size]
+        """
+        n = frames.shape[0]
+        images = frames.reshape((n * self.num_views,) + self.image_shape).float() * (2. / 255) - 1
+        images = resize_images(images, self.input_resolution)
+        with ptu.inference_mode(), self.mixed_precision.autocast():
+            features = self.encoder(images)
+        # inference tensors cannot be saved for backward, the trainers use a copy
+        return features.float().reshape(n, -1).clone()
+
+    def encode_np(self, frames):
+        """
+        :param frames: (np.ndarray) uint8 observations, or one of them
+        :return: (np.ndarray) the features
+        """
+        frames = np.asarray(frames)
+        single = frames.ndim == 1
+        frames = torch.from_numpy(frames.reshape(1 if single else len(frames), -1)).to(self._device())
+        features = ptu.get_numpy(self.encode(frames))
+        return features[0] if single else features
+
+    def _hashes(self, frames, chunk_size=16384):
+        """
+        :param frames: (torch.Tensor) uint8 [N, D]
+        :return: (torch.Tensor) the int64 dot product of every frame with random 31 bit coefficients,
+            which cannot overflow for D below 2 ** 23, and on which two distinct frames agree with a
+            probability below 2 ** -31
+        """
+        size = frames.shape[1]
+        if self._coefficients is None or len(self._coefficients) != size or self._coefficients.device != frames.device:
+            generator = torch.Generator().manual_seed(0)
+            self._coefficients = torch.randint(0, 2 ** 31, (size,), generator=generator, dtype=torch.int64).to(frames.device)
+        hashes = torch.zeros(len(frames), dtype=torch.int64, device=frames.device)
+        # in chunks of columns, so that the int64 copy of the frames stays small
+        for start in range(0, size, chunk_size):
+            chunk = frames[:, start:start + chunk_size].long()
+            hashes += (chunk * self._coefficients[start:start + chunk_size]).sum(1)
+        return hashes
+
+    def unique(self, frames):
+        """
+        :param frames: (torch.Tensor) uint8 [N, D]
+        :return: (torch.Tensor, torch.Tensor) the distinct frames, and the index of every frame in them
+        """
+        unique_hashes, inverse = torch.unique(self._hashes(frames), return_inverse=True)
+        first = torch.empty(len(unique_hashes), dtype=torch.int64, device=frames.device)
+        first.scatter_(0, inverse, torch.arange(len(frames), device=frames.device))
+        if not torch.equal(frames[first[inverse]], frames):
+            # two distinct frames with the same hash
+            return torch.unique(frames, dim=0, return_inverse=True)
+        return frames[first], inverse
+
+    def __call__(self, batch):
+        obs, next_obs = batch['observations'], batch['next_observations']
+        # [k, B, D] blocks of batches are encoded in one pass too
+        frames = torch.cat([obs.reshape(-1, obs.shape[-1]), next_obs.reshape(-1, next_obs.shape[-1])])
+        if self.deduplicate:
+            unique_frames, inverse = self.unique(frames)
+            features = self.encode(unique_frames)[inverse]
+        else:
+            unique_frames = frames
+            features = self.encode(frames)
+        self.num_frames += len(frames)
+        self.num_encoded += len(unique_frames)
+        num_obs = len(frames) // 2
+        batch['observations'] = features[:num_obs].reshape(obs.shape[:-1] + (-1,))
+        batch['next_observations'] = features[num_obs:].reshape(next_obs.shape[:-1] + (-1,))
+        return batch
+
+
+class FrameEncodingPolicy(Policy):
+    """
+    Acts on raw uint8 frames with a policy trained on their FrameEncoder features.
+    """
+
+    def __init__(self, policy, frame_encoder):
+        self.policy = policy
+        self.frame_encoder = frame_encoder
+
+    def get_action(self, obs_np):
+        return self.policy.get_action(self.frame_encoder.encode_np(obs_np))
+
+    def get_actions(self, obs):
+        return self.policy.get_actions(self.frame_encoder.encode_np(obs))
+
+    def reset(self):
+        if hasattr(self.policy, 'reset'):
+            self.policy.reset()
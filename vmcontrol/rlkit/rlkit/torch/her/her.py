@@ -19,6 +19,10 @@ class HERTrainer(TorchTrainer):
     def get_diagnostics(self):
         return self._base_trainer.get_diagnostics()
 
+    def set_mixed_precision(self, mixed_precision):
+        super().set_mixed_precision(mixed_precision)
+        self._base_trainer.set_mixed_precision(mixed_precision)
+
     def end_epoch(self, epoch):
         self._base_trainer.end_epoch(epoch)
 
@@ -45,6 +49,10 @@ class imgHERTrainer(TorchTrainer):
     def get_diagnostics(self):
         return self._base_trainer.get_diagnostics()
 
+    def set_mixed_precision(self, mixed_precision):
+        super().set_mixed_precision(mixed_precision)
+        self._base_trainer.set_mixed_precision(mixed_precision)
+
     def end_epoch(self, epoch):
         self._base_trainer.end_epoch(epoch)
 
@@ -0,0 +1,105 @@
+import copy
+import warnings
+
+import numpy as np
+import torch
+
+import rlkit.torch.pytorch_util as ptu
+from rlkit.policies.base import Policy
+
+
+class InferencePolicy(Policy):
+    """
+    Single observation get_action for the rollouts, a drop-in replacement of a
+    torch policy such as CNNPolicy in the path collectors and exploration wrappers.
+
+    eval_np allocates new tensors, converts them and records the graph of the
+    forward pass at every environment step. Here the observation is copied into
+    a preallocated (pinned if the policy is on CUDA) input tensor of the
+    flattened layout found on the first call, and the forward pass runs under
+    torch.inference_mode.
+
+    With freeze, the forward pass runs a traced and frozen TorchScript copy of
+    the policy, in eval mode, whose weights are constants. The copy is traced
+    again when the policy weights changed, which is detected from the version
+    counters of the parameters, so usually once per train loop. If the policy
+    cannot be traced the eager one is used.
+    :param policy: (nn.Module) the policy, its forward takes flat observations
+    :param freeze: (bool) use a frozen TorchScript copy
+    :param keep_uint8: (bool) keep uint8 observations as uint8, for ChannelsLastCNNPolicy
+    """
+
+    def __init__(self, policy, freeze=False, keep_uint8=False):
+        self.policy = policy
+        self.freeze = freeze
+        self.keep_uint8 = keep_uint8
+        self._obs_shape = None
+        self._host_input = None
+        self._host_input_np = None
+        self._device_input = None
+        self._frozen = None
+        self._frozen_version = None
+
+    def _device(self):
+        # a frozen or exported policy has its weights as constants, and is on the CPU
+        parameter = next(self.policy.parameters(), None)
+        return torch.device('cpu') if parameter is None else parameter.device
+
+    def _allocate(self, obs_np):
+        device = self._device()
+        dtype = torch.uint8 if self.keep_uint8 and obs_np.dtype == np.uint8 else torch.float32
+        self._obs_shape = obs_np.shape
+        host_input = torch.empty((1, obs_np.size), dtype=dtype)
+        if device.type == 'cuda':
+            host_input = host_input.pin_memory()
+            self._device_input = torch.empty_like(host_input, device=device)
+        else:
+            self._device_input = host_input
+        self._host_input = host_input
+        # writing to the numpy view converts the dtype in the same copy
+        self._host_input_np = host_input.numpy()
+
+    def _weights_version(self):
+        return tuple(p._version for p in self.policy.parameters())
+
+    def _frozen_policy(self):
+        version = self._weights_version()
+        if self._frozen is None or version != self._frozen_version:
+            self._frozen = None
+            policy = copy.deepcopy(self.policy).eval()
+            try:
+                with torch.no_grad():
+                    self._frozen = torch.jit.freeze(torch.jit.trace(policy, self._device_input))
+            except Exception as e:
+                warnings.warn("cannot freeze {}, using it eagerly: {}".format(type(self.policy).__name__, e))
+                self.freeze = False
+                return self.policy
+            self._frozen_version = version
+        return self._frozen
+
+    def get_action(self, obs_np):
+        obs_np = np.asarray(obs_np)
+        if (self._device_input is None or obs_np.shape != self._obs_shape
+                or self._device() != self._device_input.device):
+            self._allocate(obs_np)
+        self._host_input_np[0] = obs_np.reshape(-1)
+        if self._device_input is not self._host_input:
+            self._device_input.copy_(self._host_input, non_blocking=True)
+        policy = self._frozen_policy() if self.freeze else self.policy
+        with ptu.inference_mode():
+            action = policy(self._device_input)
+        return ptu.get_numpy(action[0]), {}
+
+    def get_actions(self, obs):
+        return np.stack([self.get_action(o)[0] for o in obs])
+
+    def reset(self):
+        if hasattr(self.policy, 'reset'):
+            self.policy.reset()
+
+    def __getstate__(self):
+        # the buffers and the frozen copy are rebuilt on the first action
+        state = self.__dict__.copy()
+        for key in ['_obs_shape', '_host_input', '_host_input_np', '_device_input', '_frozen', '_frozen_version']:
+            state[key] = None
+        return state
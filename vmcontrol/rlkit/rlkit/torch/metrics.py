@@ -0,0 +1,132 @@
+import math
+from collections import OrderedDict
+
+import torch
+
+
+class _RunningStats(object):
+    """
+    Count, mean, sum of squared deviations (M2), min and max of a stream of
+    batches, kept on the device. Batches are merged with the parallel variance
+    formula of Chan et al., so adding one is a few small kernels and no sync.
+    """
+
+    def __init__(self, per_column, mean_only):
+        self.per_column = per_column
+        self.mean_only = mean_only
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+
+    def add(self, values):
+        values = values.detach().to(torch.float64)
+        if self.per_column:
+            values = values.reshape(-1, values.shape[-1])
+        else:
+            values = values.reshape(-1)
+        n = values.shape[0]
+        if n == 0:
+            return
+        mean = values.mean(dim=0)
+        m2 = ((values - mean) ** 2).sum(dim=0)
+        if self.count == 0:
+            self.mean, self.m2 = mean, m2
+            self.min, self.max = values.min(dim=0)[0], values.max(dim=0)[0]
+        else:
+            total = self.count + n
+            delta = mean - self.mean
+            self.mean = self.mean + delta * (n / total)
+            self.m2 = self.m2 + m2 + delta ** 2 * (self.count * n / total)
+            self.min = torch.min(self.min, values.min(dim=0)[0])
+            self.max = torch.max(self.max, values.max(dim=0)[0])
+        self.count += n
+
+    def stacked(self):
+        """
+        :return: (torch.Tensor) mean, M2, min and max, of shape [4, num_columns]
+        """
+        return torch.stack([self.mean, self.m2, self.min, self.max]).reshape(4, -1)
+
+    def statistics(self, name, stacked):
+        """
+        :param stacked: ([[float]]) the values of stacked() on the host
+        :return: (OrderedDict) the statistics named like create_stats_ordered_dict
+        """
+        mean, m2, minimum, maximum = stacked
+        names = [name + str(i) for i in range(len(mean))] if self.per_column else [name]
+        stats = OrderedDict()
+        for i, column_name in enumerate(names):
+            if self.mean_only:
+                stats[column_name] = mean[i]
+                continue
+            stats[column_name + ' Mean'] = mean[i]
+            stats[column_name + ' Std'] = math.sqrt(max(m2[i], 0.) / self.count)
+            stats[column_name + ' Max'] = maximum[i]
+            stats[column_name + ' Min'] = minimum[i]
+        return stats
+
+
+class MetricsAccumulator(object):
+    """
+    Diagnostics of a trainer accumulated on the device over every training step.
+
+    Trainers declare their metrics once and add the tensors of each step, which
+    only queues reductions on the device. The statistics are read back, in the
+    order the metrics were declared, once per epoch, and reset at its end.
+
+    Usage:
+        self.metrics = MetricsAccumulator()
+        self.metrics.declare('QF1 Loss', mean_only=True)
+        self.metrics.declare('Policy Action', per_column=True)
+        ...
+        self.metrics.add('QF1 Loss', qf1_loss)
+        ...
+        logger.record_dict(self.metrics.read())
+    """
+
+    def __init__(self):
+        self._stats = OrderedDict()
+        self._cached = None
+
+    def declare(self, name, per_column=False, mean_only=False):
+        """
+        :param name: (str)
+        :param per_column: (bool) statistics of every column (last dimension), named name0, name1...
+        :param mean_only: (bool) only report the mean, under name, e.g. for the losses
+        """
+        self._stats[name] = _RunningStats(per_column, mean_only)
+
+    def add(self, name, values):
+        """
+        :param name: (str) a declared metric, or a new one with all the statistics over every element
+        :param values: (torch.Tensor) the values of one step
+        """
+        if name not in self._stats:
+            self.declare(name)
+        self._stats[name].add(values)
+        self._cached = None
+
+    def read(self):
+        """
+        :return: (OrderedDict) the statistics of every metric since the last reset
+        """
+        if self._cached is None:
+            self._cached = OrderedDict()
+            names = [name for name, stats in self._stats.items() if stats.count > 0]
+            if names:
+                # a single device to host transfer for every metric
+                stacked = [self._stats[name].stacked() for name in names]
+                host = torch.cat([s.to(stacked[0].device) for s in stacked], dim=1).cpu()
+                offset = 0
+                for name, s in zip(names, stacked):
+                    columns = host[:, offset:offset + s.shape[1]].tolist()
+                    offset += s.shape[1]
+                    self._cached.update(self._stats[name].statistics(name, columns))
+        return self._cached
+
+    def reset(self):
+        for name, stats in self._stats.items():
+            self._stats[name] = _RunningStats(stats.per_column, stats.mean_only)
+        self._cached = None
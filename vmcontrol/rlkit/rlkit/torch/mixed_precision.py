@@ -0,0 +1,77 @@
+import contextlib
+
+import torch
+
+from rlkit.torch import pytorch_util as ptu
+
+
+class MixedPrecision(object):
+    """
+    Autocast and loss scaling for the trainers.
+
+    On CUDA the forward passes run in float16 and every optimizer gets its own
+    GradScaler, so that a step skipped because of an overflow in one loss does
+    not skip the others. On CPU they run in bfloat16, which has the exponent
+    range of float32 and needs no scaling. When disabled every method falls
+    back to plain fp32 training.
+    """
+
+    def __init__(
+            self,
+            enabled=False,
+            device=None,
+            dtype=None,
+            init_scale=2. ** 16,
+            growth_interval=2000,
+    ):
+        """
+        :param enabled: (bool)
+        :param device: (torch.device or str) where the networks run, by default ptu.device
+        :param dtype: (torch.dtype) autocast type, by default float16 on CUDA and bfloat16 on CPU
+        :param init_scale: (float) initial loss scale of the GradScalers
+        :param growth_interval: (int) steps without overflow before a GradScaler doubles its scale
+        """
+        if device is None:
+            device = ptu.device if ptu.device is not None else 'cpu'
+        self.device_type = torch.device(device).type
+        if dtype is None:
+            dtype = torch.float16 if self.device_type == 'cuda' else torch.bfloat16
+        self.enabled = enabled
+        self.dtype = dtype
+        self.use_scaler = enabled and dtype == torch.float16
+        self.init_scale = init_scale
+        self.growth_interval = growth_interval
+        self._scalers = {}
+
+    def autocast(self):
+        if not self.enabled:
+            return contextlib.suppress()
+        return torch.autocast(self.device_type, dtype=self.dtype)
+
+    def scaler(self, optimizer):
+        """
+        :return: (GradScaler) the scaler of this optimizer, a no-op one if no scaling is needed
+        """
+        if optimizer not in self._scalers:
+            self._scalers[optimizer] = torch.cuda.amp.GradScaler(
+                init_scale=self.init_scale,
+                growth_interval=self.growth_interval,
+                enabled=self.use_scaler,
+            )
+        return self._scalers[optimizer]
+
+    def step(self, loss, optimizer):
+        """
+        Backward pass of the (scaled) loss then optimizer step, which is skipped
+        if the gradients overflowed. The gradients must have been zeroed.
+        """
+        scaler = self.scaler(optimizer)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+
+    def loss_scales(self):
+        """
+        :return: ([float]) the current scale of every GradScaler, in creation order
+        """
+        return [scaler.get_scale() for scaler in self._scalers.values() if scaler.is_enabled()]
@@ -40,6 +40,10 @@ def fanin_init_weights_like(tensor):
     return new_tensor
 
 
+# torch.inference_mode appeared in 1.9
+inference_mode = getattr(torch, 'inference_mode', torch.no_grad)
+
+
 """
 GPU wrappers
 """
@@ -0,0 +1,83 @@
+import numpy as np
+import torch
+from torch import nn as nn
+from torch.nn import functional as F
+
+from rlkit.torch.pytorch_util import inference_mode
+
+_DTYPES = {
+    'float32': torch.float32,
+    'float16': torch.float16,
+    'uint8': torch.uint8,
+}
+
+
+class ReadoutTransform(nn.Module):
+    """
+    Observation transform of the readout mode: the full Taskonomy network
+    (encoder and decoder) on a [0, 1] image, max pooled to output_size x
+    output_size on the device, the same as the reshape and max(4).max(2) of
+    the decoder output on the host.
+
+    The pooled readout is cast to dtype on the device, so that only
+    3 x output_size x output_size values of that dtype are copied to the host,
+    and transform() casts them back to float32 there. With uint8, the values
+    in value_range are quantized to 256 levels.
+    :param net: (nn.Module) maps images in [-1, 1] to readouts
+    :param input_shape: (tuple) the shape of an image
+    :param output_size: (int)
+    :param dtype: (str) float32, float16 or uint8
+    :param value_range: ((float, float)) range of the readouts, for uint8
+    """
+
+    def __init__(self, net, input_shape=(3, 256, 256), output_size=64, dtype='float32', value_range=(-1., 1.)):
+        super().__init__()
+        assert dtype in _DTYPES, "Error: dtype must be one of {}".format(list(_DTYPES))
+        self.net = net
+        self.input_shape = tuple(input_shape)
+        self.output_size = output_size
+        self.dtype = dtype
+        self.value_range = value_range
+
+    def forward(self, obs):
+        """
+        :param obs: (torch.Tensor) a batch of flat or shaped images in [0, 1]
+        :return: (torch.Tensor) the pooled readouts of dtype, of shape [batch, C, output_size, output_size]
+        """
+        obs = obs.reshape((-1,) + self.input_shape).float()
+        readout = F.adaptive_max_pool2d(self.net(obs * 2 - 1), self.output_size)
+        return self.quantize(readout)
+
+    def quantize(self, readout):
+        if self.dtype == 'uint8':
+            low, high = self.value_range
+            readout = (readout - low) * (255. / (high - low))
+            return readout.round_().clamp_(0, 255).to(torch.uint8)
+        return readout.to(_DTYPES[self.dtype])
+
+    def dequantize(self, readout):
+        """
+        :param readout: (np.ndarray) pooled readouts of dtype
+        :return: (np.ndarray) the float32 readouts
+        """
+        readout = readout.astype(np.float32)
+        if self.dtype == 'uint8':
+            low, high = self.value_range
+            readout = readout * ((high - low) / 255.) + low
+        return readout
+
+    def _device(self):
+        parameter = next(self.net.parameters(), None)
+        return torch.device('cpu') if parameter is None else parameter.device
+
+    def transform(self, obs):
+        """
+        :param obs: (np.ndarray) an image in [0, 1], or a batch of them
+        :return: (np.ndarray) the flat float32 readout, or a batch of them
+        """
+        obs = np.asarray(obs, dtype=np.float32)
+        batched = obs.size > np.prod(self.input_shape)
+        with inference_mode():
+            readout = self(torch.as_tensor(obs, device=self._device()))
+        readout = self.dequantize(readout.cpu().numpy()).reshape(readout.shape[0], -1)
+        return readout if batched else readout[0]
@@ -7,6 +7,7 @@ from torch import nn as nn
 
 import rlkit.torch.pytorch_util as ptu
 from rlkit.core.eval_util import create_stats_ordered_dict
+from rlkit.torch.target_network import TargetNetwork
 from rlkit.torch.torch_rl_algorithm import TorchTrainer
 
 
@@ -44,6 +45,10 @@ class SACTrainer(TorchTrainer):
         self.target_qf2 = target_qf2
         self.soft_target_tau = soft_target_tau
         self.target_update_period = target_update_period
+        self.target_networks = [
+            TargetNetwork(self.qf1, self.target_qf1),
+            TargetNetwork(self.qf2, self.target_qf2),
+        ]
 
         self.use_automatic_entropy_tuning = use_automatic_entropy_tuning
         if self.use_automatic_entropy_tuning:
@@ -148,12 +153,8 @@ class SACTrainer(TorchTrainer):
         Soft Updates
         """
         if self._n_train_steps_total % self.target_update_period == 0:
-            ptu.soft_update_from_to(
-                self.qf1, self.target_qf1, self.soft_target_tau
-            )
-            ptu.soft_update_from_to(
-                self.qf2, self.target_qf2, self.soft_target_tau
-            )
+            for target_network in self.target_networks:
+                target_network.update(self.soft_target_tau)
 
         """
         Save some statistics for eval
@@ -0,0 +1,125 @@
+import time
+
+import torch
+from torch import nn as nn
+from torch.nn import functional as F
+
+from rlkit.torch.pytorch_util import inference_mode
+
+
+class StudentEncoder(nn.Module):
+    """
+    Small CNN distilled from a Taskonomy encoder, a drop-in for net.encoder in
+    the t_fn and main_t_fn of mid_level_train.py that is fast enough for CPU
+    rollout workers.
+
+    It maps images in [-1, 1] of input_shape to features of output_shape (the
+    8 x 16 x 16 of the Taskonomy encoders) with a strided stem, a stride 2
+    conv per halving of the resolution and a 1 x 1 conv to the feature maps.
+    :param input_shape: (tuple) (channels, height, width) of the images
+    :param output_shape: (tuple) (channels, height, width) of the teacher features
+    :param channels: ([int]) widths of the stem and of the strided convs, the last
+        one is repeated if the resolution needs more of them
+    """
+
+    def __init__(self, input_shape=(3, 256, 256), output_shape=(8, 16, 16), channels=(32, 48, 64, 96)):
+        super().__init__()
+        self.input_shape = tuple(input_shape)
+        self.output_shape = tuple(output_shape)
+        self.channels = tuple(channels)
+        factor = self.input_shape[1] // self.output_shape[1]
+        assert factor >= 2 and factor & (factor - 1) == 0 \
+            and self.input_shape[1:] == (self.output_shape[1] * factor, self.output_shape[2] * factor), \
+            "Error: the input resolution must be a power of two times the output resolution"
+        num_strided = factor.bit_length() - 1
+
+        layers = []
+        in_channels = self.input_shape[0]
+        for i in range(num_strided):
+            out_channels = self.channels[min(i, len(self.channels) - 1)]
+            kernel_size = 5 if i == 0 else 3
+            layers.append(nn.Conv2d(in_channels, out_channels, kernel_size, stride=2, padding=kernel_size // 2))
+            layers.append(nn.ReLU(inplace=True))
+            in_channels = out_channels
+        layers.append(nn.Conv2d(in_channels, self.output_shape[0], 1))
+        self.layers = nn.Sequential(*layers)
+
+    @property
+    def config(self):
+        return dict(input_shape=self.input_shape, output_shape=self.output_shape, channels=self.channels)
+
+    def forward(self, images):
+        """
+        :param images: (torch.Tensor) [batch, *input_shape] in [-1, 1]
+        :return: (torch.Tensor) [batch, *output_shape]
+        """
+        return self.layers(images)
+
+
+def distill_step(student, teacher, images, optimizer):
+    """
+    One step of the MSE between the student and the frozen teacher features
+    :param images: (torch.Tensor) a batch in [-1, 1], on the device of both
+    :return: (float) the loss
+    """
+    with torch.no_grad():
+        targets = teacher(images)
+    loss = F.mse_loss(student(images), targets)
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+    return loss.item()
+
+
+def feature_mse(student, teacher, batches):
+    """
+    :param batches: (iterable) batches of images in [-1, 1], on the device of both
+    :return: (float) the MSE of the student features over every batch
+    """
+    total = 0.
+    count = 0
+    with inference_mode():
+        for images in batches:
+            total += F.mse_loss(student(images), teacher(images), reduction='sum').item()
+            count += images.shape[0] * student.output_shape[0] * student.output_shape[1] * student.output_shape[2]
+    return total / max(count, 1)
+
+
+def measure_latency(encoder, input_shape, batch_size=1, repeats=20, warmup=3):
+    """
+    :return: (float) median seconds per batch of the encoder, on the device of its parameters
+    """
+    parameter = next(encoder.parameters(), None)
+    device = torch.device('cpu') if parameter is None else parameter.device
+    images = torch.rand((batch_size,) + tuple(input_shape), device=device) * 2 - 1
+    times = []
+    with inference_mode():
+        for i in range(warmup + repeats):
+            start = time.perf_counter()
+            encoder(images)
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+            if i >= warmup:
+                times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def save_student(student, file_name, **metadata):
+    """
+    Save the weights with the config and metadata they were distilled with,
+    e.g. the feature task and the feature MSE of the student.
+    """
+    torch.save(dict(config=student.config, state_dict=student.state_dict(), metadata=metadata), file_name)
+
+
+def load_student(file_name, device='cpu'):
+    """
+    :return: (StudentEncoder) in eval mode and frozen, on device
+    """
+    checkpoint = torch.load(file_name, map_location='cpu')
+    student = StudentEncoder(**checkpoint['config'])
+    student.load_state_dict(checkpoint['state_dict'])
+    student.metadata = checkpoint.get('metadata', {})
+    for p in student.parameters():
+        p.requires_grad_(False)
+    return student.to(device).eval()
@@ -0,0 +1,168 @@
+import torch
+
+
+def _memory_order(t):
+    """
+    :return: (tuple) the dims of t in the order they are laid out in memory, e.g. (0, 2, 3, 1) for a
+        channels_last conv weight, None for a contiguous tensor
+    """
+    if t.is_contiguous():
+        return None
+    if t.dim() == 4 and t.is_contiguous(memory_format=torch.channels_last):
+        return (0, 2, 3, 1)
+    if t.dim() == 5 and t.is_contiguous(memory_format=torch.channels_last_3d):
+        return (0, 2, 3, 4, 1)
+    # any other layout is packed contiguous
+    return None
+
+
+def _pack(tensors, orders):
+    """
+    Copy tensors of the same dtype and device into one flat buffer and make each
+    of them a view of it, laid out in the given memory order, so that e.g. the
+    channels_last weights stay channels_last.
+    """
+    flat = torch.cat([(t.data if o is None else t.data.permute(o)).reshape(-1) for t, o in zip(tensors, orders)])
+    offset = 0
+    for t, o in zip(tensors, orders):
+        n = t.numel()
+        view = flat[offset:offset + n]
+        if o is None:
+            t.data = view.view_as(t)
+        else:
+            inverse = sorted(range(len(o)), key=o.__getitem__)
+            t.data = view.view([t.shape[d] for d in o]).permute(inverse)
+        offset += n
+    return flat
+
+
+def _slots(module, buffers=False):
+    """
+    :return: ([(nn.Module, str)]) the submodule and name of every parameter or buffer of module,
+        in the order of Module.parameters() or Module.buffers()
+    """
+    slots = []
+    seen = set()
+    for m in module.modules():
+        for name, t in (m._buffers if buffers else m._parameters).items():
+            if t is None or id(t) in seen:
+                continue
+            seen.add(id(t))
+            slots.append((m, name))
+    return slots
+
+
+def _group(source_slots, target_slots):
+    groups = {}
+    for s, t in zip(source_slots, target_slots):
+        s_tensor, t_tensor = getattr(*s), getattr(*t)
+        assert s_tensor.shape == t_tensor.shape, "source and target networks differ"
+        key = (s_tensor.dtype, s_tensor.device)
+        groups.setdefault(key, ([], []))
+        groups[key][0].append(s)
+        groups[key][1].append(t)
+    return list(groups.values())
+
+
+class TargetNetwork(object):
+    """
+    Polyak averaging of target networks with one fused kernel per update.
+
+    The parameters of the online (source) and target networks are packed into
+    contiguous flat buffers, each parameter becoming a view of its buffer, so
+        target = target * (1 - tau) + source * tau
+    is a single lerp_ instead of two kernels per tensor like
+    ptu.soft_update_from_to. Buffers, e.g. BatchNorm running stats, are copied
+    from the source at every update.
+
+    The flat buffers follow the memory format of the source tensors, so that
+    the weights of e.g. ChannelsLastCNN or CriticEnsemble stay channels_last in
+    both networks.
+
+    The views do not survive Module.to() or unpickling, so the buffers are
+    packed again whenever the first tensor of one of them no longer points
+    into it, which is all an update checks.
+    :param source: (nn.Module) the online network
+    :param target: (nn.Module) its target network
+    """
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+        self._packed = None
+        self._checks = None
+
+    def _is_packed(self):
+        if self._packed is None:
+            return False
+        return all(getattr(*slot).data_ptr() == data_ptr for slot, data_ptr in self._checks)
+
+    def _repack_if_needed(self):
+        if self._is_packed():
+            return
+        source_params, target_params = _slots(self.source), _slots(self.target)
+        source_buffers, target_buffers = _slots(self.source, True), _slots(self.target, True)
+        assert len(source_params) == len(target_params), "source and target networks differ"
+        assert len(source_buffers) == len(target_buffers), "source and target networks differ"
+
+        params, floating_buffers, other_buffers = [], [], []
+        checks = []
+
+        def pack(source_slots, target_slots):
+            # the target tensors take the layout of the source ones, so that the buffers line up
+            orders = [_memory_order(getattr(*slot)) for slot in source_slots]
+            flats = _pack([getattr(*slot) for slot in source_slots], orders), \
+                _pack([getattr(*slot) for slot in target_slots], orders)
+            checks.extend([(source_slots[0], flats[0].data_ptr()), (target_slots[0], flats[1].data_ptr())])
+            return flats
+
+        for s, t in _group(source_params, target_params):
+            params.append(pack(s, t))
+        for s, t in _group(source_buffers, target_buffers):
+            if getattr(*s[0]).is_floating_point():
+                floating_buffers.append(pack(s, t))
+            else:
+                # e.g. the num_batches_tracked counters of BatchNorm
+                pairs = [(getattr(*a), getattr(*b)) for a, b in zip(s, t)]
+                checks.extend([(s[0], pairs[0][0].data_ptr()), (t[0], pairs[0][1].data_ptr())])
+                other_buffers += pairs
+        self._packed = params, floating_buffers, other_buffers
+        self._checks = checks
+
+    @property
+    def flat_buffers(self):
+        """
+        :return: ([(torch.Tensor, torch.Tensor)]) the (source, target) flat parameter buffers,
+            one pair per dtype and device
+        """
+        self._repack_if_needed()
+        return self._packed[0]
+
+    @torch.no_grad()
+    def update(self, tau):
+        """
+        target = target * (1 - tau) + source * tau
+        :param tau: (float) 1 copies the source
+        """
+        self._repack_if_needed()
+        params, floating_buffers, other_buffers = self._packed
+        for source, target in params:
+            if tau == 1:
+                target.copy_(source)
+            else:
+                target.lerp_(source, tau)
+        for source, target in floating_buffers:
+            target.copy_(source)
+        for source, target in other_buffers:
+            target.copy_(source)
+
+    def copy(self):
+        """Hard update, the target network becomes a copy of the source one."""
+        self.update(1)
+
+    def __getstate__(self):
+        # the flat buffers are rebuilt from the modules on the first update
+        state = self.__dict__.copy()
+        state['_packed'] = None
+        state['_checks'] = None
+        return state
@@ -0,0 +1,180 @@
+import warnings
+
+import torch
+
+from rlkit.torch.td3.td3 import TD3Trainer
+
+
+class CudaGraphStep(object):
+    """
+    A training step replayed from a CUDA graph.
+
+    The first calls run eagerly on a side stream, so the optimizers create their
+    state, then the step is captured into a graph with static input tensors.
+    Later calls copy their inputs into them and replay the graph, the forward,
+    backward, optimizer step and target updates of the step being one launch.
+    The outputs are static tensors, overwritten by the next replay.
+
+    Inputs whose shapes differ from the captured ones run eagerly, as does
+    everything after a failed capture.
+    :param fn: the step, a function of tensors (or None) that returns tensors
+    :param num_warmup_steps: (int) eager calls before the capture
+    :param pool: memory pool shared with the graphs of the other steps
+    :param before_capture: function called before the capture, e.g. to set the gradients to None
+    """
+
+    def __init__(self, fn, num_warmup_steps=3, pool=None, before_capture=None):
+        self.fn = fn
+        self.num_warmup_steps = num_warmup_steps
+        self.pool = pool
+        self.before_capture = before_capture
+        self.graph = None
+        self.static_inputs = None
+        self.static_outputs = None
+        self.failed = False
+        self._num_calls = 0
+
+    def _shapes_match(self, inputs):
+        for static, x in zip(self.static_inputs, inputs):
+            if (static is None) != (x is None) or (x is not None and static.shape != x.shape):
+                return False
+        return True
+
+    def _capture(self, inputs):
+        self.static_inputs = [None if x is None else x.clone() for x in inputs]
+        if self.before_capture is not None:
+            self.before_capture()
+        graph = torch.cuda.CUDAGraph()
+        try:
+            with torch.cuda.graph(graph, pool=self.pool):
+                self.static_outputs = self.fn(*self.static_inputs)
+        except RuntimeError as e:
+            warnings.warn("CUDA graph capture failed, running the step eagerly: {}".format(e))
+            self.failed = True
+            return
+        self.graph = graph
+
+    def __call__(self, *inputs):
+        self._num_calls += 1
+        if self.failed or (self.graph is not None and not self._shapes_match(inputs)):
+            return self.fn(*inputs)
+        if self.graph is None and self._num_calls <= self.num_warmup_steps:
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                outputs = self.fn(*inputs)
+            torch.cuda.current_stream().wait_stream(stream)
+            return outputs
+        if self.graph is None:
+            self._capture(inputs)
+            if self.failed:
+                return self.fn(*inputs)
+        for static, x in zip(self.static_inputs, inputs):
+            if x is not None:
+                static.copy_(x)
+        self.graph.replay()
+        return self.static_outputs
+
+
+class CompiledTD3Trainer(TD3Trainer):
+    """
+    TD3 with the critic update and the delayed actor update each compiled into
+    one function of static shapes, the optimizer steps and target network
+    updates included.
+
+    On CUDA the two updates are captured as CUDA graphs (see CudaGraphStep),
+    which needs capturable optimizers and no loss scaling, so float16 mixed
+    precision uses torch.compile instead. An update whose capture fails runs
+    eagerly. On CPU they are compiled with torch.compile(dynamic=False), the ops
+    dynamo cannot trace running eagerly between the compiled graphs. Without
+    torch.compile the trainer is the eager TD3Trainer.
+
+    The batch size, image size and action dimension must stay fixed, a batch of
+    another shape runs eagerly (graphs) or triggers a recompilation (compile).
+    """
+
+    def __init__(
+            self,
+            *args,
+            use_cuda_graphs=None,
+            compile_backend='inductor',
+            num_warmup_steps=3,
+            **kwargs
+    ):
+        """
+        :param use_cuda_graphs: (bool) capture CUDA graphs, by default when the networks are on CUDA
+        :param compile_backend: (str) the torch.compile backend
+        :param num_warmup_steps: (int) eager steps of each update before its CUDA graph is captured
+        """
+        super().__init__(*args, **kwargs)
+        self.use_cuda_graphs = use_cuda_graphs
+        self.compile_backend = compile_backend
+        self.num_warmup_steps = num_warmup_steps
+        self._compiled_critic_update = None
+        self._compiled_actor_update = None
+
+    @property
+    def optimizers(self):
+        if self.use_ensemble or self.shared_encoder:
+            return [self.qf_optimizer, self.policy_optimizer]
+        return [self.qf1_optimizer, self.qf2_optimizer, self.policy_optimizer]
+
+    def _build(self):
+        use_cuda_graphs = self.use_cuda_graphs
+        if use_cuda_graphs is None:
+            use_cuda_graphs = next(self.policy.parameters()).is_cuda
+        if use_cuda_graphs and self.mixed_precision.use_scaler:
+            # GradScaler reads the overflow flag back on the host
+            warnings.warn("float16 loss scaling cannot be captured in a CUDA graph, using torch.compile")
+            use_cuda_graphs = False
+
+        critic_update = super()._critic_update
+        actor_update = super()._actor_update
+        if use_cuda_graphs:
+            for optimizer in self.optimizers:
+                if 'capturable' in optimizer.defaults:
+                    for group in optimizer.param_groups:
+                        group['capturable'] = True
+            pool = torch.cuda.graph_pool_handle()
+            self._compiled_critic_update = CudaGraphStep(
+                critic_update, self.num_warmup_steps, pool, self._set_grads_to_none)
+            self._compiled_actor_update = CudaGraphStep(
+                actor_update, self.num_warmup_steps, pool, self._set_grads_to_none)
+        elif hasattr(torch, 'compile'):
+            self._compiled_critic_update = self._compile(critic_update)
+            self._compiled_actor_update = self._compile(actor_update)
+        else:
+            warnings.warn("torch.compile is not available, training eagerly")
+            self._compiled_critic_update = critic_update
+            self._compiled_actor_update = actor_update
+
+    def _compile(self, fn):
+        compiled = torch.compile(fn, backend=self.compile_backend, dynamic=False)
+
+        def step(*inputs):
+            # frames dynamo fails to compile run eagerly instead of raising
+            with torch._dynamo.config.patch(suppress_errors=True):
+                return compiled(*inputs)
+        return step
+
+    def _set_grads_to_none(self):
+        # the gradients of a captured backward are allocated in the graph's memory pool
+        for optimizer in self.optimizers:
+            optimizer.zero_grad(set_to_none=True)
+
+    def _critic_update(self, obs, actions, next_obs, rewards, terminals, noise):
+        if self._compiled_critic_update is None:
+            self._build()
+        return self._compiled_critic_update(obs, actions, next_obs, rewards, terminals, noise)
+
+    def _actor_update(self, obs, features=None):
+        if self._compiled_actor_update is None:
+            self._build()
+        return self._compiled_actor_update(obs, features)
+
+    def __getstate__(self):
+        # compiled functions and graphs are rebuilt on the first step
+        state = super().__getstate__()
+        state['_compiled_critic_update'] = None
+        state['_compiled_actor_update'] = None
+        return state
@@ -1,12 +1,13 @@
 from collections import OrderedDict
 
-import numpy as np
 import torch
 import torch.optim as optim
 from torch import nn as nn
 
 import rlkit.torch.pytorch_util as ptu
-from rlkit.core.eval_util import create_stats_ordered_dict
+from rlkit.torch.conv_networks import SharedEncoderPolicy
+from rlkit.torch.metrics import MetricsAccumulator
+from rlkit.torch.target_network import TargetNetwork
 from rlkit.torch.torch_rl_algorithm import TorchTrainer
 
 
@@ -18,11 +19,11 @@ class TD3Trainer(TorchTrainer):
     def __init__(
             self,
             policy,
-            qf1,
-            qf2,
-            target_qf1,
-            target_qf2,
-            target_policy,
+            qf1=None,
+            qf2=None,
+            target_qf1=None,
+            target_qf2=None,
+            target_policy=None,
             target_policy_noise=0.2,
             target_policy_noise_clip=0.5,
 
@@ -35,8 +36,39 @@ class TD3Trainer(TorchTrainer):
             tau=0.005,
             qf_criterion=None,
             optimizer_class=optim.Adam,
+
+            qf_ensemble=None,
+            target_qf_ensemble=None,
+            target_q_reduction='min',
+
+            encoder_tau=None,
     ):
+        """
+        The critics are either qf1/qf2 with their targets, or a CriticEnsemble
+        given as qf_ensemble/target_qf_ensemble that replaces them. The ensemble is
+        trained with a single optimizer and its target Q values are reduced
+        over the critics with target_q_reduction, 'min' or 'mean'.
+
+        If the policy is a SharedEncoderPolicy, qf1/qf2 must be SharedEncoderQf
+        built on the same ConvEncoder, and the target networks on a second, target
+        encoder. Each batch is then encoded once for all the heads. The encoder is
+        trained by the critics, and by the policy unless its detach_encoder is set.
+        The target encoder is updated with encoder_tau, by default tau.
+        """
         super().__init__()
+        assert target_policy is not None
+        self.use_ensemble = qf_ensemble is not None
+        self.shared_encoder = isinstance(policy, SharedEncoderPolicy)
+        if self.use_ensemble:
+            assert target_qf_ensemble is not None
+            assert target_q_reduction in ('min', 'mean')
+            assert not self.shared_encoder, "a CriticEnsemble has its own conv layers"
+        else:
+            assert None not in (qf1, qf2, target_qf1, target_qf2)
+        if self.shared_encoder:
+            assert qf1.encoder is qf2.encoder is policy.encoder
+            assert target_qf1.encoder is target_qf2.encoder is target_policy.encoder
+            assert policy.encoder is not target_policy.encoder
         if qf_criterion is None:
             qf_criterion = nn.MSELoss()
         self.qf1 = qf1
@@ -45,6 +77,9 @@ class TD3Trainer(TorchTrainer):
         self.target_policy = target_policy
         self.target_qf1 = target_qf1
         self.target_qf2 = target_qf2
+        self.qf_ensemble = qf_ensemble
+        self.target_qf_ensemble = target_qf_ensemble
+        self.target_q_reduction = target_q_reduction
         self.target_policy_noise = target_policy_noise
         self.target_policy_noise_clip = target_policy_noise_clip
 
@@ -53,24 +88,64 @@ class TD3Trainer(TorchTrainer):
 
         self.policy_and_target_update_period = policy_and_target_update_period
         self.tau = tau
+        self.encoder_tau = tau if encoder_tau is None else encoder_tau
         self.qf_criterion = qf_criterion
 
-        self.qf1_optimizer = optimizer_class(
-            self.qf1.parameters(),
-            lr=qf_learning_rate,
-        )
-        self.qf2_optimizer = optimizer_class(
-            self.qf2.parameters(),
-            lr=qf_learning_rate,
-        )
+        if self.use_ensemble:
+            self.qf_optimizer = optimizer_class(
+                self.qf_ensemble.parameters(),
+                lr=qf_learning_rate,
+            )
+        elif self.shared_encoder:
+            self.qf_optimizer = optimizer_class(
+                list(self.policy.encoder.parameters()) +
+                list(self.qf1.head.parameters()) +
+                list(self.qf2.head.parameters()),
+                lr=qf_learning_rate,
+            )
+        else:
+            self.qf1_optimizer = optimizer_class(
+                self.qf1.parameters(),
+                lr=qf_learning_rate,
+            )
+            self.qf2_optimizer = optimizer_class(
+                self.qf2.parameters(),
+                lr=qf_learning_rate,
+            )
         self.policy_optimizer = optimizer_class(
-            self.policy.parameters(),
+            self.policy.trainable_parameters() if self.shared_encoder else self.policy.parameters(),
             lr=policy_learning_rate,
         )
 
-        self.eval_statistics = OrderedDict()
+        if self.shared_encoder:
+            # the encoders are left out of the heads' updates, they have their own rate
+            self.target_networks = [
+                TargetNetwork(self.policy.head, self.target_policy.head),
+                TargetNetwork(self.qf1.head, self.target_qf1.head),
+                TargetNetwork(self.qf2.head, self.target_qf2.head),
+            ]
+            self.encoder_target_network = TargetNetwork(self.policy.encoder, self.target_policy.encoder)
+        else:
+            self.target_networks = [TargetNetwork(self.policy, self.target_policy)]
+        if self.use_ensemble:
+            self.target_networks.append(TargetNetwork(self.qf_ensemble, self.target_qf_ensemble))
+        elif not self.shared_encoder:
+            self.target_networks.append(TargetNetwork(self.qf1, self.target_qf1))
+            self.target_networks.append(TargetNetwork(self.qf2, self.target_qf2))
+
+        num_critics = self.qf_ensemble.num_critics if self.use_ensemble else 2
+        # statistics over every step of the epoch, read back once at its end
+        self.metrics = MetricsAccumulator()
+        for i in range(num_critics):
+            self.metrics.declare('QF%d Loss' % (i + 1), mean_only=True)
+        self.metrics.declare('Policy Loss', mean_only=True)
+        for i in range(num_critics):
+            self.metrics.declare('Q%d Predictions' % (i + 1))
+        self.metrics.declare('Q Targets')
+        for i in range(num_critics):
+            self.metrics.declare('Bellman Errors %d' % (i + 1))
+        self.metrics.declare('Policy Action', per_column=True)
         self._n_train_steps_total = 0
-        self._need_to_update_eval_statistics = True
 
     def train_from_torch(self, batch):
         rewards = batch['rewards']
@@ -79,29 +154,92 @@ class TD3Trainer(TorchTrainer):
         actions = batch['actions']
         next_obs = batch['next_observations']
 
-        """
-        Critic operations.
-        """
-        next_actions = self.target_policy(next_obs)
-        noise = ptu.randn(next_actions.shape) * self.target_policy_noise
+        # the target policy smoothing noise, next actions have the shape of actions
+        noise = ptu.randn(actions.shape) * self.target_policy_noise
         noise = torch.clamp(
             noise,
             -self.target_policy_noise_clip,
             self.target_policy_noise_clip
         )
-        noisy_next_actions = next_actions + noise
 
-        target_q1_values = self.target_qf1(next_obs, noisy_next_actions)
-        target_q2_values = self.target_qf2(next_obs, noisy_next_actions)
-        target_q_values = torch.min(target_q1_values, target_q2_values)
+        q_target, q_preds, bellman_errors, qf_losses, features = self._critic_update(
+            obs, actions, next_obs, rewards, terminals, noise)
+
+        for i, (q_pred, bellman_error, qf_loss) in enumerate(zip(q_preds, bellman_errors, qf_losses)):
+            self.metrics.add('QF%d Loss' % (i + 1), qf_loss)
+            self.metrics.add('Q%d Predictions' % (i + 1), q_pred)
+            self.metrics.add('Bellman Errors %d' % (i + 1), bellman_error)
+        self.metrics.add('Q Targets', q_target)
+
+        if self._n_train_steps_total % self.policy_and_target_update_period == 0:
+            policy_actions, policy_loss = self._actor_update(obs, features)
+            self.metrics.add('Policy Loss', policy_loss)
+            self.metrics.add('Policy Action', policy_actions)
+        self._n_train_steps_total += 1
+
+    def _critic_update(self, obs, actions, next_obs, rewards, terminals, noise):
+        """
+        One gradient step of the critics.
+        :return: the Q targets, and the Q predictions, Bellman errors and losses of every
+            critic, then the features of obs if the encoder is shared, otherwise None
+        """
+        features = next_features = None
+        with self.mixed_precision.autocast():
+            if self.shared_encoder:
+                features = self.policy.encoder(obs)
+                with torch.no_grad():
+                    next_features = self.target_policy.encoder(next_obs)
+                next_actions = self.target_policy.forward_features(next_features)
+            else:
+                next_actions = self.target_policy(next_obs)
+        noisy_next_actions = next_actions.float() + noise
+
+        if self.use_ensemble:
+            q_target, q_preds, bellman_errors, qf_losses = self._train_ensemble(
+                obs, actions, next_obs, noisy_next_actions, rewards, terminals)
+        elif self.shared_encoder:
+            q_target, q_preds, bellman_errors, qf_losses = self._train_shared_encoder_critics(
+                features, actions, next_features, noisy_next_actions, rewards, terminals)
+        else:
+            q_target, q_preds, bellman_errors, qf_losses = self._train_twin_critics(
+                obs, actions, next_obs, noisy_next_actions, rewards, terminals)
+        if features is not None:
+            features = features.detach()
+        return q_target, q_preds, bellman_errors, qf_losses, features
+
+    def _actor_update(self, obs, features=None):
+        """
+        The delayed policy step, followed by the update of the target networks.
+        :return: the policy actions and the policy loss
+        """
+        policy_actions, q_output = self._policy_actions_and_q_values(obs, features)
+        policy_loss = - q_output.mean()
+
+        self.policy_optimizer.zero_grad()
+        self.mixed_precision.step(policy_loss, self.policy_optimizer)
+
+        for target_network in self.target_networks:
+            target_network.update(self.tau)
+        if self.shared_encoder:
+            self.encoder_target_network.update(self.encoder_tau)
+        return policy_actions.detach(), policy_loss.detach()
+
+    def _train_twin_critics(self, obs, actions, next_obs, noisy_next_actions, rewards, terminals):
+        with self.mixed_precision.autocast():
+            target_q1_values = self.target_qf1(next_obs, noisy_next_actions)
+            target_q2_values = self.target_qf2(next_obs, noisy_next_actions)
+            q1_pred = self.qf1(obs, actions)
+            q2_pred = self.qf2(obs, actions)
+        # the losses are computed in fp32
+        target_q_values = torch.min(target_q1_values, target_q2_values).float()
         q_target = self.reward_scale * rewards + (1. - terminals) * self.discount * target_q_values
         q_target = q_target.detach()
 
-        q1_pred = self.qf1(obs, actions)
+        q1_pred = q1_pred.float()
         bellman_errors_1 = (q1_pred - q_target) ** 2
         qf1_loss = bellman_errors_1.mean()
 
-        q2_pred = self.qf2(obs, actions)
+        q2_pred = q2_pred.float()
         bellman_errors_2 = (q2_pred - q_target) ** 2
         qf2_loss = bellman_errors_2.mean()
 
@@ -109,84 +247,96 @@ class TD3Trainer(TorchTrainer):
         Update Networks
         """
         self.qf1_optimizer.zero_grad()
-        qf1_loss.backward()
-        self.qf1_optimizer.step()
+        self.mixed_precision.step(qf1_loss, self.qf1_optimizer)
 
         self.qf2_optimizer.zero_grad()
-        qf2_loss.backward()
-        self.qf2_optimizer.step()
+        self.mixed_precision.step(qf2_loss, self.qf2_optimizer)
 
-        policy_actions = policy_loss = None
-        if self._n_train_steps_total % self.policy_and_target_update_period == 0:
-            policy_actions = self.policy(obs)
-            q_output = self.qf1(obs, policy_actions)
-            policy_loss = - q_output.mean()
-
-            self.policy_optimizer.zero_grad()
-            policy_loss.backward()
-            self.policy_optimizer.step()
-
-            ptu.soft_update_from_to(self.policy, self.target_policy, self.tau)
-            ptu.soft_update_from_to(self.qf1, self.target_qf1, self.tau)
-            ptu.soft_update_from_to(self.qf2, self.target_qf2, self.tau)
-
-        # NOTE: Evaluation is run at the end of every epoch
-        if self._need_to_update_eval_statistics:
-            self._need_to_update_eval_statistics = False
-            if policy_loss is None:
-                policy_actions = self.policy(obs)
-                q_output = self.qf1(obs, policy_actions)
-                policy_loss = - q_output.mean()
-
-            self.eval_statistics['QF1 Loss'] = np.mean(ptu.get_numpy(qf1_loss))
-            self.eval_statistics['QF2 Loss'] = np.mean(ptu.get_numpy(qf2_loss))
-            self.eval_statistics['Policy Loss'] = np.mean(ptu.get_numpy(
-                policy_loss
-            ))
-            self.eval_statistics.update(create_stats_ordered_dict(
-                'Q1 Predictions',
-                ptu.get_numpy(q1_pred),
-            ))
-            self.eval_statistics.update(create_stats_ordered_dict(
-                'Q2 Predictions',
-                ptu.get_numpy(q2_pred),
-            ))
-            self.eval_statistics.update(create_stats_ordered_dict(
-                'Q Targets',
-                ptu.get_numpy(q_target),
-            ))
-            self.eval_statistics.update(create_stats_ordered_dict(
-                'Bellman Errors 1',
-                ptu.get_numpy(bellman_errors_1),
-            ))
-            self.eval_statistics.update(create_stats_ordered_dict(
-                'Bellman Errors 2',
-                ptu.get_numpy(bellman_errors_2),
-            ))
-            for i in range(policy_actions.shape[1]):
-                self.eval_statistics.update(create_stats_ordered_dict(
-                    'Policy Action%s' % i,
-                    ptu.get_numpy(policy_actions[:, i:i+1]),
-                ))
-            
-            # NOTE: The messy list comprehension here was not working.
-            #       While I love logging, I don't think its worth the energy to figure this out.
-            """
-            policy_grads = np.array([np.linalg.norm(ptu.get_numpy(a.grad)) if a.grad is not None else [0] for a in self.policy.parameters()]).flatten()
-            pg_stats = OrderedDict({})
-            pg_stats["Policy Gradient Norm/Mean"] = np.mean(policy_grads)
-            self.eval_statistics.update(pg_stats)
-            """
-        self._n_train_steps_total += 1
+        return q_target, [q1_pred, q2_pred], [bellman_errors_1, bellman_errors_2], [qf1_loss, qf2_loss]
+
+    def _train_ensemble(self, obs, actions, next_obs, noisy_next_actions, rewards, terminals):
+        with self.mixed_precision.autocast():
+            # [num_critics, batch, 1]
+            target_q_values = self.target_qf_ensemble(next_obs, noisy_next_actions)
+            q_pred = self.qf_ensemble(obs, actions)
+        target_q_values = target_q_values.float()
+        if self.target_q_reduction == 'min':
+            target_q_values = target_q_values.min(dim=0)[0]
+        else:
+            target_q_values = target_q_values.mean(dim=0)
+        q_target = self.reward_scale * rewards + (1. - terminals) * self.discount * target_q_values
+        q_target = q_target.detach()
+
+        q_pred = q_pred.float()
+        bellman_errors = (q_pred - q_target) ** 2
+        qf_losses = bellman_errors.mean(dim=(1, 2))
+
+        # the critics do not share weights, so the gradient of the sum is each critic's own
+        self.qf_optimizer.zero_grad()
+        self.mixed_precision.step(qf_losses.sum(), self.qf_optimizer)
+
+        return q_target, list(q_pred), list(bellman_errors), list(qf_losses)
+
+    def _train_shared_encoder_critics(self, features, actions, next_features, noisy_next_actions,
+                                      rewards, terminals):
+        with self.mixed_precision.autocast():
+            target_q1_values = self.target_qf1.forward_features(next_features, noisy_next_actions)
+            target_q2_values = self.target_qf2.forward_features(next_features, noisy_next_actions)
+            q1_pred = self.qf1.forward_features(features, actions)
+            q2_pred = self.qf2.forward_features(features, actions)
+        target_q_values = torch.min(target_q1_values, target_q2_values).float()
+        q_target = self.reward_scale * rewards + (1. - terminals) * self.discount * target_q_values
+        q_target = q_target.detach()
+
+        q1_pred = q1_pred.float()
+        bellman_errors_1 = (q1_pred - q_target) ** 2
+        qf1_loss = bellman_errors_1.mean()
+
+        q2_pred = q2_pred.float()
+        bellman_errors_2 = (q2_pred - q_target) ** 2
+        qf2_loss = bellman_errors_2.mean()
+
+        # one optimizer, the encoder gets the gradients of both critics
+        self.qf_optimizer.zero_grad()
+        self.mixed_precision.step(qf1_loss + qf2_loss, self.qf_optimizer)
+
+        return q_target, [q1_pred, q2_pred], [bellman_errors_1, bellman_errors_2], [qf1_loss, qf2_loss]
+
+    def _policy_actions_and_q_values(self, obs, features=None):
+        with self.mixed_precision.autocast():
+            policy_actions, q_values = self._policy_forward(obs, features)
+        return policy_actions.float(), q_values.float()
+
+    def _policy_forward(self, obs, features):
+        if self.shared_encoder:
+            if self.policy.detach_encoder:
+                features = features.detach()
+            else:
+                # the critic step changed the encoder in place, so encode again to backpropagate into it
+                features = self.policy.encoder(obs)
+            policy_actions = self.policy.forward_features(features)
+            return policy_actions, self.qf1.forward_features(features, policy_actions)
+        policy_actions = self.policy(obs)
+        if self.use_ensemble:
+            return policy_actions, self.qf_ensemble(obs, policy_actions, critic=0)[0]
+        return policy_actions, self.qf1(obs, policy_actions)
 
     def get_diagnostics(self):
-        return self.eval_statistics
+        return OrderedDict(self.metrics.read())
 
     def end_epoch(self, epoch):
-        self._need_to_update_eval_statistics = True
+        self.metrics.reset()
 
     @property
     def networks(self):
+        # the shared encoders are submodules of the policies and critics
+        if self.use_ensemble:
+            return [
+                self.policy,
+                self.qf_ensemble,
+                self.target_policy,
+                self.target_qf_ensemble,
+            ]
         return [
             self.policy,
             self.qf1,
@@ -197,6 +347,13 @@ class TD3Trainer(TorchTrainer):
         ]
 
     def get_snapshot(self):
+        if self.use_ensemble:
+            return dict(
+                qf_ensemble=self.qf_ensemble,
+                trained_policy=self.policy,
+                target_policy=self.target_policy,
+                algorithm=self
+            )
         return dict(
             qf1=self.qf1,
             qf2=self.qf2,
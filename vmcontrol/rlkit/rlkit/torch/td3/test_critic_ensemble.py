@@ -0,0 +1,100 @@
+"""
+Tests for the stacked critics of CriticEnsemble and the ensemble option of TD3Trainer.
+"""
+
+import copy
+
+import numpy as np
+import torch
+
+from rlkit.torch.conv_networks import CriticEnsemble, FlattenCNN, TanhCNNPolicy
+from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.torch.td3.testing import ACTION_DIM, CONV_ARGS, CRITIC_ARGS, make_batch
+
+
+def test_ensemble_matches_critics():
+    torch.manual_seed(0)
+    critics = [FlattenCNN(**CRITIC_ARGS) for _ in range(3)]
+    ensemble = CriticEnsemble.from_critics(critics)
+    batch = make_batch()
+    obs, actions = batch['observations'], batch['actions']
+
+    q_values = ensemble(obs, actions)
+    assert q_values.shape == (3, 16, 1)
+    for i, critic in enumerate(critics):
+        expected = critic(obs, actions)
+        assert torch.allclose(q_values[i], expected, atol=1e-6)
+        assert torch.allclose(ensemble(obs, actions, critic=i)[0], expected, atol=1e-6)
+
+
+def test_default_init_matches_flatten_cnn():
+    torch.manual_seed(0)
+    ensemble = CriticEnsemble(2, **CRITIC_ARGS)
+    torch.manual_seed(0)
+    critics = [FlattenCNN(**CRITIC_ARGS) for _ in range(2)]
+    batch = make_batch()
+    q_values = ensemble(batch['observations'], batch['actions'])
+    for i, critic in enumerate(critics):
+        assert torch.allclose(q_values[i], critic(batch['observations'], batch['actions']), atol=1e-6)
+
+
+def make_trainers():
+    torch.manual_seed(0)
+    policy = TanhCNNPolicy(output_size=ACTION_DIM, **CONV_ARGS)
+    critics = [FlattenCNN(**CRITIC_ARGS) for _ in range(2)]
+    target_critics = [FlattenCNN(**CRITIC_ARGS) for _ in range(2)]
+    twin_trainer = TD3Trainer(
+        policy=copy.deepcopy(policy),
+        target_policy=copy.deepcopy(policy),
+        qf1=copy.deepcopy(critics[0]),
+        qf2=copy.deepcopy(critics[1]),
+        target_qf1=copy.deepcopy(target_critics[0]),
+        target_qf2=copy.deepcopy(target_critics[1]),
+        policy_and_target_update_period=1,
+    )
+    ensemble_trainer = TD3Trainer(
+        policy=copy.deepcopy(policy),
+        target_policy=copy.deepcopy(policy),
+        qf_ensemble=CriticEnsemble.from_critics(critics),
+        target_qf_ensemble=CriticEnsemble.from_critics(target_critics),
+        policy_and_target_update_period=1,
+    )
+    return twin_trainer, ensemble_trainer
+
+
+def test_td3_steps_match_twin_critics():
+    twin_trainer, ensemble_trainer = make_trainers()
+    for step in range(3):
+        for trainer in [twin_trainer, ensemble_trainer]:
+            # same target policy noise for both trainers
+            torch.manual_seed(step)
+            trainer.train_from_torch(make_batch(seed=step))
+
+    batch = make_batch(seed=10)
+    obs, actions = batch['observations'], batch['actions']
+    q_values = ensemble_trainer.qf_ensemble(obs, actions)
+    target_q_values = ensemble_trainer.target_qf_ensemble(obs, actions)
+    for i, (qf, target_qf) in enumerate([
+        (twin_trainer.qf1, twin_trainer.target_qf1),
+        (twin_trainer.qf2, twin_trainer.target_qf2),
+    ]):
+        assert torch.allclose(q_values[i], qf(obs, actions), atol=1e-5)
+        assert torch.allclose(target_q_values[i], target_qf(obs, actions), atol=1e-5)
+    assert torch.allclose(ensemble_trainer.policy(obs), twin_trainer.policy(obs), atol=1e-5)
+    for key in ['QF1 Loss', 'QF2 Loss', 'Policy Loss']:
+        assert np.isclose(ensemble_trainer.get_diagnostics()[key],
+                          twin_trainer.get_diagnostics()[key], atol=1e-5)
+
+
+def test_mean_target_reduction():
+    torch.manual_seed(0)
+    policy = TanhCNNPolicy(output_size=ACTION_DIM, **CONV_ARGS)
+    trainer = TD3Trainer(
+        policy=policy,
+        target_policy=copy.deepcopy(policy),
+        qf_ensemble=CriticEnsemble(5, **CRITIC_ARGS),
+        target_qf_ensemble=CriticEnsemble(5, **CRITIC_ARGS),
+        target_q_reduction='mean',
+    )
+    trainer.train_from_torch(make_batch())
+    assert 'QF5 Loss' in trainer.get_diagnostics()
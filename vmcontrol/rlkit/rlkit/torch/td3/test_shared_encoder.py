@@ -0,0 +1,91 @@
+"""
+Tests for TD3Trainer with actor and critic heads on a shared ConvEncoder.
+"""
+
+import torch
+from torch import nn as nn
+
+from rlkit.torch.conv_networks import ConvEncoder, SharedEncoderQf, TanhSharedEncoderPolicy
+from rlkit.torch.td3 import testing
+from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.torch.td3.testing import ACTION_DIM, CONV_ARGS
+
+GOAL_DIM = 3
+OBS_DIM = testing.OBS_DIM + GOAL_DIM
+
+ENCODER_ARGS = {k: v for k, v in CONV_ARGS.items() if k != 'hidden_sizes'}
+ENCODER_ARGS['added_input_size'] = GOAL_DIM
+HEAD_ARGS = dict(hidden_sizes=[32, 32], hidden_activation=nn.ReLU())
+
+
+def make_networks(detach_encoder):
+    encoder = ConvEncoder(**ENCODER_ARGS)
+    policy = TanhSharedEncoderPolicy(encoder, output_size=ACTION_DIM, detach_encoder=detach_encoder, **HEAD_ARGS)
+    qf1 = SharedEncoderQf(encoder, added_fc_input_size=ACTION_DIM, **HEAD_ARGS)
+    qf2 = SharedEncoderQf(encoder, added_fc_input_size=ACTION_DIM, **HEAD_ARGS)
+    return policy, qf1, qf2
+
+
+def make_trainer(detach_encoder=True, encoder_tau=None):
+    torch.manual_seed(0)
+    policy, qf1, qf2 = make_networks(detach_encoder)
+    target_policy, target_qf1, target_qf2 = make_networks(detach_encoder)
+    return TD3Trainer(
+        policy=policy,
+        qf1=qf1,
+        qf2=qf2,
+        target_policy=target_policy,
+        target_qf1=target_qf1,
+        target_qf2=target_qf2,
+        policy_and_target_update_period=1,
+        encoder_tau=encoder_tau,
+    )
+
+
+def make_batch(batch_size=16, seed=0):
+    batch = testing.make_batch(batch_size, seed, obs_dim=OBS_DIM)
+    batch['resampled_goals'] = torch.zeros(batch_size, GOAL_DIM)
+    return batch
+
+
+def count_encoder_calls(trainer):
+    calls = []
+    for encoder in [trainer.policy.encoder, trainer.target_policy.encoder]:
+        encoder.register_forward_hook(lambda *_: calls.append(1))
+    trainer.train_from_torch(make_batch())
+    return len(calls)
+
+
+def test_batch_encoded_once():
+    trainer = make_trainer(detach_encoder=True)
+    # eval statistics are computed on the first step, they do not encode again either
+    assert count_encoder_calls(trainer) == 2
+
+
+def test_actor_gradients_reencode_observations():
+    trainer = make_trainer(detach_encoder=False)
+    assert count_encoder_calls(trainer) == 3
+
+
+def test_detached_policy_does_not_train_encoder():
+    trainer = make_trainer(detach_encoder=True)
+    optimized = {id(p) for group in trainer.policy_optimizer.param_groups for p in group['params']}
+    assert optimized == {id(p) for p in trainer.policy.head.parameters()}
+    assert all(id(p) not in optimized for p in trainer.policy.encoder.parameters())
+
+
+def test_qf_features_match_forward():
+    policy, qf1, _ = make_networks(detach_encoder=False)
+    batch = make_batch()
+    obs, actions = batch['observations'], batch['actions']
+    assert torch.allclose(qf1(obs, actions), qf1.forward_features(qf1.encoder(obs), actions))
+    assert policy(obs).shape == (16, ACTION_DIM)
+
+
+def test_target_encoder_has_its_own_rate():
+    trainer = make_trainer(encoder_tau=1.)
+    trainer.train_from_torch(make_batch())
+    for p, q in zip(trainer.policy.encoder.parameters(), trainer.target_policy.encoder.parameters()):
+        assert torch.equal(p, q)
+    assert not all(torch.equal(p, q) for p, q in zip(trainer.qf1.head.parameters(),
+                                                     trainer.target_qf1.head.parameters()))
@@ -0,0 +1,58 @@
+"""
+Small CNNs and batches shared by the tests of the TD3 trainers.
+"""
+import copy
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.torch.conv_networks import FlattenCNN, TanhCNNPolicy
+
+OBS_DIM = 3 * 16 * 16
+ACTION_DIM = 4
+
+CONV_ARGS = dict(
+    input_width=16,
+    input_height=16,
+    input_channels=3,
+    kernel_sizes=[4, 3],
+    n_channels=[8, 16],
+    strides=[2, 1],
+    paddings=[0, 0],
+    hidden_sizes=[32, 32],
+    hidden_init=nn.init.orthogonal_,
+    hidden_activation=nn.ReLU(),
+)
+CRITIC_ARGS = dict(output_size=1, added_fc_input_size=ACTION_DIM, **CONV_ARGS)
+
+
+def make_batch(batch_size=16, seed=0, obs_dim=OBS_DIM, device='cpu'):
+    """
+    :return: (dict) a torch batch of random transitions, about one in ten of them terminal
+    """
+    rng = np.random.RandomState(seed)
+    batch = dict(
+        observations=rng.uniform(-1, 1, (batch_size, obs_dim)),
+        next_observations=rng.uniform(-1, 1, (batch_size, obs_dim)),
+        actions=rng.uniform(-1, 1, (batch_size, ACTION_DIM)),
+        rewards=rng.uniform(-1, 0, (batch_size, 1)),
+        terminals=(rng.uniform(size=(batch_size, 1)) > 0.9),
+    )
+    return {k: torch.from_numpy(v).float().to(device) for k, v in batch.items()}
+
+
+def make_networks(device='cpu'):
+    """
+    :return: (dict) the TD3Trainer kwargs of a policy and twin critics, the targets copies of them
+    """
+    policy = TanhCNNPolicy(output_size=ACTION_DIM, **CONV_ARGS).to(device)
+    critics = [FlattenCNN(**CRITIC_ARGS).to(device) for _ in range(2)]
+    return dict(
+        policy=policy,
+        target_policy=copy.deepcopy(policy),
+        qf1=critics[0],
+        qf2=critics[1],
+        target_qf1=copy.deepcopy(critics[0]),
+        target_qf2=copy.deepcopy(critics[1]),
+    )
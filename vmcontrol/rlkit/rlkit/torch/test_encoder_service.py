@@ -0,0 +1,89 @@
+"""
+Tests for the dynamic batching of EncoderService.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+import torch
+from torch import nn as nn
+
+from rlkit.torch.encoder_service import EncoderService
+
+INPUT_SHAPE = (3, 16, 16)
+
+
+def make_encoder():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Conv2d(3, 4, 4, stride=4), nn.ReLU()).eval()
+
+
+def per_frame(encoder, frame):
+    with torch.no_grad():
+        return encoder(torch.from_numpy(frame).float()[None]).numpy().flatten()
+
+
+def frames(n):
+    return np.random.RandomState(0).uniform(0, 1, (n,) + INPUT_SHAPE).astype(np.float32)
+
+
+def test_matches_per_frame_encoding():
+    encoder = make_encoder()
+    service = EncoderService(encoder, INPUT_SHAPE, max_batch_size=8, device='cpu')
+    observations = frames(20)
+    features = service.encode_batch(observations)
+    assert features.shape == (20, 4 * 4 * 4)
+    for frame, feature in zip(observations, features):
+        assert np.allclose(feature, per_frame(encoder, frame), atol=1e-5)
+    # a flat frame works too
+    assert np.allclose(service.encode(observations[0].flatten()), features[0], atol=1e-6)
+    service.close()
+
+
+def test_batches_up_to_max_batch_size():
+    service = EncoderService(make_encoder(), INPUT_SHAPE, max_batch_size=8, max_wait=0.05, device='cpu')
+    service.encode_batch(frames(20))
+    assert max(service.batch_sizes) <= 8
+    assert sum(service.batch_sizes) == 20
+    assert len(service.batch_sizes) < 20
+    service.close()
+
+
+def test_more_frames_than_slots():
+    encoder = make_encoder()
+    service = EncoderService(encoder, INPUT_SHAPE, max_batch_size=4, num_slots=4, device='cpu')
+    observations = frames(13)
+    features = service.encode_batch(observations)
+    assert np.allclose(features[-1], per_frame(encoder, observations[-1]), atol=1e-5)
+    service.close()
+
+
+def test_concurrent_callers():
+    encoder = make_encoder()
+    service = EncoderService(encoder, INPUT_SHAPE, max_batch_size=16, max_wait=0.01, num_slots=16, device='cpu')
+    observations = frames(64)
+    results = [None] * 8
+
+    def caller(i):
+        chunk = observations[8 * i:8 * (i + 1)]
+        results[i] = np.stack([service.encode(f) for f in chunk[:4]] + list(service.encode_batch(chunk[4:])))
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = np.stack([per_frame(encoder, f) for f in observations])
+    assert np.allclose(np.concatenate(results), expected, atol=1e-5)
+    service.close()
+
+
+def test_errors_reach_the_caller():
+    def encoder(frames):
+        raise ValueError("bad frame")
+
+    service = EncoderService(encoder, INPUT_SHAPE, device='cpu')
+    with pytest.raises(RuntimeError):
+        service.encode(frames(1)[0])
+    service.close()
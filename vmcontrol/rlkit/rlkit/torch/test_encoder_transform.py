@@ -0,0 +1,91 @@
+"""
+Tests for the resolution-adaptive mid-level encoder transform.
+"""
+
+import json
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.core.logging import MyEncoder
+from rlkit.torch.encoder_transform import EncoderTransform, feature_drift, profile_resolutions, resize_images
+from rlkit.torch.frame_encoder import FrameEncoder
+
+
+def make_encoder():
+    # fully convolutional, 16x smaller feature maps of 8 channels like the Taskonomy encoders
+    torch.manual_seed(0)
+    return nn.Sequential(nn.AvgPool2d(4), nn.Conv2d(3, 8, 4, stride=4)).eval()
+
+
+def smooth_frames(n, side, seed=0):
+    low_res = torch.from_numpy(np.random.RandomState(seed).uniform(0, 1, (n, 3, 4, 4)).astype(np.float32))
+    return resize_images(low_res, side, mode='bilinear')
+
+
+def test_matches_the_fixed_resolution_t_fn():
+    encoder = make_encoder()
+    obs = smooth_frames(1, 64)[0].numpy().astype(np.float64)
+    # the former t_fn at 64 x 64
+    expected = encoder(torch.tensor(obs * 2 - 1).float().reshape([1, 3, 64, 64])).detach().numpy().flatten()
+    transform = EncoderTransform(encoder, 64)
+    assert np.allclose(transform(obs), expected, atol=1e-6)
+    assert np.allclose(transform.transform(obs), expected, atol=1e-6)
+    assert np.allclose(transform.transform_observation(dict(observation=obs))['observation'], expected, atol=1e-6)
+
+
+def test_resizes_the_rendered_frames():
+    encoder = make_encoder()
+    obs = smooth_frames(1, 128)[0].numpy()
+    features = EncoderTransform(encoder, 64)(obs)
+    assert features.shape == (8 * 4 * 4,)
+    assert np.allclose(features, EncoderTransform(encoder, 64)(resize_images(torch.from_numpy(obs)[None], 64)[0].numpy()),
+                       atol=1e-6)
+    assert EncoderTransform(encoder, 32)(obs).shape == (8 * 2 * 2,)
+
+
+def test_views_are_concatenated_along_the_channels():
+    encoder = make_encoder()
+    front, alt = smooth_frames(2, 64).numpy()
+    transform = EncoderTransform(encoder, 32, num_views=2)
+    features = transform(np.stack([front, alt])).reshape(16, 2, 2)
+    single = EncoderTransform(encoder, 32)
+    assert np.allclose(features[:8].flatten(), single(front), atol=1e-6)
+    assert np.allclose(features[8:].flatten(), single(alt), atol=1e-6)
+
+
+def test_frame_encoder_resizes_the_stored_frames():
+    encoder = make_encoder()
+    frame = smooth_frames(1, 64)[0].numpy()
+    uint8_frame = np.rint(frame * 255).astype(np.uint8).flatten()
+    features = FrameEncoder(encoder, (3, 64, 64), input_resolution=32).encode_np(uint8_frame)
+    assert np.allclose(features, EncoderTransform(encoder, 32)(frame), atol=1e-2)
+
+
+def test_feature_drift():
+    reference = torch.randn(4, 8, 4, 4)
+    drift = feature_drift(reference, reference)
+    assert drift['relative_mse'] == 0. and np.isclose(drift['cosine'], 1.)
+    # smaller feature maps are resized to the reference resolution
+    drift = feature_drift(torch.nn.functional.avg_pool2d(reference, 2), reference)
+    assert 0. < drift['relative_mse'] < 1. and 0. < drift['cosine'] < 1.
+
+
+def test_profile_resolutions():
+    frames = smooth_frames(4, 64)
+    results = profile_resolutions(make_encoder(), frames, [32, 48, 64], reference_resolution=64, repeats=2)
+    assert [r['resolution'] for r in results] == [32, 48, 64]
+    assert [r['feature_shape'] for r in results] == [(8, 2, 2), (8, 3, 3), (8, 4, 4)]
+    assert results[-1]['relative_mse'] < 1e-10
+    assert all(r['latency_ms'] > 0 for r in results)
+    # smooth frames keep most of their features at lower resolutions
+    assert results[0]['cosine'] > 0.5
+
+
+def test_t_fns_can_be_logged():
+    # setup_logger logs the variant that holds them
+    transform = EncoderTransform(make_encoder(), 64)
+    variant = dict(t_fn=transform.transform, main_t_fn=transform.transform_observation)
+    logged = json.loads(json.dumps(variant, cls=MyEncoder))
+    assert logged['t_fn'] == {'$function': 'rlkit.torch.encoder_transform.transform'}
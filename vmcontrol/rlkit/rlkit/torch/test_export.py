@@ -0,0 +1,100 @@
+"""
+Tests for the self-describing TorchScript policy export.
+"""
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.torch.conv_networks import ConvEncoder, TanhChannelsLastCNNPolicy, TanhCNNPolicy, \
+    TanhSharedEncoderPolicy
+from rlkit.torch.export import export_policy, load_exported_policy
+from rlkit.torch.inference import InferencePolicy
+
+ACTION_DIM = 4
+GOAL_DIM = 3
+CONV_ARGS = dict(
+    input_width=16,
+    input_height=16,
+    input_channels=3,
+    kernel_sizes=[4, 3],
+    n_channels=[8, 16],
+    strides=[2, 1],
+    paddings=[0, 0],
+    hidden_sizes=[32, 32],
+    hidden_init=nn.init.orthogonal_,
+    hidden_activation=nn.ReLU(),
+)
+OBSERVATION_SPEC = dict(image_channels=3, image_size=16, goal_dim=GOAL_DIM)
+
+
+def make_policy(policy_class=TanhCNNPolicy):
+    torch.manual_seed(0)
+    return policy_class(output_size=ACTION_DIM, added_fc_input_size=GOAL_DIM, **CONV_ARGS)
+
+
+def observations(n=5, size=3 * 16 * 16 + GOAL_DIM):
+    return torch.from_numpy(np.random.RandomState(0).uniform(-1, 1, (n, size))).float()
+
+
+def test_exported_policy_matches(tmp_path):
+    policy = make_policy()
+    file_name = str(tmp_path / 'policy.pt')
+    export_policy(policy, file_name, observation_spec=OBSERVATION_SPEC)
+    exported, spec = load_exported_policy(file_name)
+    obs = observations()
+    with torch.no_grad():
+        assert torch.allclose(exported(obs), policy(obs), atol=1e-6)
+    assert spec['observation_spec'] == OBSERVATION_SPEC
+    assert spec['input_size'] == obs.shape[1]
+    assert spec['architecture']['policy_class'] == 'TanhCNNPolicy'
+    assert spec['architecture']['hidden_sizes'] == [32, 32]
+    layer_types = [layer['type'] for layer in spec['architecture']['layers']]
+    assert layer_types.count('Conv2d') == 2 and layer_types.count('Linear') == 3
+
+
+def test_shared_encoder_policy(tmp_path):
+    torch.manual_seed(0)
+    conv_args = {k: v for k, v in CONV_ARGS.items() if k != 'hidden_sizes'}
+    encoder = ConvEncoder(added_input_size=GOAL_DIM, **conv_args)
+    policy = TanhSharedEncoderPolicy(encoder, output_size=ACTION_DIM, hidden_sizes=[32, 32])
+    file_name = str(tmp_path / 'policy.pt')
+    spec = export_policy(policy, file_name)
+    exported, _ = load_exported_policy(file_name)
+    obs = observations()
+    with torch.no_grad():
+        assert torch.allclose(exported(obs), policy(obs), atol=1e-6)
+    assert spec['architecture']['encoder_added_input_size'] == GOAL_DIM
+
+
+def test_uint8_policy(tmp_path):
+    policy = make_policy(TanhChannelsLastCNNPolicy)
+    file_name = str(tmp_path / 'policy.pt')
+    spec = export_policy(policy, file_name, input_dtype=torch.uint8)
+    exported, _ = load_exported_policy(file_name)
+    obs = torch.from_numpy(np.random.RandomState(0).randint(0, 256, (5, 3 * 16 * 16 + GOAL_DIM)).astype(np.uint8))
+    with torch.no_grad():
+        assert torch.allclose(exported(obs), policy(obs), atol=1e-5)
+    assert spec['input_dtype'] == 'uint8'
+    assert spec['normalization']['pixel_scale'] == 2. / 255
+
+
+def test_int8_policy_is_close(tmp_path):
+    policy = make_policy()
+    file_name = str(tmp_path / 'policy_int8.pt')
+    spec = export_policy(policy, file_name, int8=True)
+    exported, _ = load_exported_policy(file_name)
+    obs = observations()
+    with torch.no_grad():
+        assert torch.allclose(exported(obs), policy(obs), atol=5e-2)
+    assert spec['int8']
+
+
+def test_inference_policy_wraps_exported_policy(tmp_path):
+    policy = make_policy()
+    file_name = str(tmp_path / 'policy.pt')
+    export_policy(policy, file_name)
+    exported, _ = load_exported_policy(file_name)
+    obs = observations(1)[0].numpy()
+    action, _ = InferencePolicy(exported).get_action(obs)
+    assert np.allclose(action, policy.get_action(obs)[0], atol=1e-6)
@@ -0,0 +1,137 @@
+"""
+Tests for the learner-side encoding of raw uint8 frames.
+"""
+
+import io
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.torch.frame_encoder import FrameEncoder, FrameEncodingPolicy
+from rlkit.torch.torch_rl_algorithm import TorchTrainer
+
+IMAGE_SHAPE = (3, 16, 16)
+FRAME_SIZE = int(np.prod(IMAGE_SHAPE))
+FEATURE_SIZE = 4 * 4 * 4
+
+
+def make_encoder():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Conv2d(3, 4, 4, stride=4), nn.ReLU())
+
+
+def collection_time_features(encoder, frame):
+    # the mid-level t_fn on a [0, 1] frame
+    obs = torch.tensor(frame / 255. * 2 - 1).float().reshape([1, *IMAGE_SHAPE])
+    with torch.no_grad():
+        return encoder(obs).numpy().flatten()
+
+
+def frames(n, num_views=1, seed=0):
+    return np.random.RandomState(seed).randint(0, 256, (n, num_views * FRAME_SIZE)).astype(np.uint8)
+
+
+def test_matches_collection_time_encoding():
+    encoder = make_encoder()
+    frame_encoder = FrameEncoder(encoder, IMAGE_SHAPE)
+    observations = frames(5)
+    features = frame_encoder.encode_np(observations)
+    assert features.shape == (5, FEATURE_SIZE)
+    for frame, feature in zip(observations, features):
+        assert np.allclose(feature, collection_time_features(encoder, frame), atol=1e-5)
+    assert np.allclose(frame_encoder.encode_np(observations[0]), features[0], atol=1e-6)
+
+
+def test_views_are_concatenated():
+    encoder = make_encoder()
+    frame_encoder = FrameEncoder(encoder, IMAGE_SHAPE, num_views=2)
+    observation = frames(1, num_views=2)[0]
+    features = frame_encoder.encode_np(observation)
+    expected = np.concatenate([collection_time_features(encoder, observation[:FRAME_SIZE]),
+                               collection_time_features(encoder, observation[FRAME_SIZE:])])
+    assert np.allclose(features, expected, atol=1e-5)
+
+
+def test_batch_encodes_repeated_frames_once():
+    encoder = make_encoder()
+    frame_encoder = FrameEncoder(encoder, IMAGE_SHAPE)
+    path = frames(9)
+    # consecutive steps of a path, the next observations are the following observations
+    batch = dict(
+        observations=torch.from_numpy(path[:-1]),
+        next_observations=torch.from_numpy(path[1:]),
+        actions=torch.zeros(8, 2),
+    )
+    batch = frame_encoder(batch)
+    assert frame_encoder.num_frames == 16 and frame_encoder.num_encoded == 9
+    assert batch['observations'].shape == (8, FEATURE_SIZE)
+    assert batch['observations'].dtype == torch.float32
+    assert np.allclose(batch['next_observations'][3].numpy(), collection_time_features(encoder, path[4]), atol=1e-5)
+    assert torch.equal(batch['observations'][4], batch['next_observations'][3])
+
+
+def test_unique_falls_back_on_hash_collisions():
+    frame_encoder = FrameEncoder(make_encoder(), IMAGE_SHAPE)
+    observations = torch.from_numpy(frames(6))[[0, 1, 0, 2, 1, 3]]
+    for colliding in [False, True]:
+        if colliding:
+            # every frame gets the same hash
+            frame_encoder._coefficients = torch.zeros(FRAME_SIZE, dtype=torch.int64)
+        unique_frames, inverse = frame_encoder.unique(observations)
+        assert len(unique_frames) == 4
+        assert torch.equal(unique_frames[inverse], observations)
+
+
+def test_blocks_of_batches():
+    frame_encoder = FrameEncoder(make_encoder(), IMAGE_SHAPE)
+    batch = dict(
+        observations=torch.from_numpy(frames(12).reshape(3, 4, -1)),
+        next_observations=torch.from_numpy(frames(12, seed=1).reshape(3, 4, -1)),
+    )
+    batch = frame_encoder(batch)
+    assert batch['observations'].shape == (3, 4, FEATURE_SIZE)
+    assert batch['next_observations'].shape == (3, 4, FEATURE_SIZE)
+
+
+def test_features_can_be_trained_on():
+    frame_encoder = FrameEncoder(make_encoder(), IMAGE_SHAPE)
+    batch = frame_encoder(dict(observations=torch.from_numpy(frames(4)),
+                               next_observations=torch.from_numpy(frames(4, seed=1))))
+    head = nn.Linear(FEATURE_SIZE, 1)
+    head(batch['observations']).sum().backward()
+    assert head.weight.grad is not None
+    assert all(p.grad is None for p in frame_encoder.encoder.parameters())
+
+
+class ConstantPolicy(object):
+    def get_action(self, obs):
+        return obs[:2], {}
+
+
+def test_policy_acts_on_features():
+    frame_encoder = FrameEncoder(make_encoder(), IMAGE_SHAPE)
+    policy = FrameEncodingPolicy(ConstantPolicy(), frame_encoder)
+    frame = frames(1)[0]
+    action, _ = policy.get_action(frame)
+    assert np.allclose(action, frame_encoder.encode_np(frame)[:2])
+
+
+class EncodingTrainer(TorchTrainer):
+    def train_from_torch(self, batch):
+        pass
+
+    @property
+    def networks(self):
+        return []
+
+
+def test_trainer_snapshots_without_the_encoder():
+    # as TorchBatchRLAlgorithm sets it with an observation_encoder
+    frame_encoder = FrameEncoder(make_encoder(), IMAGE_SHAPE)
+    trainer = EncodingTrainer()
+    trainer.batch_decoder = lambda batch: frame_encoder(batch)
+    snapshot = io.BytesIO()
+    torch.save(dict(algorithm=trainer), snapshot)
+    snapshot.seek(0)
+    assert torch.load(snapshot, weights_only=False)['algorithm'].batch_decoder is None
@@ -0,0 +1,80 @@
+"""
+Tests for the single observation inference path of InferencePolicy.
+"""
+
+import pickle
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.torch.conv_networks import TanhChannelsLastCNNPolicy, TanhCNNPolicy
+from rlkit.torch.inference import InferencePolicy
+
+ACTION_DIM = 4
+CONV_ARGS = dict(
+    input_width=16,
+    input_height=16,
+    input_channels=3,
+    kernel_sizes=[4, 3],
+    n_channels=[8, 16],
+    strides=[2, 1],
+    paddings=[0, 0],
+    hidden_sizes=[32, 32],
+    hidden_init=nn.init.orthogonal_,
+    hidden_activation=nn.ReLU(),
+)
+
+
+def make_policy(policy_class=TanhCNNPolicy):
+    torch.manual_seed(0)
+    return policy_class(output_size=ACTION_DIM, **CONV_ARGS)
+
+
+def test_matches_get_action():
+    policy = make_policy()
+    fast_policy = InferencePolicy(policy)
+    rng = np.random.RandomState(0)
+    for _ in range(3):
+        # the layout is flattened like the policy's
+        obs = rng.uniform(-1, 1, (3, 16, 16))
+        action, _ = fast_policy.get_action(obs)
+        expected, _ = policy.get_action(obs.reshape(-1))
+        assert np.allclose(action, expected, atol=1e-6)
+
+
+def test_frozen_copy_follows_weight_changes():
+    policy = make_policy()
+    fast_policy = InferencePolicy(policy, freeze=True)
+    obs = np.random.RandomState(0).uniform(-1, 1, 3 * 16 * 16)
+    action, _ = fast_policy.get_action(obs)
+    assert np.allclose(action, policy.get_action(obs)[0], atol=1e-5)
+    frozen = fast_policy._frozen
+    # unchanged weights reuse the frozen copy
+    fast_policy.get_action(obs)
+    assert fast_policy._frozen is frozen
+
+    with torch.no_grad():
+        for p in policy.parameters():
+            p.mul_(0.5)
+    action, _ = fast_policy.get_action(obs)
+    assert fast_policy._frozen is not frozen
+    assert np.allclose(action, policy.get_action(obs)[0], atol=1e-5)
+
+
+def test_uint8_observations():
+    policy = make_policy(TanhChannelsLastCNNPolicy)
+    fast_policy = InferencePolicy(policy, keep_uint8=True)
+    obs = np.random.RandomState(0).randint(0, 256, (16, 16, 3)).astype(np.uint8)
+    action, _ = fast_policy.get_action(obs)
+    assert fast_policy._device_input.dtype == torch.uint8
+    assert np.allclose(action, policy.get_action(obs.reshape(-1))[0], atol=1e-5)
+
+
+def test_pickles_without_buffers():
+    fast_policy = InferencePolicy(make_policy(), freeze=True)
+    obs = np.zeros(3 * 16 * 16)
+    fast_policy.get_action(obs)
+    restored = pickle.loads(pickle.dumps(fast_policy))
+    assert restored._frozen is None
+    assert np.allclose(restored.get_action(obs)[0], fast_policy.get_action(obs)[0], atol=1e-6)
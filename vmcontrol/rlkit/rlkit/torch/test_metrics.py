@@ -0,0 +1,52 @@
+"""
+Tests for the on-device running statistics of MetricsAccumulator.
+"""
+
+import numpy as np
+import torch
+
+from rlkit.core.eval_util import create_stats_ordered_dict
+from rlkit.torch.metrics import MetricsAccumulator
+
+
+def test_matches_numpy_over_all_steps():
+    rng = np.random.RandomState(0)
+    steps = [rng.normal(loc=i, scale=i + 1, size=(16, 1)) for i in range(10)]
+    metrics = MetricsAccumulator()
+    for values in steps:
+        metrics.add('Q Targets', torch.from_numpy(values).float())
+    expected = create_stats_ordered_dict('Q Targets', np.concatenate(steps).astype(np.float32))
+    stats = metrics.read()
+    assert list(stats.keys()) == list(expected.keys())
+    for key in expected:
+        assert np.isclose(stats[key], expected[key], rtol=1e-5), key
+
+
+def test_per_column_and_mean_only():
+    metrics = MetricsAccumulator()
+    metrics.declare('QF1 Loss', mean_only=True)
+    metrics.declare('Policy Action', per_column=True)
+    actions = [torch.rand(8, 3) for _ in range(4)]
+    for i, a in enumerate(actions):
+        metrics.add('QF1 Loss', torch.tensor(float(i)))
+        metrics.add('Policy Action', a)
+    stats = metrics.read()
+    assert np.isclose(stats['QF1 Loss'], 1.5)
+    all_actions = torch.cat(actions).numpy()
+    for i in range(3):
+        assert np.isclose(stats['Policy Action%d Mean' % i], all_actions[:, i].mean(), rtol=1e-5)
+        assert np.isclose(stats['Policy Action%d Min' % i], all_actions[:, i].min())
+    assert list(stats.keys())[0] == 'QF1 Loss'
+
+
+def test_reset_and_declaration_order():
+    metrics = MetricsAccumulator()
+    metrics.declare('B')
+    metrics.declare('A')
+    metrics.add('A', torch.ones(4))
+    metrics.add('B', torch.zeros(4))
+    assert list(metrics.read().keys())[0] == 'B Mean'
+    metrics.reset()
+    assert len(metrics.read()) == 0
+    metrics.add('A', torch.full((2,), 3.))
+    assert metrics.read()['A Mean'] == 3.
@@ -0,0 +1,98 @@
+"""
+Tests for the mixed precision training of the trainers and for ChannelsLastCNN.
+"""
+
+import numpy as np
+import pytest
+import torch
+from torch import nn as nn
+
+from rlkit.torch.conv_networks import ChannelsLastCNN
+from rlkit.torch.mixed_precision import MixedPrecision
+from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.torch.td3.testing import CONV_ARGS, make_batch, make_networks
+
+
+def make_trainer():
+    torch.manual_seed(0)
+    return TD3Trainer(**make_networks())
+
+
+def test_disabled_is_fp32():
+    mixed_precision = MixedPrecision(enabled=False, device='cpu')
+    with mixed_precision.autocast():
+        out = nn.Linear(4, 4)(torch.rand(2, 4))
+    assert out.dtype == torch.float32
+    assert mixed_precision.loss_scales() == []
+
+
+def test_cpu_bf16_parity():
+    fp32_trainer = make_trainer()
+    bf16_trainer = make_trainer()
+    bf16_trainer.set_mixed_precision(MixedPrecision(enabled=True, device='cpu'))
+    assert bf16_trainer.mixed_precision.dtype == torch.bfloat16
+    for trainer in [fp32_trainer, bf16_trainer]:
+        torch.manual_seed(1)
+        trainer.train_from_torch(make_batch(32))
+    for key in ['QF1 Loss', 'QF2 Loss', 'Policy Loss']:
+        assert np.isclose(bf16_trainer.get_diagnostics()[key], fp32_trainer.get_diagnostics()[key],
+                          rtol=5e-2, atol=1e-3), key
+    # no loss scaling for bfloat16
+    assert bf16_trainer.mixed_precision.loss_scales() == []
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="float16 loss scaling needs CUDA")
+def test_loss_scale_backs_off_and_grows():
+    mixed_precision = MixedPrecision(enabled=True, device='cuda', init_scale=2. ** 10, growth_interval=2)
+    layer = nn.Linear(4, 1).cuda()
+    optimizer = torch.optim.SGD(layer.parameters(), lr=0.1)
+    weight = layer.weight.detach().clone()
+
+    # an overflowing loss skips the step and halves the scale
+    optimizer.zero_grad()
+    with mixed_precision.autocast():
+        loss = layer(torch.full((2, 4), float('inf'), device='cuda')).float().mean()
+    mixed_precision.step(loss, optimizer)
+    assert torch.equal(layer.weight, weight)
+    assert mixed_precision.loss_scales() == [2. ** 9]
+
+    # growth_interval steps without overflow double it
+    for _ in range(2):
+        optimizer.zero_grad()
+        with mixed_precision.autocast():
+            loss = layer(torch.rand(2, 4, device='cuda')).float().mean()
+        mixed_precision.step(loss, optimizer)
+    assert mixed_precision.loss_scales() == [2. ** 10]
+    assert not torch.equal(layer.weight, weight)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="float16 loss scaling needs CUDA")
+def test_one_scaler_per_optimizer():
+    mixed_precision = MixedPrecision(enabled=True, device='cuda')
+    optimizers = [torch.optim.SGD(nn.Linear(1, 1).parameters(), lr=0.1) for _ in range(2)]
+    assert mixed_precision.scaler(optimizers[0]) is not mixed_precision.scaler(optimizers[1])
+    assert mixed_precision.scaler(optimizers[0]) is mixed_precision.scaler(optimizers[0])
+
+
+def test_channels_last_cnn_takes_uint8_images():
+    torch.manual_seed(0)
+    network = ChannelsLastCNN(output_size=2, **CONV_ARGS)
+    images = torch.randint(0, 256, (8, 16, 16, 3), dtype=torch.uint8)
+    uint8_out = network(images.view(8, -1))
+    float_out = network(images.view(8, -1).float())
+    assert torch.allclose(uint8_out, float_out)
+
+    conv_outputs = []
+    network.conv_layers[0].register_forward_hook(lambda m, i, o: conv_outputs.append(o))
+    network(images.view(8, -1))
+    assert conv_outputs[0].is_contiguous(memory_format=torch.channels_last)
+
+
+def test_channels_last_cnn_matches_nchw_convolutions():
+    torch.manual_seed(0)
+    network = ChannelsLastCNN(output_size=2, **CONV_ARGS)
+    images = torch.randint(0, 256, (8, 16, 16, 3), dtype=torch.uint8)
+    nchw = images.permute(0, 3, 1, 2).float() * (2. / 255) - 1
+    expected = network.conv_layers[0](nchw)
+    actual = network.conv_layers[0](network.image_batch(images.view(8, -1)))
+    assert torch.allclose(actual, expected, atol=1e-5)
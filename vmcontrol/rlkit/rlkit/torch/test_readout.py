@@ -0,0 +1,70 @@
+"""
+Tests for the on-device pooling of ReadoutTransform against the NumPy readout path.
+"""
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.torch.readout import ReadoutTransform
+
+INPUT_SHAPE = (3, 32, 32)
+OUTPUT_SIZE = 8
+
+
+def make_net():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Conv2d(3, 3, 3, padding=1), nn.Tanh())
+
+
+def numpy_readout(net, obs):
+    # the readout t_fn of starter/mid_level_train.py
+    obs = obs * 2 - 1
+    obs = torch.tensor(obs).float().reshape([1, *INPUT_SHAPE])
+    obs = net(obs)
+    bin_size = INPUT_SHAPE[1] // OUTPUT_SIZE
+    return np.array(obs.detach().cpu()).reshape((3, OUTPUT_SIZE, bin_size, OUTPUT_SIZE, bin_size)).max(4).max(2).flatten()
+
+
+def observations(n=3):
+    return np.random.RandomState(0).uniform(0, 1, (n, int(np.prod(INPUT_SHAPE))))
+
+
+def test_matches_numpy_readout():
+    net = make_net()
+    transform = ReadoutTransform(net, INPUT_SHAPE, output_size=OUTPUT_SIZE)
+    for obs in observations():
+        readout = transform.transform(obs)
+        assert readout.dtype == np.float32
+        assert np.allclose(readout, numpy_readout(net, obs), atol=1e-6)
+
+
+def test_batch_of_observations():
+    net = make_net()
+    transform = ReadoutTransform(net, INPUT_SHAPE, output_size=OUTPUT_SIZE)
+    obs = observations()
+    readouts = transform.transform(obs)
+    assert readouts.shape == (3, 3 * OUTPUT_SIZE * OUTPUT_SIZE)
+    assert np.allclose(readouts[1], numpy_readout(net, obs[1]), atol=1e-6)
+
+
+def test_no_autograd_graph():
+    net = make_net()
+    transform = ReadoutTransform(net, INPUT_SHAPE, output_size=OUTPUT_SIZE)
+    with torch.no_grad():
+        readout = transform(torch.from_numpy(observations(1)))
+    assert not readout.requires_grad
+    assert transform.transform(observations(1)[0]).shape == (3 * OUTPUT_SIZE * OUTPUT_SIZE,)
+
+
+def test_quantized_readouts():
+    net = make_net()
+    obs = observations(1)[0]
+    expected = numpy_readout(net, obs)
+    half = ReadoutTransform(net, INPUT_SHAPE, output_size=OUTPUT_SIZE, dtype='float16')
+    assert half(torch.from_numpy(obs)).dtype == torch.float16
+    assert np.allclose(half.transform(obs), expected, atol=1e-3)
+    quantized = ReadoutTransform(net, INPUT_SHAPE, output_size=OUTPUT_SIZE, dtype='uint8')
+    assert quantized(torch.from_numpy(obs)).dtype == torch.uint8
+    # tanh readouts in [-1, 1], half a level of 2 / 255
+    assert np.allclose(quantized.transform(obs), expected, atol=1. / 255 + 1e-6)
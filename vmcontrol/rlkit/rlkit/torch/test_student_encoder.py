@@ -0,0 +1,92 @@
+"""
+Smoke tests of the distillation of a mid-level encoder into a StudentEncoder,
+on a tiny synthetic dataset and a stand-in teacher.
+"""
+
+import numpy as np
+import pytest
+import torch
+from torch import nn as nn
+
+from rlkit.torch.frame_encoder import FrameEncoder
+from rlkit.torch.student_encoder import (
+    StudentEncoder, distill_step, feature_mse, load_student, measure_latency, save_student,
+)
+
+INPUT_SHAPE = (3, 32, 32)
+OUTPUT_SHAPE = (8, 4, 4)
+
+
+def make_teacher():
+    torch.manual_seed(0)
+    teacher = nn.Sequential(
+        nn.Conv2d(3, 16, 4, stride=4), nn.ReLU(),
+        nn.Conv2d(16, 8, 2, stride=2),
+    ).eval()
+    for p in teacher.parameters():
+        p.requires_grad_(False)
+    return teacher
+
+
+def synthetic_images(n, seed=0):
+    # smooth frames, so that the teacher features are learnable from a few of them
+    rng = np.random.RandomState(seed)
+    low_res = torch.from_numpy(rng.uniform(-1, 1, (n, 3, 4, 4)).astype(np.float32))
+    return nn.functional.interpolate(low_res, size=INPUT_SHAPE[1:], mode='bilinear', align_corners=False)
+
+
+def test_output_shape():
+    student = StudentEncoder(INPUT_SHAPE, OUTPUT_SHAPE, channels=(8, 16))
+    assert student(synthetic_images(2)).shape == (2,) + OUTPUT_SHAPE
+    # 256 -> 16 with the default widths
+    assert StudentEncoder()(torch.zeros(1, 3, 256, 256)).shape == (1, 8, 16, 16)
+
+
+def test_rejects_incompatible_resolutions():
+    with pytest.raises(AssertionError):
+        StudentEncoder((3, 48, 48), (8, 16, 16))
+
+
+def test_distillation_reduces_feature_mse():
+    teacher = make_teacher()
+    student = StudentEncoder(INPUT_SHAPE, OUTPUT_SHAPE, channels=(16, 32))
+    train = synthetic_images(64).split(16)
+    val = synthetic_images(32, seed=1).split(16)
+    optimizer = torch.optim.Adam(student.parameters(), lr=3e-3)
+
+    initial_mse = feature_mse(student, teacher, val)
+    for _ in range(30):
+        for images in train:
+            distill_step(student, teacher, images, optimizer)
+    assert feature_mse(student, teacher, val) < 0.5 * initial_mse
+    assert all(p.grad is None for p in teacher.parameters())
+
+
+def test_save_and_load(tmpdir):
+    student = StudentEncoder(INPUT_SHAPE, OUTPUT_SHAPE, channels=(8, 16))
+    file_name = str(tmpdir.join('student.pt'))
+    save_student(student, file_name, feature_task='normal', val_mse=0.1)
+    loaded = load_student(file_name)
+    assert loaded.metadata == dict(feature_task='normal', val_mse=0.1)
+    assert not loaded.training
+    assert all(not p.requires_grad for p in loaded.parameters())
+    images = synthetic_images(2)
+    with torch.no_grad():
+        assert torch.allclose(loaded(images), student(images))
+
+
+def test_drop_in_encoder():
+    # the t_fn of mid_level_train.py, and the learner-side encoding
+    student = StudentEncoder(INPUT_SHAPE, OUTPUT_SHAPE, channels=(8, 16)).eval()
+    frame = np.random.RandomState(0).uniform(0, 1, INPUT_SHAPE)
+    with torch.no_grad():
+        features = student(torch.tensor(frame * 2 - 1).float().reshape([1, *INPUT_SHAPE])).numpy().flatten()
+    assert features.shape == (int(np.prod(OUTPUT_SHAPE)),)
+    frame_encoder = FrameEncoder(student, INPUT_SHAPE)
+    uint8_frame = np.rint(frame * 255).astype(np.uint8).flatten()
+    assert np.allclose(frame_encoder.encode_np(uint8_frame), features, atol=5e-2)
+
+
+def test_measure_latency():
+    student = StudentEncoder(INPUT_SHAPE, OUTPUT_SHAPE, channels=(8, 16))
+    assert measure_latency(student, INPUT_SHAPE, repeats=3, warmup=1) > 0
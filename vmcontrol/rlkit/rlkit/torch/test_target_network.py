@@ -0,0 +1,111 @@
+"""
+Tests for the fused Polyak updates of TargetNetwork.
+"""
+
+import copy
+import pickle
+
+import torch
+from torch import nn as nn
+
+import rlkit.torch.pytorch_util as ptu
+from rlkit.torch.conv_networks import CNN, ChannelsLastCNN
+from rlkit.torch.target_network import TargetNetwork
+
+CNN_ARGS = dict(
+    input_width=16,
+    input_height=16,
+    input_channels=3,
+    output_size=2,
+    kernel_sizes=[4, 3],
+    n_channels=[8, 8],
+    strides=[2, 1],
+    paddings=[0, 0],
+    hidden_sizes=[32, 16],
+    batch_norm_conv=True,
+)
+
+
+def make_networks():
+    torch.manual_seed(0)
+    return CNN(**CNN_ARGS), CNN(**CNN_ARGS)
+
+
+def assert_same_parameters(a, b, atol=1e-6):
+    for p, q in zip(a.parameters(), b.parameters()):
+        assert torch.allclose(p, q, atol=atol)
+
+
+def test_update_matches_soft_update_from_to():
+    source, target = make_networks()
+    expected = copy.deepcopy(target)
+    target_network = TargetNetwork(source, target)
+    for _ in range(3):
+        target_network.update(0.1)
+        ptu.soft_update_from_to(source, expected, 0.1)
+    assert_same_parameters(target, expected)
+
+
+def test_parameters_are_views_of_flat_buffers():
+    source, target = make_networks()
+    target_network = TargetNetwork(source, target)
+    (source_flat, target_flat), = target_network.flat_buffers
+    assert source_flat.numel() == sum(p.numel() for p in source.parameters())
+    source_flat.fill_(1.)
+    assert all(bool((p == 1.).all()) for p in source.parameters())
+    target_network.copy()
+    assert all(bool((p == 1.).all()) for p in target.parameters())
+
+
+def test_buffers_are_synced():
+    source, target = make_networks()
+    source.train()
+    source(torch.rand(4, 3 * 16 * 16))
+    TargetNetwork(source, target).update(0.005)
+    for b, c in zip(source.buffers(), target.buffers()):
+        assert torch.equal(b, c)
+
+
+def test_repacks_after_module_conversion():
+    source, target = make_networks()
+    target_network = TargetNetwork(source, target)
+    target_network.update(0.5)
+    source.double()
+    target.double()
+    expected = copy.deepcopy(target)
+    target_network.update(0.5)
+    ptu.soft_update_from_to(source, expected, 0.5)
+    assert_same_parameters(target, expected)
+    assert target_network.flat_buffers[0][0].dtype == torch.float64
+
+
+def test_pickle():
+    source, target = make_networks()
+    target_network = TargetNetwork(source, target)
+    target_network.update(0.5)
+    restored = pickle.loads(pickle.dumps(target_network))
+    assert_same_parameters(restored.target, target)
+    restored.update(0.5)
+    target_network.update(0.5)
+    assert_same_parameters(restored.target, target)
+    # the restored parameters are views of their own buffers
+    restored.flat_buffers[0][1].zero_()
+    assert all(bool((p == 0.).all()) for p in restored.target.parameters())
+
+
+def test_channels_last_weights_stay_channels_last():
+    torch.manual_seed(0)
+    kwargs = dict(CNN_ARGS, batch_norm_conv=False)
+    source, target = ChannelsLastCNN(**kwargs), ChannelsLastCNN(**kwargs)
+    expected = copy.deepcopy(target)
+    target_network = TargetNetwork(source, target)
+    for _ in range(2):
+        target_network.update(0.1)
+        ptu.soft_update_from_to(source, expected, 0.1)
+    assert_same_parameters(target, expected)
+    for network in [source, target]:
+        for layer in network.conv_layers:
+            assert layer.weight.is_contiguous(memory_format=torch.channels_last)
+    # still views of the flat buffers
+    target_network.flat_buffers[0][1].zero_()
+    assert all(bool((p == 0.).all()) for p in target.parameters())
@@ -8,6 +8,7 @@ from rlkit.core.batch_rl_algorithm import BatchRLAlgorithm
 from rlkit.core.online_rl_algorithm import OnlineRLAlgorithm
 from rlkit.core.trainer import Trainer
 from rlkit.torch.core import np_to_pytorch_batch
+from rlkit.torch.mixed_precision import MixedPrecision
 
 
 class TorchOnlineRLAlgorithm(OnlineRLAlgorithm):
@@ -21,6 +22,24 @@ class TorchOnlineRLAlgorithm(OnlineRLAlgorithm):
 
 
 class TorchBatchRLAlgorithm(BatchRLAlgorithm):
+    def __init__(self, *args, mixed_precision=None, uint8_observations=False, observation_encoder=None, **kwargs):
+        """
+        :param mixed_precision: (MixedPrecision) autocast and loss scaling of the trainer, fp32 if None
+        :param uint8_observations: (bool) keep uint8 observations as uint8 up to the networks,
+            for the ChannelsLastCNN networks that convert them on the device
+        :param observation_encoder: (FrameEncoder) encodes the raw uint8 frames of the sampled
+            batches on the device, the networks are trained on their features
+        """
+        super().__init__(*args, **kwargs)
+        if mixed_precision is not None:
+            self.trainer.set_mixed_precision(mixed_precision)
+        self.trainer.keep_uint8 = uint8_observations or observation_encoder is not None
+        if observation_encoder is None:
+            self.trainer.batch_decoder = self.replay_buffer.decode_torch_batch
+        else:
+            decode = self.replay_buffer.decode_torch_batch
+            self.trainer.batch_decoder = lambda batch: observation_encoder(decode(batch))
+
     def to(self, device):
         for net in self.trainer.networks:
             net.to(device)
@@ -34,12 +53,40 @@ class TorchBatchRLAlgorithm(BatchRLAlgorithm):
 class TorchTrainer(Trainer, metaclass=abc.ABCMeta):
     def __init__(self):
         self._num_train_steps = 0
+        self.mixed_precision = MixedPrecision(enabled=False)
+        self.keep_uint8 = False
+        # decodes the compact observations of the replay buffer on the device
+        self.batch_decoder = None
+
+    def _to_torch(self, np_batch):
+        batch = np_to_pytorch_batch(np_batch, keep_uint8=self.keep_uint8)
+        if self.batch_decoder is not None:
+            batch = self.batch_decoder(batch)
+        return batch
 
     def train(self, np_batch):
         self._num_train_steps += 1
-        batch = np_to_pytorch_batch(np_batch)
+        batch = self._to_torch(np_batch)
         self.train_from_torch(batch)
 
+    def train_batches(self, np_batches):
+        # the whole block goes to the device at once, the steps then index views of it
+        batches = self._to_torch(np_batches)
+        num_batches = len(next(iter(batches.values())))
+        for i in range(num_batches):
+            self._num_train_steps += 1
+            self.train_from_torch({key: value[i] for key, value in batches.items()})
+
+    def set_mixed_precision(self, mixed_precision):
+        self.mixed_precision = mixed_precision
+
+    def __getstate__(self):
+        # the batch decoder holds the replay buffer, which is checkpointed on its own,
+        # the algorithm sets it again when it is built around the trainer
+        state = self.__dict__.copy()
+        state['batch_decoder'] = None
+        return state
+
     def get_diagnostics(self):
         return OrderedDict([
             ('num train calls', self._num_train_steps),
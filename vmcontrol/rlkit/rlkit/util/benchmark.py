@@ -0,0 +1,95 @@
+"""
+Timing, reporting and stand-in networks shared by the benchmark scripts of
+rlkit/scripts and midlevel_features.
+"""
+import time
+
+import torch
+from torch import nn as nn
+
+THREADS_HELP = 'torch CPU threads, 0 keeps the default'
+
+
+def set_threads(threads):
+    """
+    :param threads: (int) torch CPU threads, 0 keeps the default
+    """
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+
+def synchronize(device=None):
+    """
+    Wait for the queued kernels of a cuda device, before reading the clock
+    :param device: (torch.device or str) nothing to wait for when None or not cuda
+    """
+    if device is not None and torch.device(device).type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def time_calls(fn, calls, warmup=1, device=None):
+    """
+    :param fn: called without arguments
+    :param calls: (int) number of timed calls
+    :param warmup: (int) untimed calls first, which pay for the cuda context, the allocator and the caches
+    :param device: (torch.device or str) synchronized before reading the clock
+    :return: (float) mean seconds per call
+    """
+    for _ in range(warmup):
+        fn()
+    synchronize(device)
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    synchronize(device)
+    return (time.perf_counter() - start) / calls
+
+
+def print_results(results, unit, per_second=True):
+    """
+    One aligned line per result, with its speedup over the first one
+    :param results: ([(str, float) or (str, float, str)]) name, value and optional extra columns
+    :param unit: (str) of the values, e.g. 'steps/s' or 'ms/step'
+    :param per_second: (bool) whether higher values are faster, False for times
+    """
+    width = max(len(name) for name, *_ in results)
+    baseline = results[0][1]
+    for i, (name, value, *extra) in enumerate(results):
+        columns = ["{:{}s} {:10.3f} {}".format(name, width, value, unit)]
+        columns.extend(extra)
+        if i > 0 and value > 0 and baseline > 0:
+            columns.append("({:.2f}x)".format(value / baseline if per_second else baseline / value))
+        print("  ".join(columns))
+
+
+def cnn_kwargs(image_size, hidden_sizes=(1024, 512), input_channels=3):
+    """
+    The conv networks of starter/mid_level_train.py without mid-level features,
+    ISE_7202/train.py adds a 256 hidden layer
+    :param hidden_sizes: (tuple) left out when None, e.g. for a ConvEncoder
+    """
+    kwargs = dict(
+        input_width=image_size,
+        input_height=image_size,
+        input_channels=input_channels,
+        kernel_sizes=[4, 4, 3],
+        n_channels=[32, 64, 64],
+        strides=[2, 1, 1],
+        paddings=[0, 0, 0],
+        hidden_init=nn.init.orthogonal_,
+        hidden_activation=nn.ReLU(),
+    )
+    if hidden_sizes is not None:
+        kwargs['hidden_sizes'] = list(hidden_sizes)
+    return kwargs
+
+
+def stand_in_encoder():
+    """
+    3 x H x W frames to 8 x H/16 x W/16 features, like the Taskonomy encoders, at a fraction of their cost
+    """
+    return nn.Sequential(
+        nn.Conv2d(3, 16, 4, stride=4), nn.ReLU(),
+        nn.Conv2d(16, 32, 2, stride=2), nn.ReLU(),
+        nn.Conv2d(32, 8, 2, stride=2),
+    ).eval()
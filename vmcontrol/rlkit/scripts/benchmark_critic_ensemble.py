@@ -0,0 +1,75 @@
+"""
+Critic gradient steps per second of separate FlattenCNN critics, one optimizer each,
+against a CriticEnsemble with a single optimizer.
+
+    python scripts/benchmark_critic_ensemble.py --num_critics 2 10 --steps 50
+"""
+import argparse
+
+import torch
+
+from rlkit.torch.conv_networks import CriticEnsemble, FlattenCNN
+from rlkit.util.benchmark import THREADS_HELP, cnn_kwargs, print_results, set_threads, time_calls
+
+# the 'no Mid-Level Features' critic of starter/mid_level_train.py
+CONV_ARGS = cnn_kwargs(64)
+# the mid-level features critic, 8x16x16 encoder outputs
+MLF_CONV_ARGS = dict(CONV_ARGS, input_width=16, input_height=16, input_channels=8,
+                     kernel_sizes=[4], n_channels=[32], strides=[4], paddings=[0])
+ACTION_DIM = 4
+
+
+def make_batch(conv_args, batch_size):
+    obs_dim = conv_args['input_width'] * conv_args['input_height'] * conv_args['input_channels']
+    return (torch.rand(batch_size, obs_dim) * 2 - 1,
+            torch.rand(batch_size, ACTION_DIM) * 2 - 1,
+            torch.rand(batch_size, 1))
+
+
+def separate_step(critics, optimizers, obs, actions, q_target):
+    for critic, optimizer in zip(critics, optimizers):
+        loss = ((critic(obs, actions) - q_target) ** 2).mean()
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+
+def ensemble_step(ensemble, optimizer, obs, actions, q_target):
+    loss = ((ensemble(obs, actions) - q_target) ** 2).mean(dim=(1, 2)).sum()
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num_critics', type=int, nargs='+', default=[2, 10])
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=0, help=THREADS_HELP)
+    parser.add_argument('--mlf', action='store_true', default=False, help='use the mid-level features critic')
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    torch.manual_seed(0)
+    conv_args = MLF_CONV_ARGS if args.mlf else CONV_ARGS
+    critic_args = dict(output_size=1, added_fc_input_size=ACTION_DIM, **conv_args)
+    obs, actions, q_target = make_batch(conv_args, args.batch_size)
+
+    for num_critics in args.num_critics:
+        critics = [FlattenCNN(**critic_args) for _ in range(num_critics)]
+        optimizers = [torch.optim.Adam(c.parameters(), lr=1e-4) for c in critics]
+        ensemble = CriticEnsemble.from_critics(critics)
+        ensemble_optimizer = torch.optim.Adam(ensemble.parameters(), lr=1e-4)
+
+        print("N={}".format(num_critics))
+        print_results([
+            ('separate', 1 / time_calls(lambda: separate_step(critics, optimizers, obs, actions, q_target),
+                                        args.steps)),
+            ('ensemble', 1 / time_calls(lambda: ensemble_step(ensemble, ensemble_optimizer, obs, actions, q_target),
+                                        args.steps)),
+        ], 'steps/s')
+
+
+if __name__ == '__main__':
+    main()
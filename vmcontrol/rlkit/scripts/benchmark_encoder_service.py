@@ -0,0 +1,93 @@
+"""
+Frames/s and p50/p99 per-frame latency on CPU of the per-frame encoding of
+starter/mid_level_train.py (t_fn: one [1, 3, H, W] forward pass and .cpu() per
+frame) against EncoderService, with several callers sending frames at once,
+using a small stand-in for the Taskonomy encoder.
+
+    python scripts/benchmark_encoder_service.py --callers 1 4 16 --frames 512
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import torch
+
+from rlkit.torch.encoder_service import EncoderService
+from rlkit.util.benchmark import THREADS_HELP, print_results, set_threads, stand_in_encoder
+
+
+def per_frame_fn(encoder, input_shape):
+    def t_fn(obs):
+        obs = obs * 2 - 1
+        obs = torch.tensor(obs).float().reshape([1, *input_shape])
+        with torch.no_grad():
+            return np.array(encoder(obs).cpu()).flatten()
+    return t_fn
+
+
+def run(encode, observations, num_callers):
+    """
+    :return: (float, [float]) frames/s and the latency in ms of every frame
+    """
+    chunks = np.array_split(observations, num_callers)
+    latencies = [[] for _ in chunks]
+
+    def caller(i):
+        for obs in chunks[i]:
+            start = time.perf_counter()
+            encode(obs)
+            latencies[i].append(1000 * (time.perf_counter() - start))
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(num_callers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(observations) / elapsed, [l for ls in latencies for l in ls]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image_size', type=int, default=256)
+    parser.add_argument('--callers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--frames', type=int, default=256)
+    parser.add_argument('--max_batch', type=int, default=32)
+    parser.add_argument('--max_wait_ms', type=float, default=2.)
+    parser.add_argument('--threads', type=int, default=0, help=THREADS_HELP)
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    torch.manual_seed(0)
+    input_shape = (3, args.image_size, args.image_size)
+    encoder = stand_in_encoder()
+    observations = np.random.uniform(0, 1, (args.frames,) + input_shape).astype(np.float32)
+    service = EncoderService(lambda frames: encoder(frames * 2 - 1), input_shape,
+                             max_batch_size=args.max_batch, max_wait=args.max_wait_ms / 1000, device='cpu')
+    for num_callers in args.callers:
+        # per-frame callers share the encoder like the env workers would, one at a time
+        lock = threading.Lock()
+        t_fn = per_frame_fn(encoder, input_shape)
+
+        def locked_t_fn(obs):
+            with lock:
+                return t_fn(obs)
+
+        results = []
+        for name, encode in [('per frame', locked_t_fn), ('EncoderService', service.encode)]:
+            run(encode, observations[:8], num_callers)
+            frames_per_s, latencies = run(encode, observations, num_callers)
+            results.append((name, frames_per_s, "p50 {:7.2f} ms  p99 {:7.2f} ms".format(
+                np.percentile(latencies, 50), np.percentile(latencies, 99))))
+        print("{} callers".format(num_callers))
+        print_results(results, 'frames/s')
+        service.batch_sizes.clear()
+    frames_per_s, _ = run(service.encode_batch, observations[None], 1)
+    print_results([('encode_batch', frames_per_s * len(observations))], 'frames/s')
+    service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+HER relabel cost per path of imgObsDictRelabelingBuffer.add_path with and
+without a FeatureCache, and the cache hit rate, on CPU. The re-rendering env
+is a stand-in that costs --render_ms per step and renders the state and goal,
+the encoder a small stand-in for the Taskonomy encoder. The achieved goals of
+a path take --distinct_goals values, like reach targets that repeat.
+
+    python scripts/benchmark_feature_cache.py --paths 20 --path_length 50
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from gym.spaces import Box, Dict
+
+from rlkit.data_management.feature_cache import FeatureCache
+from rlkit.data_management.obs_dict_replay_buffer import imgObsDictRelabelingBuffer
+from rlkit.util.benchmark import print_results, stand_in_encoder, time_calls
+
+GOAL_DIM = 3
+ACTION_DIM = 4
+
+
+class StandInEnv(object):
+    def __init__(self, image_size):
+        self.image_size = image_size
+        self.observation_space = Dict(dict(
+            observation=Box(-10, 10, (8 * (image_size // 16) ** 2,), dtype=np.float32),
+            desired_goal=Box(-1, 1, (GOAL_DIM,), dtype=np.float32),
+            achieved_goal=Box(-1, 1, (GOAL_DIM,), dtype=np.float32),
+        ))
+        self.action_space = Box(-1, 1, (ACTION_DIM,), dtype=np.float32)
+
+
+class StandInRerenderingEnv(object):
+    def __init__(self, image_size, render_ms):
+        self.image_size = image_size
+        self.render_ms = render_ms
+
+    def reset(self):
+        pass
+
+    def _render(self, *parts):
+        time.sleep(self.render_ms / 1000)
+        seed = abs(hash(np.concatenate([np.ravel(p) for p in parts]).tobytes())) % 2 ** 32
+        return np.random.RandomState(seed).uniform(0, 1, 3 * self.image_size ** 2).astype(np.float32)
+
+    def get_resample_step(self, states, actions, goals):
+        return [(self._render(s, g), 0., False, self._render(s, a, g)) for s, a, g in zip(states, actions, goals)]
+
+
+def make_path(path_length, distinct_goals, rng):
+    goals = rng.uniform(-1, 1, (distinct_goals, GOAL_DIM))
+    obs = [dict(observation=np.zeros(1), achieved_goal=goals[rng.randint(distinct_goals)],
+                save_state=rng.uniform(-1, 1, 9)) for _ in range(path_length)]
+    return dict(
+        observations=obs,
+        next_observations=obs[1:] + obs[-1:],
+        actions=rng.uniform(-1, 1, (path_length, ACTION_DIM)),
+        rewards=np.zeros((path_length, 1)),
+        terminals=np.zeros((path_length, 1)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image_size', type=int, default=256)
+    parser.add_argument('--paths', type=int, default=10)
+    parser.add_argument('--path_length', type=int, default=50)
+    parser.add_argument('--distinct_goals', type=int, default=3)
+    parser.add_argument('--render_ms', type=float, default=2.)
+    parser.add_argument('--cache_mb', type=float, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    encoder = stand_in_encoder()
+    input_shape = (1, 3, args.image_size, args.image_size)
+
+    def t_fn(obs):
+        with torch.no_grad():
+            return encoder(torch.from_numpy(obs * 2 - 1).reshape(input_shape)).numpy().flatten()
+
+    results = []
+    for name, cache in [('no cache', None), ('FeatureCache', FeatureCache(int(args.cache_mb * 2 ** 20)))]:
+        buffer = imgObsDictRelabelingBuffer(
+            max_size=args.paths * args.path_length * 5, env=StandInEnv(args.image_size),
+            rerendering_env=StandInRerenderingEnv(args.image_size, args.render_ms), k=4, t_fn=t_fn,
+            feature_cache=cache)
+        rng = np.random.RandomState(0)
+        path = make_path(args.path_length, args.distinct_goals, rng)
+        np.random.seed(0)
+        # the same path is relabeled again, like the repeated configurations of an env
+        ms = 1e3 * time_calls(lambda: buffer.add_path(path), args.paths, warmup=0)
+        hit_rate = buffer.get_diagnostics().get('feature cache hit rate', 0.)
+        results.append((name, ms, "hit rate {:.2f}".format(hit_rate)))
+    print_results(results, 'ms/path', per_second=False)
+
+
+if __name__ == '__main__':
+    main()
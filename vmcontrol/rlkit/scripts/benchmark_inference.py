@@ -0,0 +1,77 @@
+"""
+Per-action CPU latency of the policy of ISE_7202/train.py as a pickled module
+(CNNPolicy.get_action through eval_np, what train.py saved so far), wrapped in
+InferencePolicy, eagerly and as a frozen TorchScript copy, and exported as
+TorchScript with its int8 variant, with the file size and load time of the
+saved ones, at 64x64 and 128x128.
+
+    python scripts/benchmark_inference.py --image_sizes 64 128 --actions 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from rlkit.torch.conv_networks import TanhCNNPolicy
+from rlkit.torch.export import export_policy, load_exported_policy
+from rlkit.torch.inference import InferencePolicy
+from rlkit.util.benchmark import THREADS_HELP, cnn_kwargs, print_results, set_threads, time_calls
+
+ACTION_DIM = 4
+GOAL_DIM = 3
+
+
+def latency_ms(policy, observations):
+    def act():
+        for obs in observations:
+            policy.get_action(obs)
+    for obs in observations[:5]:
+        policy.get_action(obs)
+    return 1e3 * time_calls(act, 1, warmup=0) / len(observations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image_sizes', type=int, nargs='+', default=[64, 128])
+    parser.add_argument('--actions', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=0, help=THREADS_HELP)
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    torch.manual_seed(0)
+    folder = tempfile.mkdtemp()
+    for image_size in args.image_sizes:
+        policy = TanhCNNPolicy(output_size=ACTION_DIM, added_fc_input_size=GOAL_DIM,
+                               **cnn_kwargs(image_size, hidden_sizes=[1024, 512, 256]))
+        observations = np.random.uniform(-1, 1, (args.actions, 3 * image_size * image_size + GOAL_DIM))
+        pickled = os.path.join(folder, 'trained_policy_{}.pt'.format(image_size))
+        exported = os.path.join(folder, 'policy_{}.pt'.format(image_size))
+        exported_int8 = os.path.join(folder, 'policy_{}_int8.pt'.format(image_size))
+        torch.save(policy, pickled)
+        export_policy(policy, exported)
+        export_policy(policy, exported_int8, int8=True)
+
+        results = [
+            ('get_action', latency_ms(policy, observations), ''),
+            ('InferencePolicy', latency_ms(InferencePolicy(policy), observations), ''),
+            ('InferencePolicy frozen', latency_ms(InferencePolicy(policy, freeze=True), observations), ''),
+        ]
+        for name, file_name, load, wrap in [
+            ('pickled module', pickled, torch.load, lambda p: p),
+            ('exported', exported, lambda f: load_exported_policy(f)[0], InferencePolicy),
+            ('exported int8', exported_int8, lambda f: load_exported_policy(f)[0], InferencePolicy),
+        ]:
+            start = time.perf_counter()
+            loaded = load(file_name)
+            load_ms = 1e3 * (time.perf_counter() - start)
+            results.append((name, latency_ms(wrap(loaded), observations), "{:7.2f} MB  load {:8.2f} ms".format(
+                os.path.getsize(file_name) / 2 ** 20, load_ms)))
+        print("{0}x{0}".format(image_size))
+        print_results(results, 'ms/action', per_second=False)
+
+
+if __name__ == '__main__':
+    main()
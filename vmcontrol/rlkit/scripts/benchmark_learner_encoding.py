@@ -0,0 +1,102 @@
+"""
+Learner throughput of the mid-level features encoded at collection time (one
+frame at a time, as t_fn does) against raw uint8 frames in the replay buffer
+encoded by the learner on every sampled batch with FrameEncoder, with and
+without AMP and deduplication, on a stand-in for the Taskonomy encoder. The
+time to find the repeated frames of a batch is reported on its own too.
+
+The collection-time cost is paid once per stored transition, the learner-side
+cost once per sampled transition, the samples/s below compare them per
+transition of either.
+
+    python scripts/benchmark_learner_encoding.py --batch_size 128 --batches 5 --device cpu
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from rlkit.torch.frame_encoder import FrameEncoder
+from rlkit.util.benchmark import print_results, stand_in_encoder, time_calls
+
+IMAGE_SHAPE = (3, 256, 256)
+
+
+def collection_time(encoder, observations, device):
+    """:return: (float) transitions/s, two frames encoded one at a time per transition"""
+    def t_fn(obs):
+        obs = torch.tensor(obs / 255. * 2 - 1, device=device).float().reshape([1, *IMAGE_SHAPE])
+        with torch.no_grad():
+            return np.array(encoder(obs).cpu()).flatten()
+
+    def collect():
+        for obs in observations:
+            t_fn(obs)
+            t_fn(obs)
+    t_fn(observations[0])
+    return len(observations) / time_calls(collect, 1, warmup=0)
+
+
+def learner_side(frame_encoder, batches, device):
+    """:return: (float) transitions/s of the sampled batches, and the fraction of frames encoded"""
+    def learn():
+        for batch in batches:
+            frame_encoder(dict(batch))
+    frame_encoder(dict(batches[0]))
+    frame_encoder.num_frames = frame_encoder.num_encoded = 0
+    num_transitions = sum(len(batch['observations']) for batch in batches)
+    seconds = time_calls(learn, 1, warmup=0, device=device)
+    return num_transitions / seconds, frame_encoder.num_encoded / frame_encoder.num_frames
+
+
+def deduplication_time(frame_encoder, batches, device):
+    """:return: (float, float) ms per batch to find its repeated frames by hash, and by sorting them"""
+    all_frames = [torch.cat([batch['observations'], batch['next_observations']]) for batch in batches]
+    times = []
+    for unique in [frame_encoder.unique, lambda frames: torch.unique(frames, dim=0, return_inverse=True)]:
+        def deduplicate():
+            for frames in all_frames:
+                unique(frames)
+        times.append(1e3 * time_calls(deduplicate, 1, device=device) / len(all_frames))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--batches', type=int, default=5)
+    parser.add_argument('--path_length', type=int, default=50)
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    encoder = stand_in_encoder().to(device)
+    rng = np.random.RandomState(0)
+    frame_size = int(np.prod(IMAGE_SHAPE))
+    # a buffer of consecutive steps of paths, so that some sampled frames repeat
+    buffer = rng.randint(0, 256, (4 * args.batch_size + 1, frame_size)).astype(np.uint8)
+    batches = []
+    for _ in range(args.batches):
+        indices = rng.randint(0, len(buffer) - 1, args.batch_size)
+        batches.append(dict(
+            observations=torch.from_numpy(buffer[indices]).to(device),
+            next_observations=torch.from_numpy(buffer[indices + 1]).to(device),
+        ))
+
+    results = [('collection time, batch of one', collection_time(encoder, buffer[:args.batch_size], device), '')]
+    for amp in [False, True]:
+        for deduplicate in [False, True]:
+            frame_encoder = FrameEncoder(encoder, IMAGE_SHAPE, amp=amp, deduplicate=deduplicate)
+            samples_per_s, encoded = learner_side(frame_encoder, batches, device)
+            results.append(('learner side' + (' amp' if amp else '') + (' deduplicated' if deduplicate else ''),
+                            samples_per_s, "{:.0%} of the frames encoded".format(encoded)))
+    print_results(results, 'transitions/s')
+    # included in the deduplicated throughput above
+    hashed, sorted_ = deduplication_time(FrameEncoder(encoder, IMAGE_SHAPE), batches, device)
+    print_results([('deduplication by hash', hashed), ('deduplication with torch.unique', sorted_)],
+                  'ms/batch', per_second=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+TD3 gradient steps per second in fp32 and with mixed precision (bfloat16 on
+CPU, float16 with loss scaling on CUDA), for float CHW images with CNN and
+uint8 HWC images with ChannelsLastCNN, on the 64x64 and 128x128 configs.
+
+    python scripts/benchmark_mixed_precision.py --image_sizes 64 128 --batch_size 128
+"""
+import argparse
+
+import torch
+
+import rlkit.torch.pytorch_util as ptu
+from rlkit.torch.conv_networks import FlattenCNN, FlattenChannelsLastCNN, TanhCNNPolicy, \
+    TanhChannelsLastCNNPolicy
+from rlkit.torch.mixed_precision import MixedPrecision
+from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.util.benchmark import cnn_kwargs, print_results, time_calls
+
+ACTION_DIM = 4
+
+
+def make_trainer(image_size, channels_last):
+    kwargs = cnn_kwargs(image_size)
+    policy_class = TanhChannelsLastCNNPolicy if channels_last else TanhCNNPolicy
+    qf_class = FlattenChannelsLastCNN if channels_last else FlattenCNN
+    policies = [policy_class(output_size=ACTION_DIM, **kwargs).to(ptu.device) for _ in range(2)]
+    qfs = [qf_class(output_size=1, added_fc_input_size=ACTION_DIM, **kwargs).to(ptu.device) for _ in range(4)]
+    return TD3Trainer(policy=policies[0], target_policy=policies[1],
+                      qf1=qfs[0], qf2=qfs[1], target_qf1=qfs[2], target_qf2=qfs[3])
+
+
+def make_batch(image_size, batch_size, channels_last):
+    obs_dim = 3 * image_size * image_size
+    if channels_last:
+        obs = torch.randint(0, 256, (batch_size, obs_dim), dtype=torch.uint8, device=ptu.device)
+        next_obs = torch.randint(0, 256, (batch_size, obs_dim), dtype=torch.uint8, device=ptu.device)
+    else:
+        obs = torch.rand(batch_size, obs_dim, device=ptu.device) * 2 - 1
+        next_obs = torch.rand(batch_size, obs_dim, device=ptu.device) * 2 - 1
+    return dict(
+        observations=obs,
+        next_observations=next_obs,
+        actions=torch.rand(batch_size, ACTION_DIM, device=ptu.device) * 2 - 1,
+        rewards=torch.rand(batch_size, 1, device=ptu.device),
+        terminals=ptu.zeros(batch_size, 1),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image_sizes', type=int, nargs='+', default=[64, 128])
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--gpu', action='store_true', default=False)
+    args = parser.parse_args()
+
+    ptu.set_gpu_mode(args.gpu)
+    torch.manual_seed(0)
+    for image_size in args.image_sizes:
+        results = []
+        for channels_last in [False, True]:
+            batch = make_batch(image_size, args.batch_size, channels_last)
+            for amp in [False, True]:
+                trainer = make_trainer(image_size, channels_last)
+                mixed_precision = MixedPrecision(enabled=amp)
+                trainer.set_mixed_precision(mixed_precision)
+                seconds = time_calls(lambda: trainer.train_from_torch(batch), args.steps, warmup=2,
+                                     device=ptu.device)
+                results.append(("{} {}".format(
+                    'uint8 channels_last' if channels_last else 'float NCHW',
+                    str(mixed_precision.dtype).replace('torch.', '') if amp else 'float32'), 1 / seconds))
+        print("{0}x{0}".format(image_size))
+        print_results(results, 'steps/s')
+
+
+if __name__ == '__main__':
+    main()
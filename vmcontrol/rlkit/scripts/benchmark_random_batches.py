@@ -0,0 +1,71 @@
+"""
+TD3 gradient steps per second on CPU when the replay buffer is sampled one batch
+at a time against k batches gathered and moved to the device at once, with a
+synthetic buffer of flat observations.
+
+    python scripts/benchmark_random_batches.py --num_batches 1 10 50
+"""
+import argparse
+import copy
+
+import numpy as np
+import torch
+
+from rlkit.data_management.simple_replay_buffer import SimpleReplayBuffer
+from rlkit.torch.networks import FlattenMlp, TanhMlpPolicy
+from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.util.benchmark import print_results, time_calls
+
+
+def make_buffer(size, obs_dim, action_dim):
+    buffer = SimpleReplayBuffer(size, obs_dim, action_dim, env_info_sizes={})
+    buffer._observations[:] = np.random.uniform(-1, 1, buffer._observations.shape)
+    buffer._next_obs[:] = np.random.uniform(-1, 1, buffer._next_obs.shape)
+    buffer._actions[:] = np.random.uniform(-1, 1, buffer._actions.shape)
+    buffer._rewards[:] = np.random.uniform(-1, 0, buffer._rewards.shape)
+    buffer._size = size
+    return buffer
+
+
+def make_trainer(obs_dim, action_dim, hidden_sizes):
+    policy = TanhMlpPolicy(input_size=obs_dim, output_size=action_dim, hidden_sizes=hidden_sizes)
+    qfs = [FlattenMlp(input_size=obs_dim + action_dim, output_size=1, hidden_sizes=hidden_sizes)
+           for _ in range(2)]
+    return TD3Trainer(policy=policy, target_policy=copy.deepcopy(policy),
+                      qf1=qfs[0], qf2=qfs[1], target_qf1=copy.deepcopy(qfs[0]), target_qf2=copy.deepcopy(qfs[1]))
+
+
+def train(buffer, trainer, num_batches, batch_size):
+    if num_batches == 1:
+        trainer.train(buffer.random_batch(batch_size))
+    else:
+        trainer.train_batches(buffer.random_batches(num_batches, batch_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num_batches', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--obs_dim', type=int, default=64)
+    parser.add_argument('--action_dim', type=int, default=4)
+    parser.add_argument('--buffer_size', type=int, default=100000)
+    parser.add_argument('--hidden_sizes', type=int, nargs='+', default=[256, 256])
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    torch.manual_seed(0)
+    buffer = make_buffer(args.buffer_size, args.obs_dim, args.action_dim)
+    trainer = make_trainer(args.obs_dim, args.action_dim, args.hidden_sizes)
+    for _ in range(10):
+        train(buffer, trainer, 1, args.batch_size)
+    results = []
+    for num_batches in args.num_batches:
+        seconds = time_calls(lambda: train(buffer, trainer, num_batches, args.batch_size),
+                             max(1, args.steps // num_batches), warmup=0)
+        results.append(("k={}".format(num_batches), num_batches / seconds))
+    print_results(results, 'steps/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Latency and memory per step of the readout observation mode of
+starter/mid_level_train.py: the previous t_fn (autograd graph, full decoder
+output copied to the host and pooled with NumPy) against ReadoutTransform
+(inference mode, pooled and cast on the device), with a stand-in for the
+Taskonomy network.
+
+    python scripts/benchmark_readout.py --steps 100 --dtypes float32 float16 uint8
+"""
+import argparse
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.torch.readout import ReadoutTransform
+from rlkit.util.benchmark import print_results, time_calls
+
+INPUT_SHAPE = (3, 256, 256)
+OUTPUT_SIZE = 64
+
+
+def make_net():
+    # encoder to 8x16x16 and decoder back to 3x256x256, like the Taskonomy readouts
+    return nn.Sequential(
+        nn.Conv2d(3, 16, 4, stride=4), nn.ReLU(),
+        nn.Conv2d(16, 8, 4, stride=4), nn.ReLU(),
+        nn.ConvTranspose2d(8, 16, 4, stride=4), nn.ReLU(),
+        nn.ConvTranspose2d(16, 3, 4, stride=4), nn.Tanh(),
+    )
+
+
+def numpy_t_fn(net, device):
+    def t_fn(obs):
+        obs = obs * 2 - 1
+        obs = torch.tensor(obs, device=device).float().reshape([1, *INPUT_SHAPE])
+        obs = net(obs)
+        bin_size = INPUT_SHAPE[1] // OUTPUT_SIZE
+        return np.array(obs.detach().cpu()).reshape((3, OUTPUT_SIZE, bin_size, OUTPUT_SIZE, bin_size)).max(4).max(2).flatten()
+    return t_fn
+
+
+def measure(t_fn, observations, device):
+    """
+    :return: (float, float) ms per step and the peak device memory in MB, nan on CPU
+    """
+    def steps():
+        for obs in observations:
+            t_fn(obs)
+    for obs in observations[:3]:
+        t_fn(obs)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    ms = 1e3 * time_calls(steps, 1, warmup=0, device=device) / len(observations)
+    peak_mb = torch.cuda.max_memory_allocated() / 2 ** 20 if device.type == 'cuda' else float('nan')
+    return ms, peak_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--dtypes', type=str, nargs='+', default=['float32', 'float16', 'uint8'])
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    net = make_net().to(device)
+    observations = np.random.uniform(0, 1, (args.steps, int(np.prod(INPUT_SHAPE))))
+    results = [('numpy pooling', 3 * INPUT_SHAPE[1] * INPUT_SHAPE[2] * 4) + measure(numpy_t_fn(net, device), observations, device)]
+    for dtype in args.dtypes:
+        transform = ReadoutTransform(net, INPUT_SHAPE, output_size=OUTPUT_SIZE, dtype=dtype)
+        copied = 3 * OUTPUT_SIZE ** 2 * torch.empty(0, dtype=getattr(torch, dtype)).element_size()
+        results.append(('ReadoutTransform ' + dtype, copied) + measure(transform.transform, observations, device))
+    print_results([(name, ms, "{:8.1f} KB to host  peak device memory {:7.1f} MB".format(copied / 1024, peak_mb))
+                   for name, copied, ms, peak_mb in results], 'ms/step', per_second=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Conv FLOPs and wall time per TD3 gradient step with separate CNNs for every
+network, as built by ISE_7202/train.py, against heads on a shared ConvEncoder.
+
+Conv multiply-accumulates are counted with forward hooks on the Conv2d layers,
+so they are forward passes only (the backward pass roughly doubles them).
+
+    python scripts/benchmark_shared_encoder.py --steps 20 --batch_size 100
+"""
+import argparse
+
+import numpy as np
+import torch
+from torch import nn as nn
+
+from rlkit.torch.conv_networks import ConvEncoder, FlattenCNN, SharedEncoderQf, TanhCNNPolicy, \
+    TanhSharedEncoderPolicy
+from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.util.benchmark import cnn_kwargs, print_results, time_calls
+
+ACTION_DIM = 4
+GOAL_DIM = 4
+
+
+def separate_trainer(image_size):
+    kwargs = cnn_kwargs(image_size, hidden_sizes=[1024, 512, 256])
+    policies = [TanhCNNPolicy(output_size=ACTION_DIM, **kwargs) for _ in range(2)]
+    critics = [FlattenCNN(output_size=1, added_fc_input_size=ACTION_DIM + GOAL_DIM, **kwargs) for _ in range(4)]
+    return TD3Trainer(policy=policies[0], target_policy=policies[1],
+                      qf1=critics[0], qf2=critics[1], target_qf1=critics[2], target_qf2=critics[3])
+
+
+def shared_trainer(image_size, detach_encoder):
+    def networks():
+        encoder = ConvEncoder(added_input_size=GOAL_DIM, **cnn_kwargs(image_size, hidden_sizes=None))
+        head_kwargs = dict(hidden_sizes=[1024, 512, 256], hidden_activation=nn.ReLU())
+        policy = TanhSharedEncoderPolicy(encoder, output_size=ACTION_DIM, detach_encoder=detach_encoder,
+                                         **head_kwargs)
+        qfs = [SharedEncoderQf(encoder, added_fc_input_size=ACTION_DIM, **head_kwargs) for _ in range(2)]
+        return policy, qfs
+    policy, (qf1, qf2) = networks()
+    target_policy, (target_qf1, target_qf2) = networks()
+    return TD3Trainer(policy=policy, target_policy=target_policy,
+                      qf1=qf1, qf2=qf2, target_qf1=target_qf1, target_qf2=target_qf2)
+
+
+def make_batch(image_size, batch_size):
+    obs_dim = 3 * image_size * image_size + GOAL_DIM
+    return dict(
+        observations=torch.rand(batch_size, obs_dim) * 2 - 1,
+        next_observations=torch.rand(batch_size, obs_dim) * 2 - 1,
+        actions=torch.rand(batch_size, ACTION_DIM) * 2 - 1,
+        rewards=torch.rand(batch_size, 1),
+        terminals=torch.zeros(batch_size, 1),
+    )
+
+
+def measure(trainer, batch, steps):
+    macs = []
+
+    def count(module, input, output):
+        macs.append(output.numel() * module.in_channels // module.groups *
+                    int(np.prod(module.kernel_size)))
+
+    hooks = [m.register_forward_hook(count) for network in trainer.networks
+             for m in network.modules() if isinstance(m, nn.Conv2d)]
+    # a policy step and a critic only step, TD3 alternates them
+    trainer.train_from_torch(dict(batch))
+    trainer.train_from_torch(dict(batch))
+    macs_per_step = sum(macs) / 2
+    for hook in hooks:
+        hook.remove()
+
+    return macs_per_step, time_calls(lambda: trainer.train_from_torch(dict(batch)), steps, warmup=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image_size', type=int, default=64)
+    parser.add_argument('--batch_size', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    batch = make_batch(args.image_size, args.batch_size)
+    trainers = [
+        ('separate CNNs', separate_trainer(args.image_size)),
+        ('shared encoder', shared_trainer(args.image_size, detach_encoder=False)),
+        ('shared encoder, detached actor', shared_trainer(args.image_size, detach_encoder=True)),
+    ]
+    results = []
+    for name, trainer in trainers:
+        macs, seconds = measure(trainer, batch, args.steps)
+        results.append((name, seconds * 1e3, "{:8.2f} conv GMACs/step (forward)".format(macs / 1e9)))
+    print_results(results, 'ms/step', per_second=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Epoch time of TD3 training followed by a snapshot: none, synchronous torch.save
+on the training thread, and the background SnapshotWriter. The snapshot holds
+the trainer, like RLAlgorithm._end_epoch, and optionally a replay buffer of
+the given size, which Logger leaves out of the per-epoch snapshot when it is
+checkpointed on its own (--replay_buffer_snapshot_gap).
+
+    python scripts/benchmark_snapshots.py --epochs 5 --buffer_size 100000
+"""
+import argparse
+import copy
+import os
+import tempfile
+
+import torch
+
+from rlkit.core.snapshot_writer import SnapshotWriter
+from rlkit.data_management.simple_replay_buffer import SimpleReplayBuffer
+from rlkit.torch.conv_networks import FlattenCNN, TanhCNNPolicy
+from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.util.benchmark import cnn_kwargs, print_results, time_calls
+
+ACTION_DIM = 4
+CONV_ARGS = cnn_kwargs(64)
+OBS_DIM = 3 * 64 * 64
+
+
+def make_trainer():
+    policy = TanhCNNPolicy(output_size=ACTION_DIM, **CONV_ARGS)
+    qfs = [FlattenCNN(output_size=1, added_fc_input_size=ACTION_DIM, **CONV_ARGS) for _ in range(2)]
+    return TD3Trainer(policy=policy, target_policy=copy.deepcopy(policy), qf1=qfs[0], qf2=qfs[1],
+                      target_qf1=copy.deepcopy(qfs[0]), target_qf2=copy.deepcopy(qfs[1]))
+
+
+def make_buffer(size):
+    buffer = SimpleReplayBuffer(size, OBS_DIM, ACTION_DIM, env_info_sizes={})
+    buffer._size = size
+    return buffer
+
+
+def epoch_time(trainer, buffer, args, save):
+    """
+    :return: (float) mean seconds per epoch of training followed by save()
+    """
+    def epoch():
+        for _ in range(args.steps_per_epoch):
+            trainer.train(buffer.random_batch(args.batch_size))
+        save()
+    return time_calls(epoch, args.epochs, warmup=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--steps_per_epoch', type=int, default=20)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--buffer_size', type=int, default=10000)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    trainer = make_trainer()
+    buffer = make_buffer(args.buffer_size)
+    folder = tempfile.mkdtemp()
+    file_name = os.path.join(folder, 'params.pkl')
+
+    def snapshot(with_buffer):
+        params = trainer.get_snapshot()
+        if with_buffer:
+            params['replay_buffer'] = buffer
+        return params
+
+    def sync_save(with_buffer):
+        return lambda: torch.save(snapshot(with_buffer), file_name)
+
+    writer = SnapshotWriter(async_writes=True)
+
+    results = [
+        ('no snapshot', epoch_time(trainer, buffer, args, lambda: None)),
+        ('torch.save with replay buffer', epoch_time(trainer, buffer, args, sync_save(True))),
+        ('torch.save', epoch_time(trainer, buffer, args, sync_save(False))),
+        ('SnapshotWriter', epoch_time(trainer, buffer, args, lambda: writer.save([file_name], snapshot(False)))),
+    ]
+    writer.flush()
+    print_results(results, 's/epoch', per_second=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Per-update time of ptu.soft_update_from_to against TargetNetwork.update, for the
+policy and critic CNNs of ISE_7202/train.py (hidden sizes [1024, 512, 256]).
+
+    python scripts/benchmark_target_network.py --updates 1000
+"""
+import argparse
+
+import rlkit.torch.pytorch_util as ptu
+from rlkit.torch.conv_networks import FlattenCNN, TanhCNNPolicy
+from rlkit.torch.target_network import TargetNetwork
+from rlkit.util.benchmark import cnn_kwargs, print_results, time_calls
+
+ACTION_DIM = 4
+GOAL_DIM = 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image_size', type=int, default=64)
+    parser.add_argument('--image_channels', type=int, default=3)
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--gpu', action='store_true', default=False)
+    args = parser.parse_args()
+
+    ptu.set_gpu_mode(args.gpu)
+    kwargs = cnn_kwargs(args.image_size, hidden_sizes=[1024, 512, 256], input_channels=args.image_channels)
+
+    def make_td3_networks():
+        # the three (online, target) pairs updated by TD3Trainer
+        policies = [TanhCNNPolicy(output_size=ACTION_DIM, **kwargs) for _ in range(2)]
+        critics = [FlattenCNN(output_size=1, added_fc_input_size=ACTION_DIM + GOAL_DIM, **kwargs)
+                   for _ in range(4)]
+        pairs = [(policies[0], policies[1]), (critics[0], critics[1]), (critics[2], critics[3])]
+        return [(s.to(ptu.device), t.to(ptu.device)) for s, t in pairs]
+
+    pairs = make_td3_networks()
+    num_params = sum(p.numel() for s, _ in pairs for p in s.parameters())
+    num_tensors = sum(len(list(s.parameters())) for s, _ in pairs)
+    print("{} parameter tensors, {:.1f}M parameters per set of online networks".format(
+        num_tensors, num_params / 1e6))
+
+    def loop_update():
+        for source, target in pairs:
+            ptu.soft_update_from_to(source, target, 0.005)
+
+    target_networks = [TargetNetwork(s, t) for s, t in make_td3_networks()]
+
+    def fused_update():
+        for target_network in target_networks:
+            target_network.update(0.005)
+
+    print_results([
+        ('soft_update_from_to', 1e3 * time_calls(loop_update, args.updates, device=ptu.device)),
+        ('TargetNetwork', 1e3 * time_calls(fused_update, args.updates, device=ptu.device)),
+    ], 'ms/update', per_second=False)
+
+
+if __name__ == '__main__':
+    main()
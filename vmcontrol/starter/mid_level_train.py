@@ -7,8 +7,16 @@ from rlkit.exploration_strategies.gaussian_and_epsilon_strategy import GaussianA
 from rlkit.launchers.launcher_util import setup_logger
 from rlkit.samplers.data_collector import MdpPathCollector
 from rlkit.torch.networks import FlattenMlp, TanhMlpPolicy
-from rlkit.torch.conv_networks import CNN, FlattenCNN, TanhCNNPolicy
+from rlkit.torch.conv_networks import CNN, CriticEnsemble, FlattenCNN, TanhCNNPolicy
 from rlkit.torch.td3.td3 import TD3Trainer
+from rlkit.torch.td3.compiled_td3 import CompiledTD3Trainer
+from rlkit.torch.inference import InferencePolicy
+from rlkit.torch.encoder_service import EncoderService
+from rlkit.torch.readout import ReadoutTransform
+from rlkit.torch.frame_encoder import FrameEncoder, FrameEncodingPolicy
+from rlkit.torch.student_encoder import load_student
+from rlkit.torch.encoder_transform import EncoderTransform, resize_images
+from rlkit.data_management.feature_cache import FeatureCache
 from rlkit.torch.torch_rl_algorithm import TorchBatchRLAlgorithm
 from torch import nn as nn
 import gym
@@ -49,7 +57,7 @@ from rlkit.torch.torch_rl_algorithm import TorchBatchRLAlgorithm
 from rlkit.torch.td3.td3 import TD3Trainer
 from rlkit.torch.networks import FlattenMlp, TanhMlpPolicy
 
-def experiment(variant):
+def experiment(variant, frame_encoder=None):
     # NOTE: This is calling the dict envs for the variant's specified 'env'.,
     #       A string name for a given taks,
     #       This returns a lambda which is passed the variant's dr (T/F flag
@@ -66,6 +74,13 @@ def experiment(variant):
     observation_key = 'observation'
     desired_goal_key = 'desired_goal'
     achieved_goal_key = "achieved_goal"
+    # Re-rendered HER steps and their features, looked up instead of rendered and encoded again
+    feature_cache = None
+    if variant['feature_cache_mb'] > 0:
+        feature_cache = FeatureCache(
+            max_bytes=int(variant['feature_cache_mb'] * 2 ** 20),
+            spill_dir=variant['feature_cache_spill_dir'],
+        )
     replay_buffer = imgObsDictRelabelingBuffer(
         env=expl_env,
         # NOTE: Somehow, this relates to  multi-processing??
@@ -74,6 +89,8 @@ def experiment(variant):
         desired_goal_key=desired_goal_key,
         achieved_goal_key=achieved_goal_key,
         t_fn=variant['t_fn'],
+        batch_t_fn=variant.get('batch_t_fn'),
+        feature_cache=feature_cache,
         **variant['replay_buffer_kwargs']
     )
     # NOTE: Here is where they define their CNN network structure
@@ -85,8 +102,8 @@ def experiment(variant):
         if variant['alt'] == 'both':
             # NOTE: Alt implies using the two shoulder cams (I think)
             conv_args = {
-                    "input_width": 16,
-                    "input_height": 16,
+                    "input_width": variant['feature_resolution'],
+                    "input_height": variant['feature_resolution'],
                     "input_channels": 16,
                     "kernel_sizes": [4],
                     "n_channels": [32],
@@ -103,8 +120,8 @@ def experiment(variant):
         else:
             # NOTE: Same as conv args above???
             conv_args = {
-                    "input_width": 16,
-                    "input_height": 16,
+                    "input_width": variant['feature_resolution'],
+                    "input_height": variant['feature_resolution'],
                     "input_channels": 8,
                     "kernel_sizes": [4],
                     "n_channels": [32],
@@ -167,30 +184,51 @@ def experiment(variant):
     #           policy_kwargs=dict(
     #               hidden_sizes=[256,256,256],
     #           ),
-    qf1 = FlattenCNN(
-        output_size=1,
-        added_fc_input_size=action_dim,
-        **variant['qf_kwargs'],
-        **conv_args
-    )
-    qf2 = FlattenCNN(
-        output_size=1,
-        added_fc_input_size=action_dim,
-        **variant['qf_kwargs'],
-        **conv_args
-    )
-    target_qf1 = FlattenCNN(
-        output_size=1,
-        added_fc_input_size=action_dim,
-        **variant['qf_kwargs'],
-        **conv_args
-    )
-    target_qf2 = FlattenCNN(
-        output_size=1,
-        added_fc_input_size=action_dim,
-        **variant['qf_kwargs'],
-        **conv_args
-    )
+    if variant['num_critics'] > 0:
+        # NOTE: The critics are stacked in one module and trained in one batched pass
+        critic_kwargs = dict(
+            num_critics=variant['num_critics'],
+            output_size=1,
+            added_fc_input_size=action_dim,
+            **variant['qf_kwargs'],
+            **conv_args
+        )
+        critics = dict(
+            qf_ensemble=CriticEnsemble(**critic_kwargs),
+            target_qf_ensemble=CriticEnsemble(**critic_kwargs),
+            target_q_reduction=variant['target_q_reduction'],
+        )
+    else:
+        qf1 = FlattenCNN(
+            output_size=1,
+            added_fc_input_size=action_dim,
+            **variant['qf_kwargs'],
+            **conv_args
+        )
+        qf2 = FlattenCNN(
+            output_size=1,
+            added_fc_input_size=action_dim,
+            **variant['qf_kwargs'],
+            **conv_args
+        )
+        target_qf1 = FlattenCNN(
+            output_size=1,
+            added_fc_input_size=action_dim,
+            **variant['qf_kwargs'],
+            **conv_args
+        )
+        target_qf2 = FlattenCNN(
+            output_size=1,
+            added_fc_input_size=action_dim,
+            **variant['qf_kwargs'],
+            **conv_args
+        )
+        critics = dict(
+            qf1=qf1,
+            qf2=qf2,
+            target_qf1=target_qf1,
+            target_qf2=target_qf2,
+        )
     policy = TanhCNNPolicy(
         output_size=action_dim,
         **variant['policy_kwargs'],
@@ -222,9 +260,13 @@ def experiment(variant):
 
     # NOTE: We wrap the exploration strategy with the policy and use this as
     #       an input into the Path collectors. This wrapper is unchanged.
+    rollout_policy = InferencePolicy(policy, freeze=True) if variant['fast_inference'] else policy
+    if frame_encoder is not None:
+        # The env observations are raw frames, encoded before the policy acts on them
+        rollout_policy = FrameEncodingPolicy(rollout_policy, frame_encoder)
     exploration_policy = PolicyWrappedWithExplorationStrategy(
         exploration_strategy=es,
-        policy=policy,
+        policy=rollout_policy,
     )
     # eval_path_collector = MdpPathCollector(
     #     eval_env,
@@ -249,13 +291,11 @@ def experiment(variant):
 
     # NOTE: This class is where the TD3 algorithm is implemented. I.e.,
     #       the logic for when to update the networks.
-    trainer = TD3Trainer(
+    trainer_class = CompiledTD3Trainer if variant['compile'] else TD3Trainer
+    trainer = trainer_class(
         policy=policy,
-        qf1=qf1,
-        qf2=qf2,
-        target_qf1=target_qf1,
-        target_qf2=target_qf2,
         target_policy=target_policy,
+        **critics,
         **variant['trainer_kwargs']
     )
 
@@ -272,6 +312,7 @@ def experiment(variant):
         exploration_data_collector=expl_path_collector,
         evaluation_data_collector=None,
         replay_buffer=replay_buffer,
+        observation_encoder=frame_encoder,
         **variant['algorithm_kwargs']
     )
     algorithm.to(ptu.device)
@@ -313,6 +354,26 @@ if __name__ == "__main__":
     parser.add_argument('--checkpoint', type=int, default=-1, help="to select a checkpointed model. -999 for random, -9 for init taskonomy, -1 for best, +int % 20 for checkpoints.")
     parser.add_argument('--blank', action="store_true", default=False, help="Whether to use envs with pixel observations as all 0s. ")
     parser.add_argument("--readout", action="store_true", default=False, help="Whether to use readouts directly to train. ")    
+    parser.add_argument('--readout_dtype', type=str, default='float32', choices=['float32', 'float16', 'uint8'], help="Dtype the readouts are copied to the host in. ")
+    parser.add_argument('--num_critics', type=int, default=0, help="Number of critics of a CriticEnsemble. 0 for the separate twin critics. ")
+    parser.add_argument('--target_q_reduction', type=str, default='min', choices=['min', 'mean'], help="How the ensemble's target Q values are reduced. ")
+    parser.add_argument('--batches_per_sample', type=int, default=1, help="Number of batches sampled from the replay buffer and moved to the device at once. ")
+    parser.add_argument('--compile', action="store_true", default=False, help="Whether to compile the TD3 updates (CUDA graphs on GPU, torch.compile on CPU). ")
+    parser.add_argument('--replay_buffer_snapshot_gap', type=int, default=0, help="Epochs between two incremental checkpoints of the replay buffer, 0 for none. ")
+    parser.add_argument('--fast_inference', action="store_true", default=False, help="Whether to act with a frozen TorchScript copy of the policy under inference mode during the rollouts. ")
+    parser.add_argument('--encoder_service', action="store_true", default=False, help="Whether to encode the mid-level features of every env and re-rendered frame in dynamic batches. ")
+    parser.add_argument('--encoder_max_batch', type=int, default=64, help="Largest batch of frames of the encoder service. ")
+    parser.add_argument('--encoder_max_wait_ms', type=float, default=2., help="Milliseconds a frame waits for others to batch with in the encoder service. ")
+    parser.add_argument('--feature_cache_mb', type=float, default=0, help="Memory budget of the cache of the re-rendered HER steps and their features, 0 for no cache. ")
+    parser.add_argument('--learner_encoding', action="store_true", default=False, help="Whether to store raw uint8 frames in the replay buffer and encode the mid-level features of every sampled batch in the learner. ")
+    parser.add_argument('--encoder_amp', action="store_true", default=False, help="Whether to autocast the learner-side encoder to fp16 (bf16 on CPU). ")
+    parser.add_argument('--feature_dtype', type=str, default=None, choices=['float32', 'float16', 'int8'], help="Dtype the replay buffer stores the observations in, float64 by default. int8 stores a scale per channel. ")
+    parser.add_argument('--feature_projection_dim', type=int, default=None, help="Store the observations projected on this number of principal components, fitted on the steps before training. ")
+    parser.add_argument('--student_path', type=str, default=None, help="StudentEncoder written by midlevel_features/distill.py, encodes the mid-level features instead of the Taskonomy encoder. ")
+    parser.add_argument('--student_device', type=str, default='cpu', help="Device the student encoder runs on. ")
+    parser.add_argument('--img_size', type=int, default=None, help="Side of the frames the envs render with mid-level features or readouts, 256 by default. ")
+    parser.add_argument('--encoder_resolution', type=int, default=256, help="Side the frames are resized to on the device before the mid-level encoder, a multiple of 16. ")
+    parser.add_argument('--feature_cache_spill_dir', type=str, default=None, help="Directory the feature cache spills its evicted entries to, none by default. ")
     args = parser.parse_args()
     
 
@@ -325,7 +386,8 @@ if __name__ == "__main__":
         img_size = 64
 
     else:
-        img_size = 256
+        img_size = args.img_size or 256
+    assert args.encoder_resolution % 16 == 0, "Error: --encoder_resolution must be a multiple of 16"
     print("img size", img_size)
     rand_config = VisualRandomizationConfig(
             # NOTE: Using the RLBench default textures for Domain Randomization
@@ -381,7 +443,8 @@ if __name__ == "__main__":
             max_path_length=args.max_path_length,
             batch_size=128,
             random_before_training = True,
-            num_epochs_per_eval=0
+            num_epochs_per_eval=0,
+            num_batches_per_sample=args.batches_per_sample,
         ),
         trainer_kwargs=dict(
             policy_learning_rate=args.lr,
@@ -393,6 +456,12 @@ if __name__ == "__main__":
         replay_buffer_kwargs=dict(
             max_size=args.replay_buffer_size,
             k=4,
+            feature_dtype=args.feature_dtype,
+            # a scale per feature map of the encoders, or per color channel
+            feature_channels=3 if args.readout or not args.mlf else (16 if args.alt == "both" else 8),
+            feature_projection_dim=args.feature_projection_dim,
+            projection_warmup_size=args.min_num_steps_before_training,
+            observation_dtype='uint8' if args.learner_encoding else 'float64',
         ),        
         env=args.env,
         dr = args.dr,
@@ -406,7 +475,17 @@ if __name__ == "__main__":
         alt = args.alt,
         checkpoint=args.checkpoint,
         blank = args.blank,
-        readout = args.readout
+        readout = args.readout,
+        num_critics = args.num_critics,
+        target_q_reduction = args.target_q_reduction,
+        compile = args.compile,
+        fast_inference = args.fast_inference,
+        learner_encoding = args.learner_encoding,
+        feature_cache_mb = args.feature_cache_mb,
+        feature_cache_spill_dir = args.feature_cache_spill_dir,
+        # side of the mid-level feature maps
+        feature_resolution = args.encoder_resolution // 16,
+        img_size = img_size,
     )
 
 
@@ -421,7 +500,8 @@ if __name__ == "__main__":
         "denoise": "denoising"
     }
     default_device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
-    if args.mlf or args.readout:
+    # the student replaces the Taskonomy network, which is then not loaded
+    if args.readout or (args.mlf and not args.student_path):
         taskonomy_feature = map_task_to_taskonomy[args.feature_task]
         VisualPriorPredictedLabel._load_unloaded_nets([taskonomy_feature])
         VisualPriorPredictedLabel.feature_task_to_net[taskonomy_feature] = VisualPriorPredictedLabel.feature_task_to_net[taskonomy_feature].to(default_device)
@@ -459,6 +539,16 @@ if __name__ == "__main__":
             net.encoder.normalize_outputs=True
             net.eval()
 
+    # the encoder of the mid-level features and the device it runs on
+    encoder, encoder_device = None, default_device
+    if args.mlf and not args.readout:
+        if args.student_path:
+            encoder_device = args.student_device
+            encoder = load_student(args.student_path, device=encoder_device)
+            print("Student encoder", encoder.metadata)
+        else:
+            encoder = net.encoder
+
     # ----------------------------------------------------------------------------------------- #
     # NOTE: This logic selects the functions                                                    #
     #           - t_fn(obs: UNKNOWN TYPE)                                                       #
@@ -468,84 +558,70 @@ if __name__ == "__main__":
     #           - expl_env = TransformObservationWrapper                                        #
     #           - replay_buffer = imgObsDictRelabelingBuffer                                    #
     # ----------------------------------------------------------------------------------------- #
-    # single view cases
-    if not args.alt=="both":
+    # The frames are rendered at img_size and resized to encoder_resolution on the device, with
+    # alt view both the front and alt features are concatenated along the channels
+    if encoder is not None:
+        encoder_transform = EncoderTransform(
+            encoder,
+            args.encoder_resolution,
+            num_views=2 if args.alt=="both" else 1,
+            device=encoder_device,
+        )
+        # bound methods, the variant is logged by name and the transform itself stays out of it
+        t_fn = encoder_transform.transform
+        main_t_fn = encoder_transform.transform_observation
+    if args.readout:
+        # Readouts max pooled from img_size x img_size to 64x64 on the device, under inference mode
+        readout_transform = ReadoutTransform(net, (3,img_size,img_size), output_size=64, dtype=args.readout_dtype)
+        t_fn = readout_transform.transform
+
+        def main_t_fn(o):
+            o['observation'] = readout_transform.transform(o['observation'])
+            return o
+
+    # Raw uint8 frames in the replay buffer, encoded by the learner on every sampled batch,
+    # the FrameEncoder is handed to experiment on its own, out of the logged variant
+    frame_encoder = None
+    if args.mlf and not args.readout and args.learner_encoding:
+        frame_encoder = FrameEncoder(
+            encoder,
+            (3,img_size,img_size),
+            num_views=2 if args.alt=="both" else 1,
+            amp=args.encoder_amp,
+            input_resolution=args.encoder_resolution,
+        )
         def t_fn(obs):
             # Expects obs to come between 0 and 1
-            INPUT_SHAPE = (3,256,256)
-            obs = obs * 2 - 1
-            obs = torch.tensor(obs, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            with torch.no_grad():
-                obs = net.encoder(obs)
-                return np.array(obs.cpu()).flatten()
-            return obs
+            return np.rint(np.asarray(obs) * 255).astype(np.uint8).flatten()
         def main_t_fn(obs):
-            o = obs['observation']
-            #Expects obs to come between 0 and 1
-            INPUT_SHAPE = (3,256,256)
-            o = o * 2 - 1
-            o = torch.tensor(o, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            with torch.no_grad():
-                o = net.encoder(o)
-            obs['observation'] = np.array(o.cpu()).flatten()
+            obs['observation'] = t_fn(obs['observation'])
             return obs
-    # alt view is both
-    else:
-        def t_fn(obs):
-            # Expects obs to come between 0 and 1
-            INPUT_SHAPE = (3,256,256)
-            obs = obs * 2 - 1
-            front, alt = obs
-            front = torch.tensor(front, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            alt = torch.tensor(alt, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            with torch.no_grad():
-                front = net.encoder(front).cpu()
-                alt = net.encoder(alt).cpu()
-                return np.concatenate([front, alt], axis=1).flatten()
 
+    # One encoder service for the exploration env, the re-rendered frames of the replay buffer
+    # and evaluation, which encodes the frames in batches instead of one at a time
+    if args.mlf and not args.readout and args.encoder_service and not args.learner_encoding:
+        encoder_service = EncoderService(
+            lambda frames: encoder(resize_images(frames, args.encoder_resolution) * 2 - 1),
+            (3,img_size,img_size),
+            max_batch_size=args.encoder_max_batch,
+            max_wait=args.encoder_max_wait_ms / 1000,
+            device=encoder_device,
+        )
+        if not args.alt=="both":
+            t_fn = encoder_service.encode
+            def batch_t_fn(observations):
+                return encoder_service.encode_batch(observations)
+        else:
+            # the front and alt features concatenated along the channels, like above
+            def t_fn(obs):
+                return encoder_service.encode_batch(obs).flatten()
+            def batch_t_fn(observations):
+                frames = [view for obs in observations for view in obs]
+                return encoder_service.encode_batch(frames).reshape(len(observations), -1)
         def main_t_fn(obs):
-            o = obs['observation']
-            #Expects obs to come between 0 and 1
-            INPUT_SHAPE = (3,256,256)
-            o = o * 2 - 1
-            front, alt = o
-            front = torch.tensor(front, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            alt = torch.tensor(alt, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            with torch.no_grad():
-                front = net.encoder(front).cpu()
-                alt = net.encoder(alt).cpu()
-            obs['observation'] = np.concatenate([front, alt], axis=1).flatten()
+            obs['observation'] = t_fn(obs['observation'])
             return obs
-    if args.readout:
-        def t_fn(obs):
-            INPUT_SHAPE = (3,256,256)
-            obs = obs*2 - 1
-            default_device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            obs = torch.tensor(obs, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            obs = net(obs)
-            input_size = 256
-            output_size = 64
-            bin_size = input_size // output_size
-            small_image = np.array(obs.detach().cpu()).reshape((3, output_size, bin_size, 
-                                                output_size, bin_size)).max(4).max(2).flatten()
-            # small_image = small_image.astype(np.uint8)
-            return small_image
-
-        def main_t_fn(o):
-            obs = o['observation']
-            INPUT_SHAPE = (3,256,256)
-            obs = obs*2 - 1
-            default_device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            obs = torch.tensor(obs, device=default_device).float().reshape([1, *INPUT_SHAPE])
-            obs = net(obs)
-            input_size = 256
-            output_size = 64
-            bin_size = input_size // output_size
-            small_image = np.array(obs.detach().cpu()).reshape((3, output_size, bin_size, 
-                                                output_size, bin_size)).max(4).max(2).flatten()
-            # small_image = small_image.astype(np.uint8)
-            o['observation'] = small_image 
-            return o
+        variant["batch_t_fn"] = batch_t_fn
 
     if args.mlf or args.readout:
         variant["t_fn"] = t_fn
@@ -563,5 +639,5 @@ if __name__ == "__main__":
         mlf_label = "mlf"
     else:
         mlf_label = "pixels"
-    setup_logger('trial{}-{}-HER-{}{}{}-{}-{}-{}'.format(args.trial, args.special_name, mlf_label, args.env,dr_flag(args.dr), args.feature_task, args.noise, args.lr), variant=variant, snapshot_mode='gap_and_last', snapshot_gap=100)
-    experiment(variant)
+    setup_logger('trial{}-{}-HER-{}{}{}-{}-{}-{}'.format(args.trial, args.special_name, mlf_label, args.env,dr_flag(args.dr), args.feature_task, args.noise, args.lr), variant=variant, snapshot_mode='gap_and_last', snapshot_gap=100, snapshot_async=True, replay_buffer_snapshot_gap=args.replay_buffer_snapshot_gap)
+    experiment(variant, frame_encoder=frame_encoder)
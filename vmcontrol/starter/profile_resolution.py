@@ -0,0 +1,144 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import torch
+
+from rlkit.torch.encoder_transform import profile_resolutions
+from rlkit.torch.student_encoder import load_student
+
+'''
+Latency and quality of the mid-level features of mid_level_train.py at every --encoder_resolution,
+to pick the cheapest --img_size / --encoder_resolution that is still acceptable. For every
+resolution it reports:
+    - the render time of a frame: an env step with a random action at that img_size
+    - the encode latency of a frame at that resolution, like t_fn
+    - the feature drift against 256x256: the MSE relative to the mean square of the 256x256
+      features, to which the features are bilinearly resized, and their cosine similarity
+
+The drift is measured on the frames of the largest render, resized to every resolution on the
+device. Example usage:
+
+python profile_resolution.py --feature_task normal --env reach --resolutions 64 96 128 192 256
+python profile_resolution.py --student_path /path/to/student.pt --cache_path /path/to/cache --no_render
+'''
+
+map_task_to_taskonomy = {
+    "normal" : "normal",
+    "sobel": "edge_texture",
+    "depth": "depth_euclidean",
+    "segment_semantic": "segment_semantic",
+    "segment_img": "segment_semantic",
+    "sobel_3d": "edge_occlusion",
+    "autoencoder": "autoencoding",
+    "denoise": "denoising"
+}
+
+
+def make_env(env_name, img_size):
+    import gym
+    import rlbench.gym
+    # the envs of mid_level_train.py, without domain randomization
+    if env_name == 'reach':
+        return gym.make('reach_target_easy-vision-v0', sparse=True, img_size=img_size, force_randomly_place=True, force_change_position=False)
+    if env_name == 'push_rotate':
+        return gym.make('slide_block_to_target-vision-v0', sparse=True, fixed_grip=0, img_size=img_size, force_randomly_place=False, force_change_position=False)
+    if env_name == 'pick_and_place':
+        return gym.make('pick_and_lift-vision-v0', sparse=True, img_size=img_size, force_randomly_place=False, force_change_position=False)
+    raise ValueError("Error: unknown env {}".format(env_name))
+
+
+def render(env_name, img_size, num_frames, seed=0):
+    """
+    :return: (float, np.ndarray) seconds per env step, and the [num_frames, 3, img_size, img_size] frames
+    """
+    env = make_env(env_name, img_size)
+    env.seed(seed)
+    env.action_space.seed(seed)
+    frames = [env.reset()['observation']]
+    start = time.time()
+    for _ in range(num_frames - 1):
+        obs, _, done, _ = env.step(env.action_space.sample())
+        frames.append(obs['observation'])
+        if done:
+            frames[-1] = env.reset()['observation']
+    step_time = (time.time() - start) / max(num_frames - 1, 1)
+    env.close()
+    return step_time, np.stack([np.reshape(f, (3, img_size, img_size)) for f in frames]).astype(np.float32)
+
+
+def cached_frames(cache_path, num_frames):
+    """
+    :return: (np.ndarray) [num_frames, 3, H, W] rgb frames in [0, 1] of a pack_data.py cache
+    """
+    rgb = np.load(cache_path.rstrip('/') + '/rgb.npy', mmap_mode='r')
+    indices = np.linspace(0, len(rgb) - 1, num_frames).astype(np.int64)
+    return np.ascontiguousarray(rgb[indices]).transpose(0, 3, 1, 2).astype(np.float32) / 255
+
+
+def load_encoder(args, device):
+    if args.student_path:
+        return load_student(args.student_path, device=device)
+    taskonomy_feature = map_task_to_taskonomy[args.feature_task]
+    VisualPriorPredictedLabel._load_unloaded_nets([taskonomy_feature])
+    net = VisualPriorPredictedLabel.feature_task_to_net[taskonomy_feature]
+    if args.models_path:
+        net.load_state_dict(torch.load(args.models_path + "/" + args.feature_task + "/bestModel.pth", map_location='cpu'))
+    net.encoder.eval()
+    net.encoder.normalize_outputs = True
+    return net.encoder.to(device)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Profile the mid-level features at every encoder resolution')
+    parser.add_argument('--feature_task', type=str, default='normal', help='Taskonomy encoder to profile. One of sobel, normal, segment_semantic, or depth')
+    parser.add_argument('--models_path', type=str, default="", help='Same as mid_level_train.py, path/feature_task/bestModel.pth. Default is the Taskonomy weights.')
+    parser.add_argument('--student_path', type=str, default=None, help='Profile a StudentEncoder of midlevel_features/distill.py instead')
+    parser.add_argument('--env', type=str, default='reach', help='Env to render the frames with. One of reach, push_rotate or pick_and_place')
+    parser.add_argument('--cache_path', type=str, default="", help='Folder written by pack_data.py, its frames are used instead of rendered ones')
+    parser.add_argument('--no_render', action='store_true', default=False, help='Do not time the renders, needs --cache_path')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[64, 96, 128, 160, 192, 224, 256], help='Encoder resolutions and img sizes to profile, multiples of 16')
+    parser.add_argument('--num_frames', type=int, default=32, help='Frames rendered and encoded per resolution')
+    parser.add_argument('--device', type=str, default='cuda:0' if torch.cuda.is_available() else 'cpu', help='Device the encoder runs on')
+    parser.add_argument('--threads', type=int, default=None, help='Torch threads, e.g. 1 like a CPU rollout worker')
+    parser.add_argument('--out', type=str, default=None, help='Write the results to this json file')
+    args = parser.parse_args()
+    assert all(r % 16 == 0 for r in args.resolutions), "Error: the resolutions must be multiples of 16"
+    assert args.cache_path or not args.no_render, "Error: --no_render needs --cache_path"
+
+    if not args.student_path:
+        from visualpriors.transforms import VisualPriorPredictedLabel
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    # render first, the simulator and the encoder do not share the device
+    render_times = {}
+    frames = None
+    if not args.no_render:
+        for resolution in sorted(set(args.resolutions + [256]), reverse=True):
+            render_times[resolution], rendered = render(args.env, resolution, args.num_frames)
+            if frames is None:
+                frames = rendered
+    if args.cache_path:
+        frames = cached_frames(args.cache_path, args.num_frames)
+
+    encoder = load_encoder(args, args.device)
+    results = profile_resolutions(encoder, torch.from_numpy(frames), args.resolutions, reference_resolution=256,
+                                  device=args.device)
+
+    print("{:>10s} {:>12s} {:>10s} {:>10s} {:>12s} {:>8s}".format(
+        'resolution', 'features', 'render ms', 'encode ms', 'relative MSE', 'cosine'))
+    for result in results:
+        result['render_ms'] = render_times[result['resolution']] * 1000 if render_times else None
+        print("{:>10d} {:>12s} {:>10s} {:10.2f} {:12.4f} {:8.4f}".format(
+            result['resolution'],
+            'x'.join(str(d) for d in result['feature_shape']),
+            '-' if result['render_ms'] is None else '{:.2f}'.format(result['render_ms']),
+            result['latency_ms'],
+            result['relative_mse'],
+            result['cosine'],
+        ))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)